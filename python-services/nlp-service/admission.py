@@ -0,0 +1,131 @@
+"""
+Admission control for the expensive endpoints.
+
+Without a limit, an ingest spike is accepted in full: every request holds
+memory and competes for the same OpenAI quota, and latency grows for all of
+them. Each gated endpoint gets a concurrency limit and a bounded FIFO wait
+queue. A request that finds the queue full is rejected at once with 429, and
+one that waits longer than the queue timeout gets 503; both carry a
+Retry-After estimated from the recent service time, so clients back off
+instead of piling up.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, endpoint: str, reason: str, status_code: int, retry_after: int):
+        super().__init__(f"{endpoint}: {reason}")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    def __init__(self, endpoint: str, max_concurrency: int, max_queue: int, max_wait_seconds: float = 30.0):
+        """
+        Args:
+            endpoint: Route path (for errors and metrics)
+            max_concurrency: Requests processed at the same time
+            max_queue: Requests allowed to wait for a slot; more are rejected with 429
+            max_wait_seconds: Longest wait for a slot before rejecting with 503
+        """
+        self.endpoint = endpoint
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds = 1.0  # EWMA of request durations, for Retry-After
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a newcomer: the queue ahead drained at the current rate."""
+        estimate = self._service_seconds * (self.queued + 1) / self.max_concurrency
+        return int(min(60, max(1, math.ceil(estimate))))
+
+    async def acquire(self) -> float:
+        """
+        Take a slot, waiting in the queue when all are busy.
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            AdmissionRejected: Queue full (429) or waited longer than max_wait_seconds (503)
+        """
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(self.endpoint, QUEUE_FULL, 429, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        enqueued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionRejected(self.endpoint, QUEUE_TIMEOUT, 503, self.retry_after()) from None
+        return time.monotonic() - enqueued_at
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        if service_seconds is not None:
+            self._service_seconds += 0.2 * (service_seconds - self._service_seconds)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the oldest live waiter, so in_flight never dips below the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight = max(0, self.in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self):
+        queued_seconds = await self.acquire()
+        start = time.monotonic()
+        try:
+            yield queued_seconds
+        finally:
+            self.release(time.monotonic() - start)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "queued": self.queued,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+
+class AdmissionController:
+    """Admission gates by route path; routes without a gate are not limited."""
+
+    def __init__(self):
+        self.gates: Dict[str, AdmissionGate] = {}
+
+    def add(self, gate: AdmissionGate) -> None:
+        self.gates[gate.endpoint] = gate
+
+    def gate_for(self, endpoint: str) -> Optional[AdmissionGate]:
+        return self.gates.get(endpoint)
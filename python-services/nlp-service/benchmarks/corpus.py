@@ -0,0 +1,88 @@
+"""
+Benchmark corpora built from the ontology email fixtures.
+
+Each document is the subject plus plain-text body of one ``.eml`` fixture,
+tagged with the ontology it belongs to, so benchmarks exercise the service
+with the same kind of text the ingestion pipeline sends it.
+"""
+
+import json
+from dataclasses import dataclass
+from email import policy
+from email.parser import BytesParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+ONTOLOGIES_DIR = REPO_ROOT / "ontologies"
+DEFAULT_CORPORA = ("procurement", "fibo")
+
+
+@dataclass(frozen=True)
+class Document:
+    doc_id: str
+    ontology: str
+    text: str
+
+
+def read_email_text(path: Path) -> str:
+    """
+    Extract "Subject + body" from an .eml file.
+
+    Args:
+        path: Path to the .eml fixture
+
+    Returns:
+        Plain text of the message
+    """
+    with open(path, "rb") as f:
+        message = BytesParser(policy=policy.default).parse(f)
+    body = message.get_body(preferencelist=("plain", "html"))
+    content = body.get_content() if body is not None else ""
+    subject = message.get("Subject", "")
+    return f"{subject}\n\n{content}".strip() if subject else content.strip()
+
+def load_corpus(ontologies: Sequence[str] = DEFAULT_CORPORA, limit: Optional[int] = None) -> List[Document]:
+    """
+    Load the email fixtures of the given ontologies, interleaved so that any
+    prefix of the corpus mixes ontologies.
+
+    Args:
+        ontologies: Ontology names with a fixtures/emails directory
+        limit: Optional cap on the number of documents
+
+    Returns:
+        List of documents in a stable order
+    """
+    per_ontology: List[List[Document]] = []
+    for ontology in ontologies:
+        email_dir = ONTOLOGIES_DIR / ontology / "fixtures" / "emails"
+        if not email_dir.is_dir():
+            raise FileNotFoundError(f"No email fixtures for ontology '{ontology}' in {email_dir}")
+        per_ontology.append([
+            Document(doc_id=f"{ontology}/{path.name}", ontology=ontology, text=read_email_text(path))
+            for path in sorted(email_dir.glob("*.eml"))
+        ])
+
+    documents: List[Document] = []
+    for i in range(max((len(docs) for docs in per_ontology), default=0)):
+        documents.extend(docs[i] for docs in per_ontology if i < len(docs))
+    return documents[:limit] if limit else documents
+
+def load_compact_ontology(ontology: str) -> Dict[str, Any]:
+    """
+    Compact ontology ({"e": [...], "r": [[source, type, target], ...]}) for a
+    repository ontology, as sent to the service's /ontologies endpoint.
+    """
+    ontology_dir = ONTOLOGIES_DIR / ontology
+    compact_path = ontology_dir / "ontology.compact.json"
+    if compact_path.exists():
+        return json.loads(compact_path.read_text())
+
+    full = json.loads((ontology_dir / "ontology.json").read_text())
+    ignored = set(full.get("ignoredEntities") or [])
+    return {
+        "e": [e["name"] for e in full.get("entities", []) if e["name"] not in ignored],
+        "r": [[r["source"], r["name"], r["target"]] for r in full.get("relationships", [])
+              if r.get("source") and r.get("target")],
+    }
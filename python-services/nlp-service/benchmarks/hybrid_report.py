@@ -0,0 +1,190 @@
+"""
+Accuracy/latency comparison of the "llm" and "hybrid" graph extraction modes.
+
+Sends every corpus document to /extract-graph once per mode (with
+include_timings) and reports, per mode, end-to-end and LLM-stage latency and
+LLM token usage, plus the agreement of hybrid output with the full-LLM output
+used as reference: entity precision/recall/F1 on (value, type), value-only
+entity recall, and relationship F1 on (source, type, target).
+
+Run it against a service backed by the real model or by a replayed cassette;
+against the fake backend the accuracy numbers are meaningless.
+
+    python benchmarks/hybrid_report.py --url http://127.0.0.1:8000 --limit 40 --output hybrid-report.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from corpus import DEFAULT_CORPORA, Document, load_compact_ontology, load_corpus  # noqa: E402
+from load_test import percentile  # noqa: E402
+
+MODES = ("llm", "hybrid")
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value).lower().split())
+
+def entity_keys(response: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    return {(_normalize(e["value"]), e["type"]) for e in response.get("entities", [])}
+
+def relationship_keys(response: Dict[str, Any]) -> Set[Tuple[str, str, str]]:
+    return {
+        (_normalize(r["source"]), r["type"], _normalize(r["target"]))
+        for r in response.get("relationships", [])
+    }
+
+def precision_recall_f1(predicted: Set, reference: Set) -> Dict[str, float]:
+    if not predicted and not reference:
+        return {"precision": 1.0, "recall": 1.0, "f1": 1.0}
+    overlap = len(predicted & reference)
+    precision = overlap / len(predicted) if predicted else 0.0
+    recall = overlap / len(reference) if reference else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+def llm_usage(response: Dict[str, Any]) -> Dict[str, float]:
+    """LLM stage time and tokens from the include_timings breakdown."""
+    timings = (response.get("graph_metadata") or {}).get("timings") or {}
+    usage = {"llm_ms": timings.get("stages_ms", {}).get("llm", 0.0), "prompt_tokens": 0, "completion_tokens": 0}
+    for span in timings.get("spans", []):
+        if span.get("name") == "llm":
+            attributes = span.get("attributes", {})
+            usage["prompt_tokens"] += attributes.get("prompt_tokens") or 0
+            usage["completion_tokens"] += attributes.get("completion_tokens") or 0
+    return usage
+
+async def extract(client: httpx.AsyncClient, document: Document, mode: str) -> Tuple[float, Dict[str, Any]]:
+    start = time.perf_counter()
+    response = await client.post("/extract-graph", json={
+        "text": document.text,
+        "ontology": document.ontology,
+        "extraction_mode": mode,
+        "include_timings": True,
+    })
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()
+
+def summarize_mode(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = sorted(r["latency_ms"] for r in rows)
+    return {
+        "documents": len(rows),
+        "failed": sum(1 for r in rows if r["failed"]),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "mean": round(statistics.mean(latencies), 1) if latencies else 0.0,
+        },
+        "llm_ms_mean": round(statistics.mean(r["llm_ms"] for r in rows), 1) if rows else 0.0,
+        "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+        "completion_tokens": sum(r["completion_tokens"] for r in rows),
+        "entities": sum(r["entities"] for r in rows),
+        "relationships": sum(r["relationships"] for r in rows),
+        "anchor_entities": sum(r["anchors"] for r in rows),
+    }
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    documents = load_corpus(args.corpora, limit=args.limit)
+    rows: Dict[str, List[Dict[str, Any]]] = {mode: [] for mode in MODES}
+    agreement: List[Dict[str, float]] = []
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        for ontology in args.corpora:
+            compact = load_compact_ontology(ontology)
+            (await client.post("/ontologies", json={"ontology": ontology, "compact_ontology": compact})).raise_for_status()
+
+        for i, document in enumerate(documents, 1):
+            results = {}
+            for mode in MODES:
+                latency, response = await extract(client, document, mode)
+                metadata = response.get("graph_metadata") or {}
+                usage = llm_usage(response)
+                results[mode] = response
+                rows[mode].append({
+                    "doc_id": document.doc_id,
+                    "latency_ms": latency * 1000.0,
+                    "failed": bool(metadata.get("failed")),
+                    "entities": len(response.get("entities", [])),
+                    "relationships": len(response.get("relationships", [])),
+                    "anchors": metadata.get("anchor_entity_count", 0),
+                    **usage,
+                })
+
+            reference, hybrid = results["llm"], results["hybrid"]
+            entity_scores = precision_recall_f1(entity_keys(hybrid), entity_keys(reference))
+            value_scores = precision_recall_f1(
+                {v for v, _ in entity_keys(hybrid)}, {v for v, _ in entity_keys(reference)}
+            )
+            relationship_scores = precision_recall_f1(relationship_keys(hybrid), relationship_keys(reference))
+            agreement.append({
+                "entity_f1": entity_scores["f1"],
+                "entity_precision": entity_scores["precision"],
+                "entity_recall": entity_scores["recall"],
+                "entity_value_recall": value_scores["recall"],
+                "relationship_f1": relationship_scores["f1"],
+            })
+            print(f"  [{i}/{len(documents)}] {document.doc_id:<50} entity F1 {entity_scores['f1']:.2f}  "
+                  f"relationship F1 {relationship_scores['f1']:.2f}")
+
+    summary = {mode: summarize_mode(mode_rows) for mode, mode_rows in rows.items()}
+    mean_agreement = {
+        metric: round(statistics.mean(a[metric] for a in agreement), 4) if agreement else 0.0
+        for metric in ("entity_f1", "entity_precision", "entity_recall", "entity_value_recall", "relationship_f1")
+    }
+    llm_summary, hybrid_summary = summary["llm"], summary["hybrid"]
+    savings = {
+        "completion_tokens": _saving(llm_summary["completion_tokens"], hybrid_summary["completion_tokens"]),
+        "prompt_tokens": _saving(llm_summary["prompt_tokens"], hybrid_summary["prompt_tokens"]),
+        "latency_p50": _saving(llm_summary["latency_ms"]["p50"], hybrid_summary["latency_ms"]["p50"]),
+        "latency_p95": _saving(llm_summary["latency_ms"]["p95"], hybrid_summary["latency_ms"]["p95"]),
+    }
+    return {
+        "meta": {"url": args.url, "corpora": list(args.corpora), "documents": len(documents)},
+        "modes": summary,
+        "hybrid_vs_llm_agreement": mean_agreement,
+        "hybrid_savings": savings,
+        "documents": {mode: mode_rows for mode, mode_rows in rows.items()},
+    }
+
+def _saving(before: float, after: float) -> Optional[float]:
+    return round(1.0 - after / before, 4) if before else None
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n| Mode | p50 ms | p95 ms | LLM ms (mean) | Prompt tokens | Completion tokens | Entities | Relationships |")
+    print("|------|--------|--------|---------------|---------------|-------------------|----------|---------------|")
+    for mode, s in report["modes"].items():
+        print(f"| {mode} | {s['latency_ms']['p50']} | {s['latency_ms']['p95']} | {s['llm_ms_mean']} | "
+              f"{s['prompt_tokens']} | {s['completion_tokens']} | {s['entities']} | {s['relationships']} |")
+    print("\nHybrid agreement with full-LLM output:")
+    for metric, value in report["hybrid_vs_llm_agreement"].items():
+        print(f"  {metric:<22} {value:.3f}")
+    print("Hybrid savings vs. full-LLM:")
+    for metric, value in report["hybrid_savings"].items():
+        print(f"  {metric:<22} {value:+.1%}" if value is not None else f"  {metric:<22} n/a")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare llm and hybrid graph extraction modes")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--corpora", type=lambda v: v.split(","), default=list(DEFAULT_CORPORA))
+    parser.add_argument("--limit", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=Path("hybrid-report.json"))
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
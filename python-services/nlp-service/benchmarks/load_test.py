@@ -0,0 +1,380 @@
+"""
+End-to-end load benchmark for the NLP service.
+
+Drives /extract-entities, /extract-graph, /batch-extract-graph and /embed with
+the procurement and FIBO email fixtures, either closed-loop at fixed
+concurrency levels or open-loop at fixed Poisson arrival rates, and reports
+throughput and p50/p95/p99 latency per scenario. Open-loop latency is measured
+from each request's scheduled send time, so queueing inside the client is not
+hidden (no coordinated omission).
+
+    # Against a service started with OPENAI_BASE_URL pointing at fake_openai_server.py
+    python benchmarks/load_test.py run --url http://127.0.0.1:8000 \\
+        --concurrency 1,8,32 --rates 5,20 --duration 30 --output results.json
+
+    # Fail (exit 1) when head regressed against base
+    python benchmarks/load_test.py compare base.json results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from corpus import DEFAULT_CORPORA, Document, load_compact_ontology, load_corpus  # noqa: E402
+
+ENDPOINTS = ("extract-entities", "extract-graph", "batch-extract-graph", "embed")
+
+
+@dataclass
+class Scenario:
+    endpoint: str
+    mode: str  # "closed" (fixed concurrency) or "open" (fixed arrival rate)
+    level: float  # concurrency for closed loop, requests/second for open loop
+    duration: float
+    batch_size: int = 1
+
+    @property
+    def key(self) -> str:
+        level = int(self.level) if float(self.level).is_integer() else self.level
+        return f"{self.endpoint}|{self.mode}|{level}|b{self.batch_size}"
+
+
+@dataclass
+class ScenarioResult:
+    key: str
+    endpoint: str
+    mode: str
+    level: float
+    batch_size: int
+    requests: int
+    errors: int
+    partial_failures: int
+    dropped: int
+    elapsed_seconds: float
+    throughput_rps: float
+    documents_per_second: float
+    error_rate: float
+    latency_ms: Dict[str, float]
+    status_codes: Dict[str, int] = field(default_factory=dict)
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize_latencies(latencies: Sequence[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    return {
+        "p50": round(percentile(values, 50) * 1000.0, 2),
+        "p95": round(percentile(values, 95) * 1000.0, 2),
+        "p99": round(percentile(values, 99) * 1000.0, 2),
+        "mean": round(sum(values) / len(values) * 1000.0, 2),
+        "max": round(values[-1] * 1000.0, 2),
+    }
+
+
+class PayloadFactory:
+    """Cycles through the corpus and builds request bodies per endpoint."""
+
+    def __init__(self, documents: Sequence[Document]):
+        if not documents:
+            raise ValueError("Benchmark corpus is empty")
+        self._documents = list(documents)
+        self._by_ontology: Dict[str, Iterator[Document]] = {}
+        for ontology in sorted({d.ontology for d in self._documents}):
+            self._by_ontology[ontology] = itertools.cycle([d for d in self._documents if d.ontology == ontology])
+        self._all = itertools.cycle(self._documents)
+
+    def build(self, endpoint: str, batch_size: int) -> Tuple[Dict[str, Any], int]:
+        """Return (json body, number of documents in it)."""
+        document = next(self._all)
+        if endpoint == "extract-entities":
+            return {"text": document.text}, 1
+        if endpoint == "extract-graph":
+            return {"text": document.text, "ontology": document.ontology}, 1
+        # Batches stay within one ontology, like the ingestion pipeline's batches
+        batch = [document] + [next(self._by_ontology[document.ontology]) for _ in range(batch_size - 1)]
+        if endpoint == "batch-extract-graph":
+            return {"texts": [d.text for d in batch], "ontology": document.ontology}, len(batch)
+        if endpoint == "embed":
+            return {"texts": [d.text for d in batch]}, len(batch)
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+class ScenarioRecorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ok_latencies: List[float] = []
+        self.status_codes: Counter = Counter()
+        self.errors = 0
+        self.partial_failures = 0
+        self.dropped = 0
+        self.documents = 0
+
+    def record(self, latency: float, status: Optional[int], documents: int, partial: bool = False) -> None:
+        self.latencies.append(latency)
+        self.status_codes[str(status) if status is not None else "transport_error"] += 1
+        if status is None or status >= 400:
+            self.errors += 1
+        else:
+            self.ok_latencies.append(latency)
+            self.documents += documents
+            if partial:
+                self.partial_failures += 1
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, body: Dict[str, Any],
+               recorder: ScenarioRecorder, documents: int, started: float) -> None:
+    try:
+        response = await client.post(f"/{endpoint}", json=body)
+        status = response.status_code
+        partial = bool(response.headers.get("X-Failed-Indices"))
+    except httpx.HTTPError:
+        status, partial = None, False
+    recorder.record(time.perf_counter() - started, status, documents, partial)
+
+async def run_closed_loop(client: httpx.AsyncClient, scenario: Scenario, payloads: PayloadFactory,
+                          recorder: ScenarioRecorder) -> float:
+    deadline = time.perf_counter() + scenario.duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            body, documents = payloads.build(scenario.endpoint, scenario.batch_size)
+            await send(client, scenario.endpoint, body, recorder, documents, time.perf_counter())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(int(scenario.level))))
+    return time.perf_counter() - start
+
+async def run_open_loop(client: httpx.AsyncClient, scenario: Scenario, payloads: PayloadFactory,
+                        recorder: ScenarioRecorder, max_in_flight: int, rng: random.Random) -> float:
+    start = time.perf_counter()
+    deadline = start + scenario.duration
+    next_send = start
+    in_flight: set = set()
+
+    while next_send < deadline:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # The service is not keeping up; count instead of queueing without bound
+            recorder.dropped += 1
+        else:
+            body, documents = payloads.build(scenario.endpoint, scenario.batch_size)
+            task = asyncio.create_task(send(client, scenario.endpoint, body, recorder, documents, next_send))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_send += rng.expovariate(scenario.level)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return time.perf_counter() - start
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, payloads: PayloadFactory,
+                       warmup_requests: int, max_in_flight: int, seed: int) -> ScenarioResult:
+    for _ in range(warmup_requests):
+        body, documents = payloads.build(scenario.endpoint, scenario.batch_size)
+        await send(client, scenario.endpoint, body, ScenarioRecorder(), documents, time.perf_counter())
+
+    recorder = ScenarioRecorder()
+    if scenario.mode == "closed":
+        elapsed = await run_closed_loop(client, scenario, payloads, recorder)
+    else:
+        elapsed = await run_open_loop(client, scenario, payloads, recorder, max_in_flight, random.Random(seed))
+
+    requests = len(recorder.latencies)
+    return ScenarioResult(
+        key=scenario.key,
+        endpoint=scenario.endpoint,
+        mode=scenario.mode,
+        level=scenario.level,
+        batch_size=scenario.batch_size,
+        requests=requests,
+        errors=recorder.errors,
+        partial_failures=recorder.partial_failures,
+        dropped=recorder.dropped,
+        elapsed_seconds=round(elapsed, 3),
+        throughput_rps=round((requests - recorder.errors) / elapsed, 3) if elapsed else 0.0,
+        documents_per_second=round(recorder.documents / elapsed, 3) if elapsed else 0.0,
+        error_rate=round(recorder.errors / requests, 4) if requests else 0.0,
+        latency_ms=summarize_latencies(recorder.ok_latencies),
+        status_codes=dict(recorder.status_codes),
+    )
+
+async def register_ontologies(client: httpx.AsyncClient, ontologies: Sequence[str]) -> None:
+    for ontology in ontologies:
+        compact = load_compact_ontology(ontology)
+        response = await client.post("/ontologies", json={"ontology": ontology, "compact_ontology": compact})
+        response.raise_for_status()
+        print(f"📚 Registered ontology '{ontology}': {len(compact['e'])} entities, {len(compact['r'])} relationships")
+
+def build_scenarios(args: argparse.Namespace) -> List[Scenario]:
+    scenarios = []
+    for endpoint in args.endpoints:
+        batch_size = args.batch_size if endpoint in ("batch-extract-graph", "embed") else 1
+        for concurrency in args.concurrency:
+            scenarios.append(Scenario(endpoint, "closed", concurrency, args.duration, batch_size))
+        for rate in args.rates:
+            scenarios.append(Scenario(endpoint, "open", rate, args.duration, batch_size))
+    return scenarios
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    documents = load_corpus(args.corpora, limit=args.limit)
+    payloads = PayloadFactory(documents)
+    scenarios = build_scenarios(args)
+    print(f"🏁 {len(scenarios)} scenarios over {len(documents)} documents against {args.url}")
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    results = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        (await client.get("/health")).raise_for_status()
+        if args.register_ontologies:
+            await register_ontologies(client, args.corpora)
+        for i, scenario in enumerate(scenarios):
+            result = await run_scenario(client, scenario, payloads, args.warmup, args.max_in_flight, args.seed + i)
+            results.append(result)
+            print(
+                f"  {result.key:<42} {result.throughput_rps:>8.2f} req/s  "
+                f"p50 {result.latency_ms['p50']:>8.1f}  p95 {result.latency_ms['p95']:>8.1f}  "
+                f"p99 {result.latency_ms['p99']:>8.1f} ms  errors {result.error_rate:.1%}"
+            )
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "url": args.url,
+            "label": args.label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpora": list(args.corpora),
+            "documents": len(documents),
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "scenarios": [asdict(r) for r in results],
+    }
+
+def compare_results(base: Dict[str, Any], head: Dict[str, Any], max_throughput_drop: float,
+                    max_latency_increase: float, max_error_rate_increase: float) -> List[str]:
+    """
+    Compare two result files scenario by scenario.
+
+    Returns:
+        Human-readable regression descriptions (empty when head is within tolerance)
+    """
+    base_by_key = {s["key"]: s for s in base.get("scenarios", [])}
+    regressions = []
+    for current in head.get("scenarios", []):
+        previous = base_by_key.get(current["key"])
+        if previous is None:
+            print(f"  {current['key']:<42} (new scenario)")
+            continue
+
+        throughput_change = _relative_change(previous["throughput_rps"], current["throughput_rps"])
+        p95_change = _relative_change(previous["latency_ms"]["p95"], current["latency_ms"]["p95"])
+        p99_change = _relative_change(previous["latency_ms"]["p99"], current["latency_ms"]["p99"])
+        error_change = current["error_rate"] - previous["error_rate"]
+        print(
+            f"  {current['key']:<42} throughput {throughput_change:+7.1%}  "
+            f"p95 {p95_change:+7.1%}  p99 {p99_change:+7.1%}  errors {error_change:+.2%}"
+        )
+
+        if throughput_change < -max_throughput_drop:
+            regressions.append(f"{current['key']}: throughput {throughput_change:+.1%}")
+        if p95_change > max_latency_increase:
+            regressions.append(f"{current['key']}: p95 latency {p95_change:+.1%}")
+        if error_change > max_error_rate_increase:
+            regressions.append(f"{current['key']}: error rate {error_change:+.2%}")
+    return regressions
+
+def _relative_change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NLP service load benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmark and write a JSON result file")
+    run.add_argument("--url", default="http://127.0.0.1:8000")
+    run.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS))
+    run.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",") if c], default=[1, 8, 32],
+                     help="Closed-loop concurrency levels (comma separated, empty to skip)")
+    run.add_argument("--rates", type=lambda v: [float(r) for r in v.split(",") if r], default=[5.0, 20.0],
+                     help="Open-loop arrival rates in requests/second (comma separated, empty to skip)")
+    run.add_argument("--duration", type=float, default=30.0, help="Seconds per scenario")
+    run.add_argument("--warmup", type=int, default=3, help="Unmeasured requests before each scenario")
+    run.add_argument("--batch-size", type=int, default=8, help="Texts per /batch-extract-graph and /embed call")
+    run.add_argument("--corpora", type=lambda v: v.split(","), default=list(DEFAULT_CORPORA))
+    run.add_argument("--limit", type=int, default=None, help="Use only the first N documents")
+    run.add_argument("--max-in-flight", type=int, default=256, help="Open-loop cap on outstanding requests")
+    run.add_argument("--timeout", type=float, default=300.0)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--label", default=None, help="Free-form label stored in the result metadata")
+    run.add_argument("--no-register-ontologies", dest="register_ontologies", action="store_false",
+                     help="Do not POST the corpus ontologies to /ontologies first")
+    run.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+
+    compare = subparsers.add_parser("compare", help="Compare two result files; exit 1 on regression")
+    compare.add_argument("base", type=Path)
+    compare.add_argument("head", type=Path)
+    compare.add_argument("--max-throughput-drop", type=float, default=0.15)
+    compare.add_argument("--max-latency-increase", type=float, default=0.25)
+    compare.add_argument("--max-error-rate-increase", type=float, default=0.02)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        unknown = set(args.endpoints) - set(ENDPOINTS)
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        results = asyncio.run(run_benchmark(args))
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"💾 Results written to {args.output}")
+        return 0
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    print(f"📊 {args.base} ({base['meta'].get('git_revision')}) -> {args.head} ({head['meta'].get('git_revision')})")
+    regressions = compare_results(
+        base, head, args.max_throughput_drop, args.max_latency_increase, args.max_error_rate_increase
+    )
+    if regressions:
+        print("❌ Performance regressions:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("✅ No regressions beyond tolerance")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Component microbenchmarks for one NLP service worker.
+
+Times the CPU-bound building blocks of a request in-process, without HTTP or
+LLM calls:
+
+- ``SpacyEntityExtractor.extract_entities`` by document length and pipeline
+  profile (full pipeline vs. only the components entity extraction needs)
+- ``create_entity_graph_data`` / ``create_relationship_graph_data`` per 1k objects
+- ``generate_entity_id`` per 1k ids
+- graph extraction prompt rendering per ontology
+- ``embedding_model.encode`` by batch size
+
+    python benchmarks/microbench.py run --output microbench.json
+    python benchmarks/microbench.py compare base.json microbench.json --thresholds benchmarks/microbench_thresholds.json
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+from corpus import DEFAULT_CORPORA, load_compact_ontology, load_corpus  # noqa: E402
+
+DOCUMENT_LENGTHS = {"short": 500, "medium": 2_000, "long": 8_000, "xlong": 32_000}
+EMBEDDING_BATCH_SIZES = (1, 8, 32, 128)
+# Components entity extraction needs; everything else is disabled in the "ner" profile
+NER_PIPES = ("tok2vec", "entity_ruler", "ner")
+DEFAULT_THRESHOLD = 1.25
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    unit: str  # what one measured operation is, e.g. "call" or "1k objects"
+    median_ms: float
+    min_ms: float
+    stdev_ms: float
+    repeats: int
+    params: Dict[str, Any]
+
+
+def measure(fn: Callable[[], Any], repeats: int, min_time: float = 0.2) -> List[float]:
+    """
+    Time ``fn`` ``repeats`` times after one warm-up call. Each sample loops
+    the call until ``min_time`` has elapsed and reports seconds per call.
+    """
+    fn()
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            loops = 0
+            start = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < min_time or loops == 0:
+                fn()
+                loops += 1
+                elapsed = time.perf_counter() - start
+            samples.append(elapsed / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+def to_result(name: str, group: str, unit: str, samples: Sequence[float], **params: Any) -> BenchmarkResult:
+    return BenchmarkResult(
+        name=name,
+        group=group,
+        unit=unit,
+        median_ms=round(statistics.median(samples) * 1000.0, 4),
+        min_ms=round(min(samples) * 1000.0, 4),
+        stdev_ms=round(statistics.stdev(samples) * 1000.0, 4) if len(samples) > 1 else 0.0,
+        repeats=len(samples),
+        params=params,
+    )
+
+def make_document(texts: Sequence[str], length: int) -> str:
+    """Concatenate corpus texts until ``length`` characters, cutting at a word boundary."""
+    parts, size, i = [], 0, 0
+    while size < length:
+        text = texts[i % len(texts)]
+        parts.append(text)
+        size += len(text) + 2
+        i += 1
+    document = "\n\n".join(parts)
+    cut = document.rfind(" ", 0, length)
+    return document[: cut if cut > 0 else length]
+
+def load_service(service_dir: Path):
+    """Import main.py from ``service_dir`` (this loads the spaCy model)."""
+    os.environ.setdefault("TRACE_LOG_ENABLED", "0")
+    sys.path.insert(0, str(service_dir))
+    return importlib.import_module("main")
+
+
+def bench_spacy(service, texts: Sequence[str], repeats: int) -> List[BenchmarkResult]:
+    extractor = service.extractor
+    profiles: Dict[str, Optional[List[str]]] = {
+        "full": None,
+        "ner": [pipe for pipe in extractor.nlp.pipe_names if pipe in NER_PIPES],
+    }
+    results = []
+    for profile, enabled in profiles.items():
+        for label, length in DOCUMENT_LENGTHS.items():
+            document = make_document(texts, length)
+            if enabled is None:
+                samples = measure(lambda: extractor.extract_entities(document), repeats)
+            else:
+                with extractor.nlp.select_pipes(enable=enabled):
+                    samples = measure(lambda: extractor.extract_entities(document), repeats)
+            results.append(to_result(
+                f"spacy.extract_entities[{profile},{label}]", "spacy", "call", samples,
+                profile=profile, chars=len(document), pipes=enabled or list(extractor.nlp.pipe_names),
+            ))
+    return results
+
+def bench_graph_data(service, repeats: int, count: int = 1000) -> List[BenchmarkResult]:
+    ontology_config = {
+        "entity_descriptions": {f"Type{i}": f"Description of type {i}" for i in range(50)},
+        "relationship_descriptions": {f"REL_{i}": f"Description of relationship {i}" for i in range(50)},
+        "ontology_name": "bench",
+    }
+    entities = [
+        {
+            "id": f"type{i % 50}_entity_{i}",
+            "type": f"Type{i % 50}",
+            "value": f"Entity {i}",
+            "confidence": 0.9,
+            "properties": {"rank": i},
+            "start": i,
+            "end": i + 8,
+            "context": f"context around entity {i}",
+        }
+        for i in range(count)
+    ]
+    relationships = [
+        {
+            "id": f"rel_{i}",
+            "type": f"REL_{i % 50}",
+            "source": f"Entity {i}",
+            "target": f"Entity {(i + 1) % count}",
+            "confidence": 0.9,
+        }
+        for i in range(count)
+    ]
+
+    def entities_pass():
+        for entity in entities:
+            service.create_entity_graph_data(entity, ontology_config)
+
+    def relationships_pass():
+        for relationship in relationships:
+            service.create_relationship_graph_data(relationship, ontology_config)
+
+    def ids_pass():
+        for entity in entities:
+            service.generate_entity_id(entity["type"], entity["value"])
+
+    results = []
+    try:
+        results.append(to_result("graph.create_entity_graph_data", "graph_data", "1k objects",
+                                 measure(entities_pass, repeats), objects=count))
+        results.append(to_result("graph.create_relationship_graph_data", "graph_data", "1k objects",
+                                 measure(relationships_pass, repeats), objects=count))
+        results.append(to_result("ids.generate_entity_id", "ids", "1k ids", measure(ids_pass, repeats), ids=count))
+    finally:
+        # The graph data helpers register every object in the in-memory store
+        for obj in entities + relationships:
+            service.EXTRACTED_OBJECTS.pop(obj["id"], None)
+    return results
+
+def bench_prompt(service, texts: Sequence[str], ontologies: Sequence[str], repeats: int) -> List[BenchmarkResult]:
+    if not hasattr(service, "build_graph_extraction_prompt"):
+        print("⚠️  build_graph_extraction_prompt not available in this revision, skipping prompt benchmarks")
+        return []
+    document = make_document(texts, DOCUMENT_LENGTHS["medium"])
+    results = []
+    for ontology in ontologies:
+        compact = load_compact_ontology(ontology)
+        samples = measure(lambda: service.build_graph_extraction_prompt(document, compact), repeats)
+        results.append(to_result(
+            f"prompt.render[{ontology}]", "prompt", "call", samples,
+            ontology=ontology, entity_types=len(compact["e"]), relationships=len(compact["r"]),
+            prompt_chars=len(service.build_graph_extraction_prompt(document, compact)),
+        ))
+    return results
+
+def bench_embeddings(texts: Sequence[str], repeats: int, model_name: str) -> List[BenchmarkResult]:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    results = []
+    for batch_size in EMBEDDING_BATCH_SIZES:
+        batch = [texts[i % len(texts)] for i in range(batch_size)]
+        samples = measure(lambda: model.encode(batch), repeats)
+        result = to_result(f"embedding.encode[b{batch_size}]", "embedding", "batch", samples,
+                           batch_size=batch_size, model=model_name)
+        result.params["per_text_ms"] = round(result.median_ms / batch_size, 4)
+        results.append(result)
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    documents = load_corpus(args.corpora)
+    texts = [d.text for d in documents]
+    service = load_service(args.service_dir)
+
+    groups = set(args.groups)
+    results: List[BenchmarkResult] = []
+    if "spacy" in groups:
+        results += bench_spacy(service, texts, args.repeats)
+    if "graph_data" in groups:
+        results += bench_graph_data(service, args.repeats)
+    if "prompt" in groups:
+        results += bench_prompt(service, texts, args.corpora, args.repeats)
+    if "embedding" in groups:
+        results += bench_embeddings(texts, args.repeats, args.embedding_model)
+
+    for result in results:
+        print(f"  {result.name:<48} {result.median_ms:>10.3f} ms / {result.unit}  (min {result.min_ms:.3f})")
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "service_dir": str(args.service_dir),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "results": [asdict(r) for r in results],
+    }
+
+def load_thresholds(path: Optional[Path]) -> Dict[str, float]:
+    if path is None or not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+def threshold_for(name: str, thresholds: Dict[str, float]) -> float:
+    """Most specific matching threshold: exact name, then group prefix, then "default"."""
+    if name in thresholds:
+        return thresholds[name]
+    prefix = name.split(".", 1)[0]
+    return thresholds.get(prefix, thresholds.get("default", DEFAULT_THRESHOLD))
+
+def compare_results(base: Dict[str, Any], head: Dict[str, Any], thresholds: Dict[str, float]) -> List[str]:
+    """
+    Compare median times benchmark by benchmark.
+
+    Returns:
+        Regression descriptions for benchmarks slower than their allowed ratio
+    """
+    base_by_name = {r["name"]: r for r in base.get("results", [])}
+    regressions = []
+    for current in head.get("results", []):
+        previous = base_by_name.get(current["name"])
+        if previous is None or not previous["median_ms"]:
+            print(f"  {current['name']:<48} (new benchmark)")
+            continue
+        ratio = current["median_ms"] / previous["median_ms"]
+        limit = threshold_for(current["name"], thresholds)
+        marker = "❌" if ratio > limit else "  "
+        print(f"{marker}{current['name']:<48} {previous['median_ms']:>10.3f} -> {current['median_ms']:>10.3f} ms"
+              f"  x{ratio:.2f} (limit x{limit:.2f})")
+        if ratio > limit:
+            regressions.append(f"{current['name']}: x{ratio:.2f} slower (limit x{limit:.2f})")
+    return regressions
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NLP service component microbenchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the microbenchmarks and write a JSON result file")
+    run_parser.add_argument("--service-dir", type=Path, default=BENCH_DIR.parent,
+                            help="Directory containing the main.py to benchmark")
+    run_parser.add_argument("--groups", type=lambda v: v.split(","),
+                            default=["spacy", "graph_data", "prompt", "embedding"])
+    run_parser.add_argument("--corpora", type=lambda v: v.split(","), default=list(DEFAULT_CORPORA))
+    run_parser.add_argument("--repeats", type=int, default=7)
+    run_parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    run_parser.add_argument("--output", type=Path, default=Path("microbench-results.json"))
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files; exit 1 on regression")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("head", type=Path)
+    compare_parser.add_argument("--thresholds", type=Path, default=BENCH_DIR / "microbench_thresholds.json",
+                                help="JSON map of benchmark name / group / 'default' to the allowed slowdown ratio")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        args.service_dir = args.service_dir.resolve()
+        results = run(args)
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"💾 Results written to {args.output}")
+        return 0
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    regressions = compare_results(base, head, load_thresholds(args.thresholds))
+    if regressions:
+        print("❌ Microbenchmark regressions:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("✅ No regressions beyond thresholds")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
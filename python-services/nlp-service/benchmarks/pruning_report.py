@@ -0,0 +1,113 @@
+"""
+Offline measurement of ontology pruning on the email fixtures.
+
+For every corpus document the ontology is pruned exactly as the service does
+(ontology_pruning.OntologyPruner with the all-MiniLM-L6-v2 embeddings) and the
+estimated prompt tokens of the ontology block before and after are reported.
+With ``--url`` each document is also extracted by a running service without
+pruning, and the report adds type recall: the share of entity types in that
+output which the pruned ontology still contains.
+
+    python benchmarks/pruning_report.py --top-k 40 --floor 10 --limit 60 --output pruning-report.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from corpus import DEFAULT_CORPORA, load_compact_ontology, load_corpus  # noqa: E402
+from load_test import percentile  # noqa: E402
+from ontology_pruning import OntologyPruner  # noqa: E402
+
+
+def reference_types(url: str, text: str, ontology: str, timeout: float) -> List[str]:
+    import httpx
+
+    response = httpx.post(f"{url}/extract-graph", json={"text": text, "ontology": ontology}, timeout=timeout)
+    response.raise_for_status()
+    return [e["type"] for e in response.json().get("entities", [])]
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model)
+    pruner = OntologyPruner(top_k=args.top_k, floor=args.floor, min_similarity=args.min_similarity)
+    compacts = {ontology: load_compact_ontology(ontology) for ontology in args.corpora}
+    if args.url:
+        import httpx
+
+        for ontology, compact in compacts.items():
+            httpx.post(f"{args.url}/ontologies", json={"ontology": ontology, "compact_ontology": compact},
+                       timeout=args.timeout).raise_for_status()
+
+    rows: List[Dict[str, Any]] = []
+    for document in load_corpus(args.corpora, limit=args.limit):
+        compact = compacts[document.ontology]
+        index = pruner.index_for(model, document.ontology, compact["e"])
+        pruned, stats = pruner.prune(compact, model.encode(document.text), index)
+        row = {"doc_id": document.doc_id, "ontology": document.ontology, **stats}
+        if args.url:
+            types = reference_types(args.url, document.text, document.ontology, args.timeout)
+            kept = set(pruned["e"])
+            row["reference_types"] = len(types)
+            row["type_recall"] = sum(1 for t in types if t in kept) / len(types) if types else 1.0
+        rows.append(row)
+        print(f"  {document.doc_id:<50} {stats['types_before']:>5} -> {stats['types_after']:<4} types  "
+              f"{stats['prompt_tokens_saved']:>6} tokens saved")
+
+    summary: Dict[str, Any] = {}
+    for ontology in args.corpora:
+        ontology_rows = [r for r in rows if r["ontology"] == ontology]
+        if not ontology_rows:
+            continue
+        saved = sorted(r["prompt_tokens_saved"] for r in ontology_rows)
+        before = sum(r["prompt_tokens_before"] for r in ontology_rows)
+        summary[ontology] = {
+            "documents": len(ontology_rows),
+            "types_before": ontology_rows[0]["types_before"],
+            "types_after_mean": round(statistics.mean(r["types_after"] for r in ontology_rows), 1),
+            "prompt_tokens_saved_p50": percentile(saved, 50),
+            "prompt_tokens_saved_total": sum(saved),
+            "prompt_token_reduction": round(sum(saved) / before, 4) if before else 0.0,
+        }
+        if args.url:
+            summary[ontology]["type_recall_mean"] = round(statistics.mean(r["type_recall"] for r in ontology_rows), 4)
+
+    return {
+        "meta": {"top_k": args.top_k, "floor": args.floor, "min_similarity": args.min_similarity,
+                 "model": args.model, "reference_url": args.url},
+        "ontologies": summary,
+        "documents": rows,
+    }
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure prompt token savings of ontology pruning")
+    parser.add_argument("--corpora", type=lambda v: v.split(","), default=list(DEFAULT_CORPORA))
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=40)
+    parser.add_argument("--floor", type=int, default=10)
+    parser.add_argument("--min-similarity", type=float, default=0.15)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--url", default=None, help="Service (without pruning) used as type-recall reference")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=Path("pruning-report.json"))
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print("\n| Ontology | Docs | Types | Kept (mean) | Tokens saved p50 | Reduction | Type recall |")
+    print("|----------|------|-------|-------------|------------------|-----------|-------------|")
+    for ontology, s in report["ontologies"].items():
+        recall = f"{s['type_recall_mean']:.3f}" if "type_recall_mean" in s else "n/a"
+        print(f"| {ontology} | {s['documents']} | {s['types_before']} | {s['types_after_mean']} | "
+              f"{s['prompt_tokens_saved_p50']} | {s['prompt_token_reduction']:.1%} | {recall} |")
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
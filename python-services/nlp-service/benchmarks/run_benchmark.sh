@@ -0,0 +1,60 @@
+#!/bin/bash
+
+# Start the fake LLM backend and the NLP service from SERVICE_DIR, run the load
+# benchmark against them and write the results to OUTPUT.
+#
+# Usage: benchmarks/run_benchmark.sh [SERVICE_DIR] [OUTPUT] [extra load_test.py run args...]
+#
+# The fake backend and the benchmark driver always come from this checkout, so
+# an older SERVICE_DIR (e.g. the PR base) is measured under identical load.
+
+set -euo pipefail
+
+BENCH_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+NLP_DIR="$(dirname "$BENCH_DIR")"
+SERVICE_DIR="$(cd "${1:-$NLP_DIR}" && pwd)"
+OUTPUT="${2:-benchmark-results.json}"
+shift $(( $# > 2 ? 2 : $# ))
+
+FAKE_PORT="${FAKE_LLM_PORT:-8089}"
+SERVICE_PORT="${BENCH_SERVICE_PORT:-8000}"
+LOG_DIR="${BENCH_LOG_DIR:-$(mktemp -d)}"
+
+cleanup() {
+    [[ -n "${SERVICE_PID:-}" ]] && kill "$SERVICE_PID" 2>/dev/null || true
+    [[ -n "${FAKE_PID:-}" ]] && kill "$FAKE_PID" 2>/dev/null || true
+}
+trap cleanup EXIT
+
+wait_for() {
+    local url="$1" name="$2"
+    for _ in $(seq 1 120); do
+        if curl -sf "$url" > /dev/null; then
+            return 0
+        fi
+        sleep 1
+    done
+    echo "❌ $name did not become ready at $url (logs in $LOG_DIR)" >&2
+    exit 1
+}
+
+echo "🧪 Starting fake LLM backend on port $FAKE_PORT"
+python "$NLP_DIR/fake_openai_server.py" --port "$FAKE_PORT" \
+    --latency "${FAKE_LLM_LATENCY:-lognormal:-1.2,0.3}" \
+    --seconds-per-output-token "${FAKE_LLM_SECONDS_PER_OUTPUT_TOKEN:-0.002}" \
+    --seed "${FAKE_LLM_SEED:-0}" > "$LOG_DIR/fake-llm.log" 2>&1 &
+FAKE_PID=$!
+wait_for "http://127.0.0.1:$FAKE_PORT/v1/models" "Fake LLM backend"
+
+echo "🚀 Starting NLP service from $SERVICE_DIR on port $SERVICE_PORT"
+(
+    cd "$SERVICE_DIR"
+    OPENAI_API_KEY="${OPENAI_API_KEY:-sk-local}" \
+    OPENAI_BASE_URL="http://127.0.0.1:$FAKE_PORT/v1" \
+    TRACE_LOG_ENABLED=0 \
+    exec uvicorn main:app --host 127.0.0.1 --port "$SERVICE_PORT"
+) > "$LOG_DIR/nlp-service.log" 2>&1 &
+SERVICE_PID=$!
+wait_for "http://127.0.0.1:$SERVICE_PORT/health" "NLP service"
+
+python "$BENCH_DIR/load_test.py" run --url "http://127.0.0.1:$SERVICE_PORT" --output "$OUTPUT" "$@"
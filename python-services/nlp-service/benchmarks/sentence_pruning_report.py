@@ -0,0 +1,160 @@
+"""
+Offline evaluation of salience-based sentence pruning on the email fixtures.
+
+Every corpus document is pruned at each token budget exactly as the service
+does (sentence_pruning.SentencePruner with spaCy entities, ontology keywords
+and all-MiniLM-L6-v2 type similarities) and the report gives, per ontology
+and budget, the share of documents pruned and the estimated tokens saved.
+With ``--url`` each document is also extracted by a running service without
+sentence pruning, and the report adds entity recall (the share of extracted
+entity values still present in the pruned text) and, with ``--extract``, the
+latency of extracting the pruned text instead of the full one.
+
+    python benchmarks/sentence_pruning_report.py --budgets 400,800,1600 --limit 60
+    python benchmarks/sentence_pruning_report.py --url http://127.0.0.1:8000 --extract --budgets 400,800
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from corpus import DEFAULT_CORPORA, load_compact_ontology, load_corpus  # noqa: E402
+from load_test import percentile  # noqa: E402
+from ontology_pruning import OntologyPruner  # noqa: E402
+from sentence_pruning import SalienceWeights, SentencePruner, ontology_keywords  # noqa: E402
+
+
+def extract(url: str, text: str, ontology: str, timeout: float) -> Tuple[List[str], float]:
+    """Entity values extracted by the service, and the request latency in seconds."""
+    import httpx
+
+    start = time.perf_counter()
+    response = httpx.post(f"{url}/extract-graph", json={"text": text, "ontology": ontology}, timeout=timeout)
+    response.raise_for_status()
+    return [e["value"] for e in response.json().get("entities", [])], time.perf_counter() - start
+
+def spacy_entities(nlp, text: str) -> List[Dict[str, Any]]:
+    if nlp is None:
+        return []
+    return [{"start": ent.start_char, "end": ent.end_char} for ent in nlp(text).ents]
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    nlp = None
+    if args.spacy_model:
+        import spacy
+
+        nlp = spacy.load(args.spacy_model)
+    model = None
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(args.model)
+
+    weights = SalienceWeights(entities=args.entity_weight, keywords=args.keyword_weight,
+                              similarity=args.similarity_weight if model is not None else 0.0)
+    pruners = {budget: SentencePruner(budget_tokens=budget, neighbors=args.neighbors, weights=weights)
+               for budget in args.budgets}
+    type_index = OntologyPruner()
+    compacts = {ontology: load_compact_ontology(ontology) for ontology in args.corpora}
+    keywords = {ontology: ontology_keywords(compact["e"]) for ontology, compact in compacts.items()}
+    if args.url:
+        import httpx
+
+        for ontology, compact in compacts.items():
+            httpx.post(f"{args.url}/ontologies", json={"ontology": ontology, "compact_ontology": compact},
+                       timeout=args.timeout).raise_for_status()
+
+    rows: List[Dict[str, Any]] = []
+    for document in load_corpus(args.corpora, limit=args.limit):
+        type_vectors = (type_index.index_for(model, document.ontology, compacts[document.ontology]["e"]).vectors
+                        if model is not None else None)
+        entities = spacy_entities(nlp, document.text)
+        reference: Optional[List[str]] = None
+        if args.url:
+            reference, full_latency = extract(args.url, document.text, document.ontology, args.timeout)
+
+        for budget, pruner in pruners.items():
+            start = time.perf_counter()
+            pruned, stats = pruner.prune(document.text, entities, keywords[document.ontology], model, type_vectors)
+            row = {"doc_id": document.doc_id, "ontology": document.ontology, "pruned": pruned != document.text,
+                   "pruning_ms": round((time.perf_counter() - start) * 1000.0, 2), **stats}
+            if reference is not None:
+                lowered = pruned.lower()
+                row["reference_entities"] = len(reference)
+                row["entity_recall"] = (sum(1 for v in reference if v.lower() in lowered) / len(reference)
+                                        if reference else 1.0)
+                if args.extract and row["pruned"]:
+                    _, pruned_latency = extract(args.url, pruned, document.ontology, args.timeout)
+                    row["full_latency_s"] = round(full_latency, 3)
+                    row["pruned_latency_s"] = round(pruned_latency, 3)
+            rows.append(row)
+        print(f"  {document.doc_id:<50} {rows[-1]['original_tokens']:>6} tokens, "
+              + ", ".join(f"{r['budget_tokens']}: -{r['tokens_saved']}" for r in rows[-len(pruners):]))
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    for ontology in args.corpora:
+        for budget in args.budgets:
+            group = [r for r in rows if r["ontology"] == ontology and r["budget_tokens"] == budget]
+            if not group:
+                continue
+            original = sum(r["original_tokens"] for r in group)
+            entry: Dict[str, Any] = {
+                "documents": len(group),
+                "pruned_share": round(sum(1 for r in group if r["pruned"]) / len(group), 4),
+                "tokens_saved_p50": percentile(sorted(r["tokens_saved"] for r in group), 50),
+                "token_reduction": round(sum(r["tokens_saved"] for r in group) / original, 4) if original else 0.0,
+                "pruning_ms_p50": percentile(sorted(r["pruning_ms"] for r in group), 50),
+            }
+            if args.url:
+                entry["entity_recall_mean"] = round(statistics.mean(r["entity_recall"] for r in group), 4)
+            timed = [r for r in group if "pruned_latency_s" in r]
+            if timed:
+                entry["latency_saved_p50_s"] = percentile(
+                    sorted(r["full_latency_s"] - r["pruned_latency_s"] for r in timed), 50)
+            summary[f"{ontology}@{budget}"] = entry
+
+    return {
+        "meta": {"budgets": args.budgets, "neighbors": args.neighbors, "weights": vars(weights),
+                 "spacy_model": args.spacy_model, "model": args.model, "reference_url": args.url},
+        "summary": summary,
+        "documents": rows,
+    }
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure token savings and entity recall of sentence pruning")
+    parser.add_argument("--corpora", type=lambda v: v.split(","), default=list(DEFAULT_CORPORA))
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--budgets", type=lambda v: [int(b) for b in v.split(",")], default=[400, 800, 1600])
+    parser.add_argument("--neighbors", type=int, default=1)
+    parser.add_argument("--entity-weight", type=float, default=1.0)
+    parser.add_argument("--keyword-weight", type=float, default=0.5)
+    parser.add_argument("--similarity-weight", type=float, default=1.0)
+    parser.add_argument("--spacy-model", default="en_core_web_sm", help="Empty to score without spaCy entities")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Empty to score without embeddings")
+    parser.add_argument("--url", default=None, help="Service (without sentence pruning) used as recall reference")
+    parser.add_argument("--extract", action="store_true", help="Also time the extraction of the pruned texts")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=Path("sentence-pruning-report.json"))
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print("\n| Ontology | Budget | Docs | Pruned | Tokens saved p50 | Reduction | Pruning p50 (ms) | Entity recall | Latency saved p50 |")
+    print("|----------|--------|------|--------|------------------|-----------|------------------|---------------|-------------------|")
+    for key, s in report["summary"].items():
+        ontology, budget = key.rsplit("@", 1)
+        recall = f"{s['entity_recall_mean']:.3f}" if "entity_recall_mean" in s else "n/a"
+        latency = f"{s['latency_saved_p50_s']:.2f}s" if "latency_saved_p50_s" in s else "n/a"
+        print(f"| {ontology} | {budget} | {s['documents']} | {s['pruned_share']:.0%} | {s['tokens_saved_p50']} | "
+              f"{s['token_reduction']:.1%} | {s['pruning_ms_p50']} | {recall} | {latency} |")
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Record/replay of chat completions for reproducible performance runs.
+
+In ``record`` mode every chat completion the service makes (graph extraction,
+refinement, importance analysis) is appended to a cassette file as one compact
+JSON line: request hash, prompt hash, request, response or error, and observed
+latency. In ``replay`` mode the OpenAI clients are replaced by clients that
+answer from the cassette, sleeping for the recorded latency (optionally
+scaled), so captured traffic can be re-run deterministically without OpenAI.
+
+Cassettes ending in ``.gz`` are gzip-compressed. Repeated identical requests
+are replayed in recording order, which reproduces retries and 429s. A
+streamed completion is recorded as one completion when its stream ends and
+replayed in one piece; streaming does not change the match key.
+"""
+
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Deque, Dict, IO, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+from llm_retry import CONNECTION_ERROR, TIMEOUT, classify_llm_error
+
+CASSETTE_FORMAT_VERSION = 1
+# Request arguments that do not influence the completion and are left out of the match key
+_UNKEYED_ARGS = {"timeout", "extra_headers", "user", "stream", "stream_options"}
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Stable hash of the completion-relevant request arguments."""
+    keyed = {k: v for k, v in request.items() if k not in _UNKEYED_ARGS}
+    canonical = json.dumps(keyed, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+def prompt_hash(request: Dict[str, Any]) -> str:
+    """Hash of the message contents only, to find the same prompt across models/settings."""
+    contents = "\x1e".join(str(m.get("content", "")) for m in request.get("messages", []))
+    return hashlib.sha256(contents.encode("utf-8")).hexdigest()[:32]
+
+def _open_cassette(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for a request."""
+
+
+class ReplayedLLMError(Exception):
+    """Error recorded from the live API, re-raised during replay."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Mirrors openai.APIStatusError.response for is_rate_limit_error/retry_after_seconds
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class ReplayedLLMTimeout(ReplayedLLMError):
+    pass
+
+
+class ReplayedLLMConnectionError(ReplayedLLMError):
+    pass
+
+
+class CassetteRecorder:
+    """Append-only writer shared by the sync and async recording clients."""
+
+    def __init__(self, path: str, context: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.path = path
+        self.context = context
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = _open_cassette(path, "a")
+        self.recorded = 0
+        atexit.register(self.close)
+
+    def record(self, request: Dict[str, Any], latency: float, response=None, error: Optional[BaseException] = None) -> None:
+        entry: Dict[str, Any] = {
+            "v": CASSETTE_FORMAT_VERSION,
+            "ts": round(time.time(), 3),
+            "key": request_key(request),
+            "prompt_hash": prompt_hash(request),
+            "latency": round(latency, 4),
+            "request": {k: v for k, v in request.items() if k != "timeout"},
+        }
+        if self.context is not None:
+            entry.update({k: v for k, v in self.context().items() if v is not None})
+        if error is None:
+            entry["response"] = response.model_dump(mode="json", exclude_none=True)
+        else:
+            entry["error"] = _describe_error(error)
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def _describe_error(error: BaseException) -> Dict[str, Any]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    kept_headers = {k: headers.get(k) for k in ("retry-after", "retry-after-ms") if headers.get(k)}
+    return {
+        "class": classify_llm_error(error),
+        "type": type(error).__name__,
+        "message": str(error),
+        "status_code": status,
+        "headers": kept_headers,
+    }
+
+
+class CassettePlayer:
+    """Serves recorded completions, in recording order per request key."""
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with _open_cassette(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        self.loaded = sum(len(entries) for entries in self._entries.values())
+
+    def next_entry(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_key(request)
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                entry = entries.popleft()
+                self._last[key] = entry
+            elif key in self._last:
+                # More calls than were recorded: keep answering with the last recording
+                entry = self._last[key]
+            else:
+                self.misses += 1
+                raise CassetteMiss(f"No cassette recording for request {key} (prompt {prompt_hash(request)})")
+            self.hits += 1
+            return entry
+
+    def delay_for(self, entry: Dict[str, Any]) -> float:
+        return max(0.0, entry.get("latency", 0.0) * self.latency_scale)
+
+    @staticmethod
+    def materialize(entry: Dict[str, Any]) -> ChatCompletion:
+        error = entry.get("error")
+        if error is not None:
+            error_type = {TIMEOUT: ReplayedLLMTimeout, CONNECTION_ERROR: ReplayedLLMConnectionError}.get(
+                error.get("class"), ReplayedLLMError
+            )
+            raise error_type(error.get("message", ""), error.get("status_code"), error.get("headers"))
+        return ChatCompletion.model_validate(entry["response"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "remaining": sum(len(entries) for entries in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# --- OpenAI client stand-ins exposing chat.completions.create ---
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class _ClientShim:
+    def __init__(self, create):
+        self.chat = SimpleNamespace(completions=_Completions(create))
+
+
+def recording_client(inner, recorder: CassetteRecorder) -> _ClientShim:
+    """Wrap a sync OpenAI client so every chat completion is recorded."""
+    def create(**kwargs):
+        start = time.perf_counter()
+        try:
+            response = inner.chat.completions.create(**kwargs)
+        except Exception as e:
+            recorder.record(kwargs, time.perf_counter() - start, error=e)
+            raise
+        recorder.record(kwargs, time.perf_counter() - start, response=response)
+        return response
+    return _ClientShim(create)
+
+def completion_from_chunks(chunks: List[Any]) -> ChatCompletion:
+    """The chat completion a streamed answer adds up to, as recorded for replay."""
+    contents: Dict[int, List[str]] = defaultdict(list)
+    finish_reasons: Dict[int, str] = {}
+    usage = None
+    for chunk in chunks:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        for choice in chunk.choices or ():
+            parts = contents[choice.index]
+            if choice.delta is not None and choice.delta.content:
+                parts.append(choice.delta.content)
+            if choice.finish_reason:
+                finish_reasons[choice.index] = choice.finish_reason
+    if not contents:
+        contents[0] = []
+    first = chunks[0] if chunks else None
+    return ChatCompletion.model_validate({
+        "id": getattr(first, "id", None) or "",
+        "object": "chat.completion",
+        "created": getattr(first, "created", None) or int(time.time()),
+        "model": getattr(first, "model", None) or "",
+        "choices": [
+            {"index": index, "finish_reason": finish_reasons.get(index, "stop"),
+             "message": {"role": "assistant", "content": "".join(parts)}}
+            for index, parts in sorted(contents.items())
+        ],
+        "usage": usage.model_dump() if usage is not None else None,
+    })
+
+async def _recorded_stream(stream, request: Dict[str, Any], recorder: CassetteRecorder, start: float) -> AsyncIterator[Any]:
+    """Pass the chunks of ``stream`` through and record the whole completion when it ends."""
+    chunks: List[Any] = []
+    try:
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        recorder.record(request, time.perf_counter() - start, error=e)
+        raise
+    # A stream the consumer stopped reading is not recorded: its answer is incomplete
+    recorder.record(request, time.perf_counter() - start, response=completion_from_chunks(chunks))
+
+def recording_async_client(inner, recorder: CassetteRecorder) -> _ClientShim:
+    """Wrap an async OpenAI client so every chat completion, streamed or not, is recorded."""
+    async def create(**kwargs):
+        start = time.perf_counter()
+        try:
+            response = await inner.chat.completions.create(**kwargs)
+        except Exception as e:
+            recorder.record(kwargs, time.perf_counter() - start, error=e)
+            raise
+        if kwargs.get("stream"):
+            return _recorded_stream(response, kwargs, recorder, start)
+        recorder.record(kwargs, time.perf_counter() - start, response=response)
+        return response
+    return _ClientShim(create)
+
+def replay_client(player: CassettePlayer) -> _ClientShim:
+    def create(**kwargs):
+        entry = player.next_entry(kwargs)
+        time.sleep(player.delay_for(entry))
+        return player.materialize(entry)
+    return _ClientShim(create)
+
+def replay_async_client(player: CassettePlayer) -> _ClientShim:
+    async def create(**kwargs):
+        entry = player.next_entry(kwargs)
+        await asyncio.sleep(player.delay_for(entry))
+        return player.materialize(entry)
+    return _ClientShim(create)
+
+
+def summarize_cassette(path: str) -> Dict[str, Any]:
+    """Per-operation call counts, error classes, latency percentiles and tokens of a cassette."""
+    operations: Dict[str, Dict[str, Any]] = {}
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    with _open_cassette(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            operation = entry.get("operation", "unknown")
+            summary = operations.setdefault(operation, {"calls": 0, "errors": {}, "prompt_tokens": 0, "completion_tokens": 0})
+            summary["calls"] += 1
+            latencies[operation].append(entry.get("latency", 0.0))
+            if "error" in entry:
+                error_class = entry["error"].get("class", "unknown")
+                summary["errors"][error_class] = summary["errors"].get(error_class, 0) + 1
+            usage = (entry.get("response") or {}).get("usage") or {}
+            summary["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            summary["completion_tokens"] += usage.get("completion_tokens", 0)
+    for operation, values in latencies.items():
+        values.sort()
+        operations[operation]["latency_seconds"] = {
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+    return operations
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python cassette.py CASSETTE_FILE")
+        sys.exit(2)
+    print(json.dumps(summarize_cassette(sys.argv[1]), indent=2))
@@ -78,7 +78,8 @@ class NLPServiceClient:
         base_url: str = "http://localhost:8000",
         timeout: int = 300,
         retries: int = 3,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        send_deadline: bool = False
     ):
         """
         Initialize the NLP Service client.
@@ -88,6 +89,8 @@ class NLPServiceClient:
             timeout: Request timeout in seconds
             retries: Number of retries for failed requests
             api_key: Optional API key for authentication
+            send_deadline: Send X-Request-Deadline (timeout - 5 s), so the service
+                answers with a partial result before this client gives up
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
@@ -102,6 +105,8 @@ class NLPServiceClient:
             'Content-Type': 'application/json',
             'User-Agent': 'NLP-Service-Client/1.0'
         })
+        if send_deadline:
+            self.session.headers['X-Request-Deadline'] = str(max(1, timeout - 5))
     
     def _make_request(
         self,
@@ -0,0 +1,97 @@
+"""
+Request deadlines.
+
+Clients stop waiting after their own timeout (``NLPServiceClient`` uses
+300 s), and anything the service computes after that is wasted. A request
+can state its budget in the ``X-Request-Deadline`` header or the
+``deadline_seconds`` field. The deadline is held in a context variable, so
+the LLM calls, the embedding step and every document of a batch see it. LLM
+timeouts and rate limiter waits are cut to the time left, retries stop when
+another attempt could not finish in time, and an extraction that runs out of
+time returns what it has instead of nothing.
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Optional, TypeVar
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Too little of the request's time budget is left for the operation."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: Time budget, counted from now
+        """
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self, reserve: float = 0.0) -> bool:
+        """Whether less than ``reserve`` seconds are left."""
+        return self.remaining() <= reserve
+
+    def timeout(self, default: Optional[float] = None, reserve: float = 0.0) -> float:
+        """
+        Timeout for an operation that must end ``reserve`` seconds before the deadline.
+
+        Raises:
+            DeadlineExceeded: No time is left for the operation
+        """
+        available = self.remaining() - reserve
+        if available <= 0:
+            raise DeadlineExceeded(f"deadline of {self.budget:g}s exhausted")
+        return available if default is None else min(default, available)
+
+
+current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def parse_deadline_seconds(value: Optional[object], max_seconds: Optional[float] = None) -> Optional[float]:
+    """
+    Budget in seconds from a header or field value, capped at ``max_seconds``.
+
+    Raises:
+        ValueError: The value is not a positive number
+    """
+    if value is None or value == "":
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"deadline must be a number of seconds, got {value!r}") from None
+    if not seconds > 0:
+        raise ValueError("deadline must be positive")
+    return min(seconds, max_seconds) if max_seconds else seconds
+
+
+async def within_deadline(awaitable: Awaitable[T], reserve: float = 0.0) -> T:
+    """
+    Await ``awaitable``, giving up ``reserve`` seconds before the current deadline.
+
+    Raises:
+        DeadlineExceeded: The deadline came first
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        timeout = deadline.timeout(reserve=reserve)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"deadline of {deadline.budget:g}s exhausted") from None
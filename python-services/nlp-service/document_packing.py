@@ -0,0 +1,123 @@
+"""
+Packing of short batch documents into a single graph extraction call.
+
+Short texts (two-line notification emails) cost far more in prompt preamble,
+ontology and round-trip than in content. In the batch path such texts are
+grouped into packs under a token budget; each pack is sent as one prompt with
+the documents delimited by id, and the LLM returns one result object per
+document id. Documents whose result is missing or malformed fall back to a
+regular single-document call.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from rate_limiter import estimate_tokens
+
+DOCUMENT_START = "<<<DOCUMENT {doc_id}>>>"
+DOCUMENT_END = "<<<END {doc_id}>>>"
+# Matches the delimiters above, used to strip look-alikes from document text
+_DELIMITER_RE = re.compile(r"<<<(?:DOCUMENT|END) [^>]*>>>")
+
+
+@dataclass
+class PackingPolicy:
+    """
+    Args:
+        max_pack_tokens: Token budget for the document texts of one pack
+        max_documents: Maximum number of documents per pack (bounds the completion size)
+        max_document_tokens: Documents estimated above this are never packed
+    """
+    max_pack_tokens: int = 1500
+    max_documents: int = 8
+    max_document_tokens: int = 400
+
+    def packable(self, text: str) -> bool:
+        return estimate_tokens(text) <= self.max_document_tokens
+
+
+def plan_packs(texts: Sequence[str], policy: PackingPolicy) -> List[List[int]]:
+    """
+    Group batch positions into packs. Packable texts are filled greedily, in
+    batch order, until the token budget or document cap is reached; every
+    other text gets a pack of its own.
+
+    Args:
+        texts: Batch texts
+        policy: Packing limits
+
+    Returns:
+        List of packs, each a list of positions into ``texts``
+    """
+    packs: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for position, text in enumerate(texts):
+        if not policy.packable(text):
+            packs.append([position])
+            continue
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > policy.max_pack_tokens or len(current) >= policy.max_documents):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+def document_ids(count: int) -> List[str]:
+    return [f"D{i}" for i in range(1, count + 1)]
+
+def format_packed_documents(texts: Sequence[str]) -> str:
+    """Render the documents of a pack between their id delimiters."""
+    blocks = []
+    for doc_id, text in zip(document_ids(len(texts)), texts):
+        body = _DELIMITER_RE.sub("", text).strip()
+        blocks.append(f"{DOCUMENT_START.format(doc_id=doc_id)}\n{body}\n{DOCUMENT_END.format(doc_id=doc_id)}")
+    return "\n\n".join(blocks)
+
+def split_packed_response(response_str: Optional[str], doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-document graphs from a packed response.
+
+    Accepts {"documents": [{"id": "D1", "entities": [...], "relationships": [...]}, ...]}
+    and the keyed variant {"documents": {"D1": {...}}}. Unknown ids and
+    entries without an entity or relationship list are dropped, so callers
+    treat every id absent from the result as failed.
+
+    Args:
+        response_str: Raw message content returned by the LLM
+        doc_ids: Ids sent in the pack
+
+    Returns:
+        Mapping of document id to {"entities", "relationships"}
+
+    Raises:
+        ValueError: If the response is not JSON (the whole pack falls back)
+    """
+    if not response_str:
+        return {}
+    data = json.loads(response_str)
+    documents = data.get("documents") if isinstance(data, dict) else None
+    if isinstance(documents, dict):
+        documents = [{**doc, "id": doc_id} for doc_id, doc in documents.items() if isinstance(doc, dict)]
+    if not isinstance(documents, list):
+        return {}
+
+    expected = set(doc_ids)
+    results: Dict[str, Dict[str, Any]] = {}
+    for document in documents:
+        if not isinstance(document, dict):
+            continue
+        doc_id = str(document.get("id", "")).strip()
+        entities = document.get("entities", [])
+        relationships = document.get("relationships", [])
+        if doc_id not in expected or doc_id in results:
+            continue
+        if not isinstance(entities, list) or not isinstance(relationships, list):
+            continue
+        results[doc_id] = {"entities": entities, "relationships": relationships}
+    return results
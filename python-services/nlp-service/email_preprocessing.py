@@ -0,0 +1,398 @@
+"""
+Email boilerplate stripping before entity and graph extraction.
+
+Raw emails carry quoted replies, signatures, legal disclaimers, tracking
+footers and HTML markup that cost prompt tokens without adding entities. The
+pre-processor converts HTML to text and removes those parts line by line,
+including lines a sender repeats in every message (learned per-sender
+templates). The cleaned text keeps, for every character, its offset in the
+original text, so entity ``start``/``end`` can be mapped back.
+"""
+
+import hashlib
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rate_limiter import estimate_tokens
+
+STEP_HTML = "html"
+STEP_QUOTES = "quotes"
+STEP_SIGNATURES = "signatures"
+STEP_DISCLAIMERS = "disclaimers"
+STEP_FOOTERS = "footers"
+STEP_TEMPLATES = "templates"
+ALL_STEPS = (STEP_HTML, STEP_QUOTES, STEP_SIGNATURES, STEP_DISCLAIMERS, STEP_FOOTERS, STEP_TEMPLATES)
+
+_REPLY_HEADER_RE = re.compile(
+    r"^\s*(?:On\s.{0,200}\swrote:\s*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|-{2,}\s*Forwarded message\s*-{2,}"
+    r"|_{10,}\s*$)",
+    re.IGNORECASE,
+)
+# Outlook-style reply header: "From: ..." directly followed by "Sent:"/"Date:"/"To:"
+_FORWARD_FROM_RE = re.compile(r"^\s*\*?From:\*?\s", re.IGNORECASE)
+_FORWARD_FIELD_RE = re.compile(r"^\s*\*?(?:Sent|Date|To):\*?\s", re.IGNORECASE)
+_QUOTED_LINE_RE = re.compile(r"^\s*>")
+_SIGNATURE_DELIMITER_RE = re.compile(r"^--\s?$")
+_SIGN_OFF_RE = re.compile(
+    r"^\s*(?:best|kind|warm|many thanks|thanks|thank you|regards|best regards|kind regards|warm regards|"
+    r"cheers|sincerely|yours sincerely|yours truly|respectfully)[\s,!.]*$",
+    re.IGNORECASE,
+)
+# Disclaimer phrasing, not just its vocabulary: "confidential" or "privileged" alone
+# also occur in business paragraphs that must be kept
+_DISCLAIMER_RE = re.compile(
+    r"intended (?:solely |only )?for the (?:use of the )?(?:addressee|(?:intended|named) recipient|individual)"
+    r"|(?:are|is) not the intended recipient"
+    r"|received this (?:e-?mail|message|communication|transmission) in error"
+    r"|this (?:e-?mail|message|communication|transmission)(?: and any (?:attachments?|files) (?:\w+ )*?)?"
+    r" (?:is|are|may be|contains?|may contain)(?: \w+){0,3}? (?:confidential|privileged)\b"
+    r"|(?:dissemination|distribution|copying|disclosure)[^.]{0,120}\b(?:strictly )?prohibited"
+    r"|(?:scanned|checked) for (?:the presence of )?(?:computer )?viruses|virus[- ]free"
+    r"|^\s*disclaimer\b"
+    r"|before printing this (?:e-?mail|message)",
+    re.IGNORECASE,
+)
+_FOOTER_RE = re.compile(
+    r"unsubscribe|view (?:this email )?in (?:your )?browser|manage (?:your )?(?:email )?preferences"
+    r"|^\s*sent from my \w+|^\s*get outlook for|^\s*<?https?://\S+>?\s*$",
+    re.IGNORECASE,
+)
+# A sign-off starts the signature only if at most this many short lines follow it
+_SIGNATURE_MAX_LINES = 6
+_SIGNATURE_MAX_LINE_LENGTH = 80
+# Disclaimers are whole paragraphs of at least this many characters
+_DISCLAIMER_MIN_LENGTH = 80
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "hr"}
+_SKIPPED_TAGS = {"script", "style", "head", "title"}
+_HTML_RE = re.compile(r"<(?:html|body|div|p|br|table|span)\b[^>]*>", re.IGNORECASE)
+
+
+class TrackedText:
+    """
+    Text whose characters remember their offset in the original text. A
+    character decoded from several source characters (``&eacute;``) also
+    remembers where its source ends.
+    """
+
+    def __init__(self, text: str, offsets: Sequence[int], original_length: int,
+                 ends: Optional[Sequence[int]] = None):
+        self.text = text
+        self.offsets = offsets if isinstance(offsets, array) else array("l", offsets)
+        self.original_length = original_length
+        if ends is None:
+            ends = array("l", (offset + 1 for offset in self.offsets))
+        self.ends = ends if isinstance(ends, array) else array("l", ends)
+
+    @classmethod
+    def plain(cls, text: str) -> "TrackedText":
+        return cls(text, array("l", range(len(text))), len(text))
+
+    def to_original(self, start: Optional[int], end: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+        """Map a [start, end) span of this text onto the original text."""
+        if start is None or end is None or not self.text or start >= end:
+            return None, None
+        start = min(max(start, 0), len(self.text) - 1)
+        end = min(max(end, 1), len(self.text))
+        return self.offsets[start], self.ends[end - 1]
+
+    def lines(self) -> List[Tuple[int, int]]:
+        spans, position = [], 0
+        for line in self.text.split("\n"):
+            spans.append((position, position + len(line)))
+            position += len(line) + 1
+        return spans
+
+    def select(self, spans: Iterable[Tuple[int, int]]) -> "TrackedText":
+        """Keep the given spans, joined by newlines (a newline maps to the end of the span before it)."""
+        parts: List[str] = []
+        offsets, ends = array("l"), array("l")
+        for start, end in spans:
+            if parts:
+                parts.append("\n")
+                offsets.append(ends[-1] if ends else 0)
+                ends.append(offsets[-1] + 1)
+            parts.append(self.text[start:end])
+            offsets.extend(self.offsets[start:end])
+            ends.extend(self.ends[start:end])
+        return TrackedText("".join(parts), offsets, self.original_length, ends)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=False)
+        self._html = html
+        self._line_starts = [0] + [m.end() for m in re.finditer("\n", html)]
+        self.chars: List[str] = []
+        self.offsets = array("l")
+        self.ends = array("l")
+        self._skip_depth = 0
+
+    def _append(self, char: str, start: int, end: int) -> None:
+        self.chars.append(char)
+        self.offsets.append(start)
+        self.ends.append(end)
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def _newline(self) -> None:
+        if self.chars and self.chars[-1] != "\n":
+            offset = self._offset()
+            self._append("\n", offset, offset + 1)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        start = self._offset()
+        # Collapse markup whitespace; each kept character keeps its source offset
+        for i, char in enumerate(data):
+            if char.isspace():
+                if self.chars and not self.chars[-1].isspace():
+                    self._append(" ", start + i, start + i + 1)
+            else:
+                self._append(char, start + i, start + i + 1)
+
+    def _reference(self, raw: str):
+        if self._skip_depth:
+            return
+        start = self._offset()
+        # The terminating semicolon is optional in HTML
+        end = start + (len(raw) if self._html.startswith(raw, start) else len(raw) - 1)
+        for char in unescape(raw):
+            self._append(" " if char == "\xa0" else char, start, end)
+
+    def handle_entityref(self, name):
+        self._reference(f"&{name};")
+
+    def handle_charref(self, name):
+        self._reference(f"&#{name};")
+
+
+def looks_like_html(text: str) -> bool:
+    return len(_HTML_RE.findall(text[:5000])) >= 2
+
+def html_to_text(html: str) -> TrackedText:
+    parser = _HTMLTextExtractor(html)
+    parser.feed(html)
+    parser.close()
+    return TrackedText("".join(parser.chars), parser.offsets, len(html), parser.ends)
+
+
+def _fingerprint(line: str) -> Optional[str]:
+    normalized = " ".join(line.lower().split())
+    if len(normalized) < 12:
+        return None
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _SenderProfile:
+    messages: int = 0
+    lines: Counter = field(default_factory=Counter)
+
+
+class SenderTemplates:
+    """
+    Learns, per sender, the lines repeated across their messages (signature
+    blocks, banners, legal footers). A line seen in at least ``min_messages``
+    earlier messages of the sender is treated as boilerplate.
+    """
+
+    def __init__(self, min_messages: int = 3, max_senders: int = 1000, max_lines_per_sender: int = 2000):
+        self.min_messages = min_messages
+        self.max_senders = max_senders
+        self.max_lines_per_sender = max_lines_per_sender
+        self._profiles: "OrderedDict[str, _SenderProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def known_lines(self, sender: str) -> set:
+        with self._lock:
+            profile = self._profiles.get(sender)
+            if profile is None:
+                return set()
+            return {fp for fp, count in profile.lines.items() if count >= self.min_messages}
+
+    def learn(self, sender: str, lines: Iterable[str]) -> None:
+        fingerprints = {fp for fp in (_fingerprint(line) for line in lines) if fp}
+        with self._lock:
+            profile = self._profiles.get(sender)
+            if profile is None:
+                profile = self._profiles[sender] = _SenderProfile()
+                while len(self._profiles) > self.max_senders:
+                    self._profiles.popitem(last=False)
+            else:
+                self._profiles.move_to_end(sender)
+            profile.messages += 1
+            profile.lines.update(fingerprints)
+            if len(profile.lines) > self.max_lines_per_sender:
+                profile.lines = Counter(dict(profile.lines.most_common(self.max_lines_per_sender // 2)))
+
+
+@dataclass
+class PreprocessedText:
+    original: str
+    cleaned: TrackedText
+    removed_lines: Dict[str, int]
+
+    @property
+    def text(self) -> str:
+        return self.cleaned.text
+
+    def stats(self) -> Dict[str, object]:
+        original_tokens = estimate_tokens(self.original) if self.original else 0
+        cleaned_tokens = estimate_tokens(self.cleaned.text) if self.cleaned.text else 0
+        return {
+            "original_length": len(self.original),
+            "cleaned_length": len(self.cleaned.text),
+            "original_tokens": original_tokens,
+            "cleaned_tokens": cleaned_tokens,
+            "tokens_saved": original_tokens - cleaned_tokens,
+            "removed_lines": {step: count for step, count in self.removed_lines.items() if count},
+        }
+
+    def map_entity_offsets(self, entities: Iterable[Dict]) -> None:
+        """Rewrite entity start/end from cleaned-text to original-text offsets, in place."""
+        for entity in entities:
+            if isinstance(entity, dict) and entity.get("start") is not None:
+                entity["start"], entity["end"] = self.cleaned.to_original(entity.get("start"), entity.get("end"))
+
+
+class EmailPreprocessor:
+    def __init__(self, steps: Sequence[str] = ALL_STEPS, templates: Optional[SenderTemplates] = None):
+        unknown = set(steps) - set(ALL_STEPS)
+        if unknown:
+            raise ValueError(f"Unknown pre-processing steps: {', '.join(sorted(unknown))}")
+        self.steps = set(steps)
+        self.templates = templates or SenderTemplates()
+
+    def process(self, text: str, sender: Optional[str] = None) -> PreprocessedText:
+        """
+        Strip boilerplate from one email.
+
+        Args:
+            text: Raw email text (plain text or HTML)
+            sender: Optional sender address, used to learn and strip per-sender templates
+
+        Returns:
+            Cleaned text with its offset map and the number of removed lines per step
+        """
+        tracked = html_to_text(text) if STEP_HTML in self.steps and looks_like_html(text) else TrackedText.plain(text)
+        spans = tracked.lines()
+        lines = [tracked.text[start:end] for start, end in spans]
+        keep = [True] * len(lines)
+        removed = {step: 0 for step in ALL_STEPS if step != STEP_HTML}
+
+        def drop(index: int, step: str) -> None:
+            if keep[index]:
+                keep[index] = False
+                if lines[index].strip():
+                    removed[step] += 1
+
+        if STEP_QUOTES in self.steps:
+            cut = next((
+                i for i, line in enumerate(lines) if i > 0 and (
+                    _REPLY_HEADER_RE.match(line)
+                    or (_FORWARD_FROM_RE.match(line) and i + 1 < len(lines) and _FORWARD_FIELD_RE.match(lines[i + 1]))
+                )
+            ), None)
+            for i, line in enumerate(lines):
+                if (cut is not None and i >= cut) or _QUOTED_LINE_RE.match(line):
+                    drop(i, STEP_QUOTES)
+
+        if STEP_DISCLAIMERS in self.steps:
+            for start, end in _paragraphs(lines):
+                paragraph = " ".join(lines[start:end])
+                if len(paragraph) >= _DISCLAIMER_MIN_LENGTH and _DISCLAIMER_RE.search(paragraph):
+                    for i in range(start, end):
+                        drop(i, STEP_DISCLAIMERS)
+
+        if STEP_FOOTERS in self.steps:
+            for i, line in enumerate(lines):
+                if _FOOTER_RE.search(line):
+                    drop(i, STEP_FOOTERS)
+
+        # After disclaimers and footers, so the sign-off is found near the end of what is left
+        if STEP_SIGNATURES in self.steps:
+            self._strip_signature(lines, keep, drop)
+
+        if STEP_TEMPLATES in self.steps and sender:
+            known = self.templates.known_lines(sender)
+            if known:
+                for i, line in enumerate(lines):
+                    if _fingerprint(line) in known:
+                        drop(i, STEP_TEMPLATES)
+            self.templates.learn(sender, lines)
+
+        kept_spans = _collapse_blank_lines(
+            [span for span, kept, line in zip(spans, keep, lines) if kept],
+            tracked.text,
+        )
+        return PreprocessedText(original=text, cleaned=tracked.select(kept_spans), removed_lines=removed)
+
+    @staticmethod
+    def _strip_signature(lines: List[str], keep: List[bool], drop) -> None:
+        kept_indices = [i for i, k in enumerate(keep) if k and lines[i].strip()]
+        delimiter = next((i for i in kept_indices if _SIGNATURE_DELIMITER_RE.match(lines[i])), None)
+        if delimiter is not None:
+            for i in range(delimiter, len(lines)):
+                drop(i, STEP_SIGNATURES)
+            return
+        # A sign-off near the end followed by a few short lines (name, title, phone)
+        for i in reversed(kept_indices[-(_SIGNATURE_MAX_LINES + 1):]):
+            if _SIGN_OFF_RE.match(lines[i]):
+                tail = [j for j in kept_indices if j > i]
+                if len(tail) <= _SIGNATURE_MAX_LINES and all(
+                    len(lines[j].strip()) <= _SIGNATURE_MAX_LINE_LENGTH for j in tail
+                ):
+                    for j in range(i, len(lines)):
+                        drop(j, STEP_SIGNATURES)
+                return
+
+
+def _paragraphs(lines: List[str]) -> List[Tuple[int, int]]:
+    paragraphs, start = [], None
+    for i, line in enumerate(lines + [""]):
+        if line.strip() and start is None:
+            start = i
+        elif not line.strip() and start is not None:
+            paragraphs.append((start, i))
+            start = None
+    return paragraphs
+
+def _collapse_blank_lines(spans: List[Tuple[int, int]], text: str) -> List[Tuple[int, int]]:
+    collapsed: List[Tuple[int, int]] = []
+    previous_blank = True  # also drops leading blank lines
+    for start, end in spans:
+        blank = not text[start:end].strip()
+        if blank and previous_blank:
+            continue
+        collapsed.append((start, end))
+        previous_blank = blank
+    while collapsed and not text[collapsed[-1][0]:collapsed[-1][1]].strip():
+        collapsed.pop()
+    return collapsed
@@ -0,0 +1,421 @@
+"""
+Deterministic OpenAI-compatible stand-in for offline load testing.
+
+Serves ``POST /v1/chat/completions`` (JSON mode) and answers the prompts the
+NLP service sends with ontology-shaped output derived from the input text:
+graph extraction prompts get entities/relationships typed with the ontology
+embedded in the prompt, refinement prompts get a filtered entity list and
+importance prompts get a ranked analysis. Requests with ``stream=True`` get
+the answer as server-sent chunks spread over the generation time. Responses
+carry ``usage`` token counts, and latency, 5xx, 429 (with Retry-After), timeouts and malformed JSON
+can be injected with configurable distributions.
+
+Run it and point the service at it:
+
+    python fake_openai_server.py --port 8089 --latency lognormal:-0.5,0.4 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ONTOLOGY_BLOCK_RE = re.compile(r"\*\*Ontology:\*\*\s*(\{.*?\n\})", re.DOTALL)
+TEXT_BLOCK_RE = re.compile(r"\*\*Text to Analyze:\*\*\s*---\n(.*)\n---", re.DOTALL)
+PACKED_DOCUMENT_RE = re.compile(r"<<<DOCUMENT (\w+)>>>\n(.*?)\n<<<END \1>>>", re.DOTALL)
+ENTITIES_BLOCK_RE = re.compile(r"\*\*Entities JSON:\*\*\s*---\n(.*)\n\s*---", re.DOTALL)
+MONEY_RE = re.compile(
+    r"(?:[$€£]\s?\d[\d,]*(?:\.\d+)?(?:\s?(?:million|billion|thousand|[MBK]))?(?:\s?[A-Z]{3})?"
+    r"|\b\d[\d,]*(?:\.\d+)?\s?(?:USD|EUR|GBP|CAD)\b)"
+)
+ORG_RE = re.compile(
+    r"\b(?:[A-Z][A-Za-z&.\-]+\s){1,3}(?:Corp|Corporation|Inc|Ltd|LLC|Group|Solutions|Services|Systems|"
+    r"Technologies|Enterprises|Partners|Labs|Bank|Holdings|Ratings|Global)\b\.?"
+)
+CAPITALIZED_RE = re.compile(r"\b[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b")
+REFERENCE_RE = re.compile(r"\b[A-Z]{2,}-\d{3,}\b")
+STOP_PHRASES = {"Dear Team", "Best Regards", "Kind Regards", "Hi Team", "Thank You"}
+
+MONEY_HINTS = ("money", "monetary", "amount", "value", "price", "currency")
+ORG_HINTS = ("organization", "organisation", "company", "business", "tenderer", "awarder", "party", "winner", "buyer", "supplier", "agent")
+PERSON_HINTS = ("person", "contact", "employee", "individual")
+REFERENCE_HINTS = ("contract", "tender", "reference", "identifier", "notice", "lot")
+
+
+@dataclass
+class FakeLLMConfig:
+    # Latency spec: "fixed:S", "uniform:LO,HI", "lognormal:MU,SIGMA" or "exponential:MEAN" (seconds)
+    latency: str = "fixed:0.0"
+    # Extra latency per completion token, to model generation time
+    seconds_per_output_token: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 600.0
+    malformed_rate: float = 0.0
+    # Emulated account limit; requests beyond it within a minute get a 429
+    requests_per_minute: Optional[int] = None
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        def _get(name: str, default: Any, cast):
+            value = os.getenv(f"FAKE_LLM_{name.upper()}")
+            return cast(value) if value not in (None, "") else default
+        return cls(
+            latency=_get("latency", cls.latency, str),
+            seconds_per_output_token=_get("seconds_per_output_token", cls.seconds_per_output_token, float),
+            error_rate=_get("error_rate", cls.error_rate, float),
+            rate_limit_rate=_get("rate_limit_rate", cls.rate_limit_rate, float),
+            retry_after=_get("retry_after", cls.retry_after, float),
+            timeout_rate=_get("timeout_rate", cls.timeout_rate, float),
+            timeout_seconds=_get("timeout_seconds", cls.timeout_seconds, float),
+            malformed_rate=_get("malformed_rate", cls.malformed_rate, float),
+            requests_per_minute=_get("requests_per_minute", cls.requests_per_minute, int),
+            seed=_get("seed", cls.seed, int),
+        )
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Draw a latency (seconds) from a distribution spec such as ``lognormal:-0.5,0.4``.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+    if kind == "fixed":
+        return values[0] if values else 0.0
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return rng.lognormvariate(values[0], values[1])
+    if kind == "exponential":
+        return rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def count_tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4)
+
+def _stable_index(value: str, modulo: int) -> int:
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest(), 16) % modulo
+
+def _pick_type(candidates: List[str], hints: Tuple[str, ...], value: str) -> Optional[str]:
+    matching = [t for t in candidates if any(h in t.lower() for h in hints)]
+    pool = matching or candidates
+    return pool[_stable_index(value, len(pool))] if pool else None
+
+def extract_mentions(text: str) -> List[Tuple[str, str]]:
+    """
+    Find (value, kind) mentions in text, in order of first appearance.
+    kind is one of money, org, reference, person.
+    """
+    spans: List[Tuple[int, str, str]] = []
+    taken: List[Tuple[int, int]] = []
+
+    def _add(match: "re.Match", kind: str) -> None:
+        start, end = match.span()
+        if any(start < t_end and end > t_start for t_start, t_end in taken):
+            return
+        value = match.group(0).strip().rstrip(".,")
+        if not value or value in STOP_PHRASES:
+            return
+        taken.append((start, end))
+        spans.append((start, value, kind))
+
+    for match in MONEY_RE.finditer(text):
+        _add(match, "money")
+    for match in REFERENCE_RE.finditer(text):
+        _add(match, "reference")
+    for match in ORG_RE.finditer(text):
+        _add(match, "org")
+    for match in CAPITALIZED_RE.finditer(text):
+        _add(match, "person")
+
+    seen = set()
+    mentions = []
+    for _, value, kind in sorted(spans):
+        if value.lower() in seen:
+            continue
+        seen.add(value.lower())
+        mentions.append((value, kind))
+    return mentions
+
+def build_graph(text: str, ontology: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deterministically derive an ontology-shaped graph from text.
+    """
+    entity_types: List[str] = list(ontology.get("e", [])) or ["Organization", "Person", "MonetaryAmount"]
+    triples: List[List[str]] = [t for t in ontology.get("r", []) if isinstance(t, list) and len(t) == 3]
+    hints = {"money": MONEY_HINTS, "org": ORG_HINTS, "person": PERSON_HINTS, "reference": REFERENCE_HINTS}
+
+    entities = []
+    by_type: Dict[str, List[str]] = {}
+    for value, kind in extract_mentions(text):
+        entity_type = _pick_type(entity_types, hints[kind], value)
+        entities.append({"value": value, "type": entity_type, "properties": {}})
+        by_type.setdefault(entity_type, []).append(value)
+
+    relationships = []
+    for source_type, rel_type, target_type in triples:
+        sources = by_type.get(source_type, [])
+        targets = by_type.get(target_type, [])
+        if sources and targets and sources[0] != targets[0]:
+            relationships.append({"source": sources[0], "target": targets[0], "type": rel_type})
+
+    # Guarantee some edges on ontologies whose triples did not match
+    if not relationships and len(entities) > 1:
+        rel_type = triples[0][1] if triples else "RELATED_TO_INFERRED"
+        relationships.append({"source": entities[0]["value"], "target": entities[1]["value"], "type": rel_type})
+
+    return {"entities": entities, "relationships": relationships}
+
+def refine_entities(entities_json: str) -> Dict[str, Any]:
+    try:
+        entities = json.loads(entities_json)
+    except json.JSONDecodeError:
+        entities = []
+    cleaned = [
+        e for e in entities
+        if isinstance(e, dict)
+        and len(str(e.get("value", ""))) > 3
+        and str(e.get("value", "")) not in STOP_PHRASES
+        and not str(e.get("value", "")).isdigit()
+    ]
+    return {"cleaned_entities": cleaned}
+
+def rank_importance(prompt: str) -> Dict[str, Any]:
+    names = re.findall(r'"(?:name|label|type)"\s*:\s*"([^"]+)"', prompt)
+    unique = list(dict.fromkeys(names))
+    analysis = [
+        {"name": name, "importanceScore": round(1.0 - _stable_index(name, 1000) / 1000.0, 3), "reasoning": "synthetic"}
+        for name in unique
+    ]
+    return {"analysis": analysis}
+
+def answer_prompt(prompt: str) -> Dict[str, Any]:
+    """Produce the JSON body the NLP service expects for a given prompt."""
+    if "cleaned_entities" in prompt:
+        match = ENTITIES_BLOCK_RE.search(prompt)
+        return refine_entities(match.group(1) if match else "[]")
+    if "**Text to Analyze:**" not in prompt and ("importanceScore" in prompt or "importance" in prompt.lower()):
+        return rank_importance(prompt)
+
+    ontology: Dict[str, Any] = {}
+    ontology_match = ONTOLOGY_BLOCK_RE.search(prompt)
+    if ontology_match:
+        try:
+            ontology = json.loads(ontology_match.group(1))
+        except json.JSONDecodeError:
+            ontology = {}
+    if "**Documents:**" in prompt:
+        # Multi-document pack: one graph per delimited document id
+        return {"documents": [
+            {"id": doc_id, **build_graph(text, ontology)}
+            for doc_id, text in PACKED_DOCUMENT_RE.findall(prompt)
+        ]}
+    text_match = TEXT_BLOCK_RE.search(prompt)
+    text = text_match.group(1) if text_match else prompt
+    return build_graph(text, ontology)
+
+
+class FakeLLMBackend:
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._prompt_counts: Dict[str, int] = {}
+        self._recent_requests: Deque[float] = deque()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "timeouts": 0, "malformed": 0}
+
+    def _rng_for(self, prompt: str) -> random.Random:
+        # Deterministic per (seed, prompt, occurrence) so retries draw fresh outcomes
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            occurrence = self._prompt_counts.get(digest, 0)
+            self._prompt_counts[digest] = occurrence + 1
+        return random.Random(f"{self.config.seed}:{digest}:{occurrence}")
+
+    def _over_rpm(self) -> bool:
+        if not self.config.requests_per_minute:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent_requests and self._recent_requests[0] <= now - 60.0:
+                self._recent_requests.popleft()
+            if len(self._recent_requests) >= self.config.requests_per_minute:
+                return True
+            self._recent_requests.append(now)
+            return False
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    async def complete(self, body: Dict[str, Any]) -> JSONResponse:
+        self._count("requests")
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        rng = self._rng_for(prompt)
+        config = self.config
+
+        if self._over_rpm() or rng.random() < config.rate_limit_rate:
+            self._count("rate_limited")
+            return _error_response(429, "Rate limit reached (fake backend)", "rate_limit_exceeded",
+                                   headers={"retry-after": f"{config.retry_after:g}"})
+        if rng.random() < config.error_rate:
+            self._count("errors")
+            await asyncio.sleep(sample_latency(config.latency, rng))
+            return _error_response(500, "Injected server error (fake backend)", "server_error")
+        if rng.random() < config.timeout_rate:
+            self._count("timeouts")
+            await asyncio.sleep(config.timeout_seconds)
+            return _error_response(504, "Injected timeout (fake backend)", "timeout")
+
+        content = json.dumps(answer_prompt(prompt))
+        if rng.random() < config.malformed_rate:
+            self._count("malformed")
+            content = content[: max(1, int(len(content) * rng.uniform(0.3, 0.9)))]
+
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(content)
+        first_token_delay = sample_latency(config.latency, rng)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            self._count("ok")
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                _stream_chunks(body.get("model", "gpt-4o"), content, usage if include_usage else None,
+                               first_token_delay, config.seconds_per_output_token),
+                media_type="text/event-stream",
+            )
+        delay = first_token_delay + completion_tokens * config.seconds_per_output_token
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._count("ok")
+
+        return JSONResponse({
+            "id": f"chatcmpl-fake-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+
+async def _stream_chunks(model: str, content: str, usage: Optional[Dict[str, int]], first_token_delay: float,
+                         seconds_per_token: float, chunk_chars: int = 16):
+    """Chat completion chunks of ``content`` in the OpenAI streaming format, paced like generation."""
+    completion_id = f"chatcmpl-fake-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, chunk_usage=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}] if delta is not None else [],
+        }
+        if chunk_usage is not None:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    if first_token_delay > 0:
+        await asyncio.sleep(first_token_delay)
+    yield chunk({"role": "assistant", "content": ""})
+    for start in range(0, len(content), chunk_chars):
+        piece = content[start:start + chunk_chars]
+        if seconds_per_token > 0:
+            await asyncio.sleep(count_tokens(piece) * seconds_per_token)
+        yield chunk({"content": piece})
+    yield chunk({}, finish_reason="stop")
+    if usage is not None:
+        yield chunk(None, chunk_usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def _error_response(status: int, message: str, code: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": message, "type": code, "param": None, "code": code}},
+        status_code=status,
+        headers=headers,
+    )
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    backend = FakeLLMBackend(config or FakeLLMConfig.from_env())
+    fake_app = FastAPI(title="Fake OpenAI backend", description="Deterministic stand-in for load testing.")
+
+    @fake_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await backend.complete(await request.json())
+
+    @fake_app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}]}
+
+    @fake_app.get("/stats")
+    async def stats():
+        return {"config": asdict(backend.config), "stats": backend.stats}
+
+    fake_app.state.backend = backend
+    return fake_app
+
+# Module-level app for `uvicorn fake_openai_server:app` (configured through FAKE_LLM_* variables)
+app = create_app()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI backend for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default=FakeLLMConfig.latency,
+                        help="fixed:S | uniform:LO,HI | lognormal:MU,SIGMA | exponential:MEAN")
+    parser.add_argument("--seconds-per-output-token", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=600.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sample_latency(args.latency, random.Random(0))  # validate the spec early
+    config = FakeLLMConfig(
+        latency=args.latency,
+        seconds_per_output_token=args.seconds_per_output_token,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        malformed_rate=args.malformed_rate,
+        requests_per_minute=args.requests_per_minute,
+        seed=args.seed,
+    )
+    print(f"🧪 Fake OpenAI backend on http://{args.host}:{args.port}/v1 ({config.latency})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
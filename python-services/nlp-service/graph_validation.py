@@ -0,0 +1,213 @@
+"""
+Ontology validation of extracted graphs.
+
+The LLM answer is checked against the ontology snapshot it was extracted
+with, element by element, so it works on a whole answer and on a streamed
+one alike:
+
+- Structure: entities need a value and relationships a source, target and
+  type, or the response model cannot hold them; such elements are always
+  dropped.
+- Types: an entity's ``type`` (or the first ontology type among its
+  ``types``) must be an ontology entity or property type, and a relationship
+  type an ontology relationship type. Case and spacing slips are corrected.
+  Types the prompt allows the LLM to invent (suffixed ``Inferred`` /
+  ``_INFERRED``) pass as inferred.
+- References: relationship ends must be the value or id of an entity seen
+  before, and (source type, relationship type, target type) an ontology
+  triple when both ends have ontology types.
+
+Elements that fail a type or reference check are flagged (an
+``ontology_violation`` field naming the check) or dropped, depending on the
+mode.
+"""
+
+import re
+from typing import Any, Dict, List, Mapping, Optional
+
+from ontology_snapshots import OntologySnapshot
+
+MODE_FLAG = "flag"
+MODE_DROP = "drop"
+MODE_OFF = "off"  # Structural checks and type normalization only
+VALIDATION_MODES = (MODE_FLAG, MODE_DROP, MODE_OFF)
+
+DEFAULT_CONFIDENCE = 0.9
+_KEY_RE = re.compile(r"[\s_\-]+")
+
+
+def _type_key(name: str) -> str:
+    return _KEY_RE.sub("", name).lower()
+
+
+def _type_index(types: frozenset) -> Dict[str, str]:
+    return {_type_key(name): name for name in types}
+
+
+def _elements(graph: Mapping[str, Any], key: str) -> List[Any]:
+    elements = graph.get(key)
+    return elements if isinstance(elements, list) else []
+
+
+def _is_inferred(name: str) -> bool:
+    return name.endswith("Inferred") or name.upper().endswith("_INFERRED")
+
+
+class GraphValidator:
+    def __init__(self, ontology: OntologySnapshot, mode: str = MODE_FLAG):
+        """
+        Args:
+            ontology: Snapshot the graph was extracted with
+            mode: "flag", "drop" or "off" (see the module docstring)
+        """
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"Unknown graph validation mode: {mode}")
+        self.ontology = ontology
+        self.mode = mode
+        self._entity_types = ontology.entity_type_set | ontology.property_type_set
+        self._entity_index = ontology.derived(
+            "validation_entity_types", lambda snapshot: _type_index(snapshot.entity_type_set | snapshot.property_type_set)
+        )
+        self._relationship_index = ontology.derived(
+            "validation_relationship_types", lambda snapshot: _type_index(snapshot.relationship_type_set)
+        )
+        self._entity_types_by_ref: Dict[str, str] = {}
+        self.counts = {
+            kind: {"valid": 0, "corrected": 0, "inferred": 0, "flagged": 0, "dropped": 0}
+            for kind in ("entities", "relationships")
+        }
+        self.violations: Dict[str, int] = {}
+
+    def entity(self, entity: Any) -> Optional[Dict[str, Any]]:
+        """
+        Validate and normalize one entity in place.
+
+        Returns:
+            The entity, or None if it is dropped
+        """
+        counts = self.counts["entities"]
+        if not isinstance(entity, dict):
+            return self._drop("entities", "not_an_object")
+        value = entity.get("value")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            entity["value"] = value = str(value)
+        if not isinstance(value, str) or not value.strip():
+            return self._drop("entities", "missing_value")
+
+        corrected = self._normalize_confidence(entity)
+        if entity.get("properties") is not None and not isinstance(entity["properties"], dict):
+            entity["properties"] = {}
+            corrected = True
+        names = [entity.get("type")] + (entity.pop("types") if isinstance(entity.get("types"), list) else [])
+        names = [name for name in names if isinstance(name, str) and name.strip()]
+        resolved = [self._resolve(name, self._entity_index) for name in names]
+        entity_type = next((name for name in resolved if name is not None), None)
+        if entity_type is None:
+            entity_type = names[0] if names else "Unknown"
+        if entity_type != entity.get("type"):
+            corrected = corrected or "type" in entity
+            entity["type"] = entity_type
+
+        violation = None
+        if self.mode != MODE_OFF:
+            if _type_key(value) == _type_key(entity_type):
+                violation = "type_as_value"
+            elif entity_type not in self._entity_types and not _is_inferred(entity_type):
+                violation = "unknown_entity_type"
+        if violation is not None:
+            if self.mode == MODE_DROP:
+                return self._drop("entities", violation)
+            self._flag(entity, "entities", violation)
+        elif _is_inferred(entity_type) and entity_type not in self._entity_types:
+            counts["inferred"] += 1
+        else:
+            counts["corrected" if corrected else "valid"] += 1
+
+        for ref in (value, entity.get("id")):
+            if isinstance(ref, str):
+                self._entity_types_by_ref.setdefault(ref.strip().lower(), entity_type)
+        return entity
+
+    def relationship(self, rel: Any) -> Optional[Dict[str, Any]]:
+        """
+        Validate and normalize one relationship in place, against the entities seen so far.
+
+        Returns:
+            The relationship, or None if it is dropped
+        """
+        counts = self.counts["relationships"]
+        if not isinstance(rel, dict):
+            return self._drop("relationships", "not_an_object")
+        for field in ("source", "target", "type"):
+            if isinstance(rel.get(field), (int, float)) and not isinstance(rel.get(field), bool):
+                rel[field] = str(rel[field])
+            if not isinstance(rel.get(field), str) or not rel[field].strip():
+                return self._drop("relationships", f"missing_{field}")
+
+        corrected = self._normalize_confidence(rel)
+        rel_type = self._resolve(rel["type"], self._relationship_index)
+        if rel_type is not None and rel_type != rel["type"]:
+            rel["type"] = rel_type
+            corrected = True
+
+        violation = None
+        if self.mode != MODE_OFF:
+            source_type = self._entity_types_by_ref.get(rel["source"].strip().lower())
+            target_type = self._entity_types_by_ref.get(rel["target"].strip().lower())
+            if source_type is None or target_type is None:
+                violation = "dangling_endpoint"
+            elif rel_type is None and not _is_inferred(rel["type"]):
+                violation = "unknown_relationship_type"
+            elif (
+                rel_type is not None and self.ontology.triples
+                and source_type in self._entity_types and target_type in self._entity_types
+                and (source_type, rel_type, target_type) not in self.ontology.triples
+            ):
+                violation = "triple_not_in_ontology"
+        if violation is not None:
+            if self.mode == MODE_DROP:
+                return self._drop("relationships", violation)
+            self._flag(rel, "relationships", violation)
+        elif rel_type is None:
+            counts["inferred" if _is_inferred(rel["type"]) else "valid"] += 1
+        else:
+            counts["corrected" if corrected else "valid"] += 1
+        return rel
+
+    def graph(self, graph: Mapping[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Validate a whole graph: all entities first, then the relationships."""
+        entities = [e for e in map(self.entity, _elements(graph, "entities")) if e is not None]
+        relationships = [r for r in map(self.relationship, _elements(graph, "relationships")) if r is not None]
+        return {"entities": entities, "relationships": relationships}
+
+    def report(self) -> Dict[str, Any]:
+        return {"mode": self.mode, **{kind: dict(counts) for kind, counts in self.counts.items()},
+                "violations": dict(self.violations)}
+
+    def _resolve(self, name: str, index: Dict[str, str]) -> Optional[str]:
+        """Ontology type ``name`` stands for, ignoring case, spaces, dashes and underscores."""
+        return index.get(_type_key(name))
+
+    @staticmethod
+    def _normalize_confidence(element: Dict[str, Any]) -> bool:
+        """Default a missing confidence and clamp a wrong one; True if it was wrong."""
+        confidence = element.get("confidence")
+        if confidence is None:
+            element["confidence"] = DEFAULT_CONFIDENCE
+            return False
+        try:
+            value = DEFAULT_CONFIDENCE if isinstance(confidence, bool) else float(confidence)
+        except (TypeError, ValueError):
+            value = DEFAULT_CONFIDENCE
+        element["confidence"] = value = min(1.0, max(0.0, value))
+        return value != confidence
+
+    def _flag(self, element: Dict[str, Any], kind: str, violation: str) -> None:
+        element["ontology_violation"] = violation
+        self.counts[kind]["flagged"] += 1
+        self.violations[violation] = self.violations.get(violation, 0) + 1
+
+    def _drop(self, kind: str, violation: str) -> None:
+        self.counts[kind]["dropped"] += 1
+        self.violations[violation] = self.violations.get(violation, 0) + 1
+        return None
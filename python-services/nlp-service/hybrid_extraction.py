@@ -0,0 +1,191 @@
+"""
+Hybrid spaCy + LLM graph extraction helpers.
+
+In hybrid mode spaCy runs first. Property-like mentions it finds with high
+confidence (money, percentages, dates, stock symbols, reference numbers) are
+mapped onto the ontology and kept as final "anchor" entities. The remaining
+spaCy mentions become a compact candidate list, and the LLM is only asked for
+the remaining core entities and the relationships, referring to anchors by a
+short id instead of re-emitting them.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+EXTRACTION_MODE_LLM = "llm"
+EXTRACTION_MODE_HYBRID = "hybrid"
+EXTRACTION_MODES = (EXTRACTION_MODE_LLM, EXTRACTION_MODE_HYBRID)
+
+# spaCy / entity_ruler label -> property-like kind
+PROPERTY_LIKE_LABELS = {
+    "MONEY": "money",
+    "MonetaryAmount": "money",
+    "Currency": "money",
+    "PERCENT": "percent",
+    "Percentage": "percent",
+    "DATE": "date",
+    "StockSymbol": "stock_symbol",
+    "ReferenceNumber": "reference",
+}
+# Labels produced by the deterministic entity_ruler patterns
+RULER_LABELS = {"MonetaryAmount", "Currency", "Percentage", "StockSymbol", "ReferenceNumber", "FinancialOrg", "JobTitle"}
+# Confidence assigned per label family; the spaCy extractor reports a flat 0.85
+RULER_CONFIDENCE = 0.95
+NUMERIC_NER_CONFIDENCE = 0.9
+NUMERIC_NER_LABELS = {"MONEY", "PERCENT"}
+
+# Head nouns identifying the ontology type a property-like kind maps to, in order of preference
+KIND_TYPE_HINTS = {
+    "money": ("monetaryamount", "monetaryvalue", "amountofmoney", "money", "amount", "price", "value"),
+    "percent": ("percentage", "percent"),
+    "date": ("date",),
+    "stock_symbol": ("tickersymbol", "stocksymbol", "symbol"),
+    "reference": ("referencenumber", "reference"),
+}
+# spaCy labels not worth showing the LLM as candidates
+IGNORED_CANDIDATE_LABELS = {"CARDINAL", "ORDINAL", "QUANTITY", "TIME"}
+
+_ANCHOR_ID_RE = re.compile(r"^A\d+$")
+_CAMEL_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+")
+
+
+def anchor_confidence(spacy_label: str) -> float:
+    if spacy_label in RULER_LABELS:
+        return RULER_CONFIDENCE
+    if spacy_label in NUMERIC_NER_LABELS:
+        return NUMERIC_NER_CONFIDENCE
+    return 0.85
+
+def resolve_anchor_type(kind: str, ontology_config: Dict[str, Any]) -> Optional[str]:
+    """
+    Find the ontology type a property-like kind maps to, preferring declared
+    property types over core entity types.
+
+    Args:
+        kind: Property-like kind (money, percent, date, stock_symbol, reference)
+        ontology_config: Ontology configuration
+
+    Returns:
+        Ontology type name, or None when the ontology has no matching type
+    """
+    hints = KIND_TYPE_HINTS.get(kind, ())
+    for pool in (ontology_config.get("property_types") or [], ontology_config.get("entity_types") or []):
+        heads = [(type_name, _head_suffixes(type_name)) for type_name in pool]
+        for hint in hints:
+            # Types whose trailing CamelCase words spell the hint ("OpenDate" for "date"),
+            # preferring the most generic (shortest) one
+            matching = [type_name for type_name, suffixes in heads if hint in suffixes]
+            if matching:
+                return min(matching, key=len)
+    return None
+
+def _head_suffixes(type_name: str) -> set:
+    words = [w.lower() for w in _CAMEL_WORD_RE.findall(type_name)]
+    return {"".join(words[i:]) for i in range(len(words))}
+
+def split_spacy_entities(
+    spacy_entities: List[Dict[str, Any]],
+    ontology_config: Dict[str, Any],
+    min_confidence: float,
+    type_cache: Optional[Dict[str, Optional[str]]] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """
+    Split spaCy output into final anchor entities and LLM candidates.
+
+    Args:
+        spacy_entities: Output of SpacyEntityExtractor.extract_entities
+        ontology_config: Ontology configuration used for type mapping
+        min_confidence: Minimum confidence for a property-like entity to be final
+        type_cache: Optional kind -> ontology type memo shared across calls for one ontology version
+
+    Returns:
+        (anchors, candidates); anchors are entity dicts typed with the ontology,
+        candidates are {"value", "label"} dicts
+    """
+    anchors: List[Dict[str, Any]] = []
+    candidates: List[Dict[str, str]] = []
+    seen_anchor_values = set()
+    seen_candidate_values = set()
+    if type_cache is None:
+        type_cache = {}
+
+    for entity in spacy_entities:
+        label = entity.get("spacy_label") or entity.get("type", "")
+        value = (entity.get("value") or "").strip()
+        if not value:
+            continue
+        key = value.lower()
+        kind = PROPERTY_LIKE_LABELS.get(label)
+        confidence = anchor_confidence(label)
+
+        if kind is not None and confidence >= min_confidence:
+            if kind not in type_cache:
+                type_cache[kind] = resolve_anchor_type(kind, ontology_config)
+            anchor_type = type_cache[kind]
+            if anchor_type is not None:
+                if key not in seen_anchor_values:
+                    seen_anchor_values.add(key)
+                    anchors.append({
+                        "type": anchor_type,
+                        "value": value,
+                        "confidence": confidence,
+                        "properties": {"extraction_source": "spacy"},
+                        "start": entity.get("start"),
+                        "end": entity.get("end"),
+                        "spacy_label": label,
+                        "context": entity.get("context"),
+                    })
+                continue
+
+        if label in IGNORED_CANDIDATE_LABELS or key in seen_candidate_values or key in seen_anchor_values:
+            continue
+        seen_candidate_values.add(key)
+        candidates.append({"value": value, "label": label})
+
+    return anchors, candidates
+
+def format_anchor_list(anchors: List[Dict[str, Any]]) -> str:
+    if not anchors:
+        return "(none)"
+    return "\n".join(f"A{i} | {a['type']} | {a['value']}" for i, a in enumerate(anchors, 1))
+
+def format_candidate_list(candidates: List[Dict[str, str]]) -> str:
+    if not candidates:
+        return "(none)"
+    return "\n".join(f"- {c['value']} ({c['label']})" for c in candidates)
+
+def merge_hybrid_graph(anchors: List[Dict[str, Any]], llm_graph: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combine anchors with the LLM output: resolve anchor ids used as relationship
+    endpoints and drop LLM entities that duplicate an anchor.
+
+    Args:
+        anchors: Final spaCy entities
+        llm_graph: Parsed LLM graph ({"entities", "relationships"})
+
+    Returns:
+        Graph dictionary with entities and relationships
+    """
+    anchor_values = {f"A{i}": a["value"] for i, a in enumerate(anchors, 1)}
+    anchor_keys = {a["value"].lower() for a in anchors}
+
+    entities = [dict(a) for a in anchors]
+    for entity in llm_graph.get("entities", []):
+        if not isinstance(entity, dict):
+            continue
+        value = str(entity.get("value", ""))
+        if value in anchor_values or value.lower() in anchor_keys:
+            continue
+        entities.append(entity)
+
+    relationships = []
+    for rel in llm_graph.get("relationships", []):
+        if not isinstance(rel, dict):
+            continue
+        for end in ("source", "target"):
+            endpoint = str(rel.get(end, "")).strip()
+            if _ANCHOR_ID_RE.match(endpoint) and endpoint in anchor_values:
+                rel[end] = anchor_values[endpoint]
+        relationships.append(rel)
+
+    return {"entities": entities, "relationships": relationships}
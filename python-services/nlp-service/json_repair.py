@@ -0,0 +1,271 @@
+"""
+Tolerant parsing of LLM JSON answers.
+
+An answer cut off by the token limit, or with a stray quote, used to fail
+``json.loads`` and throw the whole extraction away, which means another full
+LLM call. ``repair_json`` parses strict JSON as before and otherwise falls
+back to a forgiving recursive-descent parser that fixes the usual defects and
+reports which repairs it made:
+
+- ``code_fence``: the JSON is wrapped in a Markdown code fence
+- ``leading_text`` / ``trailing_text``: prose before or after the JSON value
+- ``truncated``: the answer stops mid-value; open strings, objects and arrays
+  are closed, and a member whose scalar value was cut off is dropped
+- ``trailing_commas`` / ``missing_commas``: separators too many or missing
+- ``single_quotes``: 'single-quoted' strings
+- ``unquoted_keys`` / ``unquoted_values``: bare words as keys or values
+- ``python_literals``: True, False and None
+- ``inner_quotes``: a double quote inside a string that does not end it
+- ``control_characters``: raw newlines or tabs inside strings
+- ``invalid_escapes``: backslashes that do not start a JSON escape
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_CODE_FENCE_RE = re.compile(r"^\s*```[A-Za-z]*\s*\n?(.*?)\n?\s*(?:```\s*)?$", re.DOTALL)
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+_HEX_DIGITS = set("0123456789abcdefABCDEF")
+_PYTHON_LITERALS = {"True": True, "False": False, "None": None}
+_JSON_LITERALS = {"true": True, "false": False, "null": None}
+# Characters that end a bare word (literal, number or unquoted key/value)
+_DELIMITERS = set(" \t\r\n,:[]{}\"'")
+# A quote followed by one of these (or the end) closes its string
+_AFTER_STRING = set(",:]}\"'")
+
+
+class _Truncated(Exception):
+    """The answer ended inside a scalar value."""
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.repairs: List[str] = []
+
+    def repair(self, kind: str) -> None:
+        if kind not in self.repairs:
+            self.repairs.append(kind)
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.text, min(self.pos, len(self.text)))
+
+    def skip_whitespace(self) -> None:
+        text, pos = self.text, self.pos
+        while pos < len(text) and text[pos] in " \t\r\n":
+            pos += 1
+        self.pos = pos
+
+    def at_end(self) -> bool:
+        self.skip_whitespace()
+        return self.pos >= len(self.text)
+
+    def value(self) -> Any:
+        if self.at_end():
+            raise _Truncated()
+        char = self.text[self.pos]
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string()
+        word = self.bare_word()
+        if word in _JSON_LITERALS:
+            return _JSON_LITERALS[word]
+        if word in _PYTHON_LITERALS:
+            self.repair("python_literals")
+            return _PYTHON_LITERALS[word]
+        try:
+            return json.loads(word)
+        except ValueError:
+            self.repair("unquoted_values")
+            return word
+
+    def bare_word(self) -> str:
+        start = self.pos
+        text = self.text
+        while self.pos < len(text) and text[self.pos] not in _DELIMITERS:
+            self.pos += 1
+        if self.pos >= len(text):
+            # A number or literal running into the end may be cut short
+            raise _Truncated()
+        if self.pos == start:
+            raise self.error(f"Unexpected character {text[self.pos]!r}")
+        return text[start:self.pos]
+
+    def string(self) -> str:
+        text = self.text
+        quote = text[self.pos]
+        if quote == "'":
+            self.repair("single_quotes")
+        self.pos += 1
+        chars: List[str] = []
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char == "\\":
+                chars.append(self.escape())
+                continue
+            if char == quote:
+                if self.closes_string(self.pos + 1):
+                    self.pos += 1
+                    return "".join(chars)
+                self.repair("inner_quotes")
+            elif char < " ":
+                self.repair("control_characters")
+            chars.append(char)
+            self.pos += 1
+        raise _Truncated()
+
+    def escape(self) -> str:
+        text = self.text
+        if self.pos + 1 >= len(text):
+            raise _Truncated()
+        code = text[self.pos + 1]
+        if code == "u":
+            codepoint = self.hex4(self.pos + 2)
+            if codepoint is not None:
+                self.pos += 6
+                if 0xD800 <= codepoint < 0xDC00 and text.startswith("\\u", self.pos):
+                    low = self.hex4(self.pos + 2)
+                    if low is not None and 0xDC00 <= low < 0xE000:
+                        self.pos += 6
+                        return chr(0x10000 + ((codepoint - 0xD800) << 10) + (low - 0xDC00))
+                return chr(codepoint)
+        elif code in _ESCAPES:
+            self.pos += 2
+            return _ESCAPES[code]
+        self.repair("invalid_escapes")
+        self.pos += 1
+        return "\\"
+
+    def hex4(self, pos: int) -> Optional[int]:
+        """Code point of the four hex digits at ``pos``, or None if they are not hex digits."""
+        digits = self.text[pos:pos + 4]
+        if len(digits) < 4:
+            raise _Truncated()
+        if not all(char in _HEX_DIGITS for char in digits):
+            return None
+        return int(digits, 16)
+
+    def closes_string(self, pos: int) -> bool:
+        text = self.text
+        while pos < len(text) and text[pos] in " \t\r\n":
+            pos += 1
+        return pos >= len(text) or text[pos] in _AFTER_STRING
+
+    def key(self) -> str:
+        if self.text[self.pos] in "\"'":
+            return self.string()
+        self.repair("unquoted_keys")
+        return self.bare_word()
+
+    def object(self) -> dict:
+        self.pos += 1
+        result: dict = {}
+        separated = True  # A comma (or the opening brace) came since the last member
+        while True:
+            if self.at_end():
+                self.repair("truncated")
+                return result
+            char = self.text[self.pos]
+            if char == "}":
+                if result and separated:
+                    self.repair("trailing_commas")
+                self.pos += 1
+                return result
+            if char == ",":
+                if separated:
+                    self.repair("trailing_commas")
+                separated = True
+                self.pos += 1
+                continue
+            if not separated:
+                self.repair("missing_commas")
+            try:
+                key = self.key()
+                if self.at_end():
+                    raise _Truncated()
+                if self.text[self.pos] != ":":
+                    raise self.error("Expecting ':' delimiter")
+                self.pos += 1
+                result[key] = self.value()
+            except _Truncated:
+                self.repair("truncated")
+                self.pos = len(self.text)
+                return result
+            separated = False
+
+    def array(self) -> list:
+        self.pos += 1
+        result: list = []
+        separated = True
+        while True:
+            if self.at_end():
+                self.repair("truncated")
+                return result
+            char = self.text[self.pos]
+            if char == "]":
+                if result and separated:
+                    self.repair("trailing_commas")
+                self.pos += 1
+                return result
+            if char == ",":
+                if separated:
+                    self.repair("trailing_commas")
+                separated = True
+                self.pos += 1
+                continue
+            if not separated:
+                self.repair("missing_commas")
+            try:
+                result.append(self.value())
+            except _Truncated:
+                self.repair("truncated")
+                self.pos = len(self.text)
+                return result
+            separated = False
+
+
+def repair_json(text: Optional[str]) -> Tuple[Any, List[str]]:
+    """
+    Parse an LLM answer as JSON, repairing it when strict parsing fails.
+
+    Args:
+        text: Raw answer
+
+    Returns:
+        (parsed value, repairs made); no repairs for valid JSON
+
+    Raises:
+        json.JSONDecodeError: The answer holds no JSON object or array, or a
+            defect the parser cannot repair
+    """
+    if text is None:
+        raise json.JSONDecodeError("Empty answer", "", 0)
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+
+    repairs: List[str] = []
+    fenced = _CODE_FENCE_RE.match(text)
+    if fenced:
+        repairs.append("code_fence")
+        text = fenced.group(1)
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        raise json.JSONDecodeError("No JSON object or array in the answer", text, 0)
+    start = min(starts)
+    if text[:start].strip():
+        repairs.append("leading_text")
+
+    parser = _Parser(text)
+    parser.repairs = repairs
+    parser.pos = start
+    value = parser.value()
+    if not parser.at_end():
+        parser.repair("trailing_text")
+    return value, parser.repairs
@@ -0,0 +1,184 @@
+"""
+Retry policy for LLM extraction calls.
+
+Failures are classified into a small set of error classes so callers can tell
+a timeout from a malformed response, retried with full-jitter exponential
+backoff, and capped by a process-wide retry budget so a provider outage does
+not turn into a retry storm. 429s are not retried here: the shared rate
+limiter already re-queues them while honoring Retry-After. Under a request
+deadline, a retry is only made if its backoff leaves time for the attempt.
+"""
+
+import asyncio
+import json
+import random
+import threading
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+from deadlines import Deadline, DeadlineExceeded
+
+# Error classes reported in refinement_info / graph_metadata
+TIMEOUT = "timeout"
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CONNECTION_ERROR = "connection_error"
+INVALID_JSON = "invalid_json"
+CLIENT_ERROR = "client_error"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+UNKNOWN = "unknown"
+
+DEFAULT_RETRYABLE = frozenset({TIMEOUT, SERVER_ERROR, CONNECTION_ERROR, INVALID_JSON})
+
+def classify_llm_error(error: BaseException) -> str:
+    """
+    Map an exception raised while calling or parsing an LLM response to an error class.
+
+    Args:
+        error: Exception raised by the OpenAI client or the JSON parser
+
+    Returns:
+        One of the error class constants of this module
+    """
+    if isinstance(error, DeadlineExceeded):
+        return DEADLINE_EXCEEDED
+    if isinstance(error, (json.JSONDecodeError, InvalidLLMResponse)):
+        return INVALID_JSON
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return TIMEOUT
+
+    name = type(error).__name__
+    if "Timeout" in name:
+        return TIMEOUT
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return RATE_LIMITED
+    if status in (408, 409):
+        return TIMEOUT if status == 408 else SERVER_ERROR
+    if isinstance(status, int) and status >= 500:
+        return SERVER_ERROR
+    if isinstance(status, int) and 400 <= status < 500:
+        return CLIENT_ERROR
+    if "Connection" in name or isinstance(error, ConnectionError):
+        return CONNECTION_ERROR
+    return UNKNOWN
+
+
+class InvalidLLMResponse(ValueError):
+    """The LLM answered, but not with the JSON structure we asked for."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    retryable: FrozenSet[str] = DEFAULT_RETRYABLE
+
+    def with_max_attempts(self, max_attempts: Optional[int]) -> "RetryPolicy":
+        if max_attempts is None:
+            return self
+        return RetryPolicy(max(1, max_attempts), self.base_delay, self.max_delay, self.retryable)
+
+    def should_retry(self, error_class: str, attempt: int) -> bool:
+        """``attempt`` is the 1-based number of the attempt that just failed."""
+        return error_class in self.retryable and attempt < self.max_attempts
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before attempt ``attempt + 1``."""
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of first attempts.
+
+    Every first attempt deposits ``ratio`` tokens (up to ``max_tokens``) and
+    every retry withdraws one, so at most ~ratio retries are made per call
+    on sustained failures while isolated errors are always retried.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_attempt(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def available(self) -> float:
+        return self._tokens
+
+
+class RetryState:
+    """Tracks attempts for one logical call and decides whether to try again."""
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        budget: RetryBudget,
+        deadline: Optional[Deadline] = None,
+        deadline_reserve: float = 0.0,
+    ):
+        """
+        Args:
+            policy: Retry policy
+            budget: Shared retry budget
+            deadline: Request deadline; no retry is made once backoff plus ``deadline_reserve`` would reach it
+            deadline_reserve: Seconds kept before the deadline for returning a result
+        """
+        self.policy = policy
+        self.budget = budget
+        self.deadline = deadline
+        self.deadline_reserve = deadline_reserve
+        self.attempts = 0
+        self.error_class: Optional[str] = None
+        self.last_error: Optional[BaseException] = None
+        self.budget_exhausted = False
+        self.deadline_exhausted = False
+        budget.record_attempt()
+
+    def start_attempt(self) -> None:
+        self.attempts += 1
+
+    def failed(self, error: BaseException) -> Optional[float]:
+        """
+        Record a failed attempt.
+
+        Returns:
+            Seconds to sleep before retrying, or None if the call should give up
+        """
+        self.last_error = error
+        self.error_class = classify_llm_error(error)
+        if not self.policy.should_retry(self.error_class, self.attempts):
+            return None
+        delay = self.policy.backoff(self.attempts)
+        if self.deadline is not None and self.deadline.remaining() <= delay + self.deadline_reserve:
+            self.deadline_exhausted = True
+            return None
+        if not self.budget.try_spend():
+            self.budget_exhausted = True
+            return None
+        return delay
+
+    def error_info(self) -> dict:
+        """Structured failure description for refinement_info / graph_metadata."""
+        return {
+            "error_class": self.error_class or UNKNOWN,
+            "message": str(self.last_error) if self.last_error else "",
+            "attempts": self.attempts,
+            "retry_budget_exhausted": self.budget_exhausted,
+            "deadline_exhausted": self.deadline_exhausted,
+        }
@@ -1,40 +1,494 @@
 import os
 import uuid
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.routing import Match
 from pydantic import BaseModel
 import spacy
 import re
 import time # Import the time module
 import uvicorn
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Mapping, Tuple
 from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import json
+import copy
 from sentence_transformers import SentenceTransformer
 import asyncio # Import asyncio
+from contextlib import contextmanager
 from pathlib import Path  # Added for prompt debugging persistence
+from tracing import create_tracer_from_env
+from rate_limiter import (
+    AdaptiveRateLimiter,
+    RateLimitPermit,
+    estimate_message_tokens,
+    estimate_tokens,
+    is_rate_limit_error,
+    retry_after_seconds,
+)
+from cassette import (
+    CassettePlayer,
+    CassetteRecorder,
+    recording_async_client,
+    recording_client,
+    replay_async_client,
+    replay_client,
+)
+from hybrid_extraction import (
+    EXTRACTION_MODE_HYBRID,
+    EXTRACTION_MODE_LLM,
+    EXTRACTION_MODES,
+    format_anchor_list,
+    format_candidate_list,
+    merge_hybrid_graph,
+    split_spacy_entities,
+)
+from ontology_pruning import OntologyPruner
+from ontology_snapshots import OntologyRegistry, OntologySnapshot, diff_snapshots
+from sentence_pruning import SalienceWeights, SentencePruner, ontology_keywords
+from document_packing import (
+    PackingPolicy,
+    document_ids,
+    format_packed_documents,
+    plan_packs,
+    split_packed_response,
+)
+from refinement_filter import (
+    DECISION_DROP,
+    DECISION_ESCALATE,
+    DECISION_KEEP,
+    DecisionLog,
+    RefinementFilter,
+    kept_by_llm,
+    load_model as load_refinement_model,
+)
+from near_duplicates import NearDuplicateIndex
+from email_preprocessing import ALL_STEPS as EMAIL_PREPROCESSING_STEPS, EmailPreprocessor, PreprocessedText, SenderTemplates
+from thread_incremental import OffsetMap, ThreadStore, merge_graphs, split_segments
+from request_coalescing import SingleFlight, coalescing_key
+from admission import AdmissionController, AdmissionGate, AdmissionRejected
+from scheduling import BULK, INTERACTIVE, PriorityExecutor, current_priority, resolve_priority
+from streaming_json import IncrementalGraphParser
+from json_repair import repair_json
+from graph_validation import VALIDATION_MODES, GraphValidator
+from deadlines import (
+    DEADLINE_HEADER,
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    parse_deadline_seconds,
+    within_deadline,
+)
+from model_routing import (
+    FAST,
+    QUALITY,
+    ModelRouter,
+    RoutingContext,
+    RoutingRule,
+    current_endpoint,
+    current_latency_tier,
+    load_rules,
+    resolve_latency_tier,
+)
+from llm_retry import (
+    DEADLINE_EXCEEDED,
+    INVALID_JSON,
+    InvalidLLMResponse,
+    RetryBudget,
+    RetryPolicy,
+    RetryState,
+    classify_llm_error,
+)
+from metrics import (
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT,
+    CPU_EXECUTOR_QUEUED,
+    DEGRADED_EXTRACTIONS,
+    GRAPH_VALIDATION_ELEMENTS,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_LATENCY,
+    HTTP_REQUESTS,
+    LLM_CALLS,
+    LLM_FIRST_TOKEN,
+    LLM_JSON_REPAIRS,
+    LLM_LIMITER_WAIT,
+    LLM_MODEL_ESCALATIONS,
+    LLM_MODEL_LATENCY,
+    LLM_MODEL_OUTPUTS,
+    LLM_RETRIES,
+    NEAR_DUPLICATE_REUSES,
+    ONTOLOGY_CACHE_INVALIDATIONS,
+    ONTOLOGY_UPDATES,
+    ONTOLOGY_PROMPT_TOKENS,
+    record_cache_lookup,
+    PACKED_DOCUMENTS,
+    PREPROCESSING_REMOVED_LINES,
+    PREPROCESSING_TOKENS,
+    SENTENCE_PRUNING_TOKENS,
+    REFINEMENT_DECISIONS,
+    STAGE_LATENCY,
+    update_limiter_gauges,
+    record_llm_usage,
+    render_metrics,
+)
 
 # --- Environment and API Key Setup ---
 load_dotenv()
+
+def env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def env_float(name: str, default: Optional[float] = None) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+# 429 handling is owned by the shared rate limiter, so SDK-level retries are off by default
+OPENAI_SDK_MAX_RETRIES = env_int("OPENAI_SDK_MAX_RETRIES", 0)
+
+# Point both clients at any OpenAI-compatible server, e.g. fake_openai_server.py for load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
 openai_api_key = os.getenv("OPENAI_API_KEY")
+if not openai_api_key and OPENAI_BASE_URL:
+    # Local compatible backends do not check the key, but the SDK requires one
+    openai_api_key = "sk-local"
 if not openai_api_key:
     print("⚠️ WARNING: OPENAI_API_KEY not found in .env file. LLM refinement will be disabled.")
     client = None
     async_client = None
 else:
-    client = OpenAI(api_key=openai_api_key)
-    async_client = AsyncOpenAI(api_key=openai_api_key)
+    client = OpenAI(api_key=openai_api_key, base_url=OPENAI_BASE_URL, max_retries=OPENAI_SDK_MAX_RETRIES)
+    async_client = AsyncOpenAI(api_key=openai_api_key, base_url=OPENAI_BASE_URL, max_retries=OPENAI_SDK_MAX_RETRIES)
+    if OPENAI_BASE_URL:
+        print(f"🔀 Using OpenAI-compatible backend at {OPENAI_BASE_URL}")
+
+# --- LLM Rate Limiting ---
+# Shared by every chat completion; budgets should match the OpenAI account tier
+LLM_EXPECTED_COMPLETION_TOKENS = env_int("LLM_EXPECTED_COMPLETION_TOKENS", 512)
+LLM_RATE_LIMIT_MAX_RETRIES = env_int("LLM_RATE_LIMIT_MAX_RETRIES", 8)
+
+# --- Priority Scheduling ---
+# Interactive requests go ahead of bulk work in the LLM limiter queue and the CPU
+# worker pool; weighted fair sharing keeps bulk moving (see scheduling.py)
+PRIORITY_WEIGHTS = {
+    INTERACTIVE: env_float("SCHEDULER_INTERACTIVE_WEIGHT", 4.0),
+    BULK: env_float("SCHEDULER_BULK_WEIGHT", 1.0),
+}
+# Endpoints whose requests default to the bulk class
+BULK_PRIORITY_ENDPOINTS = {
+    e.strip() for e in os.getenv("BULK_PRIORITY_ENDPOINTS", "/batch-extract-graph").split(",") if e.strip()
+}
+cpu_executor = PriorityExecutor(env_int("CPU_EXECUTOR_THREADS", 4), PRIORITY_WEIGHTS)
+
+llm_rate_limiter = AdaptiveRateLimiter(
+    requests_per_minute=env_int("OPENAI_RPM_LIMIT"),
+    tokens_per_minute=env_int("OPENAI_TPM_LIMIT"),
+    initial_concurrency=env_int("LLM_INITIAL_CONCURRENCY", 4),
+    min_concurrency=env_int("LLM_MIN_CONCURRENCY", 1),
+    max_concurrency=env_int("LLM_MAX_CONCURRENCY", 32),
+    latency_target=env_float("LLM_LATENCY_TARGET_SECONDS"),
+    priority_weights=PRIORITY_WEIGHTS,
+)
+
+# --- LLM Retry Policy ---
+# Transient failures (timeouts, 5xx, connection errors, malformed JSON) are retried
+# with jittered exponential backoff; the budget caps retries to a fraction of calls.
+LLM_REQUEST_TIMEOUT_SECONDS = env_float("LLM_REQUEST_TIMEOUT_SECONDS", 120.0)
+LLM_RETRY_POLICY = RetryPolicy(
+    max_attempts=env_int("LLM_RETRY_MAX_ATTEMPTS", 3),
+    base_delay=env_float("LLM_RETRY_BASE_DELAY_SECONDS", 0.5),
+    max_delay=env_float("LLM_RETRY_MAX_DELAY_SECONDS", 8.0),
+)
+llm_retry_budget = RetryBudget(ratio=env_float("LLM_RETRY_BUDGET_RATIO", 0.2))
+
+# --- Request Deadlines ---
+# A request's time budget (X-Request-Deadline header or deadline_seconds field) caps
+# LLM timeouts, rate limiter waits and retries; an extraction that runs out of time
+# or fails returns its partial graph completed with spaCy entities (see deadlines.py)
+REQUEST_DEADLINE_DEFAULT_SECONDS = env_float("REQUEST_DEADLINE_DEFAULT_SECONDS")
+REQUEST_DEADLINE_MAX_SECONDS = env_float("REQUEST_DEADLINE_MAX_SECONDS")
+# Kept before the deadline for the spaCy fallback and building the response
+DEADLINE_RESERVE_SECONDS = env_float("DEADLINE_RESERVE_SECONDS", 1.0)
+SPACY_FALLBACK_ENABLED = os.getenv("SPACY_FALLBACK_ENABLED", "1") == "1"
+
+# --- Model Routing ---
+# The model is picked per call from rules on operation, endpoint, text and ontology
+# size and the requested latency tier; an invalid or empty JSON answer is retried
+# on the escalation model (see model_routing.py)
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4o")
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "0") == "1"
+DEFAULT_MODEL_ROUTING_RULES = [
+    RoutingRule(LLM_DEFAULT_MODEL, latency_tiers=(QUALITY,)),
+    RoutingRule(LLM_SMALL_MODEL, latency_tiers=(FAST,)),
+    RoutingRule(LLM_SMALL_MODEL, operations=("graph_extraction",), max_text_tokens=300, max_ontology_types=60),
+    RoutingRule(LLM_SMALL_MODEL, operations=("refinement", "entity_importance", "relationship_importance")),
+]
+model_router = ModelRouter(
+    LLM_DEFAULT_MODEL,
+    rules=(load_rules(os.getenv("MODEL_ROUTING_RULES")) or DEFAULT_MODEL_ROUTING_RULES) if MODEL_ROUTING_ENABLED else (),
+    escalation_model=os.getenv("LLM_ESCALATION_MODEL", LLM_DEFAULT_MODEL) or None,
+    latency_budgets={FAST: env_float("LLM_FAST_TIER_LATENCY_SECONDS", 5.0)},
+)
+
+# --- Graph Extraction Mode ---
+# "llm" asks the LLM for every entity; "hybrid" keeps confident spaCy property-like
+# entities as final and asks the LLM only for the remaining entities and relationships
+GRAPH_EXTRACTION_MODE = os.getenv("GRAPH_EXTRACTION_MODE", EXTRACTION_MODE_LLM).lower()
+HYBRID_ANCHOR_MIN_CONFIDENCE = env_float("HYBRID_ANCHOR_MIN_CONFIDENCE", 0.9)
+
+# --- LLM Output Parsing ---
+# Repair truncated or slightly invalid JSON answers instead of re-running the call, and
+# check extracted graphs against the ontology: "flag" marks elements that do not fit,
+# "drop" removes them, "off" only normalizes (see json_repair.py and graph_validation.py)
+JSON_REPAIR_ENABLED = os.getenv("JSON_REPAIR_ENABLED", "1") == "1"
+GRAPH_VALIDATION_MODE = os.getenv("GRAPH_VALIDATION_MODE", "flag").lower()
+if GRAPH_VALIDATION_MODE not in VALIDATION_MODES:
+    raise ValueError(f"Unknown GRAPH_VALIDATION_MODE: {GRAPH_VALIDATION_MODE}")
+
+# --- Ontology Pruning ---
+# Send only the entity types most similar to the text (and the triples among them)
+ONTOLOGY_PRUNING_ENABLED = os.getenv("ONTOLOGY_PRUNING_ENABLED", "0") == "1"
+ontology_pruner = OntologyPruner(
+    top_k=env_int("ONTOLOGY_PRUNING_TOP_K", 40),
+    floor=env_int("ONTOLOGY_PRUNING_FLOOR", 10),
+    min_similarity=env_float("ONTOLOGY_PRUNING_MIN_SIMILARITY", 0.15),
+)
+
+# Send only the most salient sentences of long texts to the LLM, within a token budget;
+# the budget trades entity recall for prompt size and latency (see sentence_pruning.py)
+SENTENCE_PRUNING_ENABLED = os.getenv("SENTENCE_PRUNING_ENABLED", "0") == "1"
+sentence_pruner = SentencePruner(
+    budget_tokens=env_int("SENTENCE_PRUNING_BUDGET_TOKENS", 800),
+    neighbors=env_int("SENTENCE_PRUNING_NEIGHBORS", 1),
+    weights=SalienceWeights(
+        entities=env_float("SENTENCE_PRUNING_ENTITY_WEIGHT", 1.0),
+        keywords=env_float("SENTENCE_PRUNING_KEYWORD_WEIGHT", 0.5),
+        similarity=env_float("SENTENCE_PRUNING_SIMILARITY_WEIGHT", 1.0),
+    ),
+)
+
+# Pack short batch documents into one extraction call (see document_packing.py)
+BATCH_PACKING_ENABLED = os.getenv("BATCH_PACKING_ENABLED", "0") == "1"
+BATCH_PACKING_POLICY = PackingPolicy(
+    max_pack_tokens=env_int("BATCH_PACK_MAX_TOKENS", 1500),
+    max_documents=env_int("BATCH_PACK_MAX_DOCUMENTS", 8),
+    max_document_tokens=env_int("BATCH_PACK_MAX_DOCUMENT_TOKENS", 400),
+)
+
+# Local keep/drop model for /refine-entities; without one every entity goes to the LLM
+refinement_model = load_refinement_model(os.getenv("REFINEMENT_MODEL_PATH"))
+if refinement_model is not None:
+    refinement_model.keep_threshold = env_float("REFINEMENT_KEEP_THRESHOLD", refinement_model.keep_threshold)
+    refinement_model.drop_threshold = env_float("REFINEMENT_DROP_THRESHOLD", refinement_model.drop_threshold)
+refinement_filter = RefinementFilter(refinement_model)
+# LLM keep/drop decisions are appended here as training data for the local model
+REFINEMENT_DECISION_LOG = os.getenv("REFINEMENT_DECISION_LOG") or None
+refinement_decision_log = DecisionLog(REFINEMENT_DECISION_LOG) if REFINEMENT_DECISION_LOG else None
+
+# Per-endpoint concurrency limits with bounded wait queues; overflow is shed with
+# 429 (queue full) or 503 (waited too long) plus Retry-After (see admission.py)
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "1") == "1"
+ADMISSION_MAX_WAIT_SECONDS = env_float("ADMISSION_MAX_WAIT_SECONDS", 30.0)
+admission_controller = AdmissionController()
+# A streaming response is sent long after its headers, so these endpoints hold their slot
+# in the response body (see extract_graph_stream_endpoint) instead of in admission_middleware
+STREAMING_ENDPOINTS = frozenset({"/extract-graph/stream"})
+for endpoint, env_prefix, concurrency, queue in (
+    ("/extract-graph", "EXTRACT_GRAPH", 32, 128),
+    ("/batch-extract-graph", "BATCH_EXTRACT", 4, 8),
+    ("/refine-entities", "REFINE_ENTITIES", 16, 64),
+    ("/extract-graph/stream", "EXTRACT_GRAPH_STREAM", 16, 32),
+):
+    admission_controller.add(AdmissionGate(
+        endpoint,
+        max_concurrency=env_int(f"{env_prefix}_MAX_CONCURRENCY", concurrency),
+        max_queue=env_int(f"{env_prefix}_MAX_QUEUE", queue),
+        max_wait_seconds=ADMISSION_MAX_WAIT_SECONDS,
+    ))
+
+# Concurrent identical /extract-graph requests share one extraction (see request_coalescing.py)
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "1") == "1"
+extraction_flights = SingleFlight()
+
+# Per-thread segment fingerprints and merged graphs for incremental extraction (see thread_incremental.py)
+thread_store = ThreadStore(capacity=env_int("THREAD_STORE_SIZE", 5000))
+
+# Reuse the graph of an already extracted near-identical text (see near_duplicates.py)
+NEAR_DUPLICATE_REUSE_ENABLED = os.getenv("NEAR_DUPLICATE_REUSE_ENABLED", "0") == "1"
+near_duplicate_index = NearDuplicateIndex(
+    threshold=env_float("NEAR_DUPLICATE_THRESHOLD", 0.9),
+    capacity=env_int("NEAR_DUPLICATE_INDEX_SIZE", 10000),
+)
+
+# Strip quoted replies, signatures, disclaimers, footers and HTML before extraction (see email_preprocessing.py)
+EMAIL_PREPROCESSING_ENABLED = os.getenv("EMAIL_PREPROCESSING_ENABLED", "0") == "1"
+email_preprocessor = EmailPreprocessor(
+    steps=[
+        step.strip() for step in os.getenv("EMAIL_PREPROCESSING_STEPS", ",".join(EMAIL_PREPROCESSING_STEPS)).split(",")
+        if step.strip()
+    ],
+    templates=SenderTemplates(min_messages=env_int("EMAIL_TEMPLATE_MIN_MESSAGES", 3)),
+)
+if GRAPH_EXTRACTION_MODE not in EXTRACTION_MODES:
+    raise ValueError(f"Unknown GRAPH_EXTRACTION_MODE: {GRAPH_EXTRACTION_MODE}")
+
+def resolve_extraction_mode(mode: Optional[str]) -> str:
+    """Request-level extraction mode, falling back to GRAPH_EXTRACTION_MODE."""
+    if mode is None:
+        return GRAPH_EXTRACTION_MODE
+    mode = mode.lower()
+    if mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"extraction_mode must be one of {', '.join(EXTRACTION_MODES)}")
+    return mode
+
+def preprocess_text(text: str, sender: Optional[str] = None, enabled: Optional[bool] = None) -> Optional[PreprocessedText]:
+    """
+    Strip email boilerplate from a request text.
+    
+    Args:
+        text: Original request text
+        sender: Optional sender address (per-sender templates)
+        enabled: Request-level switch, falling back to EMAIL_PREPROCESSING_ENABLED
+        
+    Returns:
+        The pre-processed text, or None when pre-processing is off or would leave no text
+    """
+    if not (EMAIL_PREPROCESSING_ENABLED if enabled is None else enabled):
+        return None
+    with stage_timer("preprocessing", text_length=len(text)):
+        preprocessed = email_preprocessor.process(text, sender)
+    if not preprocessed.text.strip():
+        return None
+    stats = preprocessed.stats()
+    PREPROCESSING_TOKENS.inc(stats["original_tokens"], kind="original")
+    PREPROCESSING_TOKENS.inc(stats["cleaned_tokens"], kind="cleaned")
+    for step, count in stats["removed_lines"].items():
+        PREPROCESSING_REMOVED_LINES.inc(count, step=step)
+    return preprocessed
+
+def new_retry_state(max_retries: Optional[int] = None) -> RetryState:
+    """
+    Start retry bookkeeping for one logical LLM call.
+    
+    Args:
+        max_retries: Optional per-request override of the number of retries
+        
+    Returns:
+        RetryState bound to the shared policy and budget
+    """
+    policy = LLM_RETRY_POLICY.with_max_attempts(max_retries + 1 if max_retries is not None else None)
+    return RetryState(policy, llm_retry_budget, current_deadline.get(), DEADLINE_RESERVE_SECONDS)
+
+def enter_priority(endpoint: str, requested: Optional[str]) -> str:
+    """
+    Run the rest of the request under its priority class: the requested one,
+    else the endpoint's default (bulk for BULK_PRIORITY_ENDPOINTS).
+
+    Raises:
+        HTTPException: 400 for an unknown priority class
+    """
+    try:
+        priority = resolve_priority(requested, BULK if endpoint in BULK_PRIORITY_ENDPOINTS else INTERACTIVE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    current_priority.set(priority)
+    return priority
+
+def enter_latency_tier(requested: Optional[str]) -> str:
+    """
+    Route the rest of the request's LLM calls for the requested latency tier.
+
+    Raises:
+        HTTPException: 400 for an unknown tier
+    """
+    try:
+        tier = resolve_latency_tier(requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    current_latency_tier.set(tier)
+    return tier
+
+def enter_deadline(requested: Optional[float]) -> Optional[Deadline]:
+    """
+    Run the rest of the request under the ``deadline_seconds`` of its body, if
+    given (counted from now); otherwise keep the deadline set from the
+    X-Request-Deadline header or REQUEST_DEADLINE_DEFAULT_SECONDS, if any.
+
+    Raises:
+        HTTPException: 400 for a deadline that is not positive
+    """
+    if requested is not None:
+        try:
+            current_deadline.set(Deadline(parse_deadline_seconds(requested, REQUEST_DEADLINE_MAX_SECONDS)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return current_deadline.get()
+
+def route_model(operation: str, text: Optional[str] = None, compact_ontology: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Model for an LLM call of the current request.
+
+    Args:
+        operation: Logical operation name (as passed to create_chat_completion)
+        text: Text the call is about, for the text size rules
+        compact_ontology: Ontology block sent with the call, for the ontology size rules
+    """
+    return model_router.route(RoutingContext(
+        operation=operation,
+        endpoint=current_endpoint.get(),
+        text_tokens=estimate_tokens(text) if text else 0,
+        ontology_types=len(compact_ontology.get("e", ())) if compact_ontology else 0,
+        latency_tier=current_latency_tier.get(),
+    ))
+
+def record_model_output(operation: str, model: str, valid: bool) -> None:
+    model_router.record_output(model, valid)
+    LLM_MODEL_OUTPUTS.inc(operation=operation, model=model, outcome="valid" if valid else "invalid")
+
+def escalate_model(operation: str, model: str) -> Optional[str]:
+    """Escalation model for an invalid answer of ``model``, counted in the metrics; None if there is none."""
+    escalated = model_router.escalation_for(model)
+    if escalated:
+        LLM_MODEL_ESCALATIONS.inc(operation=operation, from_model=model, to_model=escalated)
+        print(f"      [LLM Trace] {operation}: invalid answer from {model}, escalating to {escalated}")
+    return escalated
 
 # --- Pydantic Models for API data validation ---
 class ExtractionRequest(BaseModel):
     text: str
     ontology: Optional[str] = None  # New field for ontology scoping
     database: Optional[str] = None  # New field for database specification
+    include_timings: bool = False  # Attach a per-stage timing breakdown to graph_metadata
+    max_retries: Optional[int] = None  # Override LLM_RETRY_MAX_ATTEMPTS - 1 for this request
+    extraction_mode: Optional[str] = None  # "llm" or "hybrid"; defaults to GRAPH_EXTRACTION_MODE
+    # Thread/document key for incremental extraction: only segments not seen for the key are extracted
+    thread_key: Optional[str] = None
+    preprocess: Optional[bool] = None  # Strip email boilerplate first; defaults to EMAIL_PREPROCESSING_ENABLED
+    sender: Optional[str] = None  # Sender address, for learning and stripping per-sender templates
+    priority: Optional[str] = None  # "interactive" or "bulk"; defaults by endpoint (see BULK_PRIORITY_ENDPOINTS)
+    latency_tier: Optional[str] = None  # "fast", "standard" or "quality"; steers model routing
+    deadline_seconds: Optional[float] = None  # Time budget; overrides the X-Request-Deadline header
     
 class BatchExtractionRequest(BaseModel):
     texts: List[str]
     ontology: Optional[str] = None  # New field for ontology scoping
     database: Optional[str] = None  # New field for database specification
+    include_timings: bool = False  # Attach a per-document timing breakdown to graph_metadata
+    max_retries: Optional[int] = None  # Override LLM_RETRY_MAX_ATTEMPTS - 1 for this request
+    extraction_mode: Optional[str] = None  # "llm" or "hybrid"; defaults to GRAPH_EXTRACTION_MODE
+    pack_documents: Optional[bool] = None  # Pack short texts into shared LLM calls; defaults to BATCH_PACKING_ENABLED
+    preprocess: Optional[bool] = None  # Strip email boilerplate first; defaults to EMAIL_PREPROCESSING_ENABLED
+    senders: Optional[List[Optional[str]]] = None  # Sender address per text, for per-sender templates
+    priority: Optional[str] = None  # "interactive" or "bulk"; defaults to bulk
+    latency_tier: Optional[str] = None  # "fast", "standard" or "quality"; steers model routing
+    deadline_seconds: Optional[float] = None  # Time budget of the whole batch; overrides X-Request-Deadline
+    # Original batch positions when re-submitting only the failed texts of an earlier batch
+    indices: Optional[List[int]] = None
     
 class Entity(BaseModel):
     id: str  # Unique identifier for the entity
@@ -107,18 +561,11 @@ class AnalyzeRelationshipImportanceRequest(BaseModel):
     relationships: List[Dict[str, Any]]
 
 # --- Global State ---
-VALID_ONTOLOGY_TYPES: List[str] = []
-VALID_RELATIONSHIP_TYPES: List[str] = []
-PROPERTY_ENTITY_TYPES: List[str] = []
-
-# -------------------------------------------
-# Global ontology schema context (populated via /ontologies)
-ENTITY_DESCRIPTIONS: Dict[str, str] = {}
-RELATIONSHIP_DESCRIPTIONS: Dict[str, str] = {}
-
-# New: Multiple ontology support
-ONTOLOGIES: Dict[str, Dict[str, Any]] = {}  # Store multiple ontologies by name
+# Ontologies by name (populated via /ontologies); each is an immutable, versioned
+# snapshot swapped atomically on update (see ontology_snapshots.py)
+ontology_registry = OntologyRegistry()
 DEFAULT_ONTOLOGY_NAME = "default"  # Default ontology name
+EMPTY_ONTOLOGY = OntologySnapshot(DEFAULT_ONTOLOGY_NAME, version=0)
 
 def get_database_name(database_param: Optional[str] = None) -> Optional[str]:
     """
@@ -219,6 +666,9 @@ def create_entity_graph_data(entity: Dict[str, Any], ontology_config: Dict[str,
     if entity.get("context"):
         graph_data["context"] = entity["context"]
     
+    if entity.get("ontology_violation"):
+        graph_data["ontology_violation"] = entity["ontology_violation"]
+    
     # Store the entity in global storage
     entity_id = entity.get("id", "")
     if entity_id:
@@ -260,6 +710,8 @@ def create_relationship_graph_data(relationship: Dict[str, Any], ontology_config
         "timestamp": time.time(),
         "ontology_source": ontology_config.get("ontology_name", "default")
     }
+    if relationship.get("ontology_violation"):
+        graph_data["ontology_violation"] = relationship["ontology_violation"]
     
     # Store the relationship in global storage
     rel_id = relationship.get("id", "")
@@ -276,37 +728,33 @@ def create_relationship_graph_data(relationship: Dict[str, Any], ontology_config
     return graph_data
 
 # Helper functions for ontology management
-def get_ontology_by_name(ontology: Optional[str] = None) -> Dict[str, Any]:
+def get_ontology_by_name(ontology: Optional[str] = None) -> OntologySnapshot:
     """
-    Get ontology configuration by name. Falls back to default if not found.
+    Get the current snapshot of an ontology by name. Falls back to default if not found.
     
     Args:
         ontology: Name of the ontology to retrieve
         
     Returns:
-        Ontology configuration dictionary
+        Immutable ontology snapshot (reads like the ontology configuration dictionary)
     """
     if not ontology:
         ontology = DEFAULT_ONTOLOGY_NAME
     
     # Return the specific ontology if it exists
-    if ontology in ONTOLOGIES:
-        return ONTOLOGIES[ontology]
+    snapshot = ontology_registry.get(ontology)
+    if snapshot is not None:
+        return snapshot
     
     # Fall back to default ontology
-    if DEFAULT_ONTOLOGY_NAME in ONTOLOGIES:
+    snapshot = ontology_registry.get(DEFAULT_ONTOLOGY_NAME)
+    if snapshot is not None:
         print(f"⚠️  Ontology '{ontology}' not found, using default ontology")
-        return ONTOLOGIES[DEFAULT_ONTOLOGY_NAME]
+        return snapshot
     
-    # Fall back to global state (legacy support)
-    print(f"⚠️  No ontologies configured, using global state")
-    return {
-        "entity_types": VALID_ONTOLOGY_TYPES,
-        "relationship_types": VALID_RELATIONSHIP_TYPES,
-        "property_types": PROPERTY_ENTITY_TYPES,
-        "entity_descriptions": ENTITY_DESCRIPTIONS,
-        "relationship_descriptions": RELATIONSHIP_DESCRIPTIONS
-    }
+    # Fall back to the most recently updated ontology (legacy support)
+    print(f"⚠️  No default ontology configured, using the latest ontology update")
+    return ontology_registry.latest or EMPTY_ONTOLOGY
 
 def get_available_ontologies() -> List[str]:
     """
@@ -315,7 +763,7 @@ def get_available_ontologies() -> List[str]:
     Returns:
         List of ontology names
     """
-    return list(ONTOLOGIES.keys())
+    return ontology_registry.names()
 
 def validate_ontology_name(ontology: str) -> bool:
     """
@@ -327,7 +775,249 @@ def validate_ontology_name(ontology: str) -> bool:
     Returns:
         True if valid, False otherwise
     """
-    return ontology in ONTOLOGIES or ontology == DEFAULT_ONTOLOGY_NAME
+    return ontology in ontology_registry or ontology == DEFAULT_ONTOLOGY_NAME
+
+# --- Instrumentation helpers ---
+# Span tracer correlating pipeline stages with the request_id of the request
+tracer = create_tracer_from_env()
+
+# --- LLM Cassettes ---
+# LLM_CASSETTE_MODE=record appends every chat completion to LLM_CASSETTE_PATH;
+# LLM_CASSETTE_MODE=replay answers from it instead of OpenAI (latency scaled by LLM_CASSETTE_LATENCY_SCALE)
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm-cassette.jsonl.gz")
+cassette_recorder: Optional[CassetteRecorder] = None
+cassette_player: Optional[CassettePlayer] = None
+
+def _cassette_context() -> Dict[str, Any]:
+    span = tracer.current_span
+    return {
+        "request_id": tracer.current_request_id(),
+        "operation": span.attributes.get("operation") if span is not None else None,
+    }
+
+if LLM_CASSETTE_MODE == "record":
+    if client is None:
+        print("⚠️  LLM_CASSETTE_MODE=record needs an OpenAI client; nothing will be recorded.")
+    else:
+        cassette_recorder = CassetteRecorder(LLM_CASSETTE_PATH, context=_cassette_context)
+        client = recording_client(client, cassette_recorder)
+        async_client = recording_async_client(async_client, cassette_recorder)
+        print(f"📼 Recording LLM calls to {LLM_CASSETTE_PATH}")
+elif LLM_CASSETTE_MODE == "replay":
+    cassette_player = CassettePlayer(LLM_CASSETTE_PATH, latency_scale=env_float("LLM_CASSETTE_LATENCY_SCALE", 1.0))
+    client = replay_client(cassette_player)
+    async_client = replay_async_client(cassette_player)
+    print(f"📼 Replaying {cassette_player.loaded} LLM calls from {LLM_CASSETTE_PATH} "
+          f"(latency x{cassette_player.latency_scale:g})")
+elif LLM_CASSETTE_MODE != "off":
+    raise ValueError(f"Unknown LLM_CASSETTE_MODE: {LLM_CASSETTE_MODE}")
+
+@contextmanager
+def stage_timer(stage: str, **attributes):
+    """
+    Time a pipeline stage (spacy, llm, embedding, graph_data) into the stage
+    histogram and record it as a span under the current request trace.
+    
+    Args:
+        stage: Name of the pipeline stage
+        **attributes: Optional span attributes
+    """
+    with tracer.span(stage, **attributes) as span, STAGE_LATENCY.time(stage=stage):
+        yield span
+
+def _record_llm_response(response, span, operation: str, ontology: Optional[str]):
+    usage = getattr(response, "usage", None)
+    if span is not None and usage is not None:
+        span.set_attribute("prompt_tokens", getattr(usage, "prompt_tokens", None))
+        span.set_attribute("completion_tokens", getattr(usage, "completion_tokens", None))
+    record_llm_usage(usage, operation, ontology)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+def _estimate_call_tokens(kwargs: Dict[str, Any]) -> int:
+    return estimate_message_tokens(kwargs.get("messages", [])) + LLM_EXPECTED_COMPLETION_TOKENS
+
+def _record_model_call(operation: str, model: Optional[str], latency: Optional[float]) -> None:
+    """Feed a call's latency (None for a failed call) into the model router's statistics."""
+    if not model:
+        return
+    model_router.record_call(model, latency)
+    if latency is not None:
+        LLM_MODEL_LATENCY.observe(latency, operation=operation, model=model)
+
+def _release_failed_permit(permit: RateLimitPermit, error: Exception) -> bool:
+    """Release a permit after a failed call; returns True if the failure was a 429."""
+    rate_limited = is_rate_limit_error(error)
+    llm_rate_limiter.release(
+        permit,
+        rate_limited=rate_limited,
+        retry_after=retry_after_seconds(error) if rate_limited else None,
+    )
+    return rate_limited
+
+def _apply_deadline(permit: RateLimitPermit, kwargs: Dict[str, Any]) -> None:
+    """
+    Cut the call's timeout to what is left of the request's deadline; when
+    nothing is left, release the permit unused.
+
+    Raises:
+        DeadlineExceeded: Less than DEADLINE_RESERVE_SECONDS are left
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return
+    try:
+        kwargs["timeout"] = deadline.timeout(kwargs.get("timeout"), reserve=DEADLINE_RESERVE_SECONDS)
+    except DeadlineExceeded:
+        llm_rate_limiter.release(permit)
+        raise
+
+def create_chat_completion(operation: str, ontology: Optional[str] = None, **kwargs):
+    """
+    Call the sync OpenAI client (entity refinement) through the shared rate
+    limiter and account latency, outcome and token usage. Calls rejected with a 429 are re-queued
+    (honoring Retry-After) up to LLM_RATE_LIMIT_MAX_RETRIES times. Under a
+    request deadline, the call's timeout is cut to the time left.
+    
+    Args:
+        operation: Logical operation name used as a metrics label
+        ontology: Ontology the call was made for, if any
+        **kwargs: Arguments forwarded to chat.completions.create
+        
+    Returns:
+        The OpenAI chat completion response
+    """
+    estimated_tokens = _estimate_call_tokens(kwargs)
+    ontology_label = ontology or "default"
+    for attempt in range(LLM_RATE_LIMIT_MAX_RETRIES + 1):
+        permit = llm_rate_limiter.acquire_blocking(estimated_tokens)
+        LLM_LIMITER_WAIT.observe(permit.queued_seconds, operation=operation, priority=current_priority.get())
+        _apply_deadline(permit, kwargs)
+        start = time.perf_counter()
+        try:
+            with stage_timer("llm", operation=operation, model=kwargs.get("model")) as span:
+                response = client.chat.completions.create(**kwargs)
+                total_tokens = _record_llm_response(response, span, operation, ontology)
+        except Exception as e:
+            rate_limited = _release_failed_permit(permit, e)
+            LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="rate_limited" if rate_limited else "error")
+            if not rate_limited:
+                _record_model_call(operation, kwargs.get("model"), None)
+            if rate_limited and attempt < LLM_RATE_LIMIT_MAX_RETRIES:
+                continue
+            raise
+        latency = time.perf_counter() - start
+        llm_rate_limiter.release(permit, latency=latency, actual_tokens=total_tokens)
+        LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="success")
+        _record_model_call(operation, kwargs.get("model"), latency)
+        return response
+
+async def create_chat_completion_async(operation: str, ontology: Optional[str] = None, **kwargs):
+    """
+    Async counterpart of create_chat_completion using the async OpenAI client.
+    Waiting for the rate limiter never blocks the event loop, and stops at the
+    request deadline.
+    """
+    estimated_tokens = _estimate_call_tokens(kwargs)
+    ontology_label = ontology or "default"
+    for attempt in range(LLM_RATE_LIMIT_MAX_RETRIES + 1):
+        permit = await within_deadline(llm_rate_limiter.acquire(estimated_tokens), DEADLINE_RESERVE_SECONDS)
+        LLM_LIMITER_WAIT.observe(permit.queued_seconds, operation=operation, priority=current_priority.get())
+        _apply_deadline(permit, kwargs)
+        start = time.perf_counter()
+        try:
+            with stage_timer("llm", operation=operation, model=kwargs.get("model")) as span:
+                response = await async_client.chat.completions.create(**kwargs)
+                total_tokens = _record_llm_response(response, span, operation, ontology)
+        except Exception as e:
+            rate_limited = _release_failed_permit(permit, e)
+            LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="rate_limited" if rate_limited else "error")
+            if not rate_limited:
+                _record_model_call(operation, kwargs.get("model"), None)
+            if rate_limited and attempt < LLM_RATE_LIMIT_MAX_RETRIES:
+                continue
+            raise
+        latency = time.perf_counter() - start
+        llm_rate_limiter.release(permit, latency=latency, actual_tokens=total_tokens)
+        LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="success")
+        _record_model_call(operation, kwargs.get("model"), latency)
+        return response
+
+async def stream_chat_completion_async(operation: str, ontology: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of create_chat_completion_async: yields the content
+    deltas of the answer as they arrive. The rate limiter permit is held until
+    the stream ends, and token usage is taken from the final chunk. A stream
+    still running at the request deadline is cut off with DeadlineExceeded.
+    """
+    estimated_tokens = _estimate_call_tokens(kwargs)
+    ontology_label = ontology or "default"
+    model = kwargs.get("model")
+    deadline = current_deadline.get()
+    for attempt in range(LLM_RATE_LIMIT_MAX_RETRIES + 1):
+        permit = await within_deadline(llm_rate_limiter.acquire(estimated_tokens), DEADLINE_RESERVE_SECONDS)
+        LLM_LIMITER_WAIT.observe(permit.queued_seconds, operation=operation, priority=current_priority.get())
+        _apply_deadline(permit, kwargs)
+        start = time.perf_counter()
+        started = False
+        completed = False
+        released = False
+        total_tokens = None
+        try:
+            with stage_timer("llm", operation=operation, model=model, stream=True) as span:
+                stream = await async_client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+                if hasattr(stream, "choices"):
+                    # Clients that cannot stream (cassette replay) answer in one piece
+                    total_tokens = _record_llm_response(stream, span, operation, ontology)
+                    started = True
+                    yield stream.choices[0].message.content or ""
+                else:
+                    async for chunk in stream:
+                        if deadline is not None and deadline.expired(DEADLINE_RESERVE_SECONDS):
+                            raise DeadlineExceeded(f"deadline of {deadline.budget:g}s exhausted while streaming")
+                        if getattr(chunk, "usage", None) is not None:
+                            total_tokens = _record_llm_response(chunk, span, operation, ontology)
+                        for choice in chunk.choices or ():
+                            delta = choice.delta.content if choice.delta is not None else None
+                            if not delta:
+                                continue
+                            if not started:
+                                started = True
+                                LLM_FIRST_TOKEN.observe(time.perf_counter() - start, operation=operation)
+                            yield delta
+            completed = True
+        except Exception as e:
+            released = True
+            if isinstance(e, DeadlineExceeded):
+                # Cut off by the request, not failed by the model
+                llm_rate_limiter.release(permit, actual_tokens=total_tokens)
+                LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="deadline_exceeded")
+                raise
+            rate_limited = _release_failed_permit(permit, e)
+            LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="rate_limited" if rate_limited else "error")
+            if not rate_limited:
+                _record_model_call(operation, model, None)
+            # A 429 can only arrive before the first token, so re-queueing never repeats output
+            if rate_limited and not started and attempt < LLM_RATE_LIMIT_MAX_RETRIES:
+                continue
+            raise
+        finally:
+            if not released:
+                if completed:
+                    latency = time.perf_counter() - start
+                    llm_rate_limiter.release(permit, latency=latency, actual_tokens=total_tokens)
+                    _record_model_call(operation, model, latency)
+                    LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="success")
+                else:
+                    # The consumer stopped reading (client went away)
+                    llm_rate_limiter.release(permit, actual_tokens=total_tokens)
+                    LLM_CALLS.inc(operation=operation, ontology=ontology_label, outcome="abandoned")
+        return
+
+# ISO 4217 codes recognized next to amounts by the entity_ruler
+CURRENCY_CODES = ["USD", "EUR", "GBP", "JPY", "CHF", "CAD", "AUD", "CNY", "HKD", "SGD", "SEK", "NOK", "DKK", "INR"]
 
 # --- Entity Extractor Class (adapted from the original script) ---
 class SpacyEntityExtractor:
@@ -347,11 +1037,31 @@ class SpacyEntityExtractor:
             {"label": "FinancialOrg", "pattern": [{"LOWER": "goldman"}, {"LOWER": "sachs"}]},
             {"label": "FinancialOrg", "pattern": [{"LOWER": "jpmorgan"}]},
             {"label": "JobTitle", "pattern": [{"LOWER": "cfa"}]},
+            # Amounts with a currency sign or ISO code, e.g. "$40M", "$1.2 million", "7460.50 JPY"
+            {"label": "MonetaryAmount", "pattern": [
+                {"TEXT": {"IN": ["$", "€", "£", "¥"]}}, {"LIKE_NUM": True},
+                {"LOWER": {"IN": ["million", "billion", "thousand", "m", "bn", "k"]}, "OP": "?"},
+                {"TEXT": {"IN": CURRENCY_CODES}, "OP": "?"},
+            ]},
+            {"label": "MonetaryAmount", "pattern": [
+                {"LIKE_NUM": True},
+                {"LOWER": {"IN": ["million", "billion", "thousand"]}, "OP": "?"},
+                {"TEXT": {"IN": CURRENCY_CODES}},
+            ]},
+            {"label": "MonetaryAmount", "pattern": [{"TEXT": {"IN": CURRENCY_CODES}}, {"LIKE_NUM": True}]},
+            {"label": "Percentage", "pattern": [{"LIKE_NUM": True}, {"TEXT": "%"}]},
+            {"label": "StockSymbol", "pattern": [{"TEXT": {"IN": ["NYSE", "NASDAQ", "LSE", "TSX"]}}, {"TEXT": ":"},
+                                                 {"TEXT": {"REGEX": r"^[A-Z]{1,5}$"}}]},
+            # Document references such as "PROCUREMENT-915597"
+            {"label": "ReferenceNumber", "pattern": [{"TEXT": {"REGEX": r"^[A-Z]{2,}-\d{3,}$"}}]},
+            {"label": "ReferenceNumber", "pattern": [{"TEXT": {"REGEX": r"^[A-Z]{2,}$"}}, {"TEXT": "-"},
+                                                     {"TEXT": {"REGEX": r"^\d{3,}$"}}]},
         ]
         ruler.add_patterns(patterns)
     
     def extract_entities(self, text: str) -> List[Dict[str, Any]]:
-        doc = self.nlp(text)
+        with stage_timer("spacy"):
+            doc = self.nlp(text)
         entities = []
         for ent in doc.ents:
             entity_type = self._map_entity_label(ent.label_)
@@ -383,29 +1093,34 @@ class SpacyEntityExtractor:
             "StockSymbol": "StockSymbol",
             "Currency": "Currency", 
             "FinancialOrg": "FinancialOrg",
-            "JobTitle": "JobTitle"
+            "JobTitle": "JobTitle",
+            "MonetaryAmount": "MonetaryAmount",
+            "Percentage": "Percentage",
+            "ReferenceNumber": "ReferenceNumber"
         }
         return mapping.get(spacy_label, spacy_label)
 
-# --- ASYNC LLM Graph Extraction Logic ---
-async def extract_graph_with_llm_async(text: str, ontology: Optional[str] = None, database: Optional[str] = None) -> Dict[str, Any]:
-    if not async_client:
-        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
-    
-    # Get ontology configuration
-    ontology_config = get_ontology_by_name(ontology)
-    entity_types = ontology_config.get("entity_types", [])
+# --- LLM Graph Extraction Helpers (shared by the single, streamed and packed extraction paths) ---
+def build_compact_ontology(ontology_config: OntologySnapshot) -> Dict[str, Any]:
+    """
+    Build the compact ontology block ({"e": [...], "r": [[source, type, target], ...]})
+    sent to the LLM for graph extraction. The block is computed once per
+    ontology version; callers get their own (shallow) copy.
     
-    if not entity_types:
+    Args:
+        ontology_config: Ontology snapshot
+        
+    Returns:
+        Compact ontology dictionary
+    """
+    if not ontology_config.entity_types:
         raise HTTPException(status_code=400, detail="Ontology not initialized. Please call the /ontologies endpoint first.")
+    return dict(ontology_config.derived("compact_prompt_block", _compact_prompt_block))
 
+def _compact_prompt_block(ontology_config: OntologySnapshot) -> Dict[str, Any]:
     # Core entity types are all types that are NOT property-like types.
-    property_types = ontology_config.get("property_types", [])
-    core_entity_types = [t for t in entity_types if t not in property_types]
-
-    # Build compact ontology format for the prompt
     compact_ontology = {
-        "e": core_entity_types,
+        "e": ontology_config.core_entity_types,
         "r": []  # We'll populate this from relationship types if available
     }
     
@@ -430,6 +1145,89 @@ async def extract_graph_with_llm_async(text: str, ontology: Optional[str] = None
                 compact_ontology["r"].append(["Awarder", rel_type, "Tenderer"])
                 compact_ontology["r"].append(["Awarder", rel_type, "Winner"])
 
+    compact_ontology["r"] = tuple(tuple(triple) for triple in compact_ontology["r"])
+    return compact_ontology
+
+def prune_ontology_for_text(
+    text: str,
+    ontology: Optional[str],
+    ontology_config: Dict[str, Any],
+    compact_ontology: Dict[str, Any],
+):
+    """
+    Rank the ontology's entity types against the text and keep the most
+    relevant ones (see ontology_pruning.OntologyPruner).
+    
+    Args:
+        text: Text to extract from
+        ontology: Ontology name (index cache key)
+        ontology_config: Ontology configuration (for entity descriptions)
+        compact_ontology: Full compact ontology for the prompt
+        
+    Returns:
+        (text embedding, pruned compact ontology, pruning statistics); the text
+        embedding is reused as the response embedding
+    """
+    ontology_label = ontology or DEFAULT_ONTOLOGY_NAME
+    with stage_timer("ontology_pruning", ontology=ontology_label) as span:
+        index = ontology_pruner.index_for(
+            embedding_model, ontology_label, compact_ontology.get("e", []),
+            ontology_config.get("entity_descriptions"), version=ontology_config.version_id,
+        )
+        text_embedding = embedding_model.encode(text)
+        pruned, stats = ontology_pruner.prune(compact_ontology, text_embedding, index)
+        if span is not None:
+            span.set_attribute("types_after", stats["types_after"])
+            span.set_attribute("prompt_tokens_saved", stats["prompt_tokens_saved"])
+    ONTOLOGY_PROMPT_TOKENS.inc(stats["prompt_tokens_before"], ontology=ontology_label, kind="full")
+    ONTOLOGY_PROMPT_TOKENS.inc(stats["prompt_tokens_after"], ontology=ontology_label, kind="sent")
+    return text_embedding, pruned, stats
+
+def prune_sentences_for_text(
+    text: str,
+    ontology: Optional[str],
+    ontology_config: Dict[str, Any],
+    compact_ontology: Dict[str, Any],
+    spacy_entities: Optional[List[Dict[str, Any]]] = None,
+):
+    """
+    Keep the most salient sentences of a long text within the token budget
+    (see sentence_pruning.SentencePruner).
+    
+    Args:
+        text: Text to extract from
+        ontology: Ontology name (type index cache key)
+        ontology_config: Ontology configuration (for entity descriptions)
+        compact_ontology: Full compact ontology (keywords and type embeddings)
+        spacy_entities: spaCy entities of the text, when already extracted
+        
+    Returns:
+        (text for the prompt, pruning statistics)
+    """
+    ontology_label = ontology or DEFAULT_ONTOLOGY_NAME
+    with stage_timer("sentence_pruning", ontology=ontology_label) as span:
+        if spacy_entities is None and sentence_pruner.weights.entities:
+            spacy_entities = extractor.extract_entities(text)
+        type_vectors = None
+        if embedding_model is not None and sentence_pruner.weights.similarity:
+            type_vectors = ontology_pruner.index_for(
+                embedding_model, ontology_label, compact_ontology.get("e", []),
+                ontology_config.get("entity_descriptions"), version=ontology_config.version_id,
+            ).vectors
+        pruned, stats = sentence_pruner.prune(
+            text, spacy_entities, ontology_keywords(compact_ontology.get("e", [])), embedding_model, type_vectors,
+        )
+        if span is not None:
+            span.set_attribute("kept_sentences", stats["kept_sentences"])
+            span.set_attribute("tokens_saved", stats["tokens_saved"])
+    SENTENCE_PRUNING_TOKENS.inc(stats["original_tokens"], kind="original")
+    SENTENCE_PRUNING_TOKENS.inc(stats["sent_tokens"], kind="sent")
+    return pruned, stats
+
+def build_graph_extraction_prompt(text: str, compact_ontology: Dict[str, Any]) -> str:
+    """
+    Render the graph extraction prompt for a text and compact ontology.
+    """
     prompt = f"""
 You are an expert knowledge graph builder. Your task is to extract entities and relationships from the following text, using the provided ontology as a guide.
 
@@ -483,210 +1281,805 @@ Please respond with a valid JSON object following this exact format.
 {text}
 ---
 """
-    
-    try:
-        llm_start_time = time.time()
-
-        response = await async_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
-        
-        llm_end_time = time.time()
-        print(f"      [LLM Trace] Async OpenAI API call took: {llm_end_time - llm_start_time:.2f} seconds")
-
-        response_str = response.choices[0].message.content
-        if response_str:
-            graph_data = json.loads(response_str)
-
-            if isinstance(graph_data, dict):
-                entities = graph_data.get("entities", [])
-                relationships = graph_data.get("relationships", [])
-
-                for entity in entities:
-                    if isinstance(entity, dict) and "confidence" not in entity:
-                        entity["confidence"] = 0.9
-                for rel in relationships:
-                    if isinstance(rel, dict) and "confidence" not in rel:
-                        rel["confidence"] = 0.9
-                
-                return {
-                    "entities": entities, 
-                    "relationships": relationships, 
-                    "refinement_info": f"LLM extraction successful using ontology: {ontology or 'default'}"
-                }
-        
-        return {"entities": [], "relationships": [], "refinement_info": "LLM parsing failed"}
+    return prompt
 
-    except Exception as e:
-        print(f"      [LLM Trace] Error during async extraction for a document: {e}")
-        return {"entities": [], "relationships": [], "refinement_info": f"LLM graph extraction error: {str(e)}"}
+def build_packed_extraction_prompt(texts: List[str], compact_ontology: Dict[str, Any]) -> str:
+    """
+    Render one graph extraction prompt for several short documents, each
+    delimited by its id (D1, D2, ...), asking for one result per document.
+    """
+    prompt = f"""
+You are an expert knowledge graph builder. Your task is to extract entities and relationships from each of the short documents below, using the provided ontology as a guide. Treat every document separately.
 
-# --- LLM Graph Extraction Logic ---
-def extract_graph_with_llm(text: str, ontology: Optional[str] = None, database: Optional[str] = None) -> Dict[str, Any]:
-    if not client:
-        raise HTTPException(status_code=503, detail="OpenAI client not configured.")
-    
-    # Get ontology configuration
-    ontology_config = get_ontology_by_name(ontology)
-    entity_types = ontology_config.get("entity_types", [])
-    
-    if not entity_types:
-        raise HTTPException(status_code=400, detail="Ontology not initialized. Please call the /ontologies endpoint first.")
+**Ontology:**
+{json.dumps(compact_ontology, indent=2)}
 
-    # Core entity types are all types that are NOT property-like types.
-    property_types = ontology_config.get("property_types", [])
-    core_entity_types = [t for t in entity_types if t not in property_types]
+**INSTRUCTIONS:**
+1. Each document is enclosed between <<<DOCUMENT id>>> and <<<END id>>>. Return exactly one result per document id, in the same order, including documents with nothing to extract.
+2. Entities and relationships of a document come only from that document's text. Never mix documents.
+3. Always use the ACTUAL TEXT from the document as the entity value, never the type name, and match it to the most appropriate ontology type. If an entity doesn't match any ontology type exactly, create a descriptive label and append "Inferred" to it.
+4. Extract all relationships that match the ontology's relationship patterns. If you find a relationship that does not match any ontology pattern, you may invent a relationship type in ALL_CAPS with underscores and the suffix "Inferred" (e.g. ASSOCIATED_WITH_INFERRED).
 
-    # Build compact ontology format for the prompt
-    compact_ontology = {
-        "e": core_entity_types,
-        "r": []  # We'll populate this from relationship types if available
-    }
-    
-    # Get relationship types and build compact ontology relationships
-    relationship_types = ontology_config.get("relationship_types", [])
-    
-    # Get compact ontology from the configuration if available
-    compact_ontology_config = ontology_config.get("compact_ontology", {})
-    if compact_ontology_config and "r" in compact_ontology_config:
-        compact_ontology["r"] = compact_ontology_config["r"]
-    else:
-        # Fallback: create simple relationship patterns from relationship types
-        # This is a simplified approach - the backend should provide proper patterns
-        for rel_type in relationship_types:
-            # Create generic patterns for common relationship types
-            if "Value" in rel_type or "Amount" in rel_type:
-                compact_ontology["r"].append(["Awarder", rel_type, "MonetaryValue"])
-                compact_ontology["r"].append(["Tenderer", rel_type, "MonetaryValue"])
-            elif "Winner" in rel_type:
-                compact_ontology["r"].append(["AwardDecision", rel_type, "Winner"])
-            elif "Award" in rel_type:
-                compact_ontology["r"].append(["Awarder", rel_type, "Tenderer"])
-                compact_ontology["r"].append(["Awarder", rel_type, "Winner"])
+**Output Format (JSON):**
+{{
+  "documents": [
+    {{
+      "id": "D1",
+      "entities": [{{"value": "actual text from document", "type": "entity type from ontology", "properties": {{}}}}],
+      "relationships": [{{"source": "source entity value", "target": "target entity value", "type": "relationship type"}}]
+    }}
+  ]
+}}
 
+**Documents:**
+{format_packed_documents(texts)}
+"""
+    return prompt
+
+def build_hybrid_extraction_prompt(
+    text: str,
+    compact_ontology: Dict[str, Any],
+    anchors: List[Dict[str, Any]],
+    candidates: List[Dict[str, str]],
+) -> str:
+    """
+    Render the hybrid-mode prompt: the LLM gets the final spaCy anchors (by id)
+    and the unverified candidate mentions, and returns only the remaining
+    entities plus all relationships.
+    """
     prompt = f"""
-You are an expert knowledge graph builder. Your task is to extract entities and relationships from the following text, using the provided ontology as a guide.
+You are an expert knowledge graph builder. Some entities have already been extracted from the text below. Your task is to extract the remaining entities and all relationships, using the provided ontology as a guide.
 
 **Ontology:**
 {json.dumps(compact_ontology, indent=2)}
 
-**CRITICAL INSTRUCTIONS FOR ENTITY EXTRACTION:**
-1. **ALWAYS extract the ACTUAL TEXT from the document** that represents each entity. NEVER use the entity type name as the entity value.
-2. **Entity Value Rules:**
-   - For companies: Extract the actual company name (e.g., "ABC Corp", "Microsoft", "Goldman Sachs")
-   - For people: Extract the actual person name (e.g., "John Smith", "CEO Tim Cook")
-   - For monetary values: Extract the actual amount (e.g., "$170,000 CAD", "50 million USD")
-   - For procurement objects: Extract what is being procured (e.g., "raw materials", "transport services", "steel and aluminum")
-   - For contracts: Extract the actual contract reference or description (e.g., "PROCUREMENT-816467", "purchase order for materials")
-   - For locations: Extract the actual location name (e.g., "New York", "London office")
-3. **Entity Type Matching:**
-   - Match each extracted text to the most appropriate ontology type
-   - If an entity doesn't match any ontology type exactly, create a descriptive label and append "Inferred" to it
-   - NEVER use the entity type name as the entity value
-4. **Examples of CORRECT extraction:**
-   - Text: "Contract awarded to ABC Corp for raw materials"
-   - Correct: {{"value": "ABC Corp", "type": "Business"}}, {{"value": "raw materials", "type": "ProcurementObject"}}
-   - WRONG: {{"value": "Business", "type": "Business"}}, {{"value": "ProcurementObject", "type": "ProcurementObject"}}
+**Already Extracted Entities (final - do NOT repeat them in "entities"):**
+{format_anchor_list(anchors)}
 
-**Relationship Extraction:**
-5. Extract all relationships that match the ontology's relationship types and patterns.
-6. If you find a relationship between two entities that does not match any ontology pattern, you may invent a relationship type, but you MUST use ALL_CAPS with underscores only between words, and append the suffix "Inferred" to its type (e.g., SUPERVISES_INFERRED, ASSOCIATED_WITH_INFERRED).
+**Candidate Mentions (found by NER, unverified):**
+{format_candidate_list(candidates)}
+
+**INSTRUCTIONS:**
+1. In "entities", return only entities that are NOT in the already extracted list. Use the candidate mentions as hints: keep the real ones with the most appropriate ontology type, drop the wrong ones, and add entities the candidates missed.
+2. Always use the ACTUAL TEXT from the document as the entity value, never the type name.
+3. If an entity doesn't match any ontology type exactly, create a descriptive label and append "Inferred" to it.
+4. Extract all relationships that match the ontology's relationship patterns. A relationship "source"/"target" is either the value of an entity you return or the id (e.g. "A1") of an already extracted entity.
+5. If you find a relationship that does not match any ontology pattern, you may invent a relationship type in ALL_CAPS with underscores and the suffix "Inferred" (e.g. ASSOCIATED_WITH_INFERRED).
 
 **Output Format (JSON):**
 {{
-  "entities": [
-    {{
-      "value": "actual text from document",
-      "type": "entity type from ontology",
-      "properties": {{}}
-    }}
-  ],
-  "relationships": [
-    {{
-      "source": "source entity value",
-      "target": "target entity value",
-      "type": "relationship type"
-    }}
-  ]
+  "entities": [{{"value": "actual text from document", "type": "entity type from ontology"}}],
+  "relationships": [{{"source": "entity value or anchor id", "target": "entity value or anchor id", "type": "relationship type"}}]
 }}
 
-Please respond with a valid JSON object following this exact format.
-
 **Text to Analyze:**
 ---
 {text}
 ---
 """
-    
-    try:
-        print("      [LLM Trace] Starting LLM graph extraction...")
-        llm_start_time = time.time()
+    return prompt
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
+def load_graph_json(response_str: Optional[str], operation: str = "graph_extraction") -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Graph object of an LLM answer, repaired first when it is not valid JSON
+    (truncated, stray quotes, code fences; see json_repair.py).
+    
+    Args:
+        response_str: Raw message content returned by the LLM
+        operation: Logical operation name used as a metrics label
         
-        llm_end_time = time.time()
-        print(f"      [LLM Trace] OpenAI API call took: {llm_end_time - llm_start_time:.2f} seconds")
-
-        response_str = response.choices[0].message.content
-        if response_str:
-            parsing_start_time = time.time()
-            graph_data = json.loads(response_str)
-            parsing_end_time = time.time()
-            print(f"      [LLM Trace] JSON parsing took: {parsing_end_time - parsing_start_time:.4f} seconds")
-
-            # Validate and fix the structure if needed
-            if isinstance(graph_data, dict):
-                entities = graph_data.get("entities", [])
-                relationships = graph_data.get("relationships", [])
-
-                # Patch: Support both 'type' and 'types' fields for entities
-                for entity in entities:
-                    if isinstance(entity, dict):
-                        if "types" in entity and isinstance(entity["types"], list) and entity["types"]:
-                            entity["type"] = entity["types"][0]  # Use the first type for compatibility
-                        elif "type" not in entity and "types" not in entity:
-                            entity["type"] = "Unknown"
-                        if "confidence" not in entity:
-                            entity["confidence"] = 0.9
-                for rel in relationships:
-                    if isinstance(rel, dict) and "confidence" not in rel:
-                        rel["confidence"] = 0.9
-                
-                return {"entities": entities, "relationships": relationships}
+    Returns:
+        (graph object, or None if the answer is empty or not a graph object; repairs made)
         
-        # Return a default empty structure if parsing fails
-        return {"entities": [], "relationships": []}
-
-    except Exception as e:
-        print(f"      [LLM Trace] Error during extraction: {e}")
-        raise HTTPException(status_code=500, detail=f"LLM graph extraction error: {str(e)}")
-
-# --- LLM Refinement Logic ---
-def refine_entities_with_llm(text: str, spacy_entities: List[Dict]) -> List[Dict]:
-    if not client:
-        raise HTTPException(status_code=503, detail="OpenAI client not configured.")
-
-    entities_json_str = json.dumps(spacy_entities, indent=2)
-
-    prompt = f"""
-    Review the following JSON list of named entities extracted from an email.
-    Your task is to clean this list by removing any obvious errors.
-    An error is an entity that is clearly not a real-world person, company, location, or monetary value.
+    Raises:
+        json.JSONDecodeError: The answer cannot be repaired
+    """
+    if not response_str or not response_str.strip():
+        return None, []
+    if JSON_REPAIR_ENABLED:
+        graph_data, repairs = repair_json(response_str)
+    else:
+        graph_data, repairs = json.loads(response_str), []
+    for repair in repairs:
+        LLM_JSON_REPAIRS.inc(operation=operation, repair=repair)
+    # An empty object is not an answer (and is escalated like invalid JSON)
+    if not isinstance(graph_data, dict) or not ({"entities", "relationships"} & graph_data.keys()):
+        return None, repairs
+    return graph_data, repairs
+
+def parsing_report(validator: GraphValidator, repairs: List[str]) -> Dict[str, Any]:
+    """JSON repairs and validation counts of one answer, for graph_metadata.parsing (counted in the metrics)."""
+    report = validator.report()
+    report["json_repairs"] = list(repairs)
+    for kind in ("entities", "relationships"):
+        for outcome, count in report[kind].items():
+            if count:
+                GRAPH_VALIDATION_ELEMENTS.inc(count, kind=kind, outcome=outcome)
+    return report
+
+def validate_graph_data(
+    graph_data: Dict[str, Any], ontology_config: OntologySnapshot, repairs: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Check a parsed graph against the ontology it was extracted with (see
+    graph_validation.py): normalize 'type'/'types' and confidences, and flag or
+    drop elements that do not fit the ontology.
     
-    For example, remove items like "Hi Team", "25", or "YoY".
-    Keep valid entities like "Vista Equity Partners", "David Chen", or "$40M".
+    Returns:
+        Dictionary with the remaining entities and relationships and the "parsing" report
+    """
+    validator = GraphValidator(ontology_config, GRAPH_VALIDATION_MODE)
+    graph = validator.graph(graph_data)
+    graph["parsing"] = parsing_report(validator, repairs or [])
+    return graph
+
+def parse_graph_response(
+    response_str: Optional[str],
+    ontology_config: OntologySnapshot,
+    anchors: Optional[List[Dict[str, Any]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Parse the LLM JSON output into entities and relationships: repair broken
+    JSON, merge the hybrid anchors and validate the graph against the ontology.
     
-    Return a JSON object with a single key "cleaned_entities" which contains the corrected list of entities.
+    Args:
+        response_str: Raw message content returned by the LLM
+        ontology_config: Ontology snapshot the prompt was built from
+        anchors: spaCy anchors in hybrid mode, None otherwise
+        
+    Returns:
+        Dictionary with entities, relationships and the "parsing" report, or
+        None if the output is unusable
+    """
+    graph_data, repairs = load_graph_json(response_str)
+    if graph_data is None:
+        return None
+    if anchors is not None:
+        graph_data = merge_hybrid_graph(anchors, graph_data)
+    return validate_graph_data(graph_data, ontology_config, repairs)
+
+def load_json_answer(content: Optional[str]) -> Optional[Any]:
+    """Parsed JSON of an LLM answer, or None when it is empty, {} / [] or not valid JSON."""
+    if not content or not content.strip():
+        return None
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+    return data if data not in ({}, []) else None
 
-    **Original Text:**
+async def request_json_answer_async(operation: str, text: str, allow_empty: bool = False, **kwargs) -> Any:
+    """
+    Chat completion whose answer must be non-empty JSON, on the model routed for
+    ``operation`` and escalated once when that model's answer is unusable.
+    
+    Args:
+        operation: Logical operation name
+        text: Prompt text, for the text size rules
+        allow_empty: Return an empty {} / [] answer when escalation is disabled or
+            also answers empty, instead of raising
+        **kwargs: Arguments forwarded to chat.completions.create (without model)
+        
+    Returns:
+        The parsed answer
+        
+    Raises:
+        InvalidLLMResponse: No model returned usable JSON
+    """
+    model = route_model(operation, text)
+    while True:
+        response = await create_chat_completion_async(operation, model=model, **kwargs)
+        content = response.choices[0].message.content
+        data = load_json_answer(content)
+        record_model_output(operation, model, data is not None)
+        if data is not None:
+            return data
+        model = escalate_model(operation, model)
+        if model is None:
+            if allow_empty:
+                try:
+                    empty = json.loads(content or "null")
+                except json.JSONDecodeError:
+                    empty = None
+                if empty in ({}, []):
+                    return empty
+            raise InvalidLLMResponse(f"{operation}: LLM answer is empty or not JSON")
+
+def graph_extraction_failure(retry: RetryState) -> Dict[str, Any]:
+    """
+    Empty graph result describing why extraction gave up.
+    """
+    error = retry.error_info()
+    return {
+        "entities": [],
+        "relationships": [],
+        "refinement_info": (
+            f"LLM graph extraction error ({error['error_class']}) after {error['attempts']} attempt(s): "
+            f"{error['message']}"
+        ),
+        "error": error,
+        "attempts": retry.attempts,
+    }
+
+async def degrade_to_spacy(
+    text: str,
+    graph_data: Dict[str, Any],
+    retry: RetryState,
+    spacy_entities: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Complete a failed or out-of-time extraction with spaCy entities, so the
+    caller gets a partial graph instead of an empty one.
+    
+    Entities already in ``graph_data`` (hybrid anchors, streamed elements) are
+    kept and spaCy entities with other values are added, marked with
+    ``properties.extraction_source = "spacy"``. The result keeps its error, so
+    the thread and near-duplicate stores never take it for a full extraction.
+    
+    Args:
+        text: Text the extraction was for
+        graph_data: Failure result (see graph_extraction_failure)
+        retry: Retry state of the failed extraction
+        spacy_entities: spaCy output for ``text``, if already computed
+        
+    Returns:
+        ``graph_data``, with a "degradation" entry when the fallback is enabled
+    """
+    if not SPACY_FALLBACK_ENABLED:
+        return graph_data
+    reason = "deadline" if retry.error_class == DEADLINE_EXCEEDED or retry.deadline_exhausted else "llm_failure"
+    if spacy_entities is None:
+        spacy_entities = await cpu_executor.run(extractor.extract_entities, text, cost=len(text))
+    seen = {str(entity.get("value", "")).lower() for entity in graph_data["entities"]}
+    added = []
+    for entity in spacy_entities:
+        key = entity["value"].lower()
+        if key and key not in seen:
+            seen.add(key)
+            added.append({**entity, "properties": {"extraction_source": "spacy"}})
+    graph_data["entities"].extend(added)
+    graph_data["refinement_info"] += f"; returning a partial graph with {len(added)} spaCy entities"
+    graph_data["degradation"] = {"reason": reason, "fallback": "spacy", "spacy_entities": len(added)}
+    DEGRADED_EXTRACTIONS.inc(reason=reason)
+    return graph_data
+
+async def deadline_failure(text: str, mode: str, retry: RetryState, error: DeadlineExceeded) -> Dict[str, Any]:
+    """Partial result of an extraction whose deadline came before its LLM call."""
+    retry.failed(error)
+    failure = graph_extraction_failure(retry)
+    failure["extraction_mode"] = mode
+    return await degrade_to_spacy(text, failure, retry)
+
+async def reuse_near_duplicate(text: str, ontology_config: OntologySnapshot, mode: str) -> Optional[Dict[str, Any]]:
+    """
+    Graph of an indexed near-duplicate of ``text``, patched to the text, or None.
+    
+    The index is scoped by the resolved ontology (``ontology_config.name``), not
+    the requested name, so an ontology update invalidates every graph built from
+    it, including those of requests that fell back to it.
+    """
+    if not NEAR_DUPLICATE_REUSE_ENABLED:
+        return None
+    with stage_timer("near_duplicate_lookup"):
+        found = await cpu_executor.run(near_duplicate_index.find, (ontology_config.name, mode), text)
+    record_cache_lookup("near_duplicate", found is not None)
+    if found is None:
+        return None
+    graph_data, reuse = found
+    NEAR_DUPLICATE_REUSES.inc(kind="patched" if reuse["patched_entities"] or reuse["dropped_entities"] else "identical")
+    graph_data["refinement_info"] = (
+        f"Reused the graph of a near-duplicate text (similarity {reuse['similarity']:.2f}) "
+        f"using ontology: {ontology_config.name}"
+    )
+    graph_data["attempts"] = 0
+    graph_data["extraction_mode"] = mode
+    graph_data["near_duplicate"] = reuse
+    return graph_data
+
+def index_extracted_text(text: str, ontology_config: OntologySnapshot, mode: str, graph_data: Dict[str, Any]) -> None:
+    if NEAR_DUPLICATE_REUSE_ENABLED:
+        near_duplicate_index.add((ontology_config.name, mode), text, graph_data)
+
+# --- ASYNC LLM Graph Extraction Logic ---
+async def prepare_graph_extraction(
+    text: str, ontology: Optional[str], mode: str, ontology_config: OntologySnapshot,
+) -> Dict[str, Any]:
+    """
+    Build the graph extraction prompt for ``text``: prune the ontology and the
+    sentences when enabled and, in hybrid mode, find the spaCy anchors.
+    
+    Args:
+        text: Text to extract from
+        ontology: Requested ontology name
+        mode: Extraction mode
+        ontology_config: Snapshot ``ontology`` resolved to (see get_ontology_by_name)
+    
+    Returns:
+        Dictionary with the prompt, the (pruned) prompt text and ontology block,
+        the ontology snapshot, the anchors, the pruning statistics and the text embedding and spaCy
+        entities, if computed
+    """
+    compact_ontology = build_compact_ontology(ontology_config)
+
+    full_compact_ontology = compact_ontology
+    text_embedding = None
+    pruning_stats = None
+    if ONTOLOGY_PRUNING_ENABLED and embedding_model is not None:
+        text_embedding, compact_ontology, pruning_stats = await cpu_executor.run(
+            prune_ontology_for_text, text, ontology, ontology_config, compact_ontology, cost=len(text)
+        )
+
+    anchors: List[Dict[str, Any]] = []
+    spacy_entities = None
+    if mode == EXTRACTION_MODE_HYBRID:
+        # Anchors come from the whole text, so they survive sentence pruning with their offsets
+        spacy_entities = await cpu_executor.run(extractor.extract_entities, text, cost=len(text))
+
+    prompt_text = text
+    sentence_stats = None
+    if SENTENCE_PRUNING_ENABLED and sentence_pruner.applies_to(text):
+        prompt_text, sentence_stats = await cpu_executor.run(
+            prune_sentences_for_text, text, ontology, ontology_config, full_compact_ontology, spacy_entities,
+            cost=len(text),
+        )
+
+    if mode == EXTRACTION_MODE_HYBRID:
+        anchors, candidates = split_spacy_entities(
+            spacy_entities, ontology_config, HYBRID_ANCHOR_MIN_CONFIDENCE,
+            type_cache=ontology_config.derived("anchor_types", lambda _: {}),
+        )
+        prompt = build_hybrid_extraction_prompt(prompt_text, compact_ontology, anchors, candidates)
+    else:
+        prompt = build_graph_extraction_prompt(prompt_text, compact_ontology)
+
+    return {
+        "prompt": prompt,
+        "prompt_text": prompt_text,
+        "compact_ontology": compact_ontology,
+        "anchors": anchors,
+        "ontology_pruning": pruning_stats,
+        "sentence_pruning": sentence_stats,
+        "text_embedding": text_embedding,
+        "spacy_entities": spacy_entities,
+        "ontology_config": ontology_config,
+    }
+
+async def extract_graph_with_llm_async(
+    text: str,
+    ontology: Optional[str] = None,
+    database: Optional[str] = None,
+    max_retries: Optional[int] = None,
+    mode: str = EXTRACTION_MODE_LLM,
+) -> Dict[str, Any]:
+    if not async_client:
+        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
+
+    ontology_config = get_ontology_by_name(ontology)
+    reused = await reuse_near_duplicate(text, ontology_config, mode)
+    if reused is not None:
+        return reused
+    
+    retry = new_retry_state(max_retries)
+    try:
+        prepared = await within_deadline(
+            prepare_graph_extraction(text, ontology, mode, ontology_config), DEADLINE_RESERVE_SECONDS
+        )
+    except DeadlineExceeded as e:
+        return await deadline_failure(text, mode, retry, e)
+    prompt, anchors = prepared["prompt"], prepared["anchors"]
+    pruning_stats, sentence_stats = prepared["ontology_pruning"], prepared["sentence_pruning"]
+    text_embedding = prepared["text_embedding"]
+    
+    model = route_model("graph_extraction", prepared["prompt_text"], prepared["compact_ontology"])
+    while True:
+        retry.start_attempt()
+        try:
+            llm_start_time = time.time()
+
+            response = await create_chat_completion_async(
+                "graph_extraction",
+                ontology,
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                response_format={"type": "json_object"},
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS
+            )
+            
+            llm_end_time = time.time()
+            print(f"      [LLM Trace] Async OpenAI API call took: {llm_end_time - llm_start_time:.2f} seconds")
+
+            graph_data = parse_graph_response(
+                response.choices[0].message.content, prepared["ontology_config"],
+                anchors if mode == EXTRACTION_MODE_HYBRID else None,
+            )
+            if graph_data is None:
+                raise InvalidLLMResponse("LLM response is not a graph JSON object")
+            record_model_output("graph_extraction", model, True)
+            index_extracted_text(text, ontology_config, mode, graph_data)
+            graph_data["refinement_info"] = f"LLM extraction successful using ontology: {ontology or 'default'}"
+            graph_data["attempts"] = retry.attempts
+            graph_data["extraction_mode"] = mode
+            graph_data["anchor_count"] = len(anchors)
+            graph_data["ontology_pruning"] = pruning_stats
+            graph_data["sentence_pruning"] = sentence_stats
+            graph_data["text_embedding"] = text_embedding
+            graph_data["llm_model"] = model
+            return graph_data
+
+        except Exception as e:
+            delay = retry.failed(e)
+            print(f"      [LLM Trace] Async extraction attempt {retry.attempts} failed ({retry.error_class}): {e}")
+            if retry.error_class == INVALID_JSON:
+                record_model_output("graph_extraction", model, False)
+                escalated = escalate_model("graph_extraction", model)
+                if escalated:
+                    # The larger model gets its attempt right away, even with retries exhausted
+                    model, delay = escalated, 0.0
+            if delay is None:
+                failure = graph_extraction_failure(retry)
+                # The spaCy anchors are still valid when the LLM part fails
+                failure["entities"] = [dict(a) for a in anchors]
+                failure["extraction_mode"] = mode
+                failure["anchor_count"] = len(anchors)
+                failure["ontology_pruning"] = pruning_stats
+                failure["sentence_pruning"] = sentence_stats
+                failure["text_embedding"] = text_embedding
+                failure["llm_model"] = model
+                return await degrade_to_spacy(text, failure, retry, prepared["spacy_entities"])
+            LLM_RETRIES.inc(operation="graph_extraction", error_class=retry.error_class)
+            await asyncio.sleep(delay)
+
+async def stream_graph_extraction_async(
+    text: str,
+    ontology: Optional[str] = None,
+    max_retries: Optional[int] = None,
+    mode: str = EXTRACTION_MODE_LLM,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of extract_graph_with_llm_async.
+    
+    Yields:
+        ("entity", entity) and ("relationship", relationship) as soon as the LLM
+        has written each one (hybrid anchors first), then ("graph", graph_data)
+        with the complete result, made of the same dicts
+    """
+    if not async_client:
+        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
+
+    ontology_config = get_ontology_by_name(ontology)
+    reused = await reuse_near_duplicate(text, ontology_config, mode)
+    if reused is not None:
+        for entity in reused.get("entities", []):
+            yield "entity", entity
+        for rel in reused.get("relationships", []):
+            yield "relationship", rel
+        yield "graph", reused
+        return
+
+    retry = new_retry_state(max_retries)
+    try:
+        prepared = await within_deadline(
+            prepare_graph_extraction(text, ontology, mode, ontology_config), DEADLINE_RESERVE_SECONDS
+        )
+    except DeadlineExceeded as e:
+        failure = await deadline_failure(text, mode, retry, e)
+        for entity in failure["entities"]:
+            yield "entity", entity
+        yield "graph", failure
+        return
+    anchors = prepared["anchors"]
+    entities: List[Dict[str, Any]] = []
+    relationships: List[Dict[str, Any]] = []
+    # Validates elements as they arrive; relationships are checked against the entities sent before them
+    validator = GraphValidator(prepared["ontology_config"], GRAPH_VALIDATION_MODE)
+    for anchor in anchors:
+        entities.append(validator.entity(dict(anchor)))
+        yield "entity", entities[-1]
+
+    model = route_model("graph_extraction", prepared["prompt_text"], prepared["compact_ontology"])
+    while True:
+        retry.start_attempt()
+        parser = IncrementalGraphParser()
+        try:
+            deltas = stream_chat_completion_async(
+                "graph_extraction",
+                ontology,
+                model=model,
+                messages=[{"role": "user", "content": prepared["prompt"]}],
+                temperature=0,
+                response_format={"type": "json_object"},
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS
+            )
+            async for delta in deltas:
+                for kind, element in parser.feed(delta):
+                    key = "entities" if kind == "entity" else "relationships"
+                    if mode == EXTRACTION_MODE_HYBRID:
+                        # Resolves anchor ids in place and drops entities that duplicate an anchor
+                        merged = merge_hybrid_graph(anchors, {key: [element]})
+                        if kind == "entity" and len(merged["entities"]) == len(anchors):
+                            continue
+                    element = validator.entity(element) if kind == "entity" else validator.relationship(element)
+                    if element is None:
+                        continue
+                    (entities if kind == "entity" else relationships).append(element)
+                    yield kind, element
+
+            # The streamed elements are the result; the whole answer must still be a graph object
+            answer, repairs = load_graph_json(parser.text)
+            if answer is None:
+                raise InvalidLLMResponse("LLM response is not a graph JSON object")
+            record_model_output("graph_extraction", model, True)
+            graph_data = {"entities": entities, "relationships": relationships}
+            graph_data["parsing"] = parsing_report(validator, repairs)
+            index_extracted_text(text, ontology_config, mode, graph_data)
+            graph_data["refinement_info"] = f"LLM extraction successful using ontology: {ontology or 'default'}"
+            graph_data["attempts"] = retry.attempts
+            graph_data["extraction_mode"] = mode
+            graph_data["anchor_count"] = len(anchors)
+            graph_data["ontology_pruning"] = prepared["ontology_pruning"]
+            graph_data["sentence_pruning"] = prepared["sentence_pruning"]
+            graph_data["text_embedding"] = prepared["text_embedding"]
+            graph_data["llm_model"] = model
+            graph_data["streamed_elements"] = parser.emitted
+            yield "graph", graph_data
+            return
+
+        except Exception as e:
+            delay = retry.failed(e)
+            print(f"      [LLM Trace] Streamed extraction attempt {retry.attempts} failed ({retry.error_class}): {e}")
+            if retry.error_class == INVALID_JSON:
+                record_model_output("graph_extraction", model, False)
+                escalated = escalate_model("graph_extraction", model) if not parser.emitted else None
+                if escalated:
+                    model, delay = escalated, 0.0
+            if parser.emitted:
+                # Elements already sent cannot be taken back, so a retry would duplicate them
+                delay = None
+            if delay is None:
+                failure = graph_extraction_failure(retry)
+                # Anchors and the elements streamed before the failure are kept
+                failure["entities"] = entities
+                failure["relationships"] = relationships
+                failure["extraction_mode"] = mode
+                failure["anchor_count"] = len(anchors)
+                failure["ontology_pruning"] = prepared["ontology_pruning"]
+                failure["sentence_pruning"] = prepared["sentence_pruning"]
+                failure["text_embedding"] = prepared["text_embedding"]
+                failure["llm_model"] = model
+                failure["streamed_elements"] = parser.emitted
+                streamed = len(entities)
+                await degrade_to_spacy(text, failure, retry, prepared["spacy_entities"])
+                for entity in entities[streamed:]:
+                    yield "entity", entity
+                yield "graph", failure
+                return
+            LLM_RETRIES.inc(operation="graph_extraction", error_class=retry.error_class)
+            await asyncio.sleep(delay)
+
+async def extract_packed_graphs_async(
+    texts: List[str],
+    ontology: Optional[str] = None,
+    max_retries: Optional[int] = None,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Extract the graphs of several short documents with a single LLM call.
+    
+    Args:
+        texts: Documents of one pack
+        ontology: Ontology name
+        max_retries: Optional override of the retry count for transient errors
+        
+    Returns:
+        Graph data by position in ``texts`` for the documents the LLM returned a
+        usable result for; missing positions must be extracted on their own
+    """
+    if not async_client:
+        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
+
+    ontology_config = get_ontology_by_name(ontology)
+    results: Dict[int, Dict[str, Any]] = {}
+    for position, text in enumerate(texts):
+        reused = await reuse_near_duplicate(text, ontology_config, EXTRACTION_MODE_LLM)
+        if reused is not None:
+            results[position] = reused
+    pending = [position for position in range(len(texts)) if position not in results]
+    if not pending:
+        return results
+    texts = [texts[position] for position in pending]
+
+    compact_ontology = build_compact_ontology(ontology_config)
+    if ONTOLOGY_PRUNING_ENABLED and embedding_model is not None:
+        _, compact_ontology, _ = await cpu_executor.run(
+            prune_ontology_for_text, "\n\n".join(texts), ontology, ontology_config, compact_ontology,
+            cost=sum(len(text) for text in texts),
+        )
+    prompt = build_packed_extraction_prompt(texts, compact_ontology)
+    doc_ids = document_ids(len(texts))
+    model = route_model("packed_graph_extraction", "\n\n".join(texts), compact_ontology)
+
+    retry = new_retry_state(max_retries)
+    while True:
+        retry.start_attempt()
+        try:
+            response = await create_chat_completion_async(
+                "packed_graph_extraction",
+                ontology,
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                response_format={"type": "json_object"},
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS
+            )
+            per_document = split_packed_response(response.choices[0].message.content, doc_ids)
+            record_model_output("packed_graph_extraction", model, True)
+            break
+        except Exception as e:
+            delay = retry.failed(e)
+            if retry.error_class == INVALID_JSON:
+                record_model_output("packed_graph_extraction", model, False)
+            print(f"      [LLM Trace] Packed extraction of {len(texts)} documents, attempt {retry.attempts} failed ({retry.error_class}): {e}")
+            # An unusable answer is not retried as a pack: the single-document fallback is the retry
+            if delay is None or retry.error_class == INVALID_JSON:
+                return results
+            LLM_RETRIES.inc(operation="packed_graph_extraction", error_class=retry.error_class)
+            await asyncio.sleep(delay)
+
+    for position, doc_id, text in zip(pending, doc_ids, texts):
+        if doc_id in per_document:
+            graph_data = validate_graph_data(per_document[doc_id], ontology_config)
+            index_extracted_text(text, ontology_config, EXTRACTION_MODE_LLM, graph_data)
+            graph_data["refinement_info"] = f"LLM extraction successful using ontology: {ontology or 'default'}"
+            graph_data["attempts"] = retry.attempts
+            graph_data["llm_model"] = model
+            results[position] = graph_data
+    return results
+
+async def extract_thread_increment(
+    text: str,
+    thread_key: str,
+    ontology: Optional[str] = None,
+    database: Optional[str] = None,
+    max_retries: Optional[int] = None,
+    mode: str = EXTRACTION_MODE_LLM,
+) -> Dict[str, Any]:
+    """
+    Extract only the segments of ``text`` not yet processed for ``thread_key``
+    and merge them into the thread's stored graph.
+    
+    Args:
+        text: Full message text, including quoted history
+        thread_key: Client-provided thread/document key
+        ontology: Ontology name
+        database: Target database name
+        max_retries: Optional override of the retry count
+        mode: Extraction mode
+        
+    Returns:
+        Graph data of the whole thread, with "incremental" statistics
+    """
+    # Keyed by the resolved ontology, so its updates invalidate the thread (see invalidate_ontology_caches)
+    state = thread_store.get((thread_key, get_ontology_by_name(ontology).name, mode))
+    async with state.lock:
+        segments = split_segments(text)
+        new_segments, new_fingerprints = [], set()
+        for segment in segments:
+            if segment.fingerprint not in state.fingerprints and segment.fingerprint not in new_fingerprints:
+                new_fingerprints.add(segment.fingerprint)
+                new_segments.append(segment)
+        stats = {
+            "thread_key": thread_key,
+            "segments": len(segments),
+            "new_segments": len(new_segments),
+            "new_text_length": sum(len(segment.text) for segment in new_segments),
+        }
+
+        if not new_segments:
+            graph_data = copy.deepcopy(state.graph)
+            graph_data["refinement_info"] = f"No new segments in thread '{thread_key}'; returning the stored graph"
+            graph_data["attempts"] = 0
+            graph_data["extraction_mode"] = mode
+            graph_data["incremental"] = stats
+            return graph_data
+
+        offsets = OffsetMap(new_segments)
+        graph_data = await extract_graph_with_llm_async(offsets.text, ontology, database, max_retries=max_retries, mode=mode)
+        # The response embedding covers the whole text, not just the new segments
+        graph_data.pop("text_embedding", None)
+        for entity in graph_data.get("entities", []):
+            if entity.get("start") is not None:
+                entity["start"] = offsets.to_original(entity["start"])
+                entity["end"] = offsets.to_original(entity.get("end"))
+
+        if graph_data.get("error"):
+            # Fingerprints are not recorded, so the next message retries these segments
+            merged = merge_graphs(state.graph, graph_data)
+        else:
+            state.graph = merge_graphs(state.graph, graph_data)
+            state.fingerprints.update(new_fingerprints)
+            state.updated_at = time.time()
+            merged = state.graph
+        graph_data.update(copy.deepcopy(merged))
+        graph_data["incremental"] = stats
+        return graph_data
+
+# --- LLM Refinement Logic ---
+def refine_entities(text: str, spacy_entities: List[Dict]) -> tuple:
+    """
+    Drop junk spaCy entities: the local filter settles confident cases and only
+    the uncertain entities are escalated to the LLM.
+    
+    Args:
+        text: Source text
+        spacy_entities: Raw spaCy entities
+        
+    Returns:
+        (kept entities in their original order, refinement statistics)
+    """
+    filter_start = time.perf_counter()
+    with stage_timer("refinement_filter", entities=len(spacy_entities)):
+        decisions = refinement_filter.classify(spacy_entities, len(text))
+    filter_ms = (time.perf_counter() - filter_start) * 1000.0
+
+    keep = [decision == DECISION_KEEP for decision, _ in decisions]
+    escalated = [i for i, (decision, _) in enumerate(decisions) if decision == DECISION_ESCALATE]
+    llm_ms = 0.0
+    deadline_exceeded = False
+    if escalated:
+        escalated_entities = [spacy_entities[i] for i in escalated]
+        llm_start = time.perf_counter()
+        try:
+            cleaned = refine_entities_with_llm(text, escalated_entities)
+        except DeadlineExceeded:
+            # Out of time: the uncertain entities are kept unrefined
+            cleaned, deadline_exceeded = escalated_entities, True
+        llm_ms = (time.perf_counter() - llm_start) * 1000.0
+        kept_flags = kept_by_llm(escalated_entities, cleaned)
+        for i, kept in zip(escalated, kept_flags):
+            keep[i] = kept
+        if refinement_decision_log is not None and not deadline_exceeded:
+            refinement_decision_log.record(len(text), escalated_entities, kept_flags)
+
+    counts = {
+        DECISION_KEEP: sum(1 for d, _ in decisions if d == DECISION_KEEP),
+        DECISION_DROP: sum(1 for d, _ in decisions if d == DECISION_DROP),
+        DECISION_ESCALATE: len(escalated),
+    }
+    for decision, count in counts.items():
+        REFINEMENT_DECISIONS.inc(count, decision=decision)
+    stats = {
+        "local_model": refinement_filter.enabled,
+        "local_kept": counts[DECISION_KEEP],
+        "local_dropped": counts[DECISION_DROP],
+        "escalated": counts[DECISION_ESCALATE],
+        "escalation_rate": round(len(escalated) / len(spacy_entities), 4) if spacy_entities else 0.0,
+        "filter_ms": round(filter_ms, 3),
+        "llm_ms": round(llm_ms, 1),
+        "deadline_exceeded": deadline_exceeded,
+    }
+    return [e for e, k in zip(spacy_entities, keep) if k], stats
+
+def refine_entities_with_llm(text: str, spacy_entities: List[Dict]) -> List[Dict]:
+    if not client:
+        raise HTTPException(status_code=503, detail="OpenAI client not configured.")
+
+    # Only what the keep/drop decision needs; kept entities are matched back on value
+    entities_json_str = json.dumps(
+        [{"value": e.get("value"), "label": e.get("spacy_label") or e.get("type")} for e in spacy_entities],
+        separators=(",", ":"),
+    )
+
+    prompt = f"""
+    Review the following JSON list of named entities extracted from an email.
+    Your task is to clean this list by removing any obvious errors.
+    An error is an entity that is clearly not a real-world person, company, location, or monetary value.
+    
+    For example, remove items like "Hi Team", "25", or "YoY".
+    Keep valid entities like "Vista Equity Partners", "David Chen", or "$40M".
+    
+    Return a JSON object with a single key "cleaned_entities" which contains the corrected list of entities.
+
+    **Original Text:**
     ---
     {text}
     ---
@@ -697,23 +2090,29 @@ def refine_entities_with_llm(text: str, spacy_entities: List[Dict]) -> List[Dict
     ---
     """
     
+    model = route_model("refinement", text)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
-        
-        refined_json_str = response.choices[0].message.content
-        if refined_json_str:
-            refined_data = json.loads(refined_json_str)
+        while True:
+            response = create_chat_completion(
+                "refinement",
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+            
+            refined_data = load_json_answer(response.choices[0].message.content)
             # Expecting the specific key "cleaned_entities"
-            if isinstance(refined_data, dict) and "cleaned_entities" in refined_data:
+            valid = isinstance(refined_data, dict) and "cleaned_entities" in refined_data
+            record_model_output("refinement", model, valid)
+            if valid:
                 return refined_data["cleaned_entities"]
-        
-        return [] # Return empty list if parsing fails or key is not found
+            model = escalate_model("refinement", model)
+            if model is None:
+                return [] # Return empty list if parsing fails or key is not found
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM refinement error: {str(e)}")
 
@@ -728,12 +2127,88 @@ app = FastAPI(
 extractor = SpacyEntityExtractor()
 embedding_model = None
 
+def resolve_endpoint_label(request: Request) -> str:
+    """
+    Resolve the route template (e.g. /object/{object_id}) for metrics labels,
+    so path parameters do not blow up label cardinality.
+    """
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+def admission_rejected_response(method: str, e: AdmissionRejected) -> JSONResponse:
+    """429/503 response with Retry-After for a shed request."""
+    ADMISSION_REJECTIONS.inc(endpoint=e.endpoint, reason=e.reason)
+    print(f"🚦 Shed {method} {e.endpoint} ({e.reason}); retry after {e.retry_after}s")
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"detail": f"Service overloaded ({e.reason}); retry after {e.retry_after} seconds."},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """
+    Admit requests to gated endpoints through their admission gate before the
+    body is read. Registered before metrics_middleware, so it runs inside it
+    and shed requests still show up in the request metrics.
+    """
+    endpoint = resolve_endpoint_label(request)
+    gate = admission_controller.gate_for(endpoint) if ADMISSION_CONTROL_ENABLED else None
+    if gate is None or endpoint in STREAMING_ENDPOINTS:
+        return await call_next(request)
+    try:
+        queued_seconds = await gate.acquire()
+    except AdmissionRejected as e:
+        return admission_rejected_response(request.method, e)
+    ADMISSION_WAIT.observe(queued_seconds, endpoint=gate.endpoint)
+    start = time.monotonic()
+    try:
+        return await call_next(request)
+    finally:
+        gate.release(time.monotonic() - start)
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    endpoint = resolve_endpoint_label(request)
+    current_endpoint.set(endpoint)  # For endpoint-based model routing rules
+    status = "500"
+    start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+        HTTP_REQUEST_LATENCY.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=status)
+
+@app.middleware("http")
+async def deadline_middleware(request: Request, call_next):
+    """
+    Start the request's deadline from the X-Request-Deadline header (or
+    REQUEST_DEADLINE_DEFAULT_SECONDS) on arrival. Registered last, so it runs
+    outermost and the admission queue wait counts against the deadline.
+    """
+    try:
+        seconds = parse_deadline_seconds(request.headers.get(DEADLINE_HEADER), REQUEST_DEADLINE_MAX_SECONDS)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": f"Invalid {DEADLINE_HEADER} header: {e}"})
+    seconds = seconds or REQUEST_DEADLINE_DEFAULT_SECONDS
+    if seconds:
+        current_deadline.set(Deadline(seconds))
+    return await call_next(request)
+
 @app.on_event("startup")
 async def startup_event():
     global embedding_model
     print("✅ NLP Service loading...")
     # This will download the model on the first run if it's not cached
     embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    refinement_filter.embedder = embedding_model
     print("✅ NLP Service loaded and ready.")
     if client:
         print("✅ OpenAI client configured.")
@@ -748,16 +2223,23 @@ async def extract_entities_endpoint(request: ExtractionRequest):
     - **text**: The input string to process.
     - **ontology**: Optional ontology name to scope the extraction.
     """
-    entities = extractor.extract_entities(request.text)
-    
-    # Get ontology configuration for graph data
-    ontology_config = get_ontology_by_name(request.ontology)
-    
-    # Add graph data to each entity
-    for entity in entities:
-        entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
-    
-    return entities
+    enter_priority("/extract-entities", request.priority)
+    with tracer.start_trace(generate_request_id(), "extract_entities", text_length=len(request.text)):
+        preprocessed = preprocess_text(request.text, request.sender, request.preprocess)
+        text = preprocessed.text if preprocessed else request.text
+        entities = await cpu_executor.run(extractor.extract_entities, text, cost=len(text))
+        if preprocessed:
+            preprocessed.map_entity_offsets(entities)
+        
+        # Get ontology configuration for graph data
+        ontology_config = get_ontology_by_name(request.ontology)
+        
+        # Add graph data to each entity
+        with stage_timer("graph_data"):
+            for entity in entities:
+                entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+        
+        return entities
     
 @app.post("/refine-entities", response_model=RefinedExtractionResponse, summary="Extract and Refine with LLM")
 async def refine_entities_endpoint(request: ExtractionRequest):
@@ -767,41 +2249,189 @@ async def refine_entities_endpoint(request: ExtractionRequest):
     - **ontology**: Optional ontology name to scope the extraction.
     """
     request_id = generate_request_id()
+    priority = enter_priority("/refine-entities", request.priority)
+    enter_latency_tier(request.latency_tier)
+    enter_deadline(request.deadline_seconds)
+    
+    with tracer.start_trace(request_id, "refine_entities", text_length=len(request.text)) as trace:
+        # Step 1: Raw extraction with spaCy (on the text without email boilerplate)
+        preprocessed = preprocess_text(request.text, request.sender, request.preprocess)
+        text = preprocessed.text if preprocessed else request.text
+        raw_entities = await cpu_executor.run(extractor.extract_entities, text, cost=len(text))
+        
+        # Step 2: Refine locally, escalating uncertain entities to the LLM
+        # (in a worker thread so the rate limiter never blocks the event loop)
+        refined_entities, refinement_stats = await asyncio.to_thread(refine_entities, text, raw_entities)
+        if preprocessed:
+            # Refined entities are the raw entity dicts, so mapping the raw list covers both
+            preprocessed.map_entity_offsets(raw_entities)
+        
+        # Get ontology configuration for graph data
+        ontology_config = get_ontology_by_name(request.ontology)
+        
+        # Add graph data to entities
+        with stage_timer("graph_data"):
+            for entity in raw_entities:
+                entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+            
+            for entity in refined_entities:
+                if "id" not in entity:
+                    entity["id"] = generate_entity_id(entity.get("type", ""), entity.get("value", ""))
+                entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+        
+        # Create graph metadata
+        graph_metadata = {
+            "request_id": request_id,
+            "text_length": len(request.text),
+            "raw_entity_count": len(raw_entities),
+            "refined_entity_count": len(refined_entities),
+            "refinement": refinement_stats,
+            "ontology_used": request.ontology or "default",
+            "extraction_timestamp": time.time(),
+            "priority": priority,
+        }
+        if preprocessed:
+            graph_metadata["preprocessing"] = preprocessed.stats()
+        if request.include_timings:
+            graph_metadata["timings"] = trace.breakdown()
+        
+        return RefinedExtractionResponse(
+            request_id=request_id,
+            raw_entities=[Entity(**e) for e in raw_entities],
+            refined_entities=[Entity(**e) for e in refined_entities],
+            refinement_info=(
+                "Entities refined by LLM." if not refinement_filter.enabled else
+                f"Entities refined locally; {refinement_stats['escalated']} escalated to LLM."
+            ),
+            ontology_used=request.ontology,
+            graph_metadata=graph_metadata
+        )
+
+def finalize_entity(entity: Dict[str, Any], ontology_config: Mapping[str, Any]) -> Dict[str, Any]:
+    """Give an extracted entity its type, ID and graph data (in place; an existing ID is kept)."""
+    # Patch: Ensure 'type' is present for Entity model
+    if "type" not in entity:
+        if "types" in entity and isinstance(entity["types"], list) and entity["types"]:
+            entity["type"] = entity["types"][0]
+        else:
+            entity["type"] = "Unknown"
+    if "id" not in entity:
+        entity["id"] = generate_entity_id(entity.get("type", ""), entity.get("value", ""))
+    entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+    return entity
+
+def finalize_relationship(rel: Dict[str, Any], ontology_config: Mapping[str, Any]) -> Dict[str, Any]:
+    """Give an extracted relationship its ID and graph data (in place; an existing ID is kept)."""
+    if "id" not in rel:
+        rel["id"] = generate_relationship_id(
+            rel.get("source", ""), 
+            rel.get("target", ""), 
+            rel.get("type", "")
+        )
+    rel["graph_data"] = create_relationship_graph_data(rel, ontology_config)
+    return rel
+
+def build_graph_response(
+    request_id: str,
+    text: str,
+    graph_data: Dict[str, Any],
+    ontology: Optional[str],
+    database_name: Optional[str],
+    extra_metadata: Optional[Dict[str, Any]] = None,
+) -> GraphResponse:
+    """
+    Turn raw LLM graph output into a GraphResponse: assign IDs, attach graph
+    data, embed the text and build the graph metadata.
     
-    # Step 1: Raw extraction with spaCy
-    raw_entities = extractor.extract_entities(request.text)
-    
-    # Step 2: Refine with LLM
-    refined_entities = refine_entities_with_llm(request.text, raw_entities)
-    
+    Args:
+        request_id: Request identifier stamped on the response
+        text: Source text as extracted (embedded as a whole; after email pre-processing when enabled)
+        graph_data: Entities/relationships returned by the extraction step
+        ontology: Ontology name used for the extraction
+        database_name: Target database name
+        extra_metadata: Additional graph_metadata fields
+        
+    Returns:
+        GraphResponse for the text
+    """
     # Get ontology configuration for graph data
-    ontology_config = get_ontology_by_name(request.ontology)
+    ontology_config = get_ontology_by_name(ontology)
     
-    # Add graph data to entities
-    for entity in raw_entities:
-        entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+    with stage_timer("graph_data"):
+        # Process entities: add IDs and graph data
+        entities = graph_data.get("entities", [])
+        for entity in entities:
+            finalize_entity(entity, ontology_config)
+        
+        # Process relationships: add IDs and graph data
+        relationships = graph_data.get("relationships", [])
+        for rel in relationships:
+            finalize_relationship(rel, ontology_config)
     
-    for entity in refined_entities:
-        if "id" not in entity:
-            entity["id"] = generate_entity_id(entity.get("type", ""), entity.get("value", ""))
-        entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
+    # Generate a single embedding for the whole text (already computed when the ontology was pruned)
+    embedding = None
+    text_embedding = graph_data.pop("text_embedding", None)
+    deadline = current_deadline.get()
+    # Past the request deadline the response goes out without an embedding
+    embedding_skipped = text_embedding is None and deadline is not None and deadline.expired()
+    if text_embedding is not None:
+        embedding = text_embedding.tolist()
+    elif embedding_model and not embedding_skipped:
+        with stage_timer("embedding"):
+            embedding = embedding_model.encode(text).tolist()
     
     # Create graph metadata
     graph_metadata = {
         "request_id": request_id,
-        "text_length": len(request.text),
-        "raw_entity_count": len(raw_entities),
-        "refined_entity_count": len(refined_entities),
-        "ontology_used": request.ontology or "default",
-        "extraction_timestamp": time.time()
+        "text_length": len(text),
+        "entity_count": len(entities),
+        "relationship_count": len(relationships),
+        "ontology_used": ontology or "default",
+        "database_used": database_name,
+        "extraction_timestamp": time.time(),
+        "has_embedding": embedding is not None,
+        "llm_attempts": graph_data.get("attempts"),
+        "extraction_mode": graph_data.get("extraction_mode", EXTRACTION_MODE_LLM),
+        "anchor_entity_count": graph_data.get("anchor_count", 0),
+        "priority": current_priority.get(),
+        "llm_model": graph_data.get("llm_model"),
+        "failed": bool(graph_data.get("error")),
+        "partial": bool(graph_data.get("degradation")) or embedding_skipped,
     }
-    
-    return RefinedExtractionResponse(
+    if graph_data.get("preprocessing"):
+        graph_metadata["preprocessing"] = graph_data["preprocessing"]
+    if graph_data.get("incremental"):
+        graph_metadata["incremental"] = graph_data["incremental"]
+    if graph_data.get("near_duplicate"):
+        graph_metadata["near_duplicate"] = graph_data["near_duplicate"]
+    if graph_data.get("ontology_pruning"):
+        graph_metadata["ontology_pruning"] = graph_data["ontology_pruning"]
+    if graph_data.get("sentence_pruning"):
+        graph_metadata["sentence_pruning"] = graph_data["sentence_pruning"]
+    if graph_data.get("parsing"):
+        graph_metadata["parsing"] = graph_data["parsing"]
+    if graph_data.get("error"):
+        graph_metadata["error_class"] = graph_data["error"]["error_class"]
+        graph_metadata["llm_error"] = graph_data["error"]
+    if graph_data.get("degradation"):
+        graph_metadata["degradation"] = graph_data["degradation"]
+    if deadline is not None:
+        graph_metadata["deadline"] = {
+            "budget_seconds": deadline.budget,
+            "remaining_seconds": round(deadline.remaining(), 3),
+            "embedding_skipped": embedding_skipped,
+        }
+    if extra_metadata:
+        graph_metadata.update(extra_metadata)
+
+    return GraphResponse(
         request_id=request_id,
-        raw_entities=[Entity(**e) for e in raw_entities],
-        refined_entities=[Entity(**e) for e in refined_entities],
-        refinement_info="Entities refined by LLM.",
-        ontology_used=request.ontology,
+        entities=[Entity(**e) for e in entities],
+        relationships=[Relationship(**r) for r in relationships],
+        refinement_info=graph_data.get("refinement_info", "Graph generated directly by LLM based on dynamic ontology."),
+        embedding=embedding,
+        ontology_used=ontology,
+        database_used=database_name,
         graph_metadata=graph_metadata
     )
 
@@ -811,69 +2441,168 @@ async def extract_graph_endpoint(request: ExtractionRequest):
     Extracts a knowledge graph (entities and relationships) from text using an LLM,
     constrained by a predefined ontology.
 
+    Concurrent requests for the same text, ontology, database and extraction
+    mode share one extraction; each gets its own request_id, and the ones
+    that joined an in-flight extraction have `graph_metadata.coalesced` set.
+
+    With email pre-processing enabled, quoted replies, signatures,
+    disclaimers, footers and HTML markup are stripped before extraction;
+    entity offsets point into the original text and
+    `graph_metadata.preprocessing` reports the tokens saved.
+
+    Requests run in the `interactive` priority class unless `priority` says
+    `bulk`; interactive LLM calls and CPU work go ahead of queued bulk work.
+
+    With a deadline (`X-Request-Deadline` header or `deadline_seconds`), an
+    extraction that runs out of time, or whose LLM call fails, returns what
+    it has completed with spaCy entities; `graph_metadata.partial` is set and
+    `graph_metadata.degradation` gives the reason.
+
     - **text**: The input string to process.
     - **ontology**: Optional ontology name to scope the extraction.
     """
     request_id = generate_request_id()
-    
-    # Get database name from request or environment
-    database_name = get_database_name(request.database)
-    
-    graph_data = extract_graph_with_llm(request.text, request.ontology, database_name)
-    
-    # Get ontology configuration for graph data
-    ontology_config = get_ontology_by_name(request.ontology)
-    
-    # Process entities: add IDs and graph data
-    entities = graph_data.get("entities", [])
-    for entity in entities:
-        # Patch: Ensure 'type' is present for Entity model
-        if "type" not in entity:
-            if "types" in entity and isinstance(entity["types"], list) and entity["types"]:
-                entity["type"] = entity["types"][0]
+    enter_priority("/extract-graph", request.priority)
+    enter_latency_tier(request.latency_tier)
+    deadline = enter_deadline(request.deadline_seconds)
+    
+    with tracer.start_trace(request_id, "extract_graph", ontology=request.ontology or "default",
+                            text_length=len(request.text)) as trace:
+        # Get database name from request or environment
+        database_name = get_database_name(request.database)
+        mode = resolve_extraction_mode(request.extraction_mode)
+
+        async def extract() -> GraphResponse:
+            preprocessed = preprocess_text(request.text, request.sender, request.preprocess)
+            text = preprocessed.text if preprocessed else request.text
+            if request.thread_key:
+                graph_data = await extract_thread_increment(
+                    text, request.thread_key, request.ontology, database_name,
+                    max_retries=request.max_retries, mode=mode,
+                )
             else:
-                entity["type"] = "Unknown"
-        if "id" not in entity:
-            entity["id"] = generate_entity_id(entity.get("type", ""), entity.get("value", ""))
-        entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
-    
-    # Process relationships: add IDs and graph data
-    relationships = graph_data.get("relationships", [])
-    for rel in relationships:
-        if "id" not in rel:
-            rel["id"] = generate_relationship_id(
-                rel.get("source", ""), 
-                rel.get("target", ""), 
-                rel.get("type", "")
+                graph_data = await extract_graph_with_llm_async(
+                    text, request.ontology, database_name, max_retries=request.max_retries, mode=mode,
+                )
+            if preprocessed:
+                preprocessed.map_entity_offsets(graph_data.get("entities", []))
+                graph_data["preprocessing"] = preprocessed.stats()
+            return build_graph_response(request_id, text, graph_data, request.ontology, database_name)
+
+        if REQUEST_COALESCING_ENABLED:
+            key = coalescing_key(
+                "extract-graph", request.text, request.ontology, database_name, mode, request.thread_key,
+                request.sender, str(request.preprocess), current_latency_tier.get(), current_priority.get(),
+                str(deadline.budget) if deadline else None,
             )
-        rel["graph_data"] = create_relationship_graph_data(rel, ontology_config)
-    
-    # Generate a single embedding for the whole text
-    embedding = None
-    if embedding_model:
-        embedding = embedding_model.encode(request.text).tolist()
-    
-    # Create graph metadata
-    graph_metadata = {
-        "request_id": request_id,
-        "text_length": len(request.text),
-        "entity_count": len(entities),
-        "relationship_count": len(relationships),
-        "ontology_used": request.ontology or "default",
-        "database_used": database_name,
-        "extraction_timestamp": time.time(),
-        "has_embedding": embedding is not None
-    }
+            with tracer.span("coalesce") as coalesce_span:
+                response, shared = await extraction_flights.do(key, extract)
+                if coalesce_span is not None:
+                    coalesce_span.set_attribute("shared", shared)
+            record_cache_lookup("extract_graph_single_flight", shared)
+            if shared:
+                response.request_id = request_id
+                response.graph_metadata["request_id"] = request_id
+                response.graph_metadata["coalesced"] = True
+        else:
+            response = await extract()
 
-    return GraphResponse(
-        request_id=request_id,
-        entities=[Entity(**e) for e in entities],
-        relationships=[Relationship(**r) for r in relationships],
-        refinement_info=graph_data.get("refinement_info", "Graph generated directly by LLM based on dynamic ontology."),
-        embedding=embedding,
-        ontology_used=request.ontology,
-        database_used=database_name,
-        graph_metadata=graph_metadata
+        if request.include_timings:
+            response.graph_metadata["timings"] = trace.breakdown()
+        return response
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+
+@app.post("/extract-graph/stream", summary="Stream Entities and Relationships as the LLM writes them")
+async def extract_graph_stream_endpoint(request: ExtractionRequest):
+    """
+    Server-sent events variant of /extract-graph. The LLM answer is streamed
+    and parsed incrementally, so each entity and relationship is sent as soon
+    as the LLM has finished writing it, instead of after the whole answer.
+
+    Events:
+    - **entity**: One entity, with its `id` and `graph_data` (hybrid anchors come first)
+    - **relationship**: One relationship, with its `id` and `graph_data`
+    - **done**: The complete GraphResponse, made of the entities and relationships sent before
+    - **error**: Extraction could not run (`error_class`, `message`)
+
+    An extraction that fails after elements were sent is not retried; its
+    `done` event has `graph_metadata.failed` set and keeps the elements sent.
+    A stream still running at the request deadline is cut off the same way.
+    Either way, spaCy entities not sent yet follow as `entity` events before
+    `done`, which has `graph_metadata.partial` set.
+    `thread_key` is not supported.
+
+    The admission slot is held until the stream ends, not just until the
+    headers are sent.
+    """
+    if request.thread_key:
+        raise HTTPException(status_code=400, detail="'thread_key' is not supported for streaming extraction.")
+    request_id = generate_request_id()
+    enter_priority("/extract-graph/stream", request.priority)
+    enter_latency_tier(request.latency_tier)
+    enter_deadline(request.deadline_seconds)
+    database_name = get_database_name(request.database)
+    mode = resolve_extraction_mode(request.extraction_mode)
+    gate = admission_controller.gate_for("/extract-graph/stream") if ADMISSION_CONTROL_ENABLED else None
+    if gate is not None:
+        try:
+            queued_seconds = await gate.acquire()
+        except AdmissionRejected as e:
+            return admission_rejected_response("POST", e)
+        ADMISSION_WAIT.observe(queued_seconds, endpoint=gate.endpoint)
+    admitted_at = time.monotonic()
+    released = False
+
+    def release_slot() -> None:
+        nonlocal released
+        if gate is not None and not released:
+            released = True
+            gate.release(time.monotonic() - admitted_at)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            with tracer.start_trace(request_id, "extract_graph_stream", ontology=request.ontology or "default",
+                                    text_length=len(request.text)) as trace:
+                try:
+                    preprocessed = preprocess_text(request.text, request.sender, request.preprocess)
+                    text = preprocessed.text if preprocessed else request.text
+                    ontology_config = get_ontology_by_name(request.ontology)
+                    async for kind, item in stream_graph_extraction_async(
+                        text, request.ontology, max_retries=request.max_retries, mode=mode,
+                    ):
+                        if kind == "entity":
+                            # Offsets are mapped first so text_position is built from the original text
+                            if preprocessed:
+                                preprocessed.map_entity_offsets([item])
+                            yield sse_event("entity", finalize_entity(item, ontology_config))
+                        elif kind == "relationship":
+                            yield sse_event("relationship", finalize_relationship(item, ontology_config))
+                        else:
+                            if preprocessed:
+                                item["preprocessing"] = preprocessed.stats()
+                            response = build_graph_response(
+                                request_id, text, item, request.ontology, database_name,
+                                extra_metadata={"streamed": True, "streamed_elements": item.get("streamed_elements", 0)},
+                            )
+                            if request.include_timings:
+                                response.graph_metadata["timings"] = trace.breakdown()
+                            yield sse_event("done", response)
+                except Exception as e:
+                    print(f"Error streaming extraction {request_id}: {e}")
+                    detail = e.detail if isinstance(e, HTTPException) else str(e)
+                    yield sse_event("error", {"request_id": request_id, "error_class": classify_llm_error(e), "message": detail})
+        finally:
+            release_slot()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Releases the slot of a stream whose body never started (client gone before the first chunk)
+        background=BackgroundTask(release_slot),
     )
 
 @app.post("/embed", summary="Generate sentence embeddings for a list of texts")
@@ -885,26 +2614,24 @@ async def embed_endpoint(request: EmbeddingRequest):
     if not embedding_model:
         raise HTTPException(status_code=503, detail="Embedding model not available.")
     
-    embeddings = embedding_model.encode(request.texts).tolist()
+    with stage_timer("embedding"):
+        embeddings = embedding_model.encode(request.texts).tolist()
     return {"embeddings": embeddings}
 
 @app.post("/ontologies", status_code=204, summary="Update the list of valid ontology types")
-async def update_ontologies(request: OntologyUpdateRequest):
+async def update_ontologies(request: OntologyUpdateRequest, response: Response):
     """
     Receives the latest ontology from the TypeScript backend including optional
     descriptions so the LLM can leverage richer schema context.
     Supports both full ontology format and compact format.
+
+    Re-posting an identical ontology is a no-op. Otherwise only cached results
+    that depend on changed types are invalidated. The `X-Ontology-Version` and
+    `X-Ontology-Changed` response headers report the outcome.
     - **ontology**: Optional name for the ontology (defaults to 'default').
     """
-    global VALID_ONTOLOGY_TYPES, VALID_RELATIONSHIP_TYPES, PROPERTY_ENTITY_TYPES
-    global ENTITY_DESCRIPTIONS, RELATIONSHIP_DESCRIPTIONS
-
     # Determine ontology name
     ontology = request.ontology or DEFAULT_ONTOLOGY_NAME
-    
-    # Initialize ontology if it doesn't exist
-    if ontology not in ONTOLOGIES:
-        ONTOLOGIES[ontology] = {}
 
     # Handle compact ontology format
     if request.compact_ontology:
@@ -921,27 +2648,16 @@ async def update_ontologies(request: OntologyUpdateRequest):
             if len(rel) == 3:
                 relationship_types.append(rel[1])  # rel[1] is the relationship type
         
-        # Store in the specific ontology
-        ONTOLOGIES[ontology] = {
-            "entity_types": entity_types,
-            "relationship_types": relationship_types,
-            "property_types": property_types,
-            "entity_descriptions": entity_descriptions,
-            "relationship_descriptions": relationship_descriptions,
-            "compact_ontology": compact
-        }
-        
-        # Also update global state for backward compatibility
-        VALID_ONTOLOGY_TYPES = entity_types
-        VALID_RELATIONSHIP_TYPES = relationship_types
-        PROPERTY_ENTITY_TYPES = property_types
-        ENTITY_DESCRIPTIONS = entity_descriptions
-        RELATIONSHIP_DESCRIPTIONS = relationship_descriptions
-        
-        print(
-            f"✅ Compact ontology '{ontology}' updated: {len(entity_types)} entities, "
-            f"{len(relationship_types)} relationships"
+        snapshot = OntologySnapshot(
+            ontology,
+            entity_types=entity_types,
+            relationship_types=relationship_types,
+            property_types=property_types,
+            entity_descriptions=entity_descriptions,
+            relationship_descriptions=relationship_descriptions,
+            compact_ontology=compact,
         )
+        summary = f"Compact ontology '{{version}}' updated: {len(entity_types)} entities, {len(relationship_types)} relationships"
 
         # --- DEBUG: Persist compact ontology to disk (optional) ---
         if os.getenv("ENABLE_PROMPT_DEBUG", "0") == "1":
@@ -962,110 +2678,115 @@ async def update_ontologies(request: OntologyUpdateRequest):
         entity_descriptions = request.entity_descriptions or {}
         relationship_descriptions = request.relationship_descriptions or {}
         
-        # Store in the specific ontology
-        ONTOLOGIES[ontology] = {
-            "entity_types": entity_types,
-            "relationship_types": relationship_types,
-            "property_types": property_types,
-            "entity_descriptions": entity_descriptions,
-            "relationship_descriptions": relationship_descriptions
-        }
-        
-        # Also update global state for backward compatibility
-        VALID_ONTOLOGY_TYPES = entity_types
-        VALID_RELATIONSHIP_TYPES = relationship_types
-        PROPERTY_ENTITY_TYPES = property_types
-        ENTITY_DESCRIPTIONS = entity_descriptions
-        RELATIONSHIP_DESCRIPTIONS = relationship_descriptions
-        
-        print(
-            f"✅ Full ontology '{ontology}' updated: {len(entity_types)} entities, "
+        snapshot = OntologySnapshot(
+            ontology,
+            entity_types=entity_types,
+            relationship_types=relationship_types,
+            property_types=property_types,
+            entity_descriptions=entity_descriptions,
+            relationship_descriptions=relationship_descriptions,
+        )
+        summary = (
+            f"Full ontology '{{version}}' updated: {len(entity_types)} entities, "
             f"{len(property_types)} property types, "
             f"{len(relationship_types)} relationships, "
             f"{len(entity_descriptions)} descriptions"
         )
 
-@app.post("/batch-extract-graph", response_model=List[GraphResponse], summary="Batch Extract Graphs from Multiple Texts")
-async def batch_extract_graph_endpoint(request: BatchExtractionRequest):
-    """
-    Processes a batch of texts concurrently to extract knowledge graphs.
-    This is much more efficient than calling /extract-graph in a loop.
-    - **texts**: List of texts to process.
-    - **ontology**: Optional ontology name to scope the extraction.
+    previous = ontology_registry.get(ontology)
+    if previous is not None and previous.content_hash == snapshot.content_hash:
+        # The backend re-posts its ontologies on every deploy; nothing to publish or invalidate
+        ONTOLOGY_UPDATES.inc(outcome="unchanged")
+        response.headers["X-Ontology-Version"] = previous.version_id
+        response.headers["X-Ontology-Changed"] = "0"
+        print(f"⏭️  Ontology '{previous.version_id}' unchanged; caches kept")
+        return
+
+    # Publish the new snapshot; requests in flight keep the one they started with
+    ontology_registry.publish(snapshot)
+    ONTOLOGY_UPDATES.inc(outcome="changed" if previous is not None else "created")
+    response.headers["X-Ontology-Version"] = snapshot.version_id
+    response.headers["X-Ontology-Changed"] = "1"
+    print(f"✅ {summary.format(version=snapshot.version_id)}")
+    if previous is not None:
+        invalidate_ontology_caches(previous, snapshot)
+
+def invalidate_ontology_caches(previous: OntologySnapshot, snapshot: OntologySnapshot) -> None:
     """
-    # Get database name from request or environment
-    database_name = get_database_name(request.database)
+    Drop only the cached results and derived values that depend on what
+    changed between two versions of an ontology.
     
-    print(f"--- Received batch request for {len(request.texts)} documents using ontology: {request.ontology or 'default'} and database: {database_name} ---")
-    batch_start_time = time.time()
-
-    # Process each text individually to add IDs and graph data
-    results = []
-    for i, text in enumerate(request.texts):
+    Args:
+        previous: Replaced snapshot
+        snapshot: Newly published snapshot
+    """
+    ontology = snapshot.name
+    diff = diff_snapshots(previous, snapshot)
+    print(f"🔀 Ontology diff {previous.version_id} -> {snapshot.version_id}: {json.dumps(diff.as_dict())}")
+
+    # Derived prompt values whose inputs are unchanged carry over to the new version
+    if (previous.core_entity_types == snapshot.core_entity_types
+            and previous.relationship_types == snapshot.relationship_types
+            and previous.get("compact_ontology", {}).get("r") == snapshot.get("compact_ontology", {}).get("r")):
+        snapshot.inherit_derived(previous, ["compact_prompt_block"])
+    if previous.entity_types == snapshot.entity_types and previous.property_types == snapshot.property_types:
+        snapshot.inherit_derived(previous, ["anchor_types"])
+
+    # The pruning index embeds type names and descriptions; rebuilt lazily on the next request
+    if diff.entity_types_changed or diff.changed_descriptions:
+        ontology_pruner.invalidate(ontology)
+        ONTOLOGY_CACHE_INVALIDATIONS.inc(cache="ontology_pruning")
+
+    # Cached graphs stay valid unless types were added (any of them may lack the new
+    # types) or they contain a type whose meaning changed
+    if diff.types_added or diff.affected_types():
+        dropped = near_duplicate_index.clear_scope(lambda scope: scope[0] == ontology, diff.invalidates)
+        ONTOLOGY_CACHE_INVALIDATIONS.inc(dropped, cache="near_duplicate")
+        dropped = thread_store.drop(lambda key: key[1] == ontology, diff.invalidates)
+        ONTOLOGY_CACHE_INVALIDATIONS.inc(dropped, cache="thread_store")
+
+async def extract_batch_document(
+    index: int,
+    text: str,
+    request: BatchExtractionRequest,
+    database_name: Optional[str],
+    batch_request_id: str,
+    preprocessed: Optional[PreprocessedText] = None,
+) -> GraphResponse:
+    """
+    Extract the graph for one document of a batch under its own 'document' span.
+    Errors are reported in the document's response instead of failing the batch.
+    ``text`` is the cleaned text of ``preprocessed``, if the document was pre-processed.
+    """
+    with tracer.span("document", batch_index=index, text_length=len(text)) as document_span:
         try:
             # Extract graph data
-            graph_data = extract_graph_with_llm(text, request.ontology, database_name)
-            
-            # Get ontology configuration for graph data
-            ontology_config = get_ontology_by_name(request.ontology)
+            graph_data = await extract_graph_with_llm_async(
+                text, request.ontology, database_name, max_retries=request.max_retries,
+                mode=resolve_extraction_mode(request.extraction_mode),
+            )
+            if preprocessed:
+                preprocessed.map_entity_offsets(graph_data.get("entities", []))
+                graph_data["preprocessing"] = preprocessed.stats()
             
             # Generate request ID
             request_id = generate_request_id()
+            document_span.set_attribute("document_request_id", request_id)
             
-            # Process entities: add IDs and graph data
-            entities = graph_data.get("entities", [])
-            for entity in entities:
-                if "id" not in entity:
-                    entity["id"] = generate_entity_id(entity.get("type", ""), entity.get("value", ""))
-                entity["graph_data"] = create_entity_graph_data(entity, ontology_config)
-            
-            # Process relationships: add IDs and graph data
-            relationships = graph_data.get("relationships", [])
-            for rel in relationships:
-                if "id" not in rel:
-                    rel["id"] = generate_relationship_id(
-                        rel.get("source", ""), 
-                        rel.get("target", ""), 
-                        rel.get("type", "")
-                    )
-                rel["graph_data"] = create_relationship_graph_data(rel, ontology_config)
-            
-            # Generate embedding
-            embedding = None
-            if embedding_model:
-                embedding = embedding_model.encode(text).tolist()
-            
-            # Create graph metadata
-            graph_metadata = {
-                "request_id": request_id,
-                "text_length": len(text),
-                "entity_count": len(entities),
-                "relationship_count": len(relationships),
-                "ontology_used": request.ontology or "default",
-                "database_used": database_name,
-                "extraction_timestamp": time.time(),
-                "has_embedding": embedding is not None,
-                "batch_index": i
-            }
-            
-            # Create GraphResponse
-            result = GraphResponse(
-                request_id=request_id,
-                entities=[Entity(**e) for e in entities],
-                relationships=[Relationship(**r) for r in relationships],
-                refinement_info=graph_data.get("refinement_info", "Graph generated directly by LLM based on dynamic ontology."),
-                embedding=embedding,
-                ontology_used=request.ontology,
-                database_used=database_name,
-                graph_metadata=graph_metadata
+            result = build_graph_response(
+                request_id, text, graph_data, request.ontology, database_name,
+                extra_metadata={"batch_index": index, "batch_request_id": batch_request_id},
             )
-            
-            results.append(result)
+            if request.include_timings:
+                result.graph_metadata["timings"] = tracer.current_trace.breakdown(document_span)
+            return result
             
         except Exception as e:
-            print(f"Error processing text {i}: {e}")
+            print(f"Error processing text {index}: {e}")
+            document_span.status = "error"
+            document_span.set_attribute("error", str(e))
             # Create an error response
-            error_result = GraphResponse(
+            return GraphResponse(
                 request_id=generate_request_id(),
                 entities=[],
                 relationships=[],
@@ -1075,33 +2796,209 @@ async def batch_extract_graph_endpoint(request: BatchExtractionRequest):
                 database_used=database_name,
                 graph_metadata={
                     "error": str(e),
-                    "text_index": i,
-                    "extraction_timestamp": time.time()
+                    "error_class": classify_llm_error(e),
+                    "failed": True,
+                    "text_index": index,
+                    "batch_index": index,
+                    "batch_request_id": batch_request_id,
+                    "extraction_timestamp": time.time(),
+                    **({"preprocessing": preprocessed.stats()} if preprocessed else {}),
                 }
             )
-            results.append(error_result)
+
+async def extract_batch_pack(
+    indices: List[int],
+    texts: List[str],
+    request: BatchExtractionRequest,
+    database_name: Optional[str],
+    batch_request_id: str,
+    preprocessed: List[Optional[PreprocessedText]],
+) -> List[GraphResponse]:
+    """
+    Extract a pack of short batch documents with one LLM call under a 'pack'
+    span. Documents missing from the packed answer are extracted on their own.
+    ``texts`` are the cleaned texts of ``preprocessed`` where a document was pre-processed.
+    """
+    pack_id = generate_request_id()
+    with tracer.span("pack", pack_id=pack_id, documents=len(texts)) as pack_span:
+        try:
+            packed = await extract_packed_graphs_async(texts, request.ontology, max_retries=request.max_retries)
+        except Exception as e:
+            print(f"Error processing pack {pack_id}: {e}")
+            packed = {}
+        pack_span.set_attribute("packed_documents", len(packed))
+
+        results: List[Optional[GraphResponse]] = [None] * len(texts)
+        for position, graph_data in packed.items():
+            index, text = indices[position], texts[position]
+            if preprocessed[position]:
+                preprocessed[position].map_entity_offsets(graph_data.get("entities", []))
+                graph_data["preprocessing"] = preprocessed[position].stats()
+            with tracer.span("document", batch_index=index, text_length=len(text)) as document_span:
+                request_id = generate_request_id()
+                document_span.set_attribute("document_request_id", request_id)
+                result = build_graph_response(
+                    request_id, text, graph_data, request.ontology, database_name,
+                    extra_metadata={
+                        "batch_index": index,
+                        "batch_request_id": batch_request_id,
+                        "pack": {"pack_id": pack_id, "pack_size": len(texts)},
+                    },
+                )
+            if request.include_timings:
+                # The LLM call belongs to the pack, so report the pack's breakdown
+                result.graph_metadata["timings"] = tracer.current_trace.breakdown(pack_span)
+            results[position] = result
+
+        fallback = [position for position in range(len(texts)) if results[position] is None]
+        PACKED_DOCUMENTS.inc(len(packed), outcome="packed")
+        if fallback:
+            PACKED_DOCUMENTS.inc(len(fallback), outcome="fallback")
+            print(f"      [LLM Trace] Pack {pack_id}: {len(fallback)}/{len(texts)} documents fall back to single extraction")
+            singles = await asyncio.gather(*(
+                extract_batch_document(
+                    indices[position], texts[position], request, database_name, batch_request_id,
+                    preprocessed[position],
+                )
+                for position in fallback
+            ))
+            for position, result in zip(fallback, singles):
+                results[position] = result
+    return results
+
+@app.post("/batch-extract-graph", response_model=List[GraphResponse], summary="Batch Extract Graphs from Multiple Texts")
+async def batch_extract_graph_endpoint(request: BatchExtractionRequest, response: Response):
+    """
+    Processes a batch of texts concurrently to extract knowledge graphs.
+    This is much more efficient than calling /extract-graph in a loop.
+    LLM calls are admitted through the shared rate limiter, so large batches
+    queue instead of tripping OpenAI rate limits.
+
+    Documents whose extraction failed after retries have `graph_metadata.failed`
+    set (with `error_class`), and their batch indices are listed in the
+    `X-Failed-Indices` response header so only those texts need re-submitting
+    (pass their original positions in `indices` to keep `batch_index` stable).
+
+    With packing enabled (`pack_documents` or BATCH_PACKING_ENABLED), short
+    texts are grouped by token budget and extracted several per LLM call;
+    their `graph_metadata.pack` identifies the pack.
+
+    With email pre-processing (`preprocess` or EMAIL_PREPROCESSING_ENABLED),
+    boilerplate is stripped from each text first (`senders` enables
+    per-sender templates); entity offsets still point into the original text.
+
+    Batches run in the `bulk` priority class unless `priority` says
+    `interactive`: they get a weighted share of LLM slots and CPU threads
+    while interactive requests wait, and their shortest documents go first.
+
+    A deadline (`X-Request-Deadline` or `deadline_seconds`) covers the whole
+    batch: documents not extracted in time come back as partial spaCy graphs
+    (`graph_metadata.partial`) and are listed in `X-Failed-Indices`.
+    - **texts**: List of texts to process.
+    - **ontology**: Optional ontology name to scope the extraction.
+    - **indices**: Optional original batch positions of the texts.
+    """
+    if request.indices is not None and len(request.indices) != len(request.texts):
+        raise HTTPException(status_code=400, detail="'indices' must have the same length as 'texts'.")
+    batch_indices = request.indices if request.indices is not None else list(range(len(request.texts)))
+    if request.senders is not None and len(request.senders) != len(request.texts):
+        raise HTTPException(status_code=400, detail="'senders' must have the same length as 'texts'.")
+    mode = resolve_extraction_mode(request.extraction_mode)  # Reject an invalid mode once, not per document
+    enter_priority("/batch-extract-graph", request.priority)
+    enter_latency_tier(request.latency_tier)
+    enter_deadline(request.deadline_seconds)
+    pack_documents = BATCH_PACKING_ENABLED if request.pack_documents is None else request.pack_documents
+
+    # Get database name from request or environment
+    database_name = get_database_name(request.database)
+    
+    print(f"--- Received batch request for {len(request.texts)} documents using ontology: {request.ontology or 'default'} and database: {database_name} ---")
+    batch_start_time = time.time()
+
+    # Process each text concurrently; results keep the order of request.texts
+    batch_request_id = generate_request_id()
+    with tracer.start_trace(batch_request_id, "batch_extract_graph", ontology=request.ontology or "default",
+                            documents=len(request.texts)):
+        senders = request.senders or [None] * len(request.texts)
+        preprocessed = [
+            preprocess_text(text, sender, request.preprocess) for text, sender in zip(request.texts, senders)
+        ]
+        texts = [p.text if p else text for p, text in zip(preprocessed, request.texts)]
+
+        if pack_documents and mode == EXTRACTION_MODE_LLM:
+            # Shortest packs are started (and so queued) first
+            packs = sorted(plan_packs(texts, BATCH_PACKING_POLICY), key=lambda pack: sum(len(texts[p]) for p in pack))
+            pack_results = await asyncio.gather(*(
+                extract_batch_pack(
+                    [batch_indices[p] for p in pack], [texts[p] for p in pack],
+                    request, database_name, batch_request_id, [preprocessed[p] for p in pack],
+                ) if len(pack) > 1 else
+                asyncio.gather(extract_batch_document(
+                    batch_indices[pack[0]], texts[pack[0]], request, database_name, batch_request_id,
+                    preprocessed[pack[0]],
+                ))
+                for pack in packs
+            ))
+            results: List[Optional[GraphResponse]] = [None] * len(texts)
+            for pack, pack_result in zip(packs, pack_results):
+                for position, result in zip(pack, pack_result):
+                    results[position] = result
+            print(f"--- Packed {len(texts)} documents into {len(packs)} packs ---")
+        else:
+            # Shortest documents are started (and so queued) first
+            order = sorted(range(len(texts)), key=lambda position: len(texts[position]))
+            ordered_results = await asyncio.gather(*(
+                extract_batch_document(
+                    batch_indices[position], texts[position], request, database_name, batch_request_id,
+                    preprocessed[position],
+                )
+                for position in order
+            ))
+            results = [None] * len(texts)
+            for position, result in zip(order, ordered_results):
+                results[position] = result
+    
+    failed_indices = [
+        i for i, result in zip(batch_indices, results)
+        if result.graph_metadata and result.graph_metadata.get("failed")
+    ]
+    response.headers["X-Failed-Indices"] = ",".join(str(i) for i in failed_indices)
     
     batch_end_time = time.time()
-    print(f"--- Completed batch processing in {batch_end_time - batch_start_time:.2f} seconds ---")
+    print(f"--- Completed batch processing in {batch_end_time - batch_start_time:.2f} seconds ({len(failed_indices)} failed) ---")
     
-    return results
+    return list(results)
 
 @app.get("/health")
 def health_check():
     """Simple health check to confirm the service is running."""
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics")
+def metrics_endpoint():
+    """
+    Exposes request rates, latency histograms, per-stage timings, LLM token
+    usage and cache hit ratios in the Prometheus text format.
+    """
+    update_limiter_gauges(llm_rate_limiter.snapshot())
+    for priority, queued in cpu_executor.queued().items():
+        CPU_EXECUTOR_QUEUED.set(queued, priority=priority)
+    for gate in admission_controller.gates.values():
+        ADMISSION_QUEUE_DEPTH.set(gate.queued, endpoint=gate.endpoint)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/ontologies", summary="Get available ontologies")
 async def get_ontologies():
     """
     Get list of available ontologies and their configurations.
     """
-    available_ontologies = get_available_ontologies()
+    snapshots = ontology_registry.snapshots()  # One consistent view of all ontologies
+    available_ontologies = list(snapshots)
     
     ontology_details = {}
-    for name in available_ontologies:
-        config = ONTOLOGIES[name]
+    for name, config in snapshots.items():
         ontology_details[name] = {
+            "version": config.version_id,
             "entity_types": config.get("entity_types", []),
             "relationship_types": config.get("relationship_types", []),
             "property_types": config.get("property_types", []),
@@ -1200,17 +3097,18 @@ async def search_objects(object_type: Optional[str] = None, value: Optional[str]
 
 @app.post("/analyze-entity-importance", summary="Analyze entity importance using LLM")
 async def analyze_entity_importance(request: AnalyzeEntityImportanceRequest):
-    if not client:
-        raise HTTPException(status_code=503, detail="OpenAI client not configured.")
+    if not async_client:
+        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        data = await request_json_answer_async(
+            "entity_importance",
+            request.prompt,
+            # An empty answer is an empty analysis, as before escalation existed
+            allow_empty=True,
             messages=[{"role": "user", "content": request.prompt}],
             temperature=0.2,
             response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content
-        data = json.loads(content)
         if isinstance(data, dict) and "analysis" in data:
             analysis = data["analysis"]
         elif isinstance(data, list):
@@ -1224,17 +3122,18 @@ async def analyze_entity_importance(request: AnalyzeEntityImportanceRequest):
 
 @app.post("/analyze-relationship-importance", summary="Analyze relationship importance using LLM")
 async def analyze_relationship_importance(request: AnalyzeRelationshipImportanceRequest):
-    if not client:
-        raise HTTPException(status_code=503, detail="OpenAI client not configured.")
+    if not async_client:
+        raise HTTPException(status_code=503, detail="OpenAI async client not configured.")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        data = await request_json_answer_async(
+            "relationship_importance",
+            request.prompt,
+            # An empty answer is an empty analysis, as before escalation existed
+            allow_empty=True,
             messages=[{"role": "user", "content": request.prompt}],
             temperature=0.2,
             response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content
-        data = json.loads(content)
         if isinstance(data, dict) and "analysis" in data:
             analysis = data["analysis"]
         elif isinstance(data, list):
@@ -0,0 +1,354 @@
+"""
+Lightweight Prometheus metrics for the NLP service.
+
+Implements the small subset of a Prometheus client the service needs
+(labelled counters, gauges and histograms) and renders it in the text
+exposition format served by ``GET /metrics``. Observations only take a
+per-metric lock and a dict lookup, so instrumenting the hot path is cheap.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Buckets (seconds) sized for everything from a spaCy pass to a slow gpt-4o call
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape_label_value(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape_label_value(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def value(self, **labels: str) -> float:
+        """Current value for a label set (0 if never observed)."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {_format_value(series[-1])}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# --- Service metrics ---
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "nlp_http_requests_total", "HTTP requests handled, by endpoint and status code.",
+    ("method", "endpoint", "status"),
+)
+HTTP_REQUEST_LATENCY = REGISTRY.histogram(
+    "nlp_http_request_duration_seconds", "HTTP request latency in seconds, by endpoint.",
+    ("method", "endpoint"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "nlp_http_requests_in_flight", "HTTP requests currently being processed, by endpoint.",
+    ("endpoint",),
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "nlp_stage_duration_seconds", "Time spent in each pipeline stage (spacy, llm, embedding, graph_data).",
+    ("stage",),
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "nlp_admission_queue_depth", "Requests waiting for an admission slot, by endpoint.",
+    ("endpoint",),
+)
+CPU_EXECUTOR_QUEUED = REGISTRY.gauge(
+    "nlp_cpu_executor_queued", "CPU tasks (spaCy, embeddings) waiting for a worker thread, by priority class.",
+    ("priority",),
+)
+ADMISSION_WAIT = REGISTRY.histogram(
+    "nlp_admission_wait_seconds", "Time admitted requests waited for a slot, by endpoint.",
+    ("endpoint",),
+)
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "nlp_admission_rejections_total",
+    "Requests shed by admission control, by endpoint and reason (queue_full -> 429, queue_timeout -> 503).",
+    ("endpoint", "reason"),
+)
+LLM_CALLS = REGISTRY.counter(
+    "nlp_llm_calls_total", "Chat completion calls, by operation, ontology and outcome.",
+    ("operation", "ontology", "outcome"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "nlp_llm_tokens_total", "OpenAI tokens reported in response.usage, by operation, ontology and kind.",
+    ("operation", "ontology", "kind"),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "nlp_llm_retries_total", "LLM call retries after transient failures, by operation and error class.",
+    ("operation", "error_class"),
+)
+LLM_LIMITER_WAIT = REGISTRY.histogram(
+    "nlp_llm_limiter_wait_seconds", "Time LLM calls spent queued in the rate limiter, by operation and priority class.",
+    ("operation", "priority"),
+)
+LLM_FIRST_TOKEN = REGISTRY.histogram(
+    "nlp_llm_first_token_seconds", "Time from sending a streamed LLM call to its first content token, by operation.",
+    ("operation",),
+)
+LLM_MODEL_LATENCY = REGISTRY.histogram(
+    "nlp_llm_model_latency_seconds", "Chat completion latency by operation and routed model.",
+    ("operation", "model"),
+)
+LLM_MODEL_OUTPUTS = REGISTRY.counter(
+    "nlp_llm_model_outputs_total", "LLM answers by operation, model and validity (valid, invalid JSON or empty).",
+    ("operation", "model", "outcome"),
+)
+LLM_MODEL_ESCALATIONS = REGISTRY.counter(
+    "nlp_llm_model_escalations_total", "Calls retried on the escalation model after an invalid answer.",
+    ("operation", "from_model", "to_model"),
+)
+DEGRADED_EXTRACTIONS = REGISTRY.counter(
+    "nlp_degraded_extractions_total",
+    "Graph extractions answered with a partial graph completed by spaCy, by reason (deadline, llm_failure).",
+    ("reason",),
+)
+LLM_JSON_REPAIRS = REGISTRY.counter(
+    "nlp_llm_json_repairs_total",
+    "LLM answers that needed a JSON repair to parse, by operation and repair (truncated, inner_quotes, ...).",
+    ("operation", "repair"),
+)
+GRAPH_VALIDATION_ELEMENTS = REGISTRY.counter(
+    "nlp_graph_validation_elements_total",
+    "Extracted graph elements checked against the ontology, by kind and outcome (valid, corrected, inferred, flagged, dropped).",
+    ("kind", "outcome"),
+)
+LLM_LIMITER_STATE = REGISTRY.gauge(
+    "nlp_llm_limiter_state", "Adaptive rate limiter state (concurrency_limit, in_flight, queued, ...).",
+    ("field",),
+)
+ONTOLOGY_PROMPT_TOKENS = REGISTRY.counter(
+    "nlp_ontology_prompt_tokens_total",
+    "Estimated tokens of the prompt ontology block before (full) and after (sent) pruning, by ontology.",
+    ("ontology", "kind"),
+)
+SENTENCE_PRUNING_TOKENS = REGISTRY.counter(
+    "nlp_sentence_pruning_tokens_total",
+    "Estimated tokens of long texts before (original) and after (sent) salience-based sentence pruning.",
+    ("kind",),
+)
+ONTOLOGY_UPDATES = REGISTRY.counter(
+    "nlp_ontology_updates_total",
+    "POST /ontologies calls, by outcome (created, changed, unchanged = identical content hash).",
+    ("outcome",),
+)
+ONTOLOGY_CACHE_INVALIDATIONS = REGISTRY.counter(
+    "nlp_ontology_cache_invalidations_total",
+    "Cache entries dropped after an ontology changed, by cache.",
+    ("cache",),
+)
+PACKED_DOCUMENTS = REGISTRY.counter(
+    "nlp_packed_documents_total",
+    "Batch documents sent in multi-document packs, by outcome (packed, fallback to a single-document call).",
+    ("outcome",),
+)
+REFINEMENT_DECISIONS = REGISTRY.counter(
+    "nlp_refinement_decisions_total",
+    "Entity decisions in /refine-entities, by decision (keep/drop by the local model, escalate to the LLM).",
+    ("decision",),
+)
+NEAR_DUPLICATE_REUSES = REGISTRY.counter(
+    "nlp_near_duplicate_reuses_total",
+    "Extractions answered from a near-duplicate text's graph, by kind (identical, patched).",
+    ("kind",),
+)
+PREPROCESSING_TOKENS = REGISTRY.counter(
+    "nlp_preprocessing_tokens_total",
+    "Estimated tokens of email texts before (original) and after (cleaned) boilerplate stripping.",
+    ("kind",),
+)
+PREPROCESSING_REMOVED_LINES = REGISTRY.counter(
+    "nlp_preprocessing_removed_lines_total",
+    "Non-blank lines removed by email pre-processing, by step (quotes, signatures, disclaimers, footers, templates).",
+    ("step",),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "nlp_cache_lookups_total", "Cache lookups, by cache name and result (hit/miss).",
+    ("cache", "result"),
+)
+
+
+class _CacheHitRatio(_Metric):
+    """Hit ratio per cache, derived from CACHE_LOOKUPS at scrape time."""
+    kind = "gauge"
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        totals: Dict[str, List[float]] = {}
+        for (cache, result), value in CACHE_LOOKUPS.samples():
+            hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+            if result == "hit":
+                hits_and_total[0] += value
+            hits_and_total[1] += value
+        return [((cache,), hits / total) for cache, (hits, total) in totals.items() if total]
+
+
+CACHE_HIT_RATIO = REGISTRY.register(
+    _CacheHitRatio("nlp_cache_hit_ratio", "Fraction of cache lookups that were hits, by cache.", ("cache",))
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+def record_llm_usage(usage, operation: str, ontology: Optional[str]) -> None:
+    """Account prompt/completion tokens from an OpenAI ``response.usage`` object."""
+    if usage is None:
+        return
+    ontology_label = ontology or "default"
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    LLM_TOKENS.inc(prompt_tokens, operation=operation, ontology=ontology_label, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, operation=operation, ontology=ontology_label, kind="completion")
+
+def update_limiter_gauges(snapshot: Dict[str, float]) -> None:
+    """Copy a rate limiter snapshot into the limiter state gauge (done at scrape time)."""
+    for field, value in snapshot.items():
+        LLM_LIMITER_STATE.set(value, field=field)
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,209 @@
+"""
+Latency-aware model routing for LLM calls.
+
+Every call used to go to the same large model, including two-line emails and
+the importance rankings. The router picks a model per call from ordered
+rules on the operation, endpoint, text size, ontology size and the latency
+tier the client asked for. It records the latency and output validity of
+every call per model: a rule whose model has recently been slower than the
+tier's latency budget is skipped, and a call whose answer was invalid or
+empty JSON can be escalated to the larger model.
+"""
+
+import contextvars
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FAST = "fast"
+STANDARD = "standard"
+QUALITY = "quality"
+LATENCY_TIERS = (FAST, STANDARD, QUALITY)
+
+current_latency_tier: contextvars.ContextVar[str] = contextvars.ContextVar("latency_tier", default=STANDARD)
+# Route template of the request being served (set by the HTTP middleware)
+current_endpoint: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("endpoint", default=None)
+
+
+def resolve_latency_tier(tier: Optional[str]) -> str:
+    if tier is None:
+        return STANDARD
+    tier = tier.lower()
+    if tier not in LATENCY_TIERS:
+        raise ValueError(f"latency_tier must be one of {', '.join(LATENCY_TIERS)}")
+    return tier
+
+
+@dataclass(frozen=True)
+class RoutingContext:
+    operation: str
+    endpoint: Optional[str] = None
+    text_tokens: int = 0
+    ontology_types: int = 0
+    latency_tier: str = STANDARD
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """
+    Send matching calls to ``model``. Unset conditions match everything; a
+    call matches when it meets all the set ones.
+    """
+
+    model: str
+    operations: Tuple[str, ...] = ()
+    endpoints: Tuple[str, ...] = ()
+    latency_tiers: Tuple[str, ...] = ()
+    max_text_tokens: Optional[int] = None
+    max_ontology_types: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RoutingRule":
+        if not isinstance(data, dict) or not data.get("model"):
+            raise ValueError(f"Routing rule needs a 'model': {data!r}")
+        unknown = set(data) - {f for f in cls.__dataclass_fields__}
+        if unknown:
+            raise ValueError(f"Unknown routing rule fields: {', '.join(sorted(unknown))}")
+        return cls(
+            model=data["model"],
+            operations=tuple(data.get("operations", ())),
+            endpoints=tuple(data.get("endpoints", ())),
+            latency_tiers=tuple(data.get("latency_tiers", ())),
+            max_text_tokens=data.get("max_text_tokens"),
+            max_ontology_types=data.get("max_ontology_types"),
+        )
+
+    def matches(self, context: RoutingContext) -> bool:
+        return (
+            (not self.operations or context.operation in self.operations)
+            and (not self.endpoints or context.endpoint in self.endpoints)
+            and (not self.latency_tiers or context.latency_tier in self.latency_tiers)
+            and (self.max_text_tokens is None or context.text_tokens <= self.max_text_tokens)
+            and (self.max_ontology_types is None or context.ontology_types <= self.max_ontology_types)
+        )
+
+
+def load_rules(config: Optional[str]) -> Optional[List[RoutingRule]]:
+    """
+    Rules from a JSON list, given inline or as the path of a JSON file.
+
+    Returns:
+        The rules, or None when ``config`` is empty
+    """
+    if not config or not config.strip():
+        return None
+    text = config.strip()
+    if not text.startswith("["):
+        with open(text, "r", encoding="utf-8") as f:
+            text = f.read()
+    data = json.loads(text)
+    if not isinstance(data, list):
+        raise ValueError("Model routing rules must be a JSON list")
+    return [RoutingRule.from_dict(rule) for rule in data]
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    invalid: int = 0
+    errors: int = 0
+    latency_ewma: Optional[float] = None
+    _latency_samples: int = field(default=0, repr=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "invalid_ratio": self.invalid / self.calls if self.calls else 0.0,
+            "latency_ewma": self.latency_ewma,
+        }
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        default_model: str,
+        rules: Sequence[RoutingRule] = (),
+        escalation_model: Optional[str] = None,
+        latency_budgets: Optional[Dict[str, float]] = None,
+        min_latency_samples: int = 5,
+        latency_alpha: float = 0.2,
+    ):
+        """
+        Args:
+            default_model: Model for calls no rule matches
+            rules: Routing rules, first match wins
+            escalation_model: Model retried when another model's answer is invalid (None disables escalation)
+            latency_budgets: Seconds per latency tier; rules whose model is recently slower are skipped
+            min_latency_samples: Calls observed before a model's latency is trusted
+            latency_alpha: Weight of the newest sample in the latency EWMA
+        """
+        self.default_model = default_model
+        self.rules = list(rules)
+        self.escalation_model = escalation_model
+        self.latency_budgets = dict(latency_budgets or {})
+        self.min_latency_samples = min_latency_samples
+        self.latency_alpha = latency_alpha
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def route(self, context: RoutingContext) -> str:
+        """
+        Model for a call: the first matching rule whose model fits the tier's
+        latency budget. When every match is over budget, the fastest of them.
+        """
+        candidates = [rule.model for rule in self.rules if rule.matches(context)] or [self.default_model]
+        budget = self.latency_budgets.get(context.latency_tier)
+        if budget is None:
+            return candidates[0]
+        for model in candidates:
+            latency = self.observed_latency(model)
+            if latency is None or latency <= budget:
+                return model
+        return min(candidates, key=lambda model: self.observed_latency(model) or 0.0)
+
+    def escalation_for(self, model: str) -> Optional[str]:
+        """Larger model to retry an invalid answer of ``model`` with, if any."""
+        if self.escalation_model and self.escalation_model != model:
+            return self.escalation_model
+        return None
+
+    def observed_latency(self, model: str) -> Optional[float]:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None or stats._latency_samples < self.min_latency_samples:
+                return None
+            return stats.latency_ewma
+
+    def record_call(self, model: str, latency: Optional[float]) -> None:
+        """
+        Record one call to ``model``.
+
+        Args:
+            model: Model called
+            latency: Seconds until the answer arrived; None for a failed call
+        """
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.calls += 1
+            if latency is None:
+                stats.errors += 1
+                return
+            stats._latency_samples += 1
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma += self.latency_alpha * (latency - stats.latency_ewma)
+
+    def record_output(self, model: str, valid: bool) -> None:
+        """Record whether an answer of ``model`` was usable (parsable, non-empty JSON)."""
+        if valid:
+            return
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).invalid += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {model: stats.snapshot() for model, stats in self._stats.items()}
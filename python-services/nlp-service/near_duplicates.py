@@ -0,0 +1,273 @@
+"""
+Near-duplicate detection for graph extraction reuse.
+
+Templated procurement notices, forwarded messages and signature-heavy emails
+differ by a few tokens, so exact-hash caches miss them. Every successfully
+extracted text is indexed by a MinHash signature of its word shingles with
+LSH banding (digits masked, so templated notices that differ in amounts or
+reference numbers hash alike). A new text whose estimated Jaccard similarity to an indexed one
+reaches the threshold reuses that graph instead of calling the LLM: entity
+values are patched with the token substitutions between the two texts, and
+entities whose value no longer occurs in the new text are dropped together
+with their relationships.
+"""
+
+import copy
+import difflib
+import hashlib
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_DIGITS_RE = re.compile(r"\d+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+def shingles(tokens: List[str], size: int) -> Set[str]:
+    # Digits are masked so that texts differing only in amounts, dates or reference
+    # numbers hash alike; the patch step carries those differences over
+    lowered = [_DIGITS_RE.sub("0", t.lower()) for t in tokens]
+    if len(lowered) <= size:
+        return {" ".join(lowered)} if lowered else set()
+    return {" ".join(lowered[i:i + size]) for i in range(len(lowered) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Set[str]) -> np.ndarray:
+        if not shingle_set:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        base = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingle_set),
+            dtype=np.uint64, count=len(shingle_set),
+        )
+        # (a * x + b) mod p on 32-bit inputs; wraps on uint64 like the usual datasketch formulation
+        permuted = (np.outer(base, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+@dataclass
+class IndexedDocument:
+    doc_id: int
+    scope: Hashable
+    tokens: List[str]
+    signature: np.ndarray
+    graph: Dict[str, Any]
+
+
+class NearDuplicateIndex:
+    """Bounded (LRU) MinHash/LSH index of extracted documents and their graphs."""
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 32,
+                 shingle_size: int = 3, capacity: int = 10000):
+        """
+        Args:
+            threshold: Minimum estimated Jaccard similarity for reuse
+            num_perm: MinHash signature length (must be divisible by bands)
+            bands: LSH bands; more bands find lower-similarity candidates
+            shingle_size: Words per shingle
+            capacity: Maximum number of indexed documents
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.capacity = capacity
+        self._hasher = MinHasher(num_perm)
+        self._documents: "OrderedDict[int, IndexedDocument]" = OrderedDict()
+        self._buckets: Dict[Tuple[Hashable, int, bytes], Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _band_keys(self, scope: Hashable, signature: np.ndarray) -> List[Tuple[Hashable, int, bytes]]:
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, scope: Hashable, text: str, graph: Dict[str, Any]) -> None:
+        """Index an extracted text with its graph ({"entities", "relationships"})."""
+        tokens = tokenize(text)
+        signature = self._hasher.signature(shingles(tokens, self.shingle_size))
+        stored = {"entities": copy.deepcopy(graph.get("entities", [])),
+                  "relationships": copy.deepcopy(graph.get("relationships", []))}
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._documents[doc_id] = IndexedDocument(doc_id, scope, tokens, signature, stored)
+            for key in self._band_keys(scope, signature):
+                self._buckets[key].add(doc_id)
+            while len(self._documents) > self.capacity:
+                self._evict(next(iter(self._documents)))
+
+    def _evict(self, doc_id: int) -> None:
+        document = self._documents.pop(doc_id)
+        for key in self._band_keys(document.scope, document.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear_scope(self, predicate, graph_predicate=None) -> int:
+        """
+        Drop the documents whose scope matches ``predicate`` (e.g. after an
+        ontology update) and, if given, whose graph matches ``graph_predicate``.
+        """
+        with self._lock:
+            stale = [
+                doc_id for doc_id, doc in self._documents.items()
+                if predicate(doc.scope) and (graph_predicate is None or graph_predicate(doc.graph))
+            ]
+            for doc_id in stale:
+                self._evict(doc_id)
+        return len(stale)
+
+    def find(self, scope: Hashable, text: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Look up a near-duplicate of ``text`` and adapt its graph to the text.
+
+        Returns:
+            (graph for ``text``, reuse details) or None when no indexed text is similar enough
+        """
+        tokens = tokenize(text)
+        signature = self._hasher.signature(shingles(tokens, self.shingle_size))
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in self._band_keys(scope, signature):
+                candidates.update(self._buckets.get(key, ()))
+            best: Optional[IndexedDocument] = None
+            best_similarity = 0.0
+            for doc_id in candidates:
+                document = self._documents[doc_id]
+                similarity = float(np.mean(document.signature == signature))
+                if similarity > best_similarity:
+                    best, best_similarity = document, similarity
+            if best is None or best_similarity < self.threshold:
+                return None
+            self._documents.move_to_end(best.doc_id)
+            source_tokens = best.tokens
+            graph = copy.deepcopy(best.graph)
+
+        patched_graph, patch_stats = patch_graph(graph, source_tokens, tokens, text)
+        return patched_graph, {"similarity": round(best_similarity, 4), **patch_stats}
+
+
+class TokenAlignment:
+    """Maps token spans of an indexed text onto a near-identical new text."""
+
+    def __init__(self, old_tokens: List[str], new_tokens: List[str]):
+        self.old_tokens = old_tokens
+        self.opcodes = difflib.SequenceMatcher(a=old_tokens, b=new_tokens, autojunk=False).get_opcodes()
+
+    def find(self, value_tokens: List[str]) -> Optional[int]:
+        """First position of ``value_tokens`` in the old text."""
+        size = len(value_tokens)
+        for i in range(len(self.old_tokens) - size + 1):
+            if self.old_tokens[i:i + size] == value_tokens:
+                return i
+        return None
+
+    def map_span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        New-text span of old tokens [start, end); a boundary inside a replaced
+        run widens to the whole replacement.
+        """
+        new_start = new_end = None
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if new_start is None and i1 <= start < i2:
+                new_start = j1 + (start - i1) if tag == "equal" else j1
+            if new_end is None and i1 < end <= i2:
+                new_end = j1 + (end - i1) if tag == "equal" else j2
+        return (new_start or 0), (new_end if new_end is not None else new_start or 0)
+
+def patch_graph(
+    graph: Dict[str, Any],
+    old_tokens: List[str],
+    new_tokens: List[str],
+    new_text: str,
+) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Adapt a graph extracted from one text to a near-identical text.
+
+    Entity values missing from the new text are located in the old text and
+    carried through the token alignment of the two texts ("PO-1234" ->
+    "PO-1299"); entities that cannot be located, or whose tokens were deleted,
+    are dropped with their relationships. Relationships follow their entities
+    whether they refer to them by value or by id; a patched entity loses its
+    id, so references to it are rewritten to the new value.
+
+    Returns:
+        (patched graph, {"patched_entities", "dropped_entities"})
+    """
+    alignment = TokenAlignment(old_tokens, new_tokens) if old_tokens != new_tokens else None
+    # Old value or id -> reference to use in relationships (None = entity dropped)
+    renamed: Dict[str, Optional[str]] = {}
+    entities = []
+    patched = dropped = 0
+    for entity in graph.get("entities", []):
+        value = str(entity.get("value", ""))
+        new_value: Optional[str] = value
+        if value not in new_text:
+            new_value = None
+            value_tokens = tokenize(value)
+            position = alignment.find(value_tokens) if alignment is not None and value_tokens else None
+            if position is not None:
+                new_start, new_end = alignment.map_span(position, position + len(value_tokens))
+                if new_end > new_start:
+                    new_value = _surface_form(new_tokens[new_start:new_end], new_text)
+        renamed[value] = new_value
+        entity_id = entity.get("id")
+        if entity_id is not None:
+            renamed.setdefault(str(entity_id), entity_id if new_value == value else new_value)
+        if new_value is None:
+            dropped += 1
+            continue
+        if new_value != value:
+            patched += 1
+            entity["value"] = new_value
+            entity.pop("id", None)
+        if entity.get("start") is not None:
+            start = new_text.find(new_value)
+            entity["start"], entity["end"] = (start, start + len(new_value)) if start >= 0 else (None, None)
+        entities.append(entity)
+
+    relationships = []
+    for rel in graph.get("relationships", []):
+        source = renamed.get(str(rel.get("source", "")), rel.get("source"))
+        target = renamed.get(str(rel.get("target", "")), rel.get("target"))
+        if source is None or target is None:
+            continue
+        if source != rel.get("source") or target != rel.get("target"):
+            rel["source"], rel["target"] = source, target
+            rel.pop("id", None)
+        relationships.append(rel)
+
+    return {"entities": entities, "relationships": relationships}, {
+        "patched_entities": patched,
+        "dropped_entities": dropped,
+    }
+
+def _surface_form(tokens: List[str], text: str) -> str:
+    """Original spelling (with its spacing) of a token sequence in ``text``."""
+    match = re.search(r"\s*".join(re.escape(t) for t in tokens), text)
+    return match.group(0) if match else " ".join(tokens)
@@ -0,0 +1,138 @@
+"""
+Per-request ontology pruning for graph extraction prompts.
+
+Large ontologies (FIBO has ~1,800 entity types) make the compact ontology
+block the bulk of every extraction prompt. The pruner embeds each entity type
+once per ontology (humanized name plus description, with the service's
+SentenceTransformer), ranks types by cosine similarity to the request text,
+and keeps only the best-ranked types and the relationship triples among them.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+
+
+def humanize_type_name(type_name: str) -> str:
+    """'MonetaryValue' -> 'Monetary Value', 'NYSEListing' -> 'NYSE Listing'."""
+    return _CAMEL_BOUNDARY_RE.sub(" ", type_name).replace("_", " ")
+
+def type_text(type_name: str, description: Any = None) -> str:
+    """Text embedded for one entity type."""
+    if isinstance(description, dict):
+        description = description.get("_")
+    name = humanize_type_name(type_name)
+    return f"{name}: {description[:300]}" if description else name
+
+def estimate_block_tokens(compact_ontology: Dict[str, Any]) -> int:
+    """Token estimate of the ontology block as rendered into the prompt."""
+    return max(1, len(json.dumps(compact_ontology, indent=2)) // 4)
+
+
+@dataclass
+class OntologyTypeIndex:
+    fingerprint: str
+    types: List[str]
+    vectors: np.ndarray  # (len(types), dim), L2-normalized
+    version: Optional[str] = None  # Ontology snapshot version the index was built from
+
+
+class OntologyPruner:
+    def __init__(self, top_k: int = 40, floor: int = 10, min_similarity: float = 0.0):
+        """
+        Args:
+            top_k: Maximum number of entity types kept
+            floor: Minimum number of entity types kept, regardless of similarity
+            min_similarity: Types below this cosine similarity are dropped (above the floor)
+        """
+        self.top_k = top_k
+        self.floor = min(floor, top_k)
+        self.min_similarity = min_similarity
+        self._indexes: Dict[str, OntologyTypeIndex] = {}
+        self._lock = threading.Lock()
+
+    def index_for(self, model, ontology: str, entity_types: Sequence[str],
+                  descriptions: Optional[Dict[str, Any]] = None,
+                  version: Optional[str] = None) -> OntologyTypeIndex:
+        """
+        Embedding index of an ontology's entity types, computed once per
+        ontology version (a changed type list or descriptions rebuilds it).
+        With a snapshot ``version`` id, an index of the same version is
+        returned without fingerprinting the type texts.
+        """
+        if version is not None:
+            with self._lock:
+                index = self._indexes.get(ontology)
+            if index is not None and index.version == version:
+                return index
+        descriptions = descriptions or {}
+        texts = [type_text(t, descriptions.get(t)) for t in entity_types]
+        fingerprint = hashlib.sha256("\x1e".join(texts).encode("utf-8")).hexdigest()
+        with self._lock:
+            index = self._indexes.get(ontology)
+            if index is not None and index.fingerprint == fingerprint:
+                index.version = version or index.version
+                return index
+
+        vectors = np.asarray(model.encode(texts, batch_size=128), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        index = OntologyTypeIndex(fingerprint=fingerprint, types=list(entity_types), vectors=vectors, version=version)
+        with self._lock:
+            self._indexes[ontology] = index
+        return index
+
+    def prune(self, compact_ontology: Dict[str, Any], text_vector, index: OntologyTypeIndex
+              ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Keep the entity types most similar to the text and the triples among them.
+
+        Args:
+            compact_ontology: {"e": [...], "r": [[source, type, target], ...]}
+            text_vector: Embedding of the request text
+            index: Type index built from compact_ontology["e"]
+
+        Returns:
+            (pruned compact ontology, statistics)
+        """
+        entity_types = compact_ontology.get("e", [])
+        triples = compact_ontology.get("r", [])
+        stats: Dict[str, Any] = {
+            "types_before": len(entity_types),
+            "triples_before": len(triples),
+            "prompt_tokens_before": estimate_block_tokens(compact_ontology),
+        }
+
+        if len(entity_types) <= self.top_k:
+            kept_types = list(entity_types)
+        else:
+            vector = np.asarray(text_vector, dtype=np.float32)
+            vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            similarities = index.vectors @ vector
+            order = np.argsort(-similarities)[: self.top_k]
+            selected = [i for rank, i in enumerate(order)
+                        if rank < self.floor or similarities[i] >= self.min_similarity]
+            # Keep the ontology's own order so the prompt stays stable across requests
+            kept_types = [index.types[i] for i in sorted(selected)]
+            stats["min_kept_similarity"] = round(float(similarities[order[len(selected) - 1]]), 4)
+
+        kept = set(kept_types)
+        kept_triples = [t for t in triples if len(t) == 3 and t[0] in kept and t[2] in kept]
+        pruned = {**compact_ontology, "e": kept_types, "r": kept_triples}
+        stats.update({
+            "types_after": len(kept_types),
+            "triples_after": len(kept_triples),
+            "prompt_tokens_after": estimate_block_tokens(pruned),
+        })
+        stats["prompt_tokens_saved"] = stats["prompt_tokens_before"] - stats["prompt_tokens_after"]
+        return pruned, stats
+
+    def invalidate(self, ontology: str) -> None:
+        with self._lock:
+            self._indexes.pop(ontology, None)
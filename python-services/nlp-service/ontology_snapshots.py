@@ -0,0 +1,245 @@
+"""
+Immutable, versioned ontology snapshots.
+
+``POST /ontologies`` used to mutate the ontology dictionaries that concurrent
+requests were reading, and every request re-derived the same lists (core
+entity types, the compact prompt block). Each ontology is now an immutable
+snapshot built once per update: type lists are tuples, descriptions are
+read-only mappings, and membership sets and the compact prompt block are
+precomputed. Updates build a new snapshot and swap the registry's mapping in
+one reference assignment, so readers never lock and never see a partially
+updated ontology. Every snapshot carries a version id that caches can key on.
+
+Each snapshot also has a content hash. Re-posting an identical ontology is
+recognized as a no-op, and otherwise ``diff_snapshots`` tells which types
+actually changed, so only results depending on them need invalidating.
+"""
+
+import hashlib
+import itertools
+import json
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Sequence, Set
+
+_versions = itertools.count(1)
+
+
+def _frozen_triples(triples: Sequence[Sequence[str]]) -> tuple:
+    return tuple(tuple(t) for t in triples)
+
+
+class OntologySnapshot(Mapping):
+    """
+    One version of an ontology. Reads like the former configuration dict
+    (``snapshot.get("entity_types")``), so existing read paths keep working.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        entity_types: Sequence[str] = (),
+        relationship_types: Sequence[str] = (),
+        property_types: Sequence[str] = (),
+        entity_descriptions: Optional[Dict[str, Any]] = None,
+        relationship_descriptions: Optional[Dict[str, Any]] = None,
+        compact_ontology: Optional[Dict[str, Any]] = None,
+        version: Optional[int] = None,
+    ):
+        self.name = name
+        self.version = version if version is not None else next(_versions)
+        self.version_id = f"{name}@{self.version}"
+        self.entity_types = tuple(entity_types or ())
+        self.relationship_types = tuple(relationship_types or ())
+        self.property_types = tuple(property_types or ())
+        self.entity_descriptions = MappingProxyType(dict(entity_descriptions or {}))
+        self.relationship_descriptions = MappingProxyType(dict(relationship_descriptions or {}))
+        self.compact_ontology = (
+            MappingProxyType({**compact_ontology, "e": tuple(compact_ontology.get("e", ())),
+                              "r": _frozen_triples(compact_ontology.get("r", ()))})
+            if compact_ontology else None
+        )
+
+        # Precomputed lookups
+        self.entity_type_set = frozenset(self.entity_types)
+        self.property_type_set = frozenset(self.property_types)
+        self.relationship_type_set = frozenset(self.relationship_types)
+        self.core_entity_types = tuple(t for t in self.entity_types if t not in self.property_type_set)
+        self.triples = frozenset(self.compact_ontology["r"]) if self.compact_ontology is not None else frozenset()
+        self.content_hash = hashlib.sha256(json.dumps({
+            "entity_types": self.entity_types,
+            "relationship_types": self.relationship_types,
+            "property_types": self.property_types,
+            "entity_descriptions": dict(self.entity_descriptions),
+            "relationship_descriptions": dict(self.relationship_descriptions),
+            "compact_ontology": dict(self.compact_ontology) if self.compact_ontology is not None else None,
+        }, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self._fields = MappingProxyType({
+            "ontology_name": name,
+            "version": self.version,
+            "entity_types": self.entity_types,
+            "relationship_types": self.relationship_types,
+            "property_types": self.property_types,
+            "entity_descriptions": self.entity_descriptions,
+            "relationship_descriptions": self.relationship_descriptions,
+            **({"compact_ontology": self.compact_ontology} if self.compact_ontology is not None else {}),
+        })
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> Any:
+        return self._fields[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        return f"OntologySnapshot({self.version_id}, {len(self.entity_types)} entity types)"
+
+    def derived(self, key: str, compute: Callable[["OntologySnapshot"], Any]) -> Any:
+        """
+        Value derived from this snapshot, computed once. Snapshots never change,
+        so derived values (the compact prompt block, type indexes) need no invalidation.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        value = compute(self)
+        with self._derived_lock:
+            return self._derived.setdefault(key, value)
+
+    def inherit_derived(self, previous: "OntologySnapshot", keys: Iterable[str]) -> None:
+        """Carry derived values over from the previous version when their inputs did not change."""
+        with self._derived_lock:
+            for key in keys:
+                if key in previous._derived:
+                    self._derived.setdefault(key, previous._derived[key])
+
+
+@dataclass
+class OntologyDiff:
+    """Structured difference between two versions of an ontology."""
+
+    added_entity_types: List[str] = field(default_factory=list)
+    removed_entity_types: List[str] = field(default_factory=list)
+    added_property_types: List[str] = field(default_factory=list)
+    removed_property_types: List[str] = field(default_factory=list)
+    added_relationship_types: List[str] = field(default_factory=list)
+    removed_relationship_types: List[str] = field(default_factory=list)
+    changed_descriptions: List[str] = field(default_factory=list)  # Entity or relationship types
+    added_triples: List[tuple] = field(default_factory=list)
+    removed_triples: List[tuple] = field(default_factory=list)
+
+    @property
+    def entity_types_changed(self) -> bool:
+        return bool(self.added_entity_types or self.removed_entity_types
+                    or self.added_property_types or self.removed_property_types)
+
+    @property
+    def prompt_changed(self) -> bool:
+        """Whether the compact prompt block differs."""
+        return bool(self.entity_types_changed or self.added_relationship_types or self.removed_relationship_types
+                    or self.added_triples or self.removed_triples)
+
+    @property
+    def types_added(self) -> bool:
+        """
+        Whether the new version has entity or relationship types the old one
+        did not. Any earlier extraction may have missed them, whatever it contains.
+        """
+        return bool(self.added_entity_types or self.added_relationship_types)
+
+    def affected_types(self) -> FrozenSet[str]:
+        """
+        Entity and relationship types whose meaning in an extraction changed:
+        removed types, property-type changes, changed descriptions and both
+        ends and the type of every added or removed triple.
+        """
+        affected: Set[str] = set(self.removed_entity_types) | set(self.removed_relationship_types)
+        affected.update(self.added_property_types, self.removed_property_types, self.changed_descriptions)
+        for triple in self.added_triples + self.removed_triples:
+            affected.update(triple)
+        return frozenset(affected)
+
+    def invalidates(self, graph: Mapping[str, Any]) -> bool:
+        """
+        Whether a graph extracted under the old version is stale under the new
+        one: every graph is once types were added, otherwise those containing
+        an affected type.
+        """
+        return self.types_added or bool(graph_types(graph) & self.affected_types())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: [list(v) if isinstance(v, tuple) else v for v in values]
+                for name, values in vars(self).items() if values}
+
+
+def diff_snapshots(old: OntologySnapshot, new: OntologySnapshot) -> OntologyDiff:
+    def changed(before: Mapping[str, Any], after: Mapping[str, Any]) -> List[str]:
+        return sorted(k for k in set(before) | set(after) if before.get(k) != after.get(k))
+
+    return OntologyDiff(
+        added_entity_types=sorted(new.entity_type_set - old.entity_type_set),
+        removed_entity_types=sorted(old.entity_type_set - new.entity_type_set),
+        added_property_types=sorted(new.property_type_set - old.property_type_set),
+        removed_property_types=sorted(old.property_type_set - new.property_type_set),
+        added_relationship_types=sorted(new.relationship_type_set - old.relationship_type_set),
+        removed_relationship_types=sorted(old.relationship_type_set - new.relationship_type_set),
+        changed_descriptions=sorted(set(
+            changed(old.entity_descriptions, new.entity_descriptions)
+            + changed(old.relationship_descriptions, new.relationship_descriptions)
+        )),
+        added_triples=sorted(new.triples - old.triples),
+        removed_triples=sorted(old.triples - new.triples),
+    )
+
+def graph_types(graph: Mapping[str, Any]) -> Set[str]:
+    """Entity and relationship types a cached graph depends on."""
+    types = {str(e.get("type")) for e in graph.get("entities", []) if isinstance(e, dict)}
+    types.update(str(r.get("type")) for r in graph.get("relationships", []) if isinstance(r, dict))
+    return types
+
+
+class OntologyRegistry:
+    """Copy-on-write mapping of ontology name to its current snapshot."""
+
+    def __init__(self):
+        self._snapshots: Mapping[str, OntologySnapshot] = MappingProxyType({})
+        self._latest: Optional[OntologySnapshot] = None
+        self._write_lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[OntologySnapshot]:
+        return self._snapshots.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._snapshots
+
+    def names(self) -> List[str]:
+        return list(self._snapshots)
+
+    def snapshots(self) -> Mapping[str, OntologySnapshot]:
+        """The current name -> snapshot mapping (read-only, consistent across names)."""
+        return self._snapshots
+
+    @property
+    def latest(self) -> Optional[OntologySnapshot]:
+        """The most recently published snapshot of any ontology."""
+        return self._latest
+
+    def publish(self, snapshot: OntologySnapshot) -> Optional[OntologySnapshot]:
+        """
+        Make ``snapshot`` the current version of its ontology.
+
+        Returns:
+            The snapshot it replaced, if any
+        """
+        with self._write_lock:
+            previous = self._snapshots.get(snapshot.name)
+            self._snapshots = MappingProxyType({**self._snapshots, snapshot.name: snapshot})
+            self._latest = snapshot
+        return previous
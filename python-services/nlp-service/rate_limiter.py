@@ -0,0 +1,326 @@
+"""
+Adaptive rate limiting for outbound OpenAI calls.
+
+A single AdaptiveRateLimiter is shared by every LLM call in the process. It
+enforces the account's requests-per-minute and tokens-per-minute budgets over
+a sliding window, caps concurrency with an AIMD controller (additive increase
+on healthy responses, multiplicative decrease on 429s or latency above
+target), and pauses all callers while a ``Retry-After`` window is active.
+Callers that cannot proceed are queued instead of failing; the queue is
+served by priority class (see scheduling.py), so interactive calls overtake a
+batch backlog while bulk work still gets its share.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from scheduling import BULK, INTERACTIVE, WeightedFairQueue, current_priority
+
+# Window used for the per-minute budgets
+BUDGET_WINDOW_SECONDS = 60.0
+# Fallback pause when a 429 carries no Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap prompt token estimate (~4 characters per token for English text).
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        Estimated token count
+    """
+    return max(1, (len(text) + 3) // 4)
+
+def estimate_message_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    """
+    Estimate prompt tokens for a chat completion ``messages`` list.
+
+    Args:
+        messages: OpenAI chat messages
+
+    Returns:
+        Estimated prompt token count including per-message overhead
+    """
+    total = 3
+    for message in messages:
+        content = message.get("content") or ""
+        total += 4 + estimate_tokens(content if isinstance(content, str) else str(content))
+    return total
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Extract the server-requested backoff from an OpenAI/httpx error, if any.
+    Understands ``retry-after-ms`` and ``retry-after`` (seconds or HTTP date).
+
+    Args:
+        error: Exception raised by the OpenAI client
+
+    Returns:
+        Seconds to wait, or None when the response carried no hint
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for HTTP 429 responses (openai.RateLimitError or equivalent)."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+@dataclass
+class RateLimitPermit:
+    """Handle for one admitted call; pass it back to ``release``."""
+    estimated_tokens: int
+    acquired_at: float
+    queued_seconds: float
+    _budget_entry: List[Any] = field(repr=False, default_factory=list)
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        latency_target: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        priority_weights: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Args:
+            requests_per_minute: RPM budget (None disables the check)
+            tokens_per_minute: TPM budget (None disables the check)
+            initial_concurrency: Starting concurrency limit
+            min_concurrency: Floor for the AIMD controller
+            max_concurrency: Ceiling for the AIMD controller
+            latency_target: Seconds; slower successful calls shrink the limit
+            decrease_factor: Multiplicative decrease applied on a 429
+            priority_weights: Share of queued slots per priority class (default interactive 4, bulk 1)
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._requests: Deque[float] = deque()
+        self._tokens: Deque[List[Any]] = deque()  # [timestamp, tokens, still in the window]
+        self._tokens_in_window = 0.0
+        self._waiters = WeightedFairQueue(priority_weights or {INTERACTIVE: 4.0, BULK: 1.0})
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.rate_limited_total = 0
+
+    # --- Public API ---
+    async def acquire(self, estimated_tokens: int = 0, priority: Optional[str] = None) -> RateLimitPermit:
+        """
+        Wait (without blocking the event loop) until the call may be sent.
+
+        Args:
+            estimated_tokens: Prompt plus completion token estimate
+            priority: Priority class (defaults to the current request's)
+        """
+        ticket = object()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        enqueued_at = time.monotonic()
+        with self._lock:
+            self._waiters.push(ticket, priority or current_priority.get(), estimated_tokens)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(ticket, estimated_tokens)
+                    if wait == 0.0:
+                        return self._grant(ticket, estimated_tokens, enqueued_at)
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._async_waiters.discard(waiter)
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    self._notify()
+
+    def acquire_blocking(self, estimated_tokens: int = 0, priority: Optional[str] = None) -> RateLimitPermit:
+        """Thread-blocking variant of ``acquire`` for the sync OpenAI client."""
+        ticket = object()
+        enqueued_at = time.monotonic()
+        with self._condition:
+            self._waiters.push(ticket, priority or current_priority.get(), estimated_tokens)
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, estimated_tokens)
+                    if wait == 0.0:
+                        return self._grant(ticket, estimated_tokens, enqueued_at)
+                    self._condition.wait(timeout=wait)
+            finally:
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    self._notify()
+
+    def release(
+        self,
+        permit: RateLimitPermit,
+        latency: Optional[float] = None,
+        rate_limited: bool = False,
+        retry_after: Optional[float] = None,
+        actual_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Return a permit and feed the outcome into the AIMD controller.
+
+        Args:
+            permit: Permit returned by ``acquire``
+            latency: Observed call latency in seconds (successful calls)
+            rate_limited: True when the call was rejected with a 429
+            retry_after: Server-requested pause in seconds, if known
+            actual_tokens: Total tokens reported by response.usage
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._expire(now)
+            # A call can outlive the window; once its entry has expired, the window no longer holds its tokens
+            entry = permit._budget_entry if permit._budget_entry and permit._budget_entry[2] else None
+            if actual_tokens is not None and entry is not None:
+                delta = float(actual_tokens) - entry[1]
+                entry[1] = float(actual_tokens)
+                self._tokens_in_window += delta
+            if rate_limited:
+                self.rate_limited_total += 1
+                if actual_tokens is None and entry is not None:
+                    # Rejected calls do not consume token budget
+                    self._tokens_in_window -= entry[1]
+                    entry[1] = 0.0
+                pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER_SECONDS
+                self._blocked_until = max(self._blocked_until, now + pause)
+                self._decrease(now, self.decrease_factor)
+            elif latency is not None:
+                if self.latency_target is not None and latency > self.latency_target:
+                    self._decrease(now, 0.9)
+                else:
+                    self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current controller state, for metrics and debugging."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return {
+                "concurrency_limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                **{f"queued_{cls}": count for cls, count in self._waiters.counts().items()},
+                "requests_in_window": len(self._requests),
+                "tokens_in_window": int(self._tokens_in_window),
+                "blocked_for": max(0.0, self._blocked_until - now),
+                "rate_limited_total": self.rate_limited_total,
+            }
+
+    # --- Internals (call with the lock held) ---
+    def _try_acquire(self, ticket: object, tokens: int) -> Optional[float]:
+        """Return 0.0 if the call may proceed, else seconds to wait (None = until notified)."""
+        now = time.monotonic()
+        self._expire(now)
+        if self._waiters.head() is not ticket:
+            return None
+        if self._blocked_until > now:
+            return self._blocked_until - now
+        if self._in_flight >= int(self._limit):
+            return None
+        if self.requests_per_minute and len(self._requests) >= self.requests_per_minute:
+            return self._requests[0] + BUDGET_WINDOW_SECONDS - now
+        if self.tokens_per_minute and self._tokens and self._tokens_in_window + tokens > self.tokens_per_minute:
+            # Wait until enough of the window has expired to fit this call
+            excess = self._tokens_in_window + tokens - self.tokens_per_minute
+            freed = 0.0
+            for timestamp, used, _ in self._tokens:
+                freed += used
+                if freed >= excess:
+                    return max(0.001, timestamp + BUDGET_WINDOW_SECONDS - now)
+            return max(0.001, self._tokens[-1][0] + BUDGET_WINDOW_SECONDS - now)
+        return 0.0
+
+    def _grant(self, ticket: object, tokens: int, enqueued_at: float) -> RateLimitPermit:
+        now = time.monotonic()
+        self._waiters.pop_head()
+        self._in_flight += 1
+        self._requests.append(now)
+        entry = [now, float(tokens), True]
+        self._tokens.append(entry)
+        self._tokens_in_window += tokens
+        # The next waiter may be admissible too
+        self._notify()
+        return RateLimitPermit(
+            estimated_tokens=tokens,
+            acquired_at=now,
+            queued_seconds=now - enqueued_at,
+            _budget_entry=entry,
+        )
+
+    def _expire(self, now: float) -> None:
+        horizon = now - BUDGET_WINDOW_SECONDS
+        while self._requests and self._requests[0] <= horizon:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= horizon:
+            entry = self._tokens.popleft()
+            entry[2] = False
+            self._tokens_in_window -= entry[1]
+
+    def _decrease(self, now: float, factor: float) -> None:
+        # Decrease at most once per second so one burst of 429s counts as one signal
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_concurrency), self._limit * factor)
+
+    def _notify(self) -> None:
+        self._condition.notify_all()
+        for loop, event in list(self._async_waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed
+                self._async_waiters.discard((loop, event))
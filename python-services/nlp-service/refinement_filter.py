@@ -0,0 +1,303 @@
+"""
+Local keep/drop filter for spaCy entities in /refine-entities.
+
+The LLM refinement step only removes junk mentions ("Hi Team", "25", "YoY").
+A logistic regression over spaCy label, entity shape and (optionally) the
+sentence embedding of the entity value, trained from logged LLM decisions,
+settles the confident cases in-process. Only entities whose keep probability
+falls between the drop and keep thresholds are escalated to the LLM.
+
+Decisions are logged (one JSON line per entity) whenever the LLM refines, and
+the model is trained offline:
+
+    python refinement_filter.py train refinement-decisions.jsonl --output refinement-model.json --embeddings
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MODEL_FORMAT_VERSION = 1
+
+SPACY_LABELS = (
+    "PERSON", "ORG", "GPE", "LOC", "NORP", "FAC", "PRODUCT", "EVENT", "WORK_OF_ART", "LAW", "LANGUAGE",
+    "DATE", "TIME", "PERCENT", "MONEY", "QUANTITY", "ORDINAL", "CARDINAL",
+    "MonetaryAmount", "Currency", "Percentage", "StockSymbol", "ReferenceNumber", "FinancialOrg", "JobTitle",
+)
+# Salutations and sign-offs that spaCy often tags as PERSON/ORG
+GREETING_WORDS = {"hi", "hello", "dear", "hey", "team", "regards", "thanks", "thank", "best", "cheers", "all"}
+SHAPE_FEATURES = (
+    "bias_length", "tokens", "is_title", "is_upper", "is_lower_start", "digit_ratio", "alpha_ratio",
+    "has_digit", "all_digits", "has_currency", "has_greeting", "single_char_token", "relative_position",
+)
+_CURRENCY_RE = re.compile(r"[$€£¥]|\b(?:USD|EUR|GBP|CAD|CHF|JPY)\b")
+
+DECISION_KEEP = "keep"
+DECISION_DROP = "drop"
+DECISION_ESCALATE = "escalate"
+
+
+def shape_features(entity: Dict[str, Any], text_length: int) -> List[float]:
+    """Hand-crafted features of one spaCy entity, in SHAPE_FEATURES order."""
+    value = str(entity.get("value", "")).strip()
+    tokens = value.split()
+    characters = max(1, len(value))
+    digits = sum(c.isdigit() for c in value)
+    letters = sum(c.isalpha() for c in value)
+    start = entity.get("start")
+    return [
+        math.log1p(len(value)),
+        float(len(tokens)),
+        float(bool(tokens) and all(t[:1].isupper() for t in tokens)),
+        float(value.isupper()),
+        float(value[:1].islower()),
+        digits / characters,
+        letters / characters,
+        float(digits > 0),
+        float(value.replace(",", "").replace(".", "").isdigit()),
+        float(bool(_CURRENCY_RE.search(value))),
+        float(any(t.lower().strip(",.!") in GREETING_WORDS for t in tokens)),
+        float(any(len(t) == 1 for t in tokens)),
+        (start / text_length) if isinstance(start, int) and text_length else 0.0,
+    ]
+
+def label_features(entity: Dict[str, Any]) -> List[float]:
+    label = entity.get("spacy_label") or entity.get("type", "")
+    return [float(label == known) for known in SPACY_LABELS]
+
+def feature_matrix(
+    entities: Sequence[Dict[str, Any]],
+    text_length: int,
+    embeddings: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Stack label, shape and optional embedding features for a list of entities.
+    """
+    rows = [label_features(e) + shape_features(e, text_length) for e in entities]
+    matrix = np.asarray(rows, dtype=np.float32).reshape(len(entities), len(SPACY_LABELS) + len(SHAPE_FEATURES))
+    if embeddings is not None:
+        matrix = np.hstack([matrix, np.asarray(embeddings, dtype=np.float32)])
+    return matrix
+
+
+@dataclass
+class RefinementModel:
+    weights: np.ndarray
+    bias: float
+    mean: np.ndarray
+    scale: np.ndarray
+    uses_embeddings: bool = False
+    keep_threshold: float = 0.9
+    drop_threshold: float = 0.1
+    trained_on: int = 0
+
+    def keep_probability(self, features: np.ndarray) -> np.ndarray:
+        z = ((features - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+    def decide(self, probability: float) -> str:
+        if probability >= self.keep_threshold:
+            return DECISION_KEEP
+        if probability <= self.drop_threshold:
+            return DECISION_DROP
+        return DECISION_ESCALATE
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "v": MODEL_FORMAT_VERSION,
+                "weights": self.weights.tolist(),
+                "bias": self.bias,
+                "mean": self.mean.tolist(),
+                "scale": self.scale.tolist(),
+                "uses_embeddings": self.uses_embeddings,
+                "keep_threshold": self.keep_threshold,
+                "drop_threshold": self.drop_threshold,
+                "trained_on": self.trained_on,
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "RefinementModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            weights=np.asarray(data["weights"], dtype=np.float32),
+            bias=float(data["bias"]),
+            mean=np.asarray(data["mean"], dtype=np.float32),
+            scale=np.asarray(data["scale"], dtype=np.float32),
+            uses_embeddings=bool(data.get("uses_embeddings")),
+            keep_threshold=float(data.get("keep_threshold", 0.9)),
+            drop_threshold=float(data.get("drop_threshold", 0.1)),
+            trained_on=int(data.get("trained_on", 0)),
+        )
+
+
+def load_model(path: Optional[str]) -> Optional[RefinementModel]:
+    """Load a trained model, or None (everything escalates) when it is missing or unreadable."""
+    if not path:
+        return None
+    try:
+        model = RefinementModel.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Refinement model not loaded from {path}: {e}")
+        return None
+    print(f"✅ Refinement model loaded from {path} (trained on {model.trained_on} decisions)")
+    return model
+
+def train_model(
+    features: np.ndarray,
+    labels: np.ndarray,
+    l2: float = 1e-3,
+    epochs: int = 500,
+    learning_rate: float = 0.5,
+) -> Tuple[np.ndarray, float, np.ndarray, np.ndarray]:
+    """
+    Fit an L2-regularized logistic regression with full-batch gradient descent.
+
+    Args:
+        features: (n, d) feature matrix
+        labels: (n,) 1 for entities the LLM kept, 0 for dropped ones
+
+    Returns:
+        (weights, bias, feature mean, feature scale)
+    """
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale < 1e-6] = 1.0
+    x = (features - mean) / scale
+    y = labels.astype(np.float32)
+    weights = np.zeros(x.shape[1], dtype=np.float32)
+    bias = 0.0
+    n = max(1, len(y))
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-np.clip(x @ weights + bias, -30.0, 30.0)))
+        error = p - y
+        weights -= learning_rate * (x.T @ error / n + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+    return weights, bias, mean, scale
+
+
+class RefinementFilter:
+    """Classifies spaCy entities as keep / drop / escalate with a trained model."""
+
+    def __init__(self, model: Optional[RefinementModel] = None, embedder=None):
+        self.model = model
+        self.embedder = embedder
+
+    @property
+    def enabled(self) -> bool:
+        return self.model is not None
+
+    def classify(self, entities: Sequence[Dict[str, Any]], text_length: int) -> List[Tuple[str, float]]:
+        """
+        Args:
+            entities: spaCy entities of one text
+            text_length: Length of the text (for the position feature)
+
+        Returns:
+            (decision, keep probability) per entity; everything escalates without a model
+        """
+        if self.model is None or not entities:
+            return [(DECISION_ESCALATE, 0.5) for _ in entities]
+        embeddings = None
+        if self.model.uses_embeddings:
+            if self.embedder is None:
+                return [(DECISION_ESCALATE, 0.5) for _ in entities]
+            embeddings = self.embedder.encode([str(e.get("value", "")) for e in entities])
+        probabilities = self.model.keep_probability(feature_matrix(entities, text_length, embeddings))
+        return [(self.model.decide(float(p)), float(p)) for p in probabilities]
+
+
+class DecisionLog:
+    """Appends LLM keep/drop decisions as training examples (JSON lines)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, text_length: int, entities: Sequence[Dict[str, Any]], kept: Sequence[bool]) -> None:
+        lines = [
+            json.dumps({
+                "value": e.get("value"),
+                "spacy_label": e.get("spacy_label") or e.get("type"),
+                "start": e.get("start"),
+                "text_length": text_length,
+                "kept": bool(k),
+            }, separators=(",", ":"))
+            for e, k in zip(entities, kept)
+        ]
+        if not lines:
+            return
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def kept_by_llm(entities: Sequence[Dict[str, Any]], cleaned: Sequence[Any]) -> List[bool]:
+    """Which of the submitted entities the LLM kept, matched on the normalized value."""
+    kept_values = set()
+    for item in cleaned:
+        value = item.get("value") if isinstance(item, dict) else item
+        if value is not None:
+            kept_values.add(" ".join(str(value).lower().split()))
+    return [" ".join(str(e.get("value", "")).lower().split()) in kept_values for e in entities]
+
+def load_decisions(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def evaluate(model: RefinementModel, features: np.ndarray, labels: np.ndarray) -> Dict[str, float]:
+    """Escalation rate and agreement with the LLM on the locally decided entities."""
+    probabilities = model.keep_probability(features)
+    decisions = [model.decide(float(p)) for p in probabilities]
+    local = [(d, int(y)) for d, y in zip(decisions, labels) if d != DECISION_ESCALATE]
+    agreed = sum(1 for d, y in local if (d == DECISION_KEEP) == bool(y))
+    return {
+        "examples": len(labels),
+        "escalation_rate": round(1.0 - len(local) / len(labels), 4) if len(labels) else 0.0,
+        "local_agreement": round(agreed / len(local), 4) if local else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Train the local refinement filter from logged LLM decisions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train")
+    train.add_argument("decisions", help="JSON lines written with REFINEMENT_DECISION_LOG")
+    train.add_argument("--output", default="refinement-model.json")
+    train.add_argument("--embeddings", action="store_true", help="Add all-MiniLM-L6-v2 value embeddings as features")
+    train.add_argument("--keep-threshold", type=float, default=0.9)
+    train.add_argument("--drop-threshold", type=float, default=0.1)
+    train.add_argument("--holdout", type=float, default=0.2, help="Fraction of examples used for evaluation")
+    args = parser.parse_args()
+
+    examples = load_decisions(args.decisions)
+    random.Random(0).shuffle(examples)
+    embeddings = None
+    if args.embeddings:
+        from sentence_transformers import SentenceTransformer
+        embeddings = SentenceTransformer("all-MiniLM-L6-v2").encode([str(e.get("value", "")) for e in examples])
+    features = np.vstack([
+        feature_matrix([e], e.get("text_length") or 0, None if embeddings is None else embeddings[i:i + 1])
+        for i, e in enumerate(examples)
+    ]) if examples else np.zeros((0, 0), dtype=np.float32)
+    labels = np.asarray([1 if e.get("kept") else 0 for e in examples], dtype=np.float32)
+
+    split = int(len(examples) * (1.0 - args.holdout))
+    weights, bias, mean, scale = train_model(features[:split], labels[:split])
+    model = RefinementModel(weights, bias, mean, scale, uses_embeddings=args.embeddings,
+                            keep_threshold=args.keep_threshold, drop_threshold=args.drop_threshold,
+                            trained_on=split)
+    print(json.dumps({"holdout": evaluate(model, features[split:], labels[split:])}, indent=2))
+    model.save(args.output)
+    print(f"💾 Model written to {args.output}")
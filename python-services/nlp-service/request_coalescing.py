@@ -0,0 +1,58 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Ingestion fan-out often sends the same text concurrently (forwarded emails,
+upstream retries). Requests with the same key share one computation: the
+first caller starts it, later callers await the same task, and every caller
+gets its own copy of the result to stamp with its request id. The shared task
+is shielded, so a disconnecting caller does not cancel it for the others.
+"""
+
+import asyncio
+import copy
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def coalescing_key(endpoint: str, text: str, *scope: Optional[str]) -> Tuple[str, ...]:
+    """
+    Key identifying requests that produce the same result.
+
+    Args:
+        endpoint: Endpoint name
+        text: Request text (hashed)
+        *scope: Further result-affecting parameters (ontology, database, mode, ...)
+
+    Returns:
+        Hashable key
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return (endpoint, text_hash) + tuple(value or "" for value in scope)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run ``compute`` once per key among concurrent callers.
+
+        Args:
+            key: Coalescing key
+            compute: Coroutine factory producing the result
+
+        Returns:
+            (deep copy of the result, whether this caller joined an existing computation)
+        """
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result), shared
@@ -0,0 +1,151 @@
+"""
+Priority scheduling between interactive and bulk traffic.
+
+Chat-driven ``/extract-graph`` calls and overnight ``/batch-extract-graph``
+backfills share the LLM rate limiter and the CPU threads (spaCy, embeddings).
+Every request runs under a priority class (``interactive`` or ``bulk``), held
+in a context variable so it follows the request into tasks and worker
+threads. Waiting work is served by weighted fair sharing between the classes
+(stride scheduling: with weights 4:1, bulk still gets one slot in five while
+interactive work is waiting), and within the bulk class the shortest job goes
+first.
+"""
+
+import asyncio
+import bisect
+import concurrent.futures
+import contextvars
+import itertools
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+def resolve_priority(priority: Optional[str], default: str) -> str:
+    """Request-level priority class, falling back to the endpoint's default."""
+    if priority is None:
+        return default
+    priority = priority.lower()
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITY_CLASSES)}")
+    return priority
+
+
+class WeightedFairQueue:
+    """
+    Queue of waiting items across priority classes. Not thread-safe; the
+    owner serializes access with its own lock.
+
+    Classes are served by stride scheduling: each class advances its pass by
+    1/weight when served and the class with the lowest pass goes next. A class
+    that was idle rejoins at the current virtual time, so it cannot bank
+    credit. Within a class listed in ``shortest_first``, items are ordered by
+    cost (FIFO among equal costs); other classes are FIFO.
+    """
+
+    def __init__(self, weights: Dict[str, float], shortest_first: Tuple[str, ...] = (BULK,)):
+        self.weights = {cls: max(float(weight), 1e-6) for cls, weight in weights.items()}
+        self.shortest_first = set(shortest_first)
+        self._items: Dict[str, List[Tuple[float, int, Hashable]]] = {cls: [] for cls in self.weights}
+        self._class_of: Dict[Hashable, Tuple[str, Tuple[float, int, Hashable]]] = {}
+        self._pass: Dict[str, float] = {cls: 0.0 for cls in self.weights}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._class_of)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._class_of
+
+    def push(self, item: Hashable, priority: str, cost: float = 0.0) -> None:
+        if priority not in self._items:
+            priority = next(iter(self._items))
+        items = self._items[priority]
+        if not items:
+            self._pass[priority] = max(self._pass[priority], self._virtual_time)
+        entry = (cost if priority in self.shortest_first else 0.0, next(self._sequence), item)
+        bisect.insort(items, entry, key=lambda e: e[:2])
+        self._class_of[item] = (priority, entry)
+
+    def _next_class(self) -> Optional[str]:
+        waiting = [cls for cls, items in self._items.items() if items]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda cls: (self._pass[cls], -self.weights[cls]))
+
+    def head(self) -> Optional[Hashable]:
+        """The item that will be served next, or None."""
+        cls = self._next_class()
+        return self._items[cls][0][2] if cls is not None else None
+
+    def pop_head(self) -> Optional[Hashable]:
+        cls = self._next_class()
+        if cls is None:
+            return None
+        _, _, item = self._items[cls].pop(0)
+        del self._class_of[item]
+        self._virtual_time = self._pass[cls]
+        self._pass[cls] += 1.0 / self.weights[cls]
+        return item
+
+    def remove(self, item: Hashable) -> None:
+        cls, entry = self._class_of.pop(item)
+        self._items[cls].remove(entry)
+
+    def counts(self) -> Dict[str, int]:
+        return {cls: len(items) for cls, items in self._items.items()}
+
+
+class PriorityExecutor:
+    """
+    Thread pool for CPU-bound work (spaCy, embeddings) whose queue is served
+    by priority class instead of FIFO, like ``asyncio.to_thread`` otherwise.
+    """
+
+    def __init__(self, threads: int, weights: Dict[str, float]):
+        self._queue = WeightedFairQueue(weights)
+        self._work: Dict[int, Tuple[concurrent.futures.Future, contextvars.Context, Callable, tuple]] = {}
+        self._ids = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"cpu-{i}", daemon=True) for i in range(max(1, threads))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable, *args: Any, priority: Optional[str] = None, cost: float = 0.0
+               ) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        work_id = next(self._ids)
+        with self._condition:
+            self._work[work_id] = (future, contextvars.copy_context(), fn, args)
+            self._queue.push(work_id, priority or current_priority.get(), cost)
+            self._condition.notify()
+        return future
+
+    async def run(self, fn: Callable, *args: Any, cost: float = 0.0) -> Any:
+        """Run ``fn(*args)`` on a worker thread under the caller's priority class."""
+        return await asyncio.wrap_future(self.submit(fn, *args, cost=cost))
+
+    def queued(self) -> Dict[str, int]:
+        with self._condition:
+            return self._queue.counts()
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                while not len(self._queue):
+                    self._condition.wait()
+                future, context, fn, args = self._work.pop(self._queue.pop_head())
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
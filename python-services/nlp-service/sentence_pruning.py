@@ -0,0 +1,204 @@
+"""
+Salience-based sentence pruning for graph extraction prompts.
+
+Long procurement notices carry pages of procedural text without entities.
+The pruner splits a text into sentences, scores each one cheaply (spaCy
+entity count, ontology keyword hits and, when embeddings are available, the
+best cosine similarity to an ontology entity type) and keeps the best-scoring
+sentences, with their neighbors, until a token budget is spent. The budget
+is the recall/latency knob: a smaller budget means shorter prompts and
+faster extractions, at the risk of missing entities in dropped sentences.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from ontology_pruning import humanize_type_name
+from rate_limiter import estimate_tokens
+
+_SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])|\n\s*")
+_WORD_RE = re.compile(r"[a-z]{4,}")
+_STOPWORDS = {"with", "from", "that", "this", "type", "other", "thing", "entity", "object", "about", "into"}
+# Gap marker between non-adjacent kept sentences
+GAP = "\n"
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Sentence spans of ``text``: split after sentence punctuation followed by
+    an upper-case start, and at line breaks (email headers, list items).
+    """
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for match in list(_SENTENCE_BOUNDARY_RE.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        segment = text[start:end]
+        if segment.strip():
+            leading = len(segment) - len(segment.lstrip())
+            spans.append((start + leading, start + len(segment.rstrip())))
+        if match:
+            start = match.end()
+    return spans
+
+def ontology_keywords(entity_types: Iterable[str]) -> Set[str]:
+    """Lower-cased words of the humanized entity type names ('PurchaseOrder' -> {'purchase', 'order'})."""
+    keywords: Set[str] = set()
+    for type_name in entity_types:
+        keywords.update(_WORD_RE.findall(humanize_type_name(type_name).lower()))
+    return keywords - _STOPWORDS
+
+
+@dataclass
+class SalienceWeights:
+    entities: float = 1.0
+    keywords: float = 0.5
+    similarity: float = 1.0
+
+
+def _normalized(values: Sequence[float]) -> np.ndarray:
+    array = np.asarray(values, dtype=np.float32)
+    top = float(array.max()) if array.size else 0.0
+    return array / top if top > 0 else array
+
+
+class SentencePruner:
+    def __init__(self, budget_tokens: int = 800, neighbors: int = 1, weights: Optional[SalienceWeights] = None):
+        """
+        Args:
+            budget_tokens: Maximum estimated tokens of the pruned text; texts within it are left alone
+            neighbors: Sentences kept on each side of a selected sentence, for context
+            weights: Weights of the salience signals
+        """
+        self.budget_tokens = budget_tokens
+        self.neighbors = neighbors
+        self.weights = weights or SalienceWeights()
+
+    def applies_to(self, text: str) -> bool:
+        return estimate_tokens(text) > self.budget_tokens
+
+    def scores(
+        self,
+        text: str,
+        spans: List[Tuple[int, int]],
+        entities: Optional[List[Dict[str, Any]]] = None,
+        keywords: Optional[Set[str]] = None,
+        sentence_vectors: Optional[np.ndarray] = None,
+        type_vectors: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Salience of each sentence: the weighted sum of its entity count, keyword
+        hits and best type similarity, each normalized to [0, 1] across the text.
+        """
+        total = np.zeros(len(spans), dtype=np.float32)
+        if entities and self.weights.entities:
+            starts = [e["start"] for e in entities if isinstance(e.get("start"), int)]
+            counts = [sum(1 for s in starts if start <= s < end) for start, end in spans]
+            total += self.weights.entities * _normalized(counts)
+        if keywords and self.weights.keywords:
+            hits = [
+                len(set(_WORD_RE.findall(text[start:end].lower())) & keywords)
+                for start, end in spans
+            ]
+            total += self.weights.keywords * _normalized(hits)
+        if sentence_vectors is not None and type_vectors is not None and len(type_vectors) and self.weights.similarity:
+            vectors = np.asarray(sentence_vectors, dtype=np.float32)
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            similarities = np.clip((vectors @ type_vectors.T).max(axis=1), 0.0, None)
+            total += self.weights.similarity * _normalized(similarities)
+        return total
+
+    def select(self, text: str, spans: List[Tuple[int, int]], scores: np.ndarray) -> Tuple[str, Dict[str, Any]]:
+        """
+        Keep the best-scoring sentences and their neighbors within the token budget.
+
+        The first sentence (the email subject) is always kept. Kept sentences
+        stay in document order; adjacent ones keep the original text between
+        them, gaps become a line break.
+
+        Returns:
+            (pruned text, statistics)
+        """
+        costs = [estimate_tokens(text[start:end]) for start, end in spans]
+        kept: Set[int] = set()
+        used = 0
+
+        def take(index: int) -> bool:
+            nonlocal used
+            if index in kept:
+                return True
+            if used + costs[index] > self.budget_tokens:
+                return False
+            kept.add(index)
+            used += costs[index]
+            return True
+
+        if spans:
+            take(0)
+        for index in np.argsort(-scores, kind="stable"):
+            index = int(index)
+            if scores[index] <= 0:
+                break
+            if not take(index):
+                continue
+            for offset in range(1, self.neighbors + 1):
+                for neighbor in (index - offset, index + offset):
+                    if 0 <= neighbor < len(spans):
+                        take(neighbor)
+
+        parts: List[str] = []
+        previous = None
+        for index in sorted(kept):
+            start, end = spans[index]
+            if previous is not None and previous == index - 1:
+                parts.append(text[spans[previous][1]:start])
+            elif parts:
+                parts.append(GAP)
+            parts.append(text[start:end])
+            previous = index
+        pruned = "".join(parts)
+
+        original_tokens = estimate_tokens(text)
+        pruned_tokens = estimate_tokens(pruned) if pruned else 0
+        return pruned, {
+            "sentences": len(spans),
+            "kept_sentences": len(kept),
+            "budget_tokens": self.budget_tokens,
+            "original_tokens": original_tokens,
+            "sent_tokens": pruned_tokens,
+            "tokens_saved": original_tokens - pruned_tokens,
+        }
+
+    def prune(
+        self,
+        text: str,
+        entities: Optional[List[Dict[str, Any]]] = None,
+        keywords: Optional[Set[str]] = None,
+        model=None,
+        type_vectors: Optional[np.ndarray] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Prune ``text`` to the token budget.
+
+        Args:
+            text: Text to extract from
+            entities: spaCy entities of the text (with start offsets)
+            keywords: Ontology keywords (see ontology_keywords)
+            model: Optional SentenceTransformer for the similarity signal
+            type_vectors: L2-normalized entity type embeddings (OntologyTypeIndex.vectors)
+
+        Returns:
+            (pruned text, statistics); the text is returned unchanged when it fits the budget
+        """
+        spans = split_sentences(text)
+        if not self.applies_to(text) or len(spans) < 2:
+            tokens = estimate_tokens(text)
+            return text, {"sentences": len(spans), "kept_sentences": len(spans), "budget_tokens": self.budget_tokens,
+                          "original_tokens": tokens, "sent_tokens": tokens, "tokens_saved": 0}
+        sentence_vectors = None
+        if model is not None and type_vectors is not None and self.weights.similarity:
+            sentence_vectors = model.encode([text[start:end] for start, end in spans], batch_size=64)
+        scores = self.scores(text, spans, entities, keywords, sentence_vectors, type_vectors)
+        return self.select(text, spans, scores)
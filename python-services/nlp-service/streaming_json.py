@@ -0,0 +1,105 @@
+"""
+Incremental parsing of a streamed graph extraction answer.
+
+With ``stream=True`` the LLM answer arrives in small text deltas. The parser
+scans the deltas once, tracking strings and nesting, and hands out each
+element of the top-level ``entities`` and ``relationships`` arrays as soon as
+its closing brace arrives, long before the whole JSON document is complete.
+The full text is kept, so the complete answer can still be parsed (and
+validated) at the end.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+GRAPH_ARRAYS = {"entities": "entity", "relationships": "relationship"}
+
+
+class IncrementalGraphParser:
+    def __init__(self, arrays: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            arrays: Top-level array key -> event kind emitted for its object elements
+        """
+        self.arrays = arrays or GRAPH_ARRAYS
+        self._buffer: List[str] = []
+        self._text = ""
+        self._position = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None  # Last string closed directly inside the top-level object
+        self._array_kind: Optional[str] = None  # Event kind of the open top-level array, if tracked
+        self._element_start: Optional[int] = None
+        self.emitted = 0
+        self.skipped = 0  # Completed elements that were not valid JSON objects
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        if self._buffer:
+            self._text += "".join(self._buffer)
+            self._buffer.clear()
+        return self._text
+
+    def feed(self, delta: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Consume the next piece of the answer.
+
+        Returns:
+            (kind, element) for each array element completed by this piece
+        """
+        if not delta:
+            return []
+        self._buffer.append(delta)
+        text = self.text
+        events: List[Tuple[str, Dict[str, Any]]] = []
+        stack = self._stack
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(stack) == 1 and stack[0] == "{":
+                        try:
+                            self._last_key = json.loads(text[self._string_start:index + 1])
+                        except ValueError:
+                            self._last_key = None
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                if char == "[" and len(stack) == 1 and stack[0] == "{":
+                    self._array_kind = self.arrays.get(self._last_key or "")
+                elif char == "{" and len(stack) == 2 and self._array_kind:
+                    self._element_start = index
+                stack.append(char)
+            elif char in "}]":
+                if stack:
+                    stack.pop()
+                if char == "}" and len(stack) == 2 and self._element_start is not None:
+                    event = self._element(text[self._element_start:index + 1])
+                    if event is not None:
+                        events.append(event)
+                    self._element_start = None
+                elif char == "]" and len(stack) == 1:
+                    self._array_kind = None
+        self._position = len(text)
+        return events
+
+    def _element(self, raw: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            element = json.loads(raw)
+        except ValueError:
+            element = None
+        if not isinstance(element, dict):
+            self.skipped += 1
+            return None
+        self.emitted += 1
+        return self._array_kind, element
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from admission import QUEUE_FULL, QUEUE_TIMEOUT, AdmissionController, AdmissionGate, AdmissionRejected
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def _queued(gate, count):
+    while gate.queued < count:
+        await asyncio.sleep(0)
+
+
+def test_free_slots_are_taken_without_queueing():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=2, max_queue=0)
+        assert await gate.acquire() == 0.0
+        assert await gate.acquire() == 0.0
+        assert gate.snapshot() == {"in_flight": 2, "queued": 0, "max_concurrency": 2, "max_queue": 0}
+        gate.release()
+        gate.release()
+        assert gate.in_flight == 0
+
+    run(scenario())
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=1, max_queue=1)
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await _queued(gate, 1)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        assert rejected.value.status_code == 429
+        assert rejected.value.reason == QUEUE_FULL
+        assert rejected.value.endpoint == "/x"
+        gate.release()
+        await waiter
+        gate.release()
+
+    run(scenario())
+
+
+def test_wait_past_timeout_is_rejected_with_503():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=1, max_queue=4, max_wait_seconds=0.01)
+        await gate.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        assert rejected.value.status_code == 503
+        assert rejected.value.reason == QUEUE_TIMEOUT
+        # The timed-out waiter left the queue and took no slot
+        assert gate.queued == 0
+        assert gate.in_flight == 1
+        gate.release()
+        assert gate.in_flight == 0
+
+    run(scenario())
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=1, max_queue=4)
+        await gate.acquire()
+        order = []
+
+        async def request(name):
+            await gate.acquire()
+            order.append(name)
+
+        first = asyncio.ensure_future(request("first"))
+        await _queued(gate, 1)
+        second = asyncio.ensure_future(request("second"))
+        await _queued(gate, 2)
+
+        gate.release()
+        await first
+        # The slot went straight to the waiter: never free for a newcomer in between
+        assert gate.in_flight == 1 and gate.queued == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gate.acquire(), 0.01)
+        assert gate.queued == 1
+        gate.release()
+        await second
+        gate.release()
+        assert order == ["first", "second"]
+        assert gate.in_flight == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=1, max_queue=4)
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await _queued(gate, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert gate.queued == 0
+        gate.release()
+        assert gate.in_flight == 0
+
+    run(scenario())
+
+
+def test_retry_after_follows_service_time_and_queue_length():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=2, max_queue=8)
+        assert gate.retry_after() == 1
+        for _ in range(20):
+            await gate.acquire()
+            gate.release(10.0)
+        # ~10 s per request, one in line, two slots
+        assert gate.retry_after() == 5
+        await gate.acquire()
+        await gate.acquire()
+        waiters = [asyncio.ensure_future(gate.acquire()) for _ in range(3)]
+        await _queued(gate, 3)
+        assert gate.retry_after() == 20
+        for _ in range(5):
+            gate.release(1000.0)
+        await asyncio.gather(*waiters)
+        assert gate.retry_after() == 60
+
+    run(scenario())
+
+
+def test_slot_context_manager_releases_on_error():
+    async def scenario():
+        gate = AdmissionGate("/x", max_concurrency=1, max_queue=0)
+        with pytest.raises(RuntimeError):
+            async with gate.slot() as queued_seconds:
+                assert queued_seconds == 0.0
+                assert gate.in_flight == 1
+                raise RuntimeError("boom")
+        assert gate.in_flight == 0
+
+    run(scenario())
+
+
+def test_controller_looks_up_gates_by_endpoint():
+    controller = AdmissionController()
+    gate = AdmissionGate("/extract-graph", max_concurrency=1, max_queue=1)
+    controller.add(gate)
+    assert controller.gate_for("/extract-graph") is gate
+    assert controller.gate_for("/health") is None
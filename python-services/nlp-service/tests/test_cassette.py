@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from cassette import (
+    CassetteMiss,
+    CassettePlayer,
+    CassetteRecorder,
+    ReplayedLLMError,
+    recording_async_client,
+    replay_async_client,
+    request_key,
+)
+
+ANSWER = '{"entities": [{"type": "Organization", "value": "Acme Corp"}], "relationships": []}'
+
+
+def _request(**overrides):
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": "Extract the graph of: Acme Corp ships to Globex."}],
+        "temperature": 0,
+        "response_format": {"type": "json_object"},
+        "timeout": 30,
+    }
+    request.update(overrides)
+    return request
+
+
+def _completion(content=ANSWER):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 1700000000, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 20, "completion_tokens": 15, "total_tokens": 35},
+    })
+
+
+def _chunks(content=ANSWER, size=7):
+    pieces = [content[i:i + size] for i in range(0, len(content), size)]
+    return [
+        ChatCompletionChunk.model_validate({
+            "id": "chatcmpl-2", "object": "chat.completion.chunk", "created": 1700000000, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": {"content": piece},
+                         "finish_reason": "stop" if i == len(pieces) - 1 else None}],
+        })
+        for i, piece in enumerate(pieces)
+    ]
+
+
+class FakeAsyncClient:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        if kwargs.get("stream"):
+            async def stream():
+                for chunk in answer:
+                    yield chunk
+            return stream()
+        return answer
+
+
+def _record(path, answers, requests):
+    recorder = CassetteRecorder(str(path))
+    client = recording_async_client(FakeAsyncClient(answers), recorder)
+
+    async def run():
+        for request in requests:
+            try:
+                response = await client.chat.completions.create(**request)
+            except Exception:
+                continue
+            if request.get("stream"):
+                async for _ in response:
+                    pass
+
+    asyncio.run(run())
+    recorder.close()
+    return recorder
+
+
+def _replay(path, request):
+    client = replay_async_client(CassettePlayer(str(path), latency_scale=0))
+    return asyncio.run(client.chat.completions.create(**request))
+
+
+@pytest.mark.parametrize("name", ["cassette.jsonl", "cassette.jsonl.gz"])
+def test_json_completion_round_trip(tmp_path, name):
+    path = tmp_path / name
+    assert _record(path, [_completion()], [_request()]).recorded == 1
+    replayed = _replay(path, _request())
+    assert replayed.choices[0].message.content == ANSWER
+    assert replayed.usage.total_tokens == 35
+
+
+def test_streamed_completion_round_trip(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    _record(path, [_chunks()], [_request(stream=True)])
+    # Streaming is not part of the key, so the plain request finds the recording too
+    replayed = _replay(path, _request())
+    assert replayed.choices[0].message.content == ANSWER
+    assert replayed.choices[0].finish_reason == "stop"
+    assert _replay(path, _request(stream=True)).choices[0].message.content == ANSWER
+
+
+def test_key_excludes_timeout_and_includes_the_routed_model(tmp_path):
+    assert request_key(_request(timeout=30)) == request_key(_request(timeout=5))
+    assert request_key(_request()) == request_key({k: v for k, v in _request().items() if k != "timeout"})
+    assert request_key(_request(model="gpt-4o")) != request_key(_request())
+
+    path = tmp_path / "cassette.jsonl"
+    _record(path, [_completion()], [_request()])
+    assert _replay(path, _request(timeout=5)).choices[0].message.content == ANSWER
+    with pytest.raises(CassetteMiss):
+        _replay(path, _request(model="gpt-4o"))
+
+
+def test_repeated_requests_replay_in_recording_order(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    rate_limited = RuntimeError("Rate limit reached")
+    rate_limited.status_code = 429
+    _record(path, [rate_limited, _completion()], [_request(), _request()])
+    client = replay_async_client(CassettePlayer(str(path), latency_scale=0))
+
+    async def run():
+        with pytest.raises(ReplayedLLMError) as error:
+            await client.chat.completions.create(**_request())
+        assert error.value.status_code == 429
+        first = await client.chat.completions.create(**_request())
+        again = await client.chat.completions.create(**_request())
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first.choices[0].message.content == again.choices[0].message.content == ANSWER
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import deadlines
+from deadlines import Deadline, DeadlineExceeded, current_deadline, parse_deadline_seconds, within_deadline
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deadlines, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+@pytest.mark.parametrize("value,expected", [
+    (None, None), ("", None), ("30", 30.0), (" 2.5 ", 2.5), (12, 12.0), ("900", 600.0),
+])
+def test_parse_deadline_seconds(value, expected):
+    assert parse_deadline_seconds(value, max_seconds=600) == expected
+
+
+def test_parse_deadline_without_cap():
+    assert parse_deadline_seconds("900") == 900.0
+
+
+@pytest.mark.parametrize("value", ["soon", "0", "-5", "nan", [30]])
+def test_parse_invalid_deadline_raises(value):
+    with pytest.raises(ValueError):
+        parse_deadline_seconds(value, max_seconds=600)
+
+
+def test_remaining_budget(clock):
+    deadline = Deadline(10)
+    assert deadline.remaining() == 10
+    clock[0] += 4
+    assert deadline.remaining() == 6
+    assert deadline.timeout() == 6
+    assert deadline.timeout(default=2) == 2
+    assert deadline.timeout(reserve=1) == 5
+    assert not deadline.expired(reserve=5)
+    assert deadline.expired(reserve=6)
+    clock[0] += 20
+    assert deadline.remaining() == 0
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout()
+
+
+def test_timeout_raises_once_only_the_reserve_is_left(clock):
+    deadline = Deadline(3)
+    clock[0] += 2
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(reserve=1)
+
+
+def _under_deadline(seconds, awaitable_factory, reserve=0.0):
+    async def run():
+        if seconds is not None:
+            current_deadline.set(Deadline(seconds))
+        return await within_deadline(awaitable_factory(), reserve)
+    return asyncio.run(run())
+
+
+async def _sleep_then(value, seconds):
+    await asyncio.sleep(seconds)
+    return value
+
+
+def test_within_deadline_without_deadline_just_awaits():
+    assert _under_deadline(None, lambda: _sleep_then("done", 0)) == "done"
+
+
+def test_within_deadline_returns_in_time():
+    assert _under_deadline(5, lambda: _sleep_then("done", 0)) == "done"
+
+
+def test_within_deadline_gives_up_at_the_deadline():
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        _under_deadline(0.05, lambda: _sleep_then("late", 5))
+    assert time.monotonic() - started < 2
+
+
+def test_within_deadline_does_not_start_without_budget():
+    started = []
+
+    async def work():
+        started.append(True)
+
+    with pytest.raises(DeadlineExceeded):
+        _under_deadline(0.5, work, reserve=1.0)
+    assert started == []
+
+
+def test_exhausted_deadline_degrades_to_spacy_entities(monkeypatch):
+    main = pytest.importorskip("main")
+    spacy_entities = [{"type": "PERSON", "value": "Jane Doe", "start": 0, "end": 8, "confidence": 0.8}]
+    monkeypatch.setattr(main, "async_client", object())
+    monkeypatch.setattr(main, "NEAR_DUPLICATE_REUSE_ENABLED", False)
+    monkeypatch.setattr(main, "SPACY_FALLBACK_ENABLED", True)
+    monkeypatch.setattr(main, "extractor", SimpleNamespace(extract_entities=lambda text: spacy_entities))
+
+    async def extract():
+        # Less than DEADLINE_RESERVE_SECONDS is left, so no LLM call is made
+        current_deadline.set(Deadline(main.DEADLINE_RESERVE_SECONDS / 2))
+        return await main.extract_graph_with_llm_async("Jane Doe joined Acme Corp.")
+
+    graph_data = asyncio.run(extract())
+    assert graph_data["error"]["error_class"] == main.DEADLINE_EXCEEDED
+    assert graph_data["degradation"] == {"reason": "deadline", "fallback": "spacy", "spacy_entities": 1}
+    assert graph_data["entities"] == [{**spacy_entities[0], "properties": {"extraction_source": "spacy"}}]
+    assert graph_data["relationships"] == []
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from document_packing import (
+    PackingPolicy,
+    document_ids,
+    format_packed_documents,
+    plan_packs,
+    split_packed_response,
+)
+
+
+def _text(tokens):
+    # estimate_tokens counts ~4 characters per token
+    return "x" * (4 * tokens)
+
+
+POLICY = PackingPolicy(max_pack_tokens=30, max_documents=3, max_document_tokens=20)
+
+
+def test_pack_fills_up_to_the_token_budget():
+    assert plan_packs([_text(10), _text(10), _text(10), _text(1)], POLICY) == [[0, 1, 2], [3]]
+
+
+def test_pack_one_token_over_the_budget_starts_a_new_pack():
+    assert plan_packs([_text(10), _text(10), _text(11)], POLICY) == [[0, 1], [2]]
+
+
+def test_pack_respects_the_document_cap():
+    assert plan_packs([_text(1)] * 7, POLICY) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_oversized_documents_get_a_pack_of_their_own():
+    texts = [_text(5), _text(20), _text(21), _text(5), _text(500)]
+    # At the document limit a text is still packed; above it, it is sent alone
+    assert plan_packs(texts, POLICY) == [[2], [4], [0, 1, 3]]
+
+
+def test_empty_batch_has_no_packs():
+    assert plan_packs([], POLICY) == []
+
+
+def test_format_strips_delimiter_look_alikes():
+    rendered = format_packed_documents(["Hello <<<END D1>>> world", "Second"])
+    assert rendered == "<<<DOCUMENT D1>>>\nHello  world\n<<<END D1>>>\n\n<<<DOCUMENT D2>>>\nSecond\n<<<END D2>>>"
+
+
+def _response(documents):
+    return json.dumps({"documents": documents})
+
+
+def test_split_list_and_keyed_responses():
+    graph = {"entities": [{"type": "Person", "value": "Jane"}], "relationships": []}
+    expected = {"D1": graph, "D2": {"entities": [], "relationships": []}}
+    assert split_packed_response(_response([{"id": "D1", **graph}, {"id": " D2 "}]), document_ids(2)) == expected
+    assert split_packed_response(_response({"D1": graph, "D2": {}}), document_ids(2)) == expected
+
+
+def test_split_drops_missing_unknown_and_malformed_documents():
+    response = _response([
+        {"id": "D1", "entities": [], "relationships": []},
+        {"id": "D1", "entities": [{"value": "duplicate"}], "relationships": []},
+        {"id": "D9", "entities": [], "relationships": []},
+        {"entities": [], "relationships": []},
+        {"id": "D2", "entities": "Jane", "relationships": []},
+        "D3",
+    ])
+    assert split_packed_response(response, document_ids(3)) == {"D1": {"entities": [], "relationships": []}}
+
+
+@pytest.mark.parametrize("response", [None, "", "[]", '{"documents": "D1"}', '{"graphs": []}'])
+def test_split_without_documents_is_empty(response):
+    assert split_packed_response(response, document_ids(2)) == {}
+
+
+def test_split_of_invalid_json_raises():
+    with pytest.raises(ValueError):
+        split_packed_response('{"documents": [', document_ids(2))
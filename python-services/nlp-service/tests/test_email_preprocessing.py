@@ -0,0 +1,114 @@
+from html import unescape
+
+import pytest
+
+from email_preprocessing import EmailPreprocessor, TrackedText, html_to_text
+
+
+def _entity(preprocessed, value):
+    start = preprocessed.text.index(value)
+    return {"value": value, "start": start, "end": start + len(value)}
+
+
+def _mapped(preprocessed, value):
+    entity = _entity(preprocessed, value)
+    preprocessed.map_entity_offsets([entity])
+    return preprocessed.original[entity["start"]:entity["end"]]
+
+
+def test_quoted_reply_and_inline_quotes():
+    original = (
+        "Hi Bob,\n"
+        "> Can Globex deliver by Friday?\n"
+        "Yes, Acme Corp confirmed PO-1234 with Globex.\n"
+        "\n"
+        "On Mon, Jan 6, 2025 at 10:00 AM Jane Doe <jane@initech.com> wrote:\n"
+        "> Please confirm the order for Initech.\n"
+    )
+    preprocessed = EmailPreprocessor().process(original)
+    assert "Initech" not in preprocessed.text
+    assert "Can Globex" not in preprocessed.text
+    assert preprocessed.stats()["removed_lines"] == {"quotes": 3}
+    for value in ("Acme Corp", "PO-1234", "Globex", "Hi Bob"):
+        assert _mapped(preprocessed, value) == value
+
+
+def test_signature_and_footer():
+    original = (
+        "Team,\n"
+        "\n"
+        "The Rotterdam warehouse will receive 40 pallets from Globex Ltd.\n"
+        "\n"
+        "Best regards,\n"
+        "Jane Doe\n"
+        "Head of Procurement, Initech\n"
+        "\n"
+        "Sent from my iPhone\n"
+    )
+    preprocessed = EmailPreprocessor().process(original)
+    assert preprocessed.text == "Team,\n\nThe Rotterdam warehouse will receive 40 pallets from Globex Ltd."
+    for value in ("Rotterdam", "Globex Ltd", "Team"):
+        assert _mapped(preprocessed, value) == value
+
+
+def test_html_markup_and_character_references():
+    original = (
+        "<html><head><style>p { color: red }</style></head><body>"
+        "<div>Hi team,</div>"
+        "<p>Caf&eacute; Ren&eacute; signed with <b>Acme Corp</b> &amp; Globex for &#8364;5M.</p>"
+        "<p>Thanks,<br>Jane Doe</p>"
+        "</body></html>"
+    )
+    preprocessed = EmailPreprocessor().process(original)
+    assert preprocessed.text == "Hi team,\nCafé René signed with Acme Corp & Globex for €5M."
+    for value in ("Acme Corp", "Globex", "Hi team"):
+        assert _mapped(preprocessed, value) == value
+    # Values with decoded characters map onto the whole reference, not into it
+    assert _mapped(preprocessed, "Café René") == "Caf&eacute; Ren&eacute;"
+    assert _mapped(preprocessed, "€5M") == "&#8364;5M"
+    assert _mapped(preprocessed, "Acme Corp & Globex") == "Acme Corp</b> &amp; Globex"
+    for value in ("Café", "René", "€5M", "Acme Corp & Globex"):
+        mapped = _mapped(preprocessed, value)
+        assert unescape(mapped.replace("</b>", "")) == value
+
+
+def test_disclaimer_paragraph_is_dropped():
+    original = (
+        "Hi Bob,\n"
+        "Acme Corp confirmed PO-1234 with Globex.\n"
+        "\n"
+        "This email and any attachments are confidential and may be privileged. If you are not the\n"
+        "intended recipient, please notify the sender and delete this message.\n"
+    )
+    preprocessed = EmailPreprocessor().process(original)
+    assert preprocessed.text == "Hi Bob,\nAcme Corp confirmed PO-1234 with Globex."
+    assert preprocessed.stats()["removed_lines"]["disclaimers"] == 2
+
+
+def test_business_paragraph_mentioning_confidentiality_is_kept():
+    paragraph = (
+        "The confidential settlement between ABC Corp and XYZ Ltd was signed on 3 March; the privileged\n"
+        "documents and the virus scan report were handed over to counsel the same day."
+    )
+    preprocessed = EmailPreprocessor().process(f"Hi Bob,\n\n{paragraph}\n")
+    assert paragraph in preprocessed.text
+    assert "disclaimers" not in preprocessed.stats()["removed_lines"]
+
+
+def test_reference_without_semicolon():
+    tracked = html_to_text("<div>Caf&eacute au lait</div><p>x</p>")
+    start = tracked.text.index("Café")
+    start, end = tracked.to_original(start, start + 4)
+    assert "<div>Caf&eacute au lait</div><p>x</p>"[start:end] == "Caf&eacute"
+
+
+def test_select_maps_joined_spans():
+    tracked = TrackedText.plain("alpha\nbeta\ngamma").select([(0, 5), (11, 16)])
+    assert tracked.text == "alpha\ngamma"
+    assert tracked.to_original(6, 11) == (11, 16)
+    assert tracked.to_original(0, 11) == (0, 16)
+
+
+@pytest.mark.parametrize("span", [(None, 3), (3, None), (4, 4)])
+def test_empty_or_missing_spans_map_to_none(span):
+    assert TrackedText.plain("some text").to_original(*span) == (None, None)
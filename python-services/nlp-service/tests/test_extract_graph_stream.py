@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+main = pytest.importorskip("main")
+from fastapi.testclient import TestClient
+
+EMAIL = (
+    "Hi Bob,\n"
+    "> Can Globex deliver by Friday?\n"
+    "Yes, Acme Corp confirmed PO-1234 with Globex.\n"
+    "\n"
+    "Best regards,\n"
+    "Jane Doe\n"
+    "Head of Procurement, Initech\n"
+    "\n"
+    "On Mon, Jan 6, 2025 at 10:00 AM Jane Doe <jane@initech.com> wrote:\n"
+    "> Please confirm the order for Initech.\n"
+)
+
+
+def _events(body):
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        yield event[len("event: "):], json.loads(data[len("data: "):])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fake_stream(text, ontology=None, max_retries=None, mode=None):
+        # The LLM sees the cleaned text, so offsets are cleaned-text offsets
+        entities = []
+        for value in ("Acme Corp", "Globex"):
+            start = text.index(value, text.index("Yes,"))
+            entities.append({"type": "Organization", "value": value, "start": start, "end": start + len(value)})
+            yield "entity", entities[-1]
+        yield "graph", {"entities": entities, "relationships": []}
+
+    monkeypatch.setattr(main, "stream_graph_extraction_async", fake_stream)
+    monkeypatch.setattr(main, "ADMISSION_CONTROL_ENABLED", False)
+    monkeypatch.setattr(main, "embedding_model", None)
+    return TestClient(main.app)
+
+
+def test_streamed_entity_positions_point_into_the_original_text(client):
+    response = client.post("/extract-graph/stream", json={"text": EMAIL, "preprocess": True})
+    events = list(_events(response.text))
+
+    streamed = [data for event, data in events if event == "entity"]
+    assert [entity["value"] for entity in streamed] == ["Acme Corp", "Globex"]
+    for entity in streamed:
+        assert EMAIL[entity["start"]:entity["end"]] == entity["value"]
+        assert entity["graph_data"]["text_position"] == {"start": entity["start"], "end": entity["end"]}
+
+    (done,) = [data for event, data in events if event == "done"]
+    assert "preprocessing" in done["graph_metadata"]
+    for entity in done["entities"]:
+        assert EMAIL[entity["start"]:entity["end"]] == entity["value"]
+        assert entity["graph_data"]["text_position"] == {"start": entity["start"], "end": entity["end"]}
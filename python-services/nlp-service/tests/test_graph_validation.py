@@ -0,0 +1,109 @@
+import pytest
+
+from graph_validation import MODE_DROP, MODE_FLAG, MODE_OFF, GraphValidator
+from ontology_snapshots import OntologySnapshot
+
+
+@pytest.fixture
+def ontology():
+    return OntologySnapshot(
+        "test",
+        entity_types=["Company", "Person", "Deal", "MonetaryAmount"],
+        relationship_types=["WORKS_FOR", "HAS_AMOUNT"],
+        property_types=["MonetaryAmount"],
+        compact_ontology={
+            "e": ["Company", "Person", "Deal"],
+            "r": [["Person", "WORKS_FOR", "Company"], ["Deal", "HAS_AMOUNT", "MonetaryAmount"]],
+        },
+    )
+
+
+def test_types_list_resolves_to_first_ontology_type(ontology):
+    validator = GraphValidator(ontology)
+    entity = validator.entity({"value": "Acme", "types": ["Organisation", "company", "Deal"]})
+    assert entity["type"] == "Company"
+    assert "types" not in entity
+    assert entity["confidence"] == 0.9
+    assert validator.counts["entities"]["corrected"] == 0
+    assert "ontology_violation" not in entity
+
+
+def test_type_spelling_is_corrected(ontology):
+    validator = GraphValidator(ontology)
+    entity = validator.entity({"value": "$5M", "type": "monetary_amount", "confidence": 1.7})
+    assert entity["type"] == "MonetaryAmount"
+    assert entity["confidence"] == 1.0
+    assert validator.counts["entities"]["corrected"] == 1
+
+
+def test_types_without_ontology_match_keep_first_name(ontology):
+    validator = GraphValidator(ontology)
+    entity = validator.entity({"value": "Blue Fund", "types": ["Fund", "Vehicle"]})
+    assert entity["type"] == "Fund"
+    assert entity["ontology_violation"] == "unknown_entity_type"
+
+
+def test_inferred_types_pass(ontology):
+    validator = GraphValidator(ontology)
+    entity = validator.entity({"value": "Blue Fund", "type": "FundInferred"})
+    assert "ontology_violation" not in entity
+    assert validator.counts["entities"]["inferred"] == 1
+
+
+def test_structural_failures_are_always_dropped(ontology):
+    validator = GraphValidator(ontology, MODE_OFF)
+    graph = validator.graph({
+        "entities": [{"type": "Company"}, "Acme", {"value": "Acme", "type": "Company"}],
+        "relationships": [{"source": "Acme", "type": "WORKS_FOR"}],
+    })
+    assert [e["value"] for e in graph["entities"]] == ["Acme"]
+    assert graph["relationships"] == []
+    assert validator.violations == {"missing_value": 1, "not_an_object": 1, "missing_target": 1}
+
+
+def _graph():
+    return {
+        "entities": [
+            {"value": "Jane Doe", "type": "Person", "id": "p1"},
+            {"value": "Acme", "type": "Company"},
+        ],
+        "relationships": [
+            {"source": "p1", "target": "Acme", "type": "works_for"},
+            {"source": "Jane Doe", "target": "Globex", "type": "WORKS_FOR"},
+            {"source": "Acme", "target": "Jane Doe", "type": "WORKS_FOR"},
+        ],
+    }
+
+
+def test_flag_mode_marks_dangling_endpoints_and_unknown_triples(ontology):
+    validator = GraphValidator(ontology, MODE_FLAG)
+    graph = validator.graph(_graph())
+    valid, dangling, reversed_triple = graph["relationships"]
+    assert valid["type"] == "WORKS_FOR"
+    assert "ontology_violation" not in valid
+    assert dangling["ontology_violation"] == "dangling_endpoint"
+    assert reversed_triple["ontology_violation"] == "triple_not_in_ontology"
+    report = validator.report()
+    assert report["relationships"] == {"valid": 0, "corrected": 1, "inferred": 0, "flagged": 2, "dropped": 0}
+    assert report["violations"] == {"dangling_endpoint": 1, "triple_not_in_ontology": 1}
+
+
+def test_drop_mode_removes_dangling_endpoints_and_unknown_triples(ontology):
+    validator = GraphValidator(ontology, MODE_DROP)
+    graph = validator.graph(_graph())
+    assert [(r["source"], r["target"]) for r in graph["relationships"]] == [("p1", "Acme")]
+    assert all("ontology_violation" not in r for r in graph["relationships"])
+    assert validator.counts["relationships"]["dropped"] == 2
+    assert validator.violations == {"dangling_endpoint": 1, "triple_not_in_ontology": 1}
+
+
+def test_off_mode_only_normalizes(ontology):
+    validator = GraphValidator(ontology, MODE_OFF)
+    graph = validator.graph(_graph())
+    assert len(graph["relationships"]) == 3
+    assert all("ontology_violation" not in r for r in graph["relationships"])
+
+
+def test_unknown_mode_is_rejected(ontology):
+    with pytest.raises(ValueError):
+        GraphValidator(ontology, "strict")
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from json_repair import repair_json
+
+
+def test_valid_json_needs_no_repair():
+    assert repair_json('{"entities": [], "relationships": []}') == ({"entities": [], "relationships": []}, [])
+
+
+def test_truncated_array_keeps_complete_elements():
+    text = '{"entities": [{"value": "Acme", "type": "Company"}, {"value": "Bo'
+    value, repairs = repair_json(text)
+    assert value == {"entities": [{"value": "Acme", "type": "Company"}, {}]}
+    assert repairs == ["truncated"]
+
+
+def test_truncated_object_drops_cut_off_member():
+    value, repairs = repair_json('{"entities": [{"value": "Acme", "confidence": 0.9')
+    # 0.9 may be the start of 0.95, so the member is dropped rather than guessed
+    assert value == {"entities": [{"value": "Acme"}]}
+    assert repairs == ["truncated"]
+
+
+def test_truncated_after_key():
+    value, repairs = repair_json('{"entities": [], "relationships"')
+    assert value == {"entities": []}
+    assert "truncated" in repairs
+
+
+def test_unescaped_inner_quotes():
+    value, repairs = repair_json('{"value": "The "Blue" Fund", "type": "Fund"}')
+    assert value == {"value": 'The "Blue" Fund', "type": "Fund"}
+    assert repairs == ["inner_quotes"]
+
+
+def test_trailing_commas():
+    value, repairs = repair_json('{"entities": [{"value": "Acme",}, ], }')
+    assert value == {"entities": [{"value": "Acme"}]}
+    assert repairs == ["trailing_commas"]
+
+
+def test_missing_commas():
+    value, repairs = repair_json('{"a": 1 "b": [1 2]}')
+    assert value == {"a": 1, "b": [1, 2]}
+    assert repairs == ["missing_commas"]
+
+
+def test_code_fence_and_surrounding_text():
+    value, repairs = repair_json('```json\n{"entities": []}\n```')
+    assert value == {"entities": []}
+    assert repairs == ["code_fence"]
+    value, repairs = repair_json('Here is the graph: {"entities": []} Hope this helps.')
+    assert value == {"entities": []}
+    assert repairs == ["leading_text", "trailing_text"]
+
+
+def test_single_quotes_unquoted_keys_and_python_literals():
+    value, repairs = repair_json("{'value': 'Acme', final: True, id: None}")
+    assert value == {"value": "Acme", "final": True, "id": None}
+    assert set(repairs) == {"single_quotes", "unquoted_keys", "python_literals"}
+
+
+def test_control_characters_and_escapes():
+    value, repairs = repair_json('{"value": "line\none", "path": "C:\\dir", "emoji": "\\ud83d\\ude00"}')
+    assert value == {"value": "line\none", "path": "C:\\dir", "emoji": "\U0001F600"}
+    assert set(repairs) == {"control_characters", "invalid_escapes"}
+
+
+@pytest.mark.parametrize("text", [None, "no json here", '{"a": 1 : 2}', '[1, }'])
+def test_unrepairable_answers_raise(text):
+    with pytest.raises(json.JSONDecodeError):
+        repair_json(text)
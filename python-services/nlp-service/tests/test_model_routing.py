@@ -0,0 +1,147 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from model_routing import (
+    FAST,
+    QUALITY,
+    STANDARD,
+    ModelRouter,
+    RoutingContext,
+    RoutingRule,
+    load_rules,
+    resolve_latency_tier,
+)
+
+RULES = [
+    RoutingRule(model="small", operations=("entity_importance", "relationship_importance")),
+    RoutingRule(model="small", operations=("graph_extraction",), max_text_tokens=200, max_ontology_types=20),
+    RoutingRule(model="medium", operations=("graph_extraction",), latency_tiers=(FAST,)),
+]
+
+
+def _router(**kwargs):
+    return ModelRouter("large", RULES, **kwargs)
+
+
+@pytest.mark.parametrize("context,model", [
+    (RoutingContext("entity_importance"), "small"),
+    (RoutingContext("graph_extraction", text_tokens=200, ontology_types=20), "small"),
+    (RoutingContext("graph_extraction", text_tokens=201, ontology_types=20), "large"),
+    (RoutingContext("graph_extraction", text_tokens=50, ontology_types=21), "large"),
+    (RoutingContext("graph_extraction", text_tokens=5000, latency_tier=FAST), "medium"),
+    (RoutingContext("refinement"), "large"),
+])
+def test_first_matching_rule_wins(context, model):
+    assert _router().route(context) == model
+
+
+def test_endpoint_condition():
+    router = ModelRouter("large", [RoutingRule(model="small", endpoints=("/extract-graph/stream",))])
+    assert router.route(RoutingContext("graph_extraction", endpoint="/extract-graph/stream")) == "small"
+    assert router.route(RoutingContext("graph_extraction", endpoint="/extract-graph")) == "large"
+
+
+def _record(router, model, latency, calls=5):
+    for _ in range(calls):
+        router.record_call(model, latency)
+
+
+def test_model_over_the_latency_budget_is_skipped():
+    router = _router(latency_budgets={FAST: 2.0}, min_latency_samples=5)
+    context = RoutingContext("graph_extraction", text_tokens=100, latency_tier=FAST)
+    assert router.route(context) == "small"
+    _record(router, "small", 3.0)
+    assert router.route(context) == "medium"
+    # Budgets only apply to the tier they are set for
+    assert router.route(RoutingContext("graph_extraction", text_tokens=100)) == "small"
+
+
+def test_latency_is_only_trusted_after_enough_samples():
+    router = _router(latency_budgets={FAST: 2.0}, min_latency_samples=5)
+    context = RoutingContext("graph_extraction", text_tokens=100, latency_tier=FAST)
+    _record(router, "small", 3.0, calls=4)
+    router.record_call("small", None)  # Failed calls carry no latency
+    assert router.observed_latency("small") is None
+    assert router.route(context) == "small"
+
+
+def test_fastest_candidate_when_every_match_is_over_budget():
+    router = _router(latency_budgets={FAST: 1.0}, min_latency_samples=1)
+    context = RoutingContext("graph_extraction", text_tokens=100, latency_tier=FAST)
+    _record(router, "small", 4.0)
+    _record(router, "medium", 2.0)
+    assert router.route(context) == "medium"
+
+
+def test_latency_ewma():
+    router = _router(min_latency_samples=1, latency_alpha=0.5)
+    router.record_call("small", 2.0)
+    router.record_call("small", 4.0)
+    assert router.observed_latency("small") == 3.0
+
+
+def test_escalation_for():
+    assert _router().escalation_for("small") is None
+    router = _router(escalation_model="large")
+    assert router.escalation_for("small") == "large"
+    assert router.escalation_for("large") is None
+
+
+def test_snapshot_counts_calls_errors_and_invalid_answers():
+    router = _router()
+    router.record_call("small", 1.0)
+    router.record_call("small", None)
+    router.record_output("small", True)
+    router.record_output("small", False)
+    stats = router.snapshot()["small"]
+    assert (stats["calls"], stats["errors"], stats["invalid"], stats["invalid_ratio"]) == (2, 1, 1, 0.5)
+
+
+def test_load_rules_inline_and_from_file(tmp_path):
+    config = json.dumps([{"model": "small", "operations": ["refinement"], "max_text_tokens": 100}])
+    expected = [RoutingRule(model="small", operations=("refinement",), max_text_tokens=100)]
+    assert load_rules(config) == expected
+    path = tmp_path / "rules.json"
+    path.write_text(config, encoding="utf-8")
+    assert load_rules(str(path)) == expected
+    assert load_rules("  ") is None
+
+
+@pytest.mark.parametrize("config", ['[1]', '[{"operations": ["refinement"]}]', '[{"model": "x", "tier": "fast"}]'])
+def test_load_invalid_rules_raises(config):
+    with pytest.raises(ValueError):
+        load_rules(config)
+
+
+@pytest.mark.parametrize("tier,expected", [(None, STANDARD), ("Fast", FAST), ("quality", QUALITY)])
+def test_resolve_latency_tier(tier, expected):
+    assert resolve_latency_tier(tier) == expected
+
+
+def test_resolve_unknown_latency_tier_raises():
+    with pytest.raises(ValueError):
+        resolve_latency_tier("instant")
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.mark.parametrize("escalation_model", [None, "large"])
+def test_empty_importance_answer_is_an_empty_analysis(monkeypatch, escalation_model):
+    main = pytest.importorskip("main")
+    calls = []
+
+    async def create(operation, model=None, **kwargs):
+        calls.append(model)
+        return _completion("{}")
+
+    monkeypatch.setattr(main, "async_client", object())
+    monkeypatch.setattr(main, "create_chat_completion_async", create)
+    monkeypatch.setattr(main, "model_router", ModelRouter("small", escalation_model=escalation_model))
+    request = main.AnalyzeEntityImportanceRequest(prompt="Rank the entities.", entities=[])
+    assert asyncio.run(main.analyze_entity_importance(request)) == {"analysis": []}
+    assert calls == ["small"] + ([escalation_model] if escalation_model else [])
@@ -0,0 +1,101 @@
+from near_duplicates import NearDuplicateIndex, TokenAlignment, patch_graph, tokenize
+
+NOTICE = (
+    "Purchase order {ref} was issued by Acme Corp to Globex Ltd for the delivery of forty pallets "
+    "of steel beams to the Rotterdam warehouse before the end of the month.{contact}"
+)
+CONTACT = " Contact Jane Doe for questions."
+
+
+def _graph(ref="PO-1234"):
+    text = NOTICE.format(ref=ref, contact=CONTACT)
+    start = text.index(ref)
+    return {
+        "entities": [
+            {"value": ref, "type": "PurchaseOrder", "id": "e1", "start": start, "end": start + len(ref)},
+            {"value": "Acme Corp", "type": "Company", "id": "e2"},
+            {"value": "Jane Doe", "type": "Person", "id": "e3"},
+        ],
+        "relationships": [
+            {"source": "e1", "target": "e2", "type": "ISSUED_BY", "id": "r1"},
+            {"source": ref, "target": "Acme Corp", "type": "ISSUED_BY", "id": "r2"},
+            {"source": "e3", "target": "e2", "type": "WORKS_FOR", "id": "r3"},
+            {"source": "Jane Doe", "target": "Acme Corp", "type": "WORKS_FOR"},
+        ],
+    }
+
+
+def _patch(old_text, new_text, graph):
+    return patch_graph(graph, tokenize(old_text), tokenize(new_text), new_text)
+
+
+def test_changed_reference_number_is_patched_through_value_and_id_references():
+    old_text = NOTICE.format(ref="PO-1234", contact=CONTACT)
+    new_text = NOTICE.format(ref="PO-1299", contact=CONTACT)
+    graph, stats = _patch(old_text, new_text, _graph())
+
+    assert stats == {"patched_entities": 1, "dropped_entities": 0}
+    order = graph["entities"][0]
+    assert order["value"] == "PO-1299"
+    assert "id" not in order
+    assert new_text[order["start"]:order["end"]] == "PO-1299"
+    assert graph["entities"][1]["id"] == "e2"
+
+    by_id, by_value = graph["relationships"][:2]
+    assert (by_id["source"], by_id["target"]) == ("PO-1299", "e2")
+    assert (by_value["source"], by_value["target"]) == ("PO-1299", "Acme Corp")
+    # Rewritten relationships lose their id; untouched ones keep it
+    assert "id" not in by_id and "id" not in by_value
+    assert graph["relationships"][2]["id"] == "r3"
+
+
+def test_deleted_entity_is_dropped_with_its_relationships():
+    old_text = NOTICE.format(ref="PO-1234", contact=CONTACT)
+    new_text = NOTICE.format(ref="PO-1234", contact="")
+    graph, stats = _patch(old_text, new_text, _graph())
+
+    assert stats == {"patched_entities": 0, "dropped_entities": 1}
+    assert [e["value"] for e in graph["entities"]] == ["PO-1234", "Acme Corp"]
+    # Both the id-based and the value-based WORKS_FOR relationship go with Jane Doe
+    assert [r.get("id") for r in graph["relationships"]] == ["r1", "r2"]
+
+
+def test_identical_text_keeps_the_graph():
+    text = NOTICE.format(ref="PO-1234", contact=CONTACT)
+    graph, stats = _patch(text, text, _graph())
+    assert stats == {"patched_entities": 0, "dropped_entities": 0}
+    assert graph == {"entities": _graph()["entities"], "relationships": _graph()["relationships"]}
+
+
+def test_map_span_widens_into_replaced_runs():
+    alignment = TokenAlignment(tokenize("order PO - 1234 from Acme"), tokenize("order PO - 56 78 from Acme"))
+    assert alignment.map_span(1, 4) == (1, 5)
+    assert alignment.map_span(5, 6) == (6, 7)
+
+
+def test_index_reuses_near_duplicate_in_the_same_scope():
+    index = NearDuplicateIndex(threshold=0.9)
+    index.add(("default", "llm"), NOTICE.format(ref="PO-1234", contact=CONTACT), _graph())
+
+    new_text = NOTICE.format(ref="PO-1299", contact=CONTACT)
+    assert index.find(("other", "llm"), new_text) is None
+    graph, reuse = index.find(("default", "llm"), new_text)
+    assert reuse["similarity"] == 1.0
+    assert reuse["patched_entities"] == 1
+    assert graph["entities"][0]["value"] == "PO-1299"
+    # The indexed graph itself is not modified by patching
+    again, _ = index.find(("default", "llm"), NOTICE.format(ref="PO-1234", contact=CONTACT))
+    assert again["entities"][0]["value"] == "PO-1234"
+
+
+def test_clear_scope_with_graph_predicate():
+    index = NearDuplicateIndex()
+    index.add(("a", "llm"), "first text about Acme", {"entities": [{"value": "Acme", "type": "Company"}]})
+    index.add(("a", "llm"), "second text about Jane", {"entities": [{"value": "Jane", "type": "Person"}]})
+    index.add(("b", "llm"), "third text about Acme", {"entities": [{"value": "Acme", "type": "Company"}]})
+    dropped = index.clear_scope(
+        lambda scope: scope[0] == "a",
+        lambda graph: any(e["type"] == "Company" for e in graph["entities"]),
+    )
+    assert dropped == 1
+    assert len(index) == 2
@@ -0,0 +1,116 @@
+from ontology_snapshots import OntologySnapshot, diff_snapshots
+
+
+def _snapshot(entity_types=("Person", "Organization"), relationship_types=("WORKS_FOR",), triples=None, **kwargs):
+    triples = [("Person", "WORKS_FOR", "Organization")] if triples is None else triples
+    return OntologySnapshot(
+        "test",
+        entity_types=entity_types,
+        relationship_types=relationship_types,
+        compact_ontology={"e": list(entity_types), "r": triples},
+        **kwargs,
+    )
+
+
+GRAPH = {
+    "entities": [{"type": "Person", "value": "Jane"}, {"type": "Organization", "value": "Acme"}],
+    "relationships": [{"type": "WORKS_FOR", "source": "Jane", "target": "Acme"}],
+}
+
+
+def test_added_entity_type_without_triples_invalidates_every_graph():
+    diff = diff_snapshots(_snapshot(), _snapshot(entity_types=("Person", "Organization", "Product")))
+    assert diff.added_entity_types == ["Product"]
+    assert diff.affected_types() == frozenset()
+    assert diff.types_added
+    assert diff.invalidates(GRAPH)
+    assert diff.invalidates({"entities": [], "relationships": []})
+
+
+def test_added_relationship_type_invalidates_every_graph():
+    diff = diff_snapshots(_snapshot(), _snapshot(relationship_types=("WORKS_FOR", "OWNS")))
+    assert diff.added_relationship_types == ["OWNS"]
+    assert diff.invalidates(GRAPH)
+
+
+def test_changed_description_only_invalidates_graphs_with_that_type():
+    diff = diff_snapshots(
+        _snapshot(entity_descriptions={"Organization": "A company"}),
+        _snapshot(entity_descriptions={"Organization": "A company or public body"}),
+    )
+    assert not diff.types_added
+    assert diff.invalidates(GRAPH)
+    assert not diff.invalidates({"entities": [{"type": "Person", "value": "Jane"}], "relationships": []})
+
+
+def test_content_hash_ignores_key_order_and_version():
+    first = OntologySnapshot(
+        "test", ["Person"], ["WORKS_FOR"],
+        entity_descriptions={"Person": "A human", "Organization": "A company"},
+        compact_ontology={"e": ["Person"], "r": [["Person", "WORKS_FOR", "Organization"]]},
+    )
+    second = OntologySnapshot(
+        "test", ("Person",), ("WORKS_FOR",),
+        entity_descriptions={"Organization": "A company", "Person": "A human"},
+        compact_ontology={"r": [("Person", "WORKS_FOR", "Organization")], "e": ("Person",)},
+    )
+    assert first.version != second.version
+    assert first.content_hash == second.content_hash
+
+
+def test_content_hash_changes_with_content():
+    base = _snapshot()
+    assert _snapshot().content_hash == base.content_hash
+    assert _snapshot(entity_types=("Organization", "Person")).content_hash != base.content_hash
+    assert _snapshot(entity_descriptions={"Person": "A human"}).content_hash != base.content_hash
+    assert _snapshot(triples=[]).content_hash != base.content_hash
+
+
+def test_diff_of_identical_snapshots_is_empty():
+    diff = diff_snapshots(_snapshot(), _snapshot())
+    assert diff.as_dict() == {}
+    assert not diff.prompt_changed
+    assert not diff.invalidates(GRAPH)
+
+
+def test_diff_reports_added_removed_and_changed_types():
+    old = _snapshot(
+        entity_types=("Person", "Organization", "Email"),
+        relationship_types=("WORKS_FOR", "SENT"),
+        property_types=("Email",),
+        triples=[("Person", "WORKS_FOR", "Organization"), ("Person", "SENT", "Email")],
+        relationship_descriptions={"WORKS_FOR": "Employment"},
+    )
+    new = _snapshot(
+        entity_types=("Person", "Organization", "Product", "Phone"),
+        relationship_types=("WORKS_FOR", "MAKES"),
+        property_types=("Phone",),
+        triples=[("Person", "WORKS_FOR", "Organization"), ("Organization", "MAKES", "Product")],
+        relationship_descriptions={"WORKS_FOR": "Current employment"},
+    )
+    diff = diff_snapshots(old, new)
+    assert diff.as_dict() == {
+        "added_entity_types": ["Phone", "Product"],
+        "removed_entity_types": ["Email"],
+        "added_property_types": ["Phone"],
+        "removed_property_types": ["Email"],
+        "added_relationship_types": ["MAKES"],
+        "removed_relationship_types": ["SENT"],
+        "changed_descriptions": ["WORKS_FOR"],
+        "added_triples": [["Organization", "MAKES", "Product"]],
+        "removed_triples": [["Person", "SENT", "Email"]],
+    }
+    assert diff.entity_types_changed and diff.prompt_changed
+    assert diff.affected_types() == {
+        "Email", "SENT", "Phone", "WORKS_FOR", "Person", "Organization", "MAKES", "Product",
+    }
+
+
+def test_diff_of_changed_triples_only():
+    diff = diff_snapshots(
+        _snapshot(triples=[("Person", "WORKS_FOR", "Organization")]),
+        _snapshot(triples=[("Organization", "WORKS_FOR", "Organization")]),
+    )
+    assert not diff.entity_types_changed and not diff.types_added
+    assert diff.prompt_changed
+    assert diff.affected_types() == {"Person", "WORKS_FOR", "Organization"}
@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, retry_after_seconds
+from scheduling import INTERACTIVE
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Only the limiter's clock is faked; asyncio and threading keep the real one
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic, time=time.time))
+    return clock
+
+
+def wait_for_call(limiter: AdaptiveRateLimiter, tokens: int):
+    """Seconds a call of ``tokens`` arriving now would have to wait (0.0 = may go)."""
+    ticket = object()
+    with limiter._lock:
+        limiter._waiters.push(ticket, INTERACTIVE, tokens)
+        try:
+            return limiter._try_acquire(ticket, tokens)
+        finally:
+            limiter._waiters.remove(ticket)
+
+
+def test_tpm_wait_until_enough_of_the_window_expires(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=1000, initial_concurrency=8)
+    limiter.release(limiter.acquire_blocking(600), latency=0.1)
+    clock.advance(10)
+    limiter.release(limiter.acquire_blocking(300), latency=0.1)
+    clock.advance(10)
+
+    assert wait_for_call(limiter, 100) == 0.0
+    # 900 + 500 exceeds the budget by 400: the 600-token call must leave the window (at t+60)
+    assert wait_for_call(limiter, 500) == pytest.approx(40.0)
+    # 900 + 800 needs both calls to expire
+    assert wait_for_call(limiter, 800) == pytest.approx(50.0)
+    clock.advance(40)
+    assert wait_for_call(limiter, 500) == 0.0
+    assert limiter.snapshot()["tokens_in_window"] == 300
+
+
+def test_actual_tokens_replace_the_estimate(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=1000)
+    limiter.release(limiter.acquire_blocking(600), latency=0.1, actual_tokens=250)
+    assert limiter.snapshot()["tokens_in_window"] == 250
+
+
+def test_rate_limited_call_refunds_its_tokens_and_pauses(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=1000)
+    permit = limiter.acquire_blocking(600)
+    limiter.release(permit, rate_limited=True, retry_after=2.5)
+
+    snapshot = limiter.snapshot()
+    assert snapshot["tokens_in_window"] == 0
+    assert snapshot["rate_limited_total"] == 1
+    assert snapshot["blocked_for"] == pytest.approx(2.5)
+    assert wait_for_call(limiter, 10) == pytest.approx(2.5)
+    clock.advance(2.5)
+    assert wait_for_call(limiter, 10) == 0.0
+
+
+def test_rate_limited_call_with_usage_keeps_reported_tokens(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=1000)
+    limiter.release(limiter.acquire_blocking(600), rate_limited=True, actual_tokens=40)
+    assert limiter.snapshot()["tokens_in_window"] == 40
+
+
+def test_missing_retry_after_uses_default_pause(clock):
+    limiter = AdaptiveRateLimiter()
+    limiter.release(limiter.acquire_blocking(), rate_limited=True)
+    assert limiter.snapshot()["blocked_for"] == pytest.approx(rate_limiter.DEFAULT_RETRY_AFTER_SECONDS)
+
+
+def test_burst_of_429s_decreases_once(clock):
+    limiter = AdaptiveRateLimiter(initial_concurrency=8, min_concurrency=1)
+    permits = [limiter.acquire_blocking() for _ in range(3)]
+    for permit in permits:
+        limiter.release(permit, rate_limited=True, retry_after=0)
+    assert limiter.snapshot()["concurrency_limit"] == 4
+
+    clock.advance(1.5)
+    limiter.release(limiter.acquire_blocking(), rate_limited=True, retry_after=0)
+    assert limiter.snapshot()["concurrency_limit"] == 2
+
+
+def test_additive_increase_and_latency_decrease(clock):
+    limiter = AdaptiveRateLimiter(initial_concurrency=4, max_concurrency=5, latency_target=2.0)
+    expected = 4.0
+    for _ in range(3):
+        limiter.release(limiter.acquire_blocking(), latency=0.5)
+        expected += 1 / expected  # +1 per limit's worth of successes
+    assert limiter._limit == pytest.approx(expected)
+    assert limiter.snapshot()["concurrency_limit"] == 4
+    for _ in range(10):
+        limiter.release(limiter.acquire_blocking(), latency=0.5)
+    assert limiter.snapshot()["concurrency_limit"] == 5
+
+    clock.advance(5)
+    limiter.release(limiter.acquire_blocking(), latency=3.0)
+    assert limiter._limit == pytest.approx(5 * 0.9)
+
+
+def test_rpm_budget(clock):
+    limiter = AdaptiveRateLimiter(requests_per_minute=2, initial_concurrency=8)
+    limiter.release(limiter.acquire_blocking(), latency=0.1)
+    clock.advance(15)
+    limiter.release(limiter.acquire_blocking(), latency=0.1)
+    assert wait_for_call(limiter, 0) == pytest.approx(45.0)
+    clock.advance(45)
+    assert wait_for_call(limiter, 0) == 0.0
+
+
+def _wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.mark.parametrize("first", ["async", "blocking"])
+def test_async_and_blocking_waiters_are_served_in_arrival_order(clock, first):
+    limiter = AdaptiveRateLimiter(initial_concurrency=1, max_concurrency=1)
+    held = limiter.acquire_blocking()
+    granted = []
+
+    blocking_permits = []
+
+    def blocking_call():
+        permit = limiter.acquire_blocking()
+        granted.append("blocking")
+        blocking_permits.append(permit)
+
+    async def scenario():
+        thread = threading.Thread(target=blocking_call)
+        task = None
+
+        async def async_call():
+            permit = await limiter.acquire()
+            granted.append("async")
+            return permit
+
+        async def wait_queued(count):
+            while limiter.snapshot()["queued"] < count:
+                await asyncio.sleep(0.005)
+
+        if first == "async":
+            task = asyncio.ensure_future(async_call())
+            await wait_queued(1)
+            thread.start()
+            await wait_queued(2)
+        else:
+            thread.start()
+            await wait_queued(1)
+            task = asyncio.ensure_future(async_call())
+            await wait_queued(2)
+
+        limiter.release(held, latency=0.1)
+        if first == "async":
+            permit = await asyncio.wait_for(task, timeout=2)
+            await asyncio.sleep(0.05)
+            assert granted == ["async"]
+            limiter.release(permit, latency=0.1)
+            await asyncio.get_running_loop().run_in_executor(None, thread.join, 2)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: _wait_until(lambda: granted))
+            await asyncio.sleep(0.05)
+            assert granted == ["blocking"] and not task.done()
+            limiter.release(blocking_permits[0], latency=0.1)
+            await asyncio.wait_for(task, timeout=2)
+        assert not thread.is_alive()
+
+    asyncio.run(scenario())
+    assert granted == [first, "blocking" if first == "async" else "async"]
+
+
+def test_retry_after_headers():
+    def error(headers):
+        return SimpleNamespace(response=SimpleNamespace(headers=headers, status_code=429))
+
+    assert retry_after_seconds(error({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(error({"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(error({"retry-after": "soon"})) is None
+    assert retry_after_seconds(error({})) is None
+
+
+def test_release_after_the_entry_expired_leaves_the_window_alone(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=10000)
+    permit = limiter.acquire_blocking(1000)
+    clock.advance(70)
+    limiter.snapshot()  # Expires the entry while the call is still running
+    clock.advance(20)
+    limiter.release(permit, latency=90, actual_tokens=3000)
+    assert limiter._tokens_in_window == 0.0
+    clock.advance(120)
+    assert limiter.snapshot()["tokens_in_window"] == 0
+    assert not limiter._tokens
+
+
+def test_rate_limited_release_after_expiry_refunds_nothing(clock):
+    limiter = AdaptiveRateLimiter(tokens_per_minute=10000)
+    permit = limiter.acquire_blocking(1000)
+    clock.advance(61)
+    limiter.release(permit, rate_limited=True, retry_after=0)
+    assert limiter._tokens_in_window == 0.0
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from scheduling import BULK, INTERACTIVE, PriorityExecutor, WeightedFairQueue, current_priority, resolve_priority
+
+
+def _drain(queue, count=None):
+    served = []
+    while len(queue) and (count is None or len(served) < count):
+        served.append(queue.pop_head())
+    return served
+
+
+def _filled_queue(per_class=100, weights=None):
+    queue = WeightedFairQueue(weights or {INTERACTIVE: 4, BULK: 1})
+    for i in range(per_class):
+        queue.push(("bulk", i), BULK)
+        queue.push(("interactive", i), INTERACTIVE)
+    return queue
+
+
+def test_classes_share_slots_by_weight():
+    served = _drain(_filled_queue(), 50)
+    assert sum(1 for cls, _ in served if cls == "bulk") == 10
+    # Bulk is never starved for long while interactive work waits
+    bulk_slots = [i for i, (cls, _) in enumerate(served) if cls == "bulk"]
+    assert max(b - a for a, b in zip(bulk_slots, bulk_slots[1:])) <= 5
+
+
+def test_higher_priority_is_served_first_on_a_tie():
+    queue = WeightedFairQueue({INTERACTIVE: 4, BULK: 1})
+    queue.push("bulk", BULK)
+    queue.push("interactive", INTERACTIVE)
+    assert queue.head() == "interactive"
+    assert _drain(queue) == ["interactive", "bulk"]
+
+
+def test_idle_class_does_not_bank_credit():
+    queue = WeightedFairQueue({INTERACTIVE: 4, BULK: 1})
+    for i in range(20):
+        queue.push(("bulk", i), BULK)
+    _drain(queue)
+    for i in range(8):
+        queue.push(("interactive", i), INTERACTIVE)
+        queue.push(("bulk", 20 + i), BULK)
+    served = _drain(queue, 5)
+    assert sum(1 for cls, _ in served if cls == "interactive") >= 3
+
+
+def test_bulk_is_shortest_first_and_interactive_is_fifo():
+    jobs = (("long", 30.0), ("short", 1.0), ("medium", 10.0), ("short-2", 1.0))
+    served = {}
+    for cls in (INTERACTIVE, BULK):
+        queue = WeightedFairQueue({INTERACTIVE: 4, BULK: 1})
+        for name, cost in jobs:
+            queue.push(name, cls, cost)
+        served[cls] = _drain(queue)
+    assert served[INTERACTIVE] == ["long", "short", "medium", "short-2"]
+    assert served[BULK] == ["short", "short-2", "medium", "long"]
+
+
+def test_remove_and_unknown_class():
+    queue = WeightedFairQueue({INTERACTIVE: 4, BULK: 1})
+    queue.push("a", "overnight")
+    queue.push("b", BULK)
+    assert queue.counts() == {INTERACTIVE: 1, BULK: 1}
+    queue.remove("b")
+    assert "b" not in queue
+    assert _drain(queue) == ["a"]
+    assert queue.head() is None and queue.pop_head() is None
+
+
+@pytest.mark.parametrize("priority,expected", [(None, BULK), ("Interactive", INTERACTIVE), ("bulk", BULK)])
+def test_resolve_priority(priority, expected):
+    assert resolve_priority(priority, BULK) == expected
+
+
+def test_resolve_unknown_priority_raises():
+    with pytest.raises(ValueError):
+        resolve_priority("urgent", INTERACTIVE)
+
+
+def test_executor_runs_waiting_interactive_work_first():
+    executor = PriorityExecutor(1, {INTERACTIVE: 4, BULK: 1})
+    started, release = threading.Event(), threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    blocked = executor.submit(blocker, priority=BULK)
+    assert started.wait(5)
+    futures = [executor.submit(order.append, f"bulk-{i}", priority=BULK) for i in range(2)]
+    futures += [executor.submit(order.append, f"interactive-{i}", priority=INTERACTIVE) for i in range(2)]
+    assert executor.queued() == {INTERACTIVE: 2, BULK: 2}
+    release.set()
+    for future in [blocked] + futures:
+        future.result(5)
+    assert order[:2] == ["interactive-0", "interactive-1"]
+
+
+def test_executor_runs_work_in_the_callers_context():
+    executor = PriorityExecutor(1, {INTERACTIVE: 4, BULK: 1})
+    token = current_priority.set(BULK)
+    try:
+        future = executor.submit(current_priority.get)
+    finally:
+        current_priority.reset(token)
+    assert future.result(5) == BULK
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(lambda: 1 / 0).result(5)
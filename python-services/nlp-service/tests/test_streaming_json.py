@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from streaming_json import IncrementalGraphParser
+
+ANSWER = json.dumps({
+    "notes": [{"value": "not an element"}],
+    "entities": [
+        {"type": "Organization", "value": "Acme \"ACME\" Corp", "properties": {"aliases": ["Acme", "{ACME}"]}},
+        {"type": "Person", "value": "René Müller \\ back", "start": 4, "end": 15},
+    ],
+    "relationships": [
+        {"type": "WORKS_FOR", "source": "René Müller \\ back", "target": "Acme \"ACME\" Corp", "confidence": 0.9},
+    ],
+}, ensure_ascii=False, indent=1)
+
+
+def _expected(answer):
+    graph = json.loads(answer)
+    return [("entity", e) for e in graph["entities"]] + [("relationship", r) for r in graph["relationships"]]
+
+
+def _feed(parser, pieces):
+    events = []
+    for piece in pieces:
+        events.extend(parser.feed(piece))
+    return events
+
+
+@pytest.mark.parametrize("split", range(len(ANSWER) + 1))
+def test_answer_split_anywhere(split):
+    parser = IncrementalGraphParser()
+    assert _feed(parser, [ANSWER[:split], ANSWER[split:]]) == _expected(ANSWER)
+    assert parser.text == ANSWER
+    assert parser.emitted == 3
+    assert parser.skipped == 0
+
+
+def test_answer_fed_one_byte_at_a_time():
+    # Deltas are text, so a multi-byte character arrives with its last byte
+    pieces, pending = [], b""
+    for byte in ANSWER.encode("utf-8"):
+        pending += bytes([byte])
+        try:
+            pieces.append(pending.decode("utf-8"))
+            pending = b""
+        except UnicodeDecodeError:
+            pieces.append("")
+    assert "".join(pieces) == ANSWER
+    assert _feed(IncrementalGraphParser(), pieces) == _expected(ANSWER)
+
+
+def test_elements_are_emitted_as_soon_as_they_close():
+    parser = IncrementalGraphParser()
+    first = ANSWER.rindex("}", 0, ANSWER.index('"Person"')) + 1
+    assert parser.feed(ANSWER[:first - 1]) == []
+    assert [kind for kind, _ in parser.feed(ANSWER[first - 1:first])] == ["entity"]
+
+
+def test_truncated_answer_emits_only_completed_elements():
+    truncated = ANSWER[:ANSWER.index('"WORKS_FOR"')]
+    parser = IncrementalGraphParser()
+    assert _feed(parser, [truncated]) == _expected(ANSWER)[:2]
+    assert parser.text == truncated
+
+
+def test_malformed_elements_are_skipped():
+    answer = '{"entities": [{"type": "Person", "value": "Jane",}, "Acme", {"type": "Organization", "value": "Acme"}]}'
+    parser = IncrementalGraphParser()
+    assert _feed(parser, [answer]) == [("entity", {"type": "Organization", "value": "Acme"})]
+    assert parser.skipped == 1
+    assert parser.emitted == 1
+
+
+def test_stray_closers_are_ignored():
+    parser = IncrementalGraphParser()
+    assert _feed(parser, ["]}", '{"entities": [{"value": "x"}]}', "}}"]) == [("entity", {"value": "x"})]
+    assert parser.text == ']}{"entities": [{"value": "x"}]}}}'
@@ -0,0 +1,107 @@
+from thread_incremental import OffsetMap, ThreadStore, merge_graphs, split_segments
+
+FIRST = (
+    "Hi Bob,\n"
+    "\n"
+    "Acme Corp will deliver PO-1234 on Friday.\n"
+    "Regards, Jane"
+)
+REPLY = (
+    "Thanks Jane, Globex confirms the date.\n"
+    "\n"
+    "On Mon, Jan 6, 2025 at 10:00 AM Jane Doe <jane@acme.com> wrote:\n"
+    "> Hi Bob,\n"
+    ">\n"
+    "> Acme Corp   will deliver PO-1234 on Friday.\n"
+    "> Regards, Jane"
+)
+
+
+def _texts(segments):
+    return [segment.text for segment in segments]
+
+
+def test_segments_split_at_blank_lines_and_quote_depth():
+    segments = split_segments(REPLY)
+    assert _texts(segments) == [
+        "Thanks Jane, Globex confirms the date.",
+        "On Mon, Jan 6, 2025 at 10:00 AM Jane Doe <jane@acme.com> wrote:",
+        "> Hi Bob,",
+        "> Acme Corp   will deliver PO-1234 on Friday.\n> Regards, Jane",
+    ]
+    for segment in segments:
+        assert REPLY[segment.start:segment.start + len(segment.text)] == segment.text
+
+
+def test_quoted_history_reuses_the_original_fingerprints():
+    original = {segment.fingerprint for segment in split_segments(FIRST)}
+    reply = split_segments(REPLY)
+    reused = [segment.text for segment in reply if segment.fingerprint in original]
+    assert reused == ["> Hi Bob,", "> Acme Corp   will deliver PO-1234 on Friday.\n> Regards, Jane"]
+    assert len(original) == 2
+
+
+def test_whitespace_only_and_marker_only_blocks_are_not_segments():
+    assert split_segments("\n\n>\n> \n   \n") == []
+
+
+def test_offset_map_shifts_offsets_back_to_the_original_text():
+    segments = [s for s in split_segments(REPLY) if not s.text.startswith(">")]
+    offsets = OffsetMap(segments)
+    assert offsets.text == (
+        "Thanks Jane, Globex confirms the date.\n\n"
+        "On Mon, Jan 6, 2025 at 10:00 AM Jane Doe <jane@acme.com> wrote:"
+    )
+    for value in ("Globex", "Jane Doe", "jane@acme.com"):
+        start = offsets.text.index(value)
+        original_start = offsets.to_original(start)
+        original_end = offsets.to_original(start + len(value))
+        assert REPLY[original_start:original_end] == value
+    assert offsets.to_original(None) is None
+    # Offsets inside the separator or past the text have no original position
+    separator = len(segments[0].text) + 1
+    assert offsets.to_original(separator) is None
+    assert offsets.to_original(len(offsets.text) + 5) is None
+
+
+def test_merge_deduplicates_entities_and_relationships():
+    stored = {
+        "entities": [{"type": "Organization", "value": "Acme Corp", "start": 9}],
+        "relationships": [{"type": "SUPPLIES", "source": "Acme Corp", "target": "Globex"}],
+    }
+    new = {
+        "entities": [
+            {"type": "Organization", "value": "acme  corp", "start": 90},
+            {"type": "Person", "value": "Acme Corp"},
+            {"type": "Organization", "value": "Globex"},
+            "Globex",
+        ],
+        "relationships": [
+            {"type": "SUPPLIES", "source": "ACME Corp", "target": "globex"},
+            {"type": "CONTACTS", "source": "Acme Corp", "target": "Globex"},
+        ],
+    }
+    merged = merge_graphs(stored, new)
+    assert merged["entities"] == [
+        {"type": "Organization", "value": "Acme Corp", "start": 9},
+        {"type": "Person", "value": "Acme Corp"},
+        {"type": "Organization", "value": "Globex"},
+    ]
+    assert [r["type"] for r in merged["relationships"]] == ["SUPPLIES", "CONTACTS"]
+    # The stored graph is copied, not modified
+    assert len(stored["entities"]) == 1
+    merged["entities"][0]["start"] = 0
+    assert stored["entities"][0]["start"] == 9
+
+
+def test_store_is_bounded_and_drops_by_predicate():
+    store = ThreadStore(capacity=2)
+    store.get(("a", "default"))
+    store.get(("b", "default"))
+    store.get(("a", "default"))  # most recently used
+    store.get(("c", "other")).graph["entities"].append({"type": "Person", "value": "Jane"})
+    assert len(store) == 2
+    assert store.drop(lambda key: key[0] == "b") == 0
+    assert store.drop(lambda key: True, lambda graph: bool(graph["entities"])) == 1
+    assert store.drop(lambda key: key[1] == "default") == 1
+    assert len(store) == 0
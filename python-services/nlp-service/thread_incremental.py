@@ -0,0 +1,166 @@
+"""
+Append-aware incremental extraction for growing email threads.
+
+Every reply in a thread re-sends the quoted conversation. When a client passes
+a thread key, the text is split into segments (paragraphs, also split where
+the quote depth changes) and each segment is fingerprinted after normalization (quote markers, whitespace and case are
+ignored, so "> quoted" history matches the original message). Only segments
+not seen before for the key are extracted; the result is merged into the
+graph stored for the thread.
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_QUOTE_PREFIX_RE = re.compile(r"^[ \t]*(?:>[ \t]?)+", re.MULTILINE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Segment:
+    start: int  # Offset in the original text
+    text: str
+    fingerprint: str
+
+
+def split_segments(text: str) -> List[Segment]:
+    """
+    Split a text into segments at blank lines and wherever the quote depth
+    changes ("On ... wrote:" followed directly by "> ..." lines), with
+    fingerprints of the normalized segment text. Lines are kept verbatim, so
+    segment offsets point into the original text.
+    """
+    segments: List[Segment] = []
+    block: List[Tuple[int, str]] = []  # (offset, line) of the current segment
+
+    def flush() -> None:
+        if not block:
+            return
+        first_offset, _ = block[0]
+        raw = text[first_offset:block[-1][0] + len(block[-1][1])]
+        body = _QUOTE_PREFIX_RE.sub("", raw)
+        if re.search(r"\w", body):
+            normalized = _WHITESPACE_RE.sub(" ", body).strip().lower()
+            segments.append(Segment(
+                start=first_offset,
+                text=raw,
+                fingerprint=hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32],
+            ))
+        block.clear()
+
+    offset = 0
+    depth = None
+    for line in text.split("\n"):
+        prefix = _QUOTE_PREFIX_RE.match(line)
+        line_depth = prefix.group(0).count(">") if prefix else 0
+        if not line[prefix.end() if prefix else 0:].strip():
+            flush()
+        else:
+            if line_depth != depth:
+                flush()
+            depth = line_depth
+            block.append((offset, line))
+        offset += len(line) + 1
+    flush()
+    return segments
+
+
+class OffsetMap:
+    """Maps offsets in a text assembled from segments back to the original text."""
+
+    SEPARATOR = "\n\n"
+
+    def __init__(self, segments: List[Segment]):
+        self.text = self.SEPARATOR.join(segment.text for segment in segments)
+        self._spans: List[Tuple[int, int, int]] = []  # (assembled start, assembled end, original start)
+        offset = 0
+        for segment in segments:
+            self._spans.append((offset, offset + len(segment.text), segment.start))
+            offset += len(segment.text) + len(self.SEPARATOR)
+
+    def to_original(self, offset: Optional[int]) -> Optional[int]:
+        if offset is None:
+            return None
+        for start, end, original in self._spans:
+            if start <= offset <= end:
+                return original + (offset - start)
+        return None
+
+
+def _entity_key(entity: Dict[str, Any]) -> Tuple[str, str]:
+    return " ".join(str(entity.get("value", "")).lower().split()), str(entity.get("type", ""))
+
+def _relationship_key(rel: Dict[str, Any]) -> Tuple[str, str, str]:
+    return (
+        " ".join(str(rel.get("source", "")).lower().split()),
+        str(rel.get("type", "")),
+        " ".join(str(rel.get("target", "")).lower().split()),
+    )
+
+def merge_graphs(stored: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Union of two graphs; entities match on (value, type), relationships on (source, type, target)."""
+    entities = [dict(e) for e in stored.get("entities", [])]
+    seen_entities = {_entity_key(e) for e in entities}
+    for entity in new.get("entities", []):
+        if isinstance(entity, dict) and _entity_key(entity) not in seen_entities:
+            seen_entities.add(_entity_key(entity))
+            entities.append(entity)
+
+    relationships = [dict(r) for r in stored.get("relationships", [])]
+    seen_relationships = {_relationship_key(r) for r in relationships}
+    for rel in new.get("relationships", []):
+        if isinstance(rel, dict) and _relationship_key(rel) not in seen_relationships:
+            seen_relationships.add(_relationship_key(rel))
+            relationships.append(rel)
+    return {"entities": entities, "relationships": relationships}
+
+
+@dataclass
+class ThreadState:
+    fingerprints: Set[str] = field(default_factory=set)
+    graph: Dict[str, Any] = field(default_factory=lambda: {"entities": [], "relationships": []})
+    updated_at: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ThreadStore:
+    """Bounded (LRU) store of per-thread segment fingerprints and merged graphs."""
+
+    def __init__(self, capacity: int = 5000):
+        self.capacity = capacity
+        self._threads: "OrderedDict[Tuple[str, ...], ThreadState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def get(self, key: Tuple[str, ...]) -> ThreadState:
+        with self._lock:
+            state = self._threads.get(key)
+            if state is None:
+                state = self._threads[key] = ThreadState()
+                while len(self._threads) > self.capacity:
+                    self._threads.popitem(last=False)
+            else:
+                self._threads.move_to_end(key)
+            return state
+
+    def drop(self, predicate, graph_predicate=None) -> int:
+        """
+        Forget the threads whose key matches ``predicate`` (e.g. after an
+        ontology update) and, if given, whose merged graph matches ``graph_predicate``.
+        """
+        with self._lock:
+            stale = [
+                key for key, state in self._threads.items()
+                if predicate(key) and (graph_predicate is None or graph_predicate(state.graph))
+            ]
+            for key in stale:
+                del self._threads[key]
+        return len(stale)
@@ -0,0 +1,315 @@
+"""
+Lightweight per-request stage tracing for the NLP service.
+
+Spans are recorded under the request_id of the request that opened the trace
+and propagated implicitly through ``contextvars``, so helpers deep in the
+pipeline only need ``tracer.span("stage")``. Finished spans are emitted as
+structured JSON log lines and, when ``OTEL_EXPORTER_OTLP_ENDPOINT`` is set,
+exported in OTLP/JSON format to a local OpenTelemetry collector.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    request_id: str
+    start_time: float
+    end_time: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_time if self.end_time is not None else time.time()
+        return (end - self.start_time) * 1000.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_log_record(self) -> Dict[str, Any]:
+        return {
+            "event": "span",
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "span": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans recorded for a single request_id."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.trace_id = _trace_id_for(request_id)
+        self.root: Optional[Span] = None
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def breakdown(self, root: Optional[Span] = None) -> Dict[str, Any]:
+        """
+        Summarize the time spent per stage below ``root`` (the trace root by default).
+
+        Args:
+            root: Span whose subtree is summarized
+
+        Returns:
+            Dictionary with total_ms, per-stage totals and the individual spans
+        """
+        root = root or self.root
+        spans = self.spans
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        subtree: List[Span] = []
+        pending = list(children.get(root.span_id, [])) if root else [s for s in spans if s.parent_id is None]
+        while pending:
+            span = pending.pop()
+            subtree.append(span)
+            pending.extend(children.get(span.span_id, []))
+
+        stages: Dict[str, float] = {}
+        for span in subtree:
+            stages[span.name] = round(stages.get(span.name, 0.0) + span.duration_ms, 3)
+
+        return {
+            "total_ms": round(root.duration_ms, 3) if root else None,
+            "stages_ms": stages,
+            "spans": [
+                {
+                    "name": span.name,
+                    "start_offset_ms": round((span.start_time - root.start_time) * 1000.0, 3) if root else None,
+                    "duration_ms": round(span.duration_ms, 3),
+                    "status": span.status,
+                    **({"attributes": span.attributes} if span.attributes else {}),
+                }
+                for span in sorted(subtree, key=lambda s: s.start_time)
+            ],
+        }
+
+
+def _trace_id_for(request_id: str) -> str:
+    # OTLP wants a 32-hex trace id; request ids are "req_<uuid4>" so reuse the uuid
+    candidate = request_id[4:] if request_id.startswith("req_") else request_id
+    try:
+        return uuid.UUID(candidate).hex
+    except ValueError:
+        return hashlib.md5(request_id.encode("utf-8")).hexdigest()
+
+
+class OTLPExporter:
+    """
+    Background exporter posting finished spans to an OTLP/HTTP JSON endpoint
+    (e.g. http://localhost:4318). Export is best effort: spans are dropped when
+    the queue is full or the collector is unreachable.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "nlp-service",
+                 max_queue_size: int = 2048, batch_size: int = 128, flush_interval: float = 2.0):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "nlp-service.tracing"},
+                    "spans": [self._to_otlp(span) for span in spans],
+                }],
+            }]
+        }
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            print(f"⚠️  OTLP export to {self.url} failed: {e}")
+
+    @staticmethod
+    def _to_otlp(span: Span) -> Dict[str, Any]:
+        attributes = [_otlp_attribute("request_id", span.request_id)]
+        attributes.extend(_otlp_attribute(k, v) for k, v in span.attributes.items())
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start_time * 1e9)),
+            "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+            "attributes": attributes,
+            "status": {"code": 2 if span.status == "error" else 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    def __init__(self, logger: Optional[logging.Logger] = None, exporter: Optional[OTLPExporter] = None):
+        self.logger = logger
+        self.exporter = exporter
+        self._current_trace: ContextVar[Optional[Trace]] = ContextVar("nlp_current_trace", default=None)
+        self._current_span: ContextVar[Optional[Span]] = ContextVar("nlp_current_span", default=None)
+
+    @property
+    def current_trace(self) -> Optional[Trace]:
+        return self._current_trace.get()
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        return self._current_span.get()
+
+    def current_request_id(self) -> Optional[str]:
+        trace = self._current_trace.get()
+        return trace.request_id if trace else None
+
+    @contextmanager
+    def start_trace(self, request_id: str, name: str, **attributes: Any) -> Iterator[Trace]:
+        """Open a trace for ``request_id`` with a root span named ``name``."""
+        trace = Trace(request_id)
+        trace_token = self._current_trace.set(trace)
+        try:
+            with self.span(name, **attributes) as root:
+                trace.root = root
+                yield trace
+        finally:
+            self._current_trace.reset(trace_token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Record a span under the active trace. Outside of a trace this is a no-op
+        and yields None, so library helpers can be traced unconditionally.
+        """
+        trace = self._current_trace.get()
+        if trace is None:
+            yield None
+            return
+
+        parent = self._current_span.get()
+        span = Span(
+            name=name,
+            trace_id=trace.trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            request_id=trace.request_id,
+            start_time=time.time(),
+            attributes=dict(attributes),
+        )
+        span_token = self._current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            span.end_time = time.time()
+            self._current_span.reset(span_token)
+            trace.add(span)
+            self._emit(span)
+
+    def _emit(self, span: Span) -> None:
+        if self.logger is not None:
+            self.logger.info(json.dumps(span.to_log_record(), default=str))
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+def create_tracer_from_env() -> Tracer:
+    """
+    Build the service tracer from environment variables.
+
+    - TRACE_LOG_ENABLED: emit one JSON log line per finished span (default: 1)
+    - OTEL_EXPORTER_OTLP_ENDPOINT: optional OTLP/HTTP collector, e.g. http://localhost:4318
+    - OTEL_SERVICE_NAME: service name reported to the collector (default: nlp-service)
+    """
+    logger = None
+    if os.getenv("TRACE_LOG_ENABLED", "1") == "1":
+        logger = logging.getLogger("nlp_service.trace")
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    exporter = None
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if endpoint:
+        exporter = OTLPExporter(endpoint, service_name=os.getenv("OTEL_SERVICE_NAME", "nlp-service"))
+        print(f"📡 Exporting trace spans to {exporter.url}")
+
+    return Tracer(logger=logger, exporter=exporter)